@@ -6,6 +6,7 @@ from logging.config import fileConfig
 
 from alembic import context
 from sqlalchemy import engine_from_config, pool
+from sqlalchemy.engine import Connection
 
 from app.core.config import get_settings
 from app import models  # noqa: F401  # ensure model modules are imported
@@ -14,7 +15,8 @@ from app.models import metadata
 config = context.config
 
 if config.config_file_name is not None:
-    fileConfig(config.config_file_name)
+    # Keep the application loggers alive when migrations run at startup.
+    fileConfig(config.config_file_name, disable_existing_loggers=False)
 
 
 def get_database_url() -> str:
@@ -44,9 +46,40 @@ def run_migrations_offline() -> None:
         context.run_migrations()
 
 
+def _run_with_connection(connection: Connection) -> None:
+    """Configure the migration context on an open connection and run."""
+
+    if connection.dialect.name == "postgresql":
+        # Fail fast instead of queueing for a lock behind live traffic; the
+        # helpers in ``app.core.online_migrations`` retry with backoff.
+        lock_timeout = int(get_settings().migration_lock_timeout_ms)
+        connection.exec_driver_sql(f"SET lock_timeout = {lock_timeout}")
+        connection.commit()
+
+    context.configure(
+        connection=connection,
+        target_metadata=metadata,
+        compare_type=True,
+        render_as_batch=connection.dialect.name == "sqlite",
+        # Commit each revision separately so locks are held briefly and
+        # ``autocommit_block`` (CREATE INDEX CONCURRENTLY) can be used.
+        transaction_per_migration=True,
+    )
+
+    with context.begin_transaction():
+        context.run_migrations()
+
+
 def run_migrations_online() -> None:
     """Run migrations in 'online' mode."""
 
+    # ``app.core.migrations`` hands over the application's connection so the
+    # migration runs against the same database (including in-memory SQLite).
+    connection = config.attributes.get("connection")
+    if connection is not None:
+        _run_with_connection(connection)
+        return
+
     configuration = config.get_section(config.config_ini_section) or {}
     configuration["sqlalchemy.url"] = get_database_url()
 
@@ -57,14 +90,7 @@ def run_migrations_online() -> None:
     )
 
     with connectable.connect() as connection:
-        context.configure(
-            connection=connection,
-            target_metadata=metadata,
-            compare_type=True,
-        )
-
-        with context.begin_transaction():
-            context.run_migrations()
+        _run_with_connection(connection)
 
 
 if context.is_offline_mode():
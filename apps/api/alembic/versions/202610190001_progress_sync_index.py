@@ -0,0 +1,27 @@
+"""Index listening progress by QR and update time for delta sync."""
+
+from __future__ import annotations
+
+from app.core.online_migrations import create_index_concurrently, drop_index_concurrently
+
+
+revision = "202610190001"
+down_revision = "202409180001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """Add the keyset index used by ``GET /api/progress/sync``."""
+
+    create_index_concurrently(
+        "idx_progress_qr_updated",
+        "listening_progress",
+        ["qr_id", "updated_at", "device_id", "track_id"],
+    )
+
+
+def downgrade() -> None:
+    """Drop the delta-sync index."""
+
+    drop_index_concurrently("idx_progress_qr_updated", "listening_progress")
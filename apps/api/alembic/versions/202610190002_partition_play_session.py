@@ -0,0 +1,149 @@
+"""Partition play_session by month on started_at."""
+
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+
+from alembic import op
+
+from app.core.online_migrations import (
+    DEFAULT_LOCK_TIMEOUT_MS,
+    add_check_constraint_not_valid,
+    create_index_concurrently,
+    execute_with_lock_retry,
+    retry_on_lock_timeout,
+    validate_constraint,
+)
+from app.core.partitions import (
+    DEFAULT_MONTHS_AHEAD,
+    DEFAULT_PARTITION,
+    LEGACY_PARTITION,
+    add_months,
+    create_partition,
+    month_start,
+)
+
+
+revision = "202610190002"
+down_revision = "202610190001"
+branch_labels = None
+depends_on = None
+
+_COLUMNS = "id, qr_id, device_id, started_at, ended_at, ip_hash"
+
+_COLUMN_DEFINITIONS = """
+    id UUID NOT NULL,
+    qr_id UUID NOT NULL,
+    device_id UUID NOT NULL,
+    started_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    ended_at TIMESTAMP WITH TIME ZONE,
+    ip_hash TEXT NOT NULL
+"""
+
+_FOREIGN_KEYS = """
+    CONSTRAINT play_session_qr_id_fkey FOREIGN KEY (qr_id)
+        REFERENCES qr_code (id) ON DELETE CASCADE,
+    CONSTRAINT play_session_device_id_fkey FOREIGN KEY (device_id)
+        REFERENCES device (id) ON DELETE CASCADE
+"""
+
+_BOUND_CHECK = "play_session_legacy_bound"
+
+
+def upgrade() -> None:
+    """Turn ``play_session`` into a range-partitioned table without copying it.
+
+    The existing table becomes the partition ``play_session_legacy`` holding
+    everything before the first monthly partition. Its indexes are built
+    concurrently and a validated CHECK constraint proves the partition bound,
+    so the final swap (two renames and ``ATTACH PARTITION``) is a catalog-only
+    change that holds its locks for milliseconds, under ``lock_timeout`` with
+    retries. The legacy partition keeps every row until retention empties it,
+    after which it can be detached like a monthly partition.
+    """
+
+    bind = op.get_bind()
+    if bind.dialect.name != "postgresql":
+        op.create_index("idx_play_session_qr_started", "play_session", ["qr_id", "started_at"])
+        op.create_index("idx_play_session_device_started", "play_session", ["device_id", "started_at"])
+        return
+
+    # Rows keep arriving in the legacy table until the swap, so its range has
+    # to reach past "now" by a margin the migration cannot outlive.
+    now = datetime.now(timezone.utc)
+    first_month = add_months(month_start(now + timedelta(days=1)), 1)
+    bound = f"'{first_month.isoformat()} 00:00:00+00'"
+
+    # The index builds below commit, so a retry after a failure further on
+    # finds the new table and its default partition already there.
+    op.execute(
+        f"CREATE TABLE IF NOT EXISTS play_session_partitioned ({_COLUMN_DEFINITIONS}, {_FOREIGN_KEYS}, "
+        "CONSTRAINT play_session_partitioned_pkey PRIMARY KEY (id, started_at)"
+        ") PARTITION BY RANGE (started_at)"
+    )
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS idx_play_session_qr_started ON play_session_partitioned (qr_id, started_at)"
+    )
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS idx_play_session_device_started "
+        "ON play_session_partitioned (device_id, started_at)"
+    )
+    op.execute(f"CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION} PARTITION OF play_session_partitioned DEFAULT")
+
+    # Matching indexes let ATTACH PARTITION adopt them instead of building.
+    create_index_concurrently(
+        "play_session_legacy_id_started_key", "play_session", ["id", "started_at"], unique=True
+    )
+    create_index_concurrently("play_session_legacy_qr_started_idx", "play_session", ["qr_id", "started_at"])
+    create_index_concurrently(
+        "play_session_legacy_device_started_idx", "play_session", ["device_id", "started_at"]
+    )
+    execute_with_lock_retry(
+        "ALTER TABLE play_session ADD CONSTRAINT play_session_legacy_id_started_key "
+        "UNIQUE USING INDEX play_session_legacy_id_started_key"
+    )
+    add_check_constraint_not_valid(_BOUND_CHECK, "play_session", f"started_at < {bound}")
+    validate_constraint("play_session", _BOUND_CHECK)
+
+    def swap() -> None:
+        with bind.begin_nested():
+            bind.exec_driver_sql(f"SET LOCAL lock_timeout = {DEFAULT_LOCK_TIMEOUT_MS}")
+            bind.exec_driver_sql(f"ALTER TABLE play_session RENAME TO {LEGACY_PARTITION}")
+            bind.exec_driver_sql(f"ALTER INDEX play_session_pkey RENAME TO {LEGACY_PARTITION}_pkey")
+            bind.exec_driver_sql("ALTER TABLE play_session_partitioned RENAME TO play_session")
+            bind.exec_driver_sql("ALTER INDEX play_session_partitioned_pkey RENAME TO play_session_pkey")
+            # The validated CHECK implies the bound, so this does not scan.
+            bind.exec_driver_sql(
+                f"ALTER TABLE play_session ATTACH PARTITION {LEGACY_PARTITION} "
+                f"FOR VALUES FROM (MINVALUE) TO ({bound})"
+            )
+            bind.exec_driver_sql(f"ALTER TABLE {LEGACY_PARTITION} DROP CONSTRAINT {_BOUND_CHECK}")
+            month = first_month
+            while month <= add_months(month_start(now), DEFAULT_MONTHS_AHEAD):
+                create_partition(bind, month)
+                month = add_months(month, 1)
+
+    retry_on_lock_timeout(swap, description="attach play_session_legacy")
+
+
+def downgrade() -> None:
+    """Copy the rows back into an unpartitioned ``play_session``.
+
+    Unlike the upgrade this rewrites the table under an exclusive lock; it is
+    meant for development databases only.
+    """
+
+    bind = op.get_bind()
+    if bind.dialect.name != "postgresql":
+        op.drop_index("idx_play_session_device_started", table_name="play_session")
+        op.drop_index("idx_play_session_qr_started", table_name="play_session")
+        return
+
+    op.execute("ALTER TABLE play_session RENAME TO play_session_partitioned")
+    op.execute("ALTER INDEX play_session_pkey RENAME TO play_session_partitioned_pkey")
+    op.execute(
+        f"CREATE TABLE play_session ({_COLUMN_DEFINITIONS}, {_FOREIGN_KEYS}, "
+        "CONSTRAINT play_session_pkey PRIMARY KEY (id))"
+    )
+    op.execute(f"INSERT INTO play_session ({_COLUMNS}) SELECT {_COLUMNS} FROM play_session_partitioned")
+    op.execute("DROP TABLE play_session_partitioned")
@@ -0,0 +1,34 @@
+"""Add job_checkpoint for resumable maintenance jobs."""
+
+from __future__ import annotations
+
+import sqlalchemy as sa
+from alembic import op
+
+
+revision = "202610190003"
+down_revision = "202610190002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """Create the checkpoint table used by the retention runner."""
+
+    op.create_table(
+        "job_checkpoint",
+        sa.Column("name", sa.Text(), primary_key=True, nullable=False),
+        sa.Column("position", sa.Text(), nullable=True),
+        sa.Column(
+            "updated_at",
+            sa.TIMESTAMP(timezone=True),
+            nullable=False,
+            server_default=sa.text("CURRENT_TIMESTAMP"),
+        ),
+    )
+
+
+def downgrade() -> None:
+    """Drop the checkpoint table."""
+
+    op.drop_table("job_checkpoint")
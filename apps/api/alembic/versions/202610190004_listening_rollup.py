@@ -0,0 +1,47 @@
+"""Add listening_daily_rollup and the columns and indexes that feed it."""
+
+from __future__ import annotations
+
+import sqlalchemy as sa
+from alembic import op
+
+from app.core.online_migrations import add_column, create_partitioned_index
+
+
+revision = "202610190004"
+down_revision = "202610190003"
+branch_labels = None
+depends_on = None
+
+ENDED_INDEX = "idx_play_session_ended"
+
+
+def upgrade() -> None:
+    """Create the rollup table, ``completed_at`` and the ``ended_at`` index."""
+
+    op.create_table(
+        "listening_daily_rollup",
+        sa.Column("product_id", sa.Integer(), primary_key=True, nullable=False),
+        sa.Column("day", sa.Date(), primary_key=True, nullable=False),
+        sa.Column("sessions", sa.Integer(), nullable=False, server_default=sa.text("0")),
+        sa.Column("listening_ms", sa.BigInteger(), nullable=False, server_default=sa.text("0")),
+        sa.Column("completions", sa.Integer(), nullable=False, server_default=sa.text("0")),
+        sa.Column(
+            "updated_at",
+            sa.TIMESTAMP(timezone=True),
+            nullable=False,
+            server_default=sa.text("CURRENT_TIMESTAMP"),
+        ),
+    )
+    add_column("listening_progress", sa.Column("completed_at", sa.TIMESTAMP(timezone=True), nullable=True))
+
+    create_partitioned_index(ENDED_INDEX, "play_session", ["ended_at"])
+
+
+def downgrade() -> None:
+    """Drop the rollup table, ``completed_at`` and the ``ended_at`` index."""
+
+    op.drop_index(ENDED_INDEX, table_name="play_session")
+    with op.batch_alter_table("listening_progress") as batch:
+        batch.drop_column("completed_at")
+    op.drop_table("listening_daily_rollup")
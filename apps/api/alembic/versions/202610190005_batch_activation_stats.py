@@ -0,0 +1,41 @@
+"""Add batch_activation_stats counters."""
+
+from __future__ import annotations
+
+import sqlalchemy as sa
+from alembic import op
+
+
+revision = "202610190005"
+down_revision = "202610190004"
+branch_labels = None
+depends_on = None
+
+_COUNTERS = ("new", "active", "blocked", "reregistrations", "cooldowns")
+
+
+def upgrade() -> None:
+    """Create the per-batch activation counters (filled by rebuild_activation_stats)."""
+
+    op.create_table(
+        "batch_activation_stats",
+        sa.Column("batch_id", sa.Integer(), primary_key=True, nullable=False),
+        sa.Column("product_id", sa.Integer(), primary_key=True, nullable=False),
+        sa.Column("slot", sa.Integer(), primary_key=True, nullable=False),
+        *(
+            sa.Column(name, sa.Integer(), nullable=False, server_default=sa.text("0"))
+            for name in _COUNTERS
+        ),
+        sa.Column(
+            "updated_at",
+            sa.TIMESTAMP(timezone=True),
+            nullable=False,
+            server_default=sa.text("CURRENT_TIMESTAMP"),
+        ),
+    )
+
+
+def downgrade() -> None:
+    """Drop the activation counters."""
+
+    op.drop_table("batch_activation_stats")
@@ -0,0 +1,41 @@
+"""Add the media_asset catalog."""
+
+from __future__ import annotations
+
+import sqlalchemy as sa
+from alembic import op
+
+
+revision = "202610190006"
+down_revision = "202610190005"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """Create the media asset catalog (filled by ingest_hls and rescan_media)."""
+
+    op.create_table(
+        "media_asset",
+        sa.Column("path", sa.String(length=512), primary_key=True, nullable=False),
+        sa.Column("product_id", sa.Integer(), nullable=True),
+        sa.Column("size", sa.BigInteger(), nullable=False),
+        sa.Column("mtime", sa.Double(), nullable=True),
+        sa.Column("duration_ms", sa.Integer(), nullable=True),
+        sa.Column("bitrate", sa.Integer(), nullable=True),
+        sa.Column("sha256", sa.String(length=64), nullable=True),
+        sa.Column(
+            "updated_at",
+            sa.TIMESTAMP(timezone=True),
+            nullable=False,
+            server_default=sa.text("CURRENT_TIMESTAMP"),
+        ),
+    )
+    op.create_index("idx_media_asset_product", "media_asset", ["product_id"])
+
+
+def downgrade() -> None:
+    """Drop the media asset catalog."""
+
+    op.drop_index("idx_media_asset_product", table_name="media_asset")
+    op.drop_table("media_asset")
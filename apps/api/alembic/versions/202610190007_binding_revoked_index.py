@@ -0,0 +1,54 @@
+"""Index bindings and progress for the retention scans."""
+
+from __future__ import annotations
+
+from alembic import op
+
+from app.core.online_migrations import (
+    create_index_concurrently,
+    drop_index_concurrently,
+    execute_with_lock_retry,
+)
+
+
+revision = "202610190007"
+down_revision = "202610190006"
+branch_labels = None
+depends_on = None
+
+BINDING_INDEX = "idx_binding_revoked_at"
+PROGRESS_INDEX = "idx_progress_updated_at"
+PROGRESS_COLUMNS = ["updated_at", "qr_id", "device_id", "track_id"]
+
+
+def _replace_progress_index(columns: list[str]) -> None:
+    """Rebuild ``idx_progress_updated_at`` over ``columns`` without blocking writes."""
+
+    if op.get_bind().dialect.name != "postgresql":
+        op.drop_index(PROGRESS_INDEX, table_name="listening_progress")
+        op.create_index(PROGRESS_INDEX, "listening_progress", columns)
+        return
+
+    create_index_concurrently(f"{PROGRESS_INDEX}_next", "listening_progress", columns)
+    drop_index_concurrently(PROGRESS_INDEX, "listening_progress")
+    execute_with_lock_retry(f"ALTER INDEX {PROGRESS_INDEX}_next RENAME TO {PROGRESS_INDEX}")
+
+
+def upgrade() -> None:
+    """Key the retention indexes by timestamp and primary key.
+
+    The retention windows page on ``(timestamp, primary key)``. With the whole
+    key in the index the row comparison is an index condition, so rows that
+    share a timestamp (one progress flush stamps thousands) are not read again
+    by every window.
+    """
+
+    create_index_concurrently(BINDING_INDEX, "qr_binding", ["revoked_at", "qr_id", "device_id"])
+    _replace_progress_index(PROGRESS_COLUMNS)
+
+
+def downgrade() -> None:
+    """Drop the binding index and restore the single-column progress index."""
+
+    drop_index_concurrently(BINDING_INDEX, "qr_binding")
+    _replace_progress_index(["updated_at"])
@@ -0,0 +1,38 @@
+"""Record when each play session was closed, for the listening rollup."""
+
+from __future__ import annotations
+
+import sqlalchemy as sa
+from alembic import op
+
+from app.core.online_migrations import add_column, create_partitioned_index
+
+
+revision = "202610190008"
+down_revision = "202610190007"
+branch_labels = None
+depends_on = None
+
+CLOSED_INDEX = "idx_play_session_closed"
+
+
+def upgrade() -> None:
+    """Add ``play_session.closed_at`` and its index.
+
+    ``ended_at`` can lie in the past when a session is closed (at its last
+    heartbeat, or at its start when nothing is known), so the rollup selects
+    sessions by when the close was written instead. Existing rows are not
+    backfilled: the rollup falls back to ``ended_at`` where ``closed_at`` is
+    null.
+    """
+
+    add_column("play_session", sa.Column("closed_at", sa.TIMESTAMP(timezone=True), nullable=True))
+    create_partitioned_index(CLOSED_INDEX, "play_session", ["closed_at"])
+
+
+def downgrade() -> None:
+    """Drop ``play_session.closed_at`` and its index."""
+
+    op.drop_index(CLOSED_INDEX, table_name="play_session")
+    with op.batch_alter_table("play_session") as batch:
+        batch.drop_column("closed_at")
@@ -2,17 +2,34 @@
 
 from __future__ import annotations
 
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
-from .api import access, auth, play, preview, shop
+from .api import access, analytics, auth, media, play, preview, progress, shop
 from .core.config import get_settings
 from .core.migrations import run_migrations
+from .core.partitions import ensure_shard_partitions
 
 
 API_PREFIX = "/api"
 
 
+@asynccontextmanager
+async def lifespan(_app: FastAPI) -> AsyncIterator[None]:
+    """Run background workers for the lifetime of the application."""
+
+    progress.progress_flusher.start()
+    await play.play_events.start()
+    try:
+        yield
+    finally:
+        await play.play_events.stop()
+        progress.progress_flusher.stop()
+
+
 def create_app() -> FastAPI:
     """Create and configure the FastAPI application instance."""
 
@@ -22,9 +39,11 @@ def create_app() -> FastAPI:
         title="Audiovook API",
         version="0.1.0",
         debug=settings.debug,
+        lifespan=lifespan,
     )
 
     run_migrations()
+    ensure_shard_partitions()
 
     app.add_middleware(
         CORSMiddleware,
@@ -35,9 +54,12 @@ def create_app() -> FastAPI:
     )
 
     app.include_router(access.router, prefix=API_PREFIX)
+    app.include_router(analytics.router, prefix=API_PREFIX)
     app.include_router(auth.router, prefix=API_PREFIX)
+    app.include_router(media.router, prefix=API_PREFIX)
     app.include_router(play.router, prefix=API_PREFIX)
     app.include_router(preview.router, prefix=API_PREFIX)
+    app.include_router(progress.router, prefix=API_PREFIX)
     app.include_router(shop.router, prefix=API_PREFIX)
 
     @app.get("/health")
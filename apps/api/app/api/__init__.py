@@ -1,11 +1,14 @@
 """API router modules for the Audiovook service."""
 
-from . import access, auth, play, preview, shop
+from . import access, analytics, auth, media, play, preview, progress, shop
 
 __all__ = [
     "access",
+    "analytics",
     "auth",
+    "media",
     "play",
     "preview",
+    "progress",
     "shop",
 ]
@@ -13,11 +13,14 @@ from fastapi import APIRouter, Depends, HTTPException, Request, status
 from pydantic import BaseModel, Field
 from sqlalchemy import func
 from sqlmodel import Session, select
+from sqlmodel.sql.expression import SelectOfScalar
 
-from app.core.database import get_session
+from app.core.database import ShardSessions, get_shard_sessions
 from app.core.rate_limit import DEFAULT_ACCESS_RULE, RateLimitExceeded, RateLimiter
 from app.core.redis import get_redis_client
 from app.models import Device, QrBinding, QrCode, QrStatus
+from app.services.activation_stats import record_transition
+from app.services.bindings import binding_cache
 
 logger = logging.getLogger("app.access")
 
@@ -131,6 +134,10 @@ def _log_validation_result(
     )
 
 
+def _qr_by_token_query(token: str) -> SelectOfScalar[QrCode]:
+    return select(QrCode).where(QrCode.token == token)
+
+
 def _build_product_payload(qr: QrCode) -> Optional[ProductInfo]:
     if qr.product_id is None:
         return None
@@ -166,7 +173,7 @@ def _build_validation_payload(qr_code: QrCode) -> AccessValidateResponse:
 def validate_access(
     payload: AccessValidateRequest,
     request: Request,
-    session: Session = Depends(get_session),
+    shards: ShardSessions = Depends(get_shard_sessions),
 ) -> AccessValidateResponse:
     """Validate a QR token and return its access status."""
 
@@ -183,8 +190,8 @@ def validate_access(
         _log_validation_result(request, payload.token, payload.device_id, response)
         return response
 
-    query = select(QrCode).where(QrCode.token == token)
-    qr_code = session.exec(query).first()
+    session = shards.for_token(token, read_only=True)
+    qr_code = session.exec(_qr_by_token_query(token)).first()
 
     if qr_code is None:
         response = AccessValidateResponse(
@@ -219,13 +226,16 @@ class AccessReregisterRequest(BaseModel):
     account_id: Optional[uuid.UUID] = None
 
 
-def _get_active_binding(session: Session, qr_id: uuid.UUID) -> Optional[QrBinding]:
-    binding_query = (
+def _active_binding_query(qr_id: uuid.UUID) -> SelectOfScalar[QrBinding]:
+    return (
         select(QrBinding)
         .where(QrBinding.qr_id == qr_id)
         .where(QrBinding.active.is_(True))
     )
-    return session.exec(binding_query).first()
+
+
+def _get_active_binding(session: Session, qr_id: uuid.UUID) -> Optional[QrBinding]:
+    return session.exec(_active_binding_query(qr_id)).first()
 
 
 def _ensure_device(
@@ -238,6 +248,9 @@ def _ensure_device(
     if device is None:
         device = Device(id=device_id, ua_hash=ua_hash, account_id=account_id)
         session.add(device)
+        # The models declare no relationships, so the unit of work cannot
+        # order this INSERT ahead of the binding that references the device.
+        session.flush()
     elif account_id is not None and device.account_id != account_id:
         device.account_id = account_id
     return device
@@ -271,7 +284,7 @@ def _check_cooldown(
 def register_access(
     payload: AccessRegisterRequest,
     request: Request,
-    session: Session = Depends(get_session),
+    shards: ShardSessions = Depends(get_shard_sessions),
 ) -> AccessValidateResponse:
     """Create the initial binding between a QR token and a device."""
 
@@ -280,7 +293,8 @@ def register_access(
         _log_event(request, "access.register.invalid", payload.token, payload.device_id)
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Token is required")
 
-    qr_code = session.exec(select(QrCode).where(QrCode.token == token)).first()
+    session = shards.for_token(token)
+    qr_code = session.exec(_qr_by_token_query(token)).first()
     if qr_code is None:
         _log_event(request, "access.register.not_found", token, payload.device_id)
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Token not found")
@@ -301,6 +315,7 @@ def register_access(
                 active_binding.account_id = payload.account_id
                 session.add(active_binding)
                 session.commit()
+                binding_cache.invalidate(token)
                 session.refresh(qr_code)
             _log_event(request, "access.register.idempotent", token, payload.device_id)
             return _build_validation_payload(qr_code)
@@ -328,9 +343,11 @@ def register_access(
     )
     session.add(binding)
 
+    previous_status = qr_code.status
     qr_code.status = QrStatus.ACTIVE
     qr_code.registered_at = datetime.utcnow()
     session.add(qr_code)
+    record_transition(session, qr_code, previous_status)
 
     session.commit()
     session.refresh(qr_code)
@@ -346,30 +363,38 @@ def register_access(
     return _build_validation_payload(qr_code)
 
 
-def _count_total_bindings(session: Session, qr_id: uuid.UUID) -> int:
-    return session.exec(
+def _total_bindings_query(qr_id: uuid.UUID) -> SelectOfScalar[int]:
+    return (
         select(func.count())
         .select_from(QrBinding)
         .where(QrBinding.qr_id == qr_id)
-    ).one()
+    )
 
 
-def _count_recent_reactivations(session: Session, qr_id: uuid.UUID, now: datetime) -> int:
-    cutoff = now - timedelta(hours=24)
-    return session.exec(
+def _recent_reactivations_query(qr_id: uuid.UUID, cutoff: datetime) -> SelectOfScalar[int]:
+    return (
         select(func.count())
         .select_from(QrBinding)
         .where(QrBinding.qr_id == qr_id)
         .where(QrBinding.revoked_at.is_not(None))
         .where(QrBinding.revoked_at >= cutoff)
-    ).one()
+    )
+
+
+def _count_total_bindings(session: Session, qr_id: uuid.UUID) -> int:
+    return session.exec(_total_bindings_query(qr_id)).one()
+
+
+def _count_recent_reactivations(session: Session, qr_id: uuid.UUID, now: datetime) -> int:
+    cutoff = now - timedelta(hours=24)
+    return session.exec(_recent_reactivations_query(qr_id, cutoff)).one()
 
 
 @router.post("/reregister", response_model=AccessValidateResponse)
 def reregister_access(
     payload: AccessReregisterRequest,
     request: Request,
-    session: Session = Depends(get_session),
+    shards: ShardSessions = Depends(get_shard_sessions),
 ) -> AccessValidateResponse:
     """Move an existing registration to a new device."""
 
@@ -378,7 +403,8 @@ def reregister_access(
         _log_event(request, "access.reregister.invalid", payload.token, payload.new_device_id)
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Token is required")
 
-    qr_code = session.exec(select(QrCode).where(QrCode.token == token)).first()
+    session = shards.for_token(token)
+    qr_code = session.exec(_qr_by_token_query(token)).first()
     if qr_code is None:
         _log_event(request, "access.reregister.not_found", token, payload.new_device_id)
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Token not found")
@@ -411,6 +437,7 @@ def reregister_access(
             session.add(active_binding)
 
         session.commit()
+        binding_cache.invalidate(token)
         session.refresh(qr_code)
 
         _log_event(
@@ -453,15 +480,21 @@ def reregister_access(
     )
     session.add(new_binding)
 
+    previous_status = qr_code.status
     qr_code.status = QrStatus.ACTIVE
     qr_code.registered_at = now
 
     recent_reactivations = _count_recent_reactivations(session, qr_code.id, now)
-    if recent_reactivations > 3:
+    cooldown = recent_reactivations > 3
+    if cooldown:
         qr_code.cooldown_until = now + timedelta(hours=48)
 
     session.add(qr_code)
+    record_transition(session, qr_code, previous_status, reregistration=True, cooldown=cooldown)
     session.commit()
+    # The old device must stop passing player checks in every worker now,
+    # not when its cached binding expires.
+    binding_cache.invalidate(token)
     session.refresh(qr_code)
 
     _log_event(
@@ -0,0 +1,191 @@
+"""Publisher analytics endpoints, served from precomputed rollups."""
+
+from __future__ import annotations
+
+import hmac
+from dataclasses import asdict
+from datetime import date, datetime, timedelta
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+from app.core.config import get_settings
+from app.core.database import ShardRouter, get_shard_router, read_only_engine
+from app.services.activation_stats import ActivationCounts, read_activation_stats
+from app.services.analytics import RollupTotals, read_listening_rollup
+from app.services.exports import EXPORTS, iter_csv_chunks
+
+router = APIRouter(prefix="/analytics")
+
+MAX_RANGE_DAYS = 366
+DEFAULT_RANGE_DAYS = 30
+
+
+def require_admin_key(x_admin_key: Optional[str] = Header(default=None)) -> None:
+    """Reject requests that do not carry the configured admin key."""
+
+    expected = get_settings().admin_api_key
+    if not expected or x_admin_key is None or not hmac.compare_digest(x_admin_key, expected):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin key required")
+
+
+class ListeningDay(BaseModel):
+    """Listening totals of one product on one UTC day."""
+
+    day: date
+    sessions: int
+    listening_hours: float
+    completions: int
+
+
+class ListeningReport(BaseModel):
+    """Daily listening totals of a product over a date range."""
+
+    product_id: int
+    start: date
+    end: date
+    days: list[ListeningDay]
+    sessions: int
+    listening_hours: float
+    completions: int
+
+
+def _hours(listening_ms: int) -> float:
+    return round(listening_ms / 3_600_000, 3)
+
+
+@router.get("/listening", response_model=ListeningReport, dependencies=[Depends(require_admin_key)])
+def listening_report(
+    product_id: int,
+    start: Optional[date] = Query(default=None),
+    end: Optional[date] = Query(default=None),
+    shards: ShardRouter = Depends(get_shard_router),
+) -> ListeningReport:
+    """Return listening hours, sessions and completions per day for a product.
+
+    Only ``listening_daily_rollup`` is read, so the cost depends on the
+    number of days requested rather than on the amount of listening. Days
+    reflect everything folded in by the last rollup run.
+    """
+
+    end = end or datetime.utcnow().date()
+    start = start or end - timedelta(days=DEFAULT_RANGE_DAYS - 1)
+    if start > end or (end - start).days >= MAX_RANGE_DAYS:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"Date range must be ordered and at most {MAX_RANGE_DAYS} days",
+        )
+
+    totals: dict[date, RollupTotals] = {}
+    for shard in shards.shards:
+        with read_only_engine(shard.engine).connect() as connection:
+            for day, stored in read_listening_rollup(connection, product_id, start, end).items():
+                entry = totals.setdefault(day, RollupTotals())
+                entry.sessions += stored.sessions
+                entry.listening_ms += stored.listening_ms
+                entry.completions += stored.completions
+
+    days = [
+        ListeningDay(
+            day=day,
+            sessions=entry.sessions,
+            listening_hours=_hours(entry.listening_ms),
+            completions=entry.completions,
+        )
+        for day, entry in sorted(totals.items())
+    ]
+    return ListeningReport(
+        product_id=product_id,
+        start=start,
+        end=end,
+        days=days,
+        sessions=sum(entry.sessions for entry in totals.values()),
+        listening_hours=_hours(sum(entry.listening_ms for entry in totals.values())),
+        completions=sum(entry.completions for entry in totals.values()),
+    )
+
+
+class ProductActivations(BaseModel):
+    """Activation counters of one product within a print batch."""
+
+    product_id: int
+    new: int
+    active: int
+    blocked: int
+    reregistrations: int
+    cooldowns: int
+
+
+class ActivationReport(BaseModel):
+    """Activation counters of a print batch, per product and in total."""
+
+    batch_id: int
+    products: list[ProductActivations]
+    totals: ProductActivations
+
+
+@router.get("/activations", response_model=ActivationReport, dependencies=[Depends(require_admin_key)])
+def activation_report(
+    batch_id: int = Query(..., description="Print batch; 0 for codes without one"),
+    product_id: Optional[int] = Query(default=None),
+    shards: ShardRouter = Depends(get_shard_router),
+) -> ActivationReport:
+    """Return how many codes of a batch are new, active or blocked.
+
+    The counters are kept current by the access flows, so this reads a few
+    ``batch_activation_stats`` rows per shard whatever the batch size.
+    """
+
+    totals: dict[int, dict[str, int]] = {}
+    for shard in shards.shards:
+        with read_only_engine(shard.engine).connect() as connection:
+            for product, stored in read_activation_stats(connection, batch_id, product_id).items():
+                entry = totals.setdefault(product, asdict(ActivationCounts()))
+                for name, value in asdict(stored).items():
+                    entry[name] += value
+
+    overall = asdict(ActivationCounts())
+    for entry in totals.values():
+        for name, value in entry.items():
+            overall[name] += value
+
+    return ActivationReport(
+        batch_id=batch_id,
+        products=[ProductActivations(product_id=product, **entry) for product, entry in sorted(totals.items())],
+        totals=ProductActivations(product_id=product_id or 0, **overall),
+    )
+
+
+@router.get("/export/{table}.csv", dependencies=[Depends(require_admin_key)])
+def export_csv(
+    table: str,
+    start: datetime,
+    end: datetime,
+    shards: ShardRouter = Depends(get_shard_router),
+) -> StreamingResponse:
+    """Stream ``play_session`` or ``listening_progress`` rows as CSV.
+
+    Sessions are selected by ``ended_at`` and progress by ``updated_at``,
+    with ``start`` inclusive and ``end`` exclusive. Rows are read in short
+    keyset chunks, so large exports neither buffer in memory nor keep a
+    transaction open while the client downloads.
+    """
+
+    spec = EXPORTS.get(table)
+    if spec is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Unknown export")
+    if start >= end:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="start must precede end")
+
+    chunks = iter_csv_chunks((shard.engine for shard in shards.shards), spec, start, end)
+    filename = f"{table}_{start:%Y%m%dT%H%M%S}_{end:%Y%m%dT%H%M%S}.csv"
+    return StreamingResponse(
+        chunks,
+        media_type="text/csv",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+__all__ = ["router", "require_admin_key"]
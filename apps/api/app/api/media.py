@@ -0,0 +1,73 @@
+"""Signed audio delivery with HTTP range support."""
+
+from __future__ import annotations
+
+import logging
+
+import anyio
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.responses import Response
+
+from app.core.config import get_settings
+from app.services.media_catalog import media_catalog
+from app.services.media_delivery import (
+    MediaFile,
+    MediaResponse,
+    RangeNotSatisfiable,
+    describe,
+    if_range_allows,
+    parse_range_header,
+)
+from app.services.media_signer import verify_media_signature
+from app.services.storage import StorageBackend, get_storage
+
+logger = logging.getLogger("app.media")
+
+router = APIRouter(prefix="/media")
+
+
+@router.api_route("/{path:path}", methods=["GET", "HEAD"], response_model=None)
+async def stream_media(
+    path: str,
+    request: Request,
+    exp: int = Query(...),
+    sig: str = Query(...),
+    storage: StorageBackend = Depends(get_storage),
+) -> Response:
+    """Serve a stored audio file, whole or by byte ranges.
+
+    The URL must carry a signature from :func:`sign_media_url` over its
+    path. ``Range`` requests get ``206`` (``multipart/byteranges`` for several
+    ranges) or ``416`` when no range overlaps the file; an ``If-Range`` that
+    no longer matches falls back to the whole file.
+    """
+
+    if not verify_media_signature(get_settings().hmac_media_secret, request.url.path, sig, exp):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid or expired signature")
+
+    try:
+        # Catalogued files are described from memory, without a thread hop.
+        asset = media_catalog.peek(path)
+        if asset is not None:
+            media = MediaFile(storage, path, asset.size, asset.mtime)
+        else:
+            media = await anyio.to_thread.run_sync(describe, storage, path, media_catalog)
+    except (FileNotFoundError, IsADirectoryError, NotADirectoryError):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Media not found") from None
+
+    head = request.method == "HEAD"
+    range_header = request.headers.get("range")
+    if range_header is None or not if_range_allows(request.headers.get("if-range"), media):
+        return MediaResponse(media, head=head)
+
+    try:
+        ranges = parse_range_header(range_header, media.size)
+    except RangeNotSatisfiable:
+        return Response(
+            status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+            headers={"content-range": f"bytes */{media.size}", "accept-ranges": "bytes"},
+        )
+    return MediaResponse(media, ranges, head=head)
+
+
+__all__ = ["router"]
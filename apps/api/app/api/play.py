@@ -1,12 +1,320 @@
-"""Placeholder module for the \"play\" API endpoints."""
+"""Playback session endpoints."""
 
-from fastapi import APIRouter
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import uuid
+from collections.abc import AsyncIterator
+from datetime import datetime, timedelta, timezone
+from typing import Literal
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+from sqlalchemy import update
+from sqlmodel import Session
+
+from app.api.progress import require_bound_device
+from app.core.config import get_settings
+from app.core.database import ShardSessions, get_shard_router, get_shard_sessions
+from app.core.ids import uuid7, uuid7_timestamp
+from app.core.redis import get_async_redis_client, get_redis_client
+from app.models import PlaySession
+from app.services.bindings import BoundDevice
+from app.services.play_events import PlayEvent, PlayEventBroker
+from app.services.session_lease import LeaseHolder, SessionLeaseManager
 
 router = APIRouter(prefix="/play")
 
+SESSION_START_SLACK = timedelta(minutes=5)
+
+session_leases = SessionLeaseManager(redis_client=get_redis_client())
+play_events = PlayEventBroker(
+    redis_client=get_redis_client(),
+    async_redis_client=get_async_redis_client(),
+)
+
+
+class PlayStartRequest(BaseModel):
+    """Payload sent when a device starts playback."""
+
+    token: str = Field(..., min_length=1)
+    device_id: uuid.UUID
+
+
+class PlayStartResponse(BaseModel):
+    """The new session and how often it must send heartbeats."""
+
+    session_id: uuid.UUID
+    lease_ttl_seconds: float
+    heartbeat_interval_seconds: float
+
+
+class PlaySessionRequest(BaseModel):
+    """Payload identifying a running play session."""
+
+    token: str = Field(..., min_length=1)
+    device_id: uuid.UUID
+    session_id: uuid.UUID
+
+
+class PlaySessionResponse(BaseModel):
+    """State of a play session after a heartbeat or stop."""
+
+    status: Literal["active", "stopped"]
+
+
+def _end_session(
+    session: Session, session_id: uuid.UUID, qr_id: uuid.UUID, ended_at: datetime, now: datetime
+) -> None:
+    statement = (
+        update(PlaySession)
+        .where(PlaySession.id == session_id)
+        .where(PlaySession.qr_id == qr_id)
+        .where(PlaySession.ended_at.is_(None))
+        .values(ended_at=ended_at, closed_at=now)
+    )
+    # Session ids are minted right before the row is inserted, so their
+    # timestamp pins ``started_at`` and lets PostgreSQL prune to one partition.
+    minted_at = uuid7_timestamp(session_id)
+    if minted_at is not None:
+        statement = statement.where(
+            PlaySession.started_at.between(
+                minted_at - SESSION_START_SLACK, minted_at + SESSION_START_SLACK
+            )
+        )
+    session.exec(statement)
+
+
+def _close_abandoned_sessions(
+    session: Session, qr_id: uuid.UUID, keep: uuid.UUID, started_before: datetime, now: datetime
+) -> None:
+    """End open sessions of ``qr_id`` nobody remembers a heartbeat for.
+
+    Their lease history has expired (or Redis lost it), so the real end is
+    unknown; they are closed as zero-length rather than left open.
+    """
+
+    session.exec(
+        update(PlaySession)
+        .where(PlaySession.qr_id == qr_id)
+        .where(PlaySession.ended_at.is_(None))
+        .where(PlaySession.id != keep)
+        .where(PlaySession.started_at < started_before)
+        .values(ended_at=PlaySession.started_at, closed_at=now)
+    )
+
+
+@router.post("/start", response_model=PlayStartResponse)
+def start_playback(
+    payload: PlayStartRequest,
+    request: Request,
+    shards: ShardSessions = Depends(get_shard_sessions),
+) -> PlayStartResponse:
+    """Open a play session, evicting whichever session held the QR before.
+
+    A previous session whose lease lapsed without a stop is closed as of its
+    last heartbeat, so abandoned players do not leave sessions open forever.
+    """
+
+    token = payload.token.strip()
+    bound = require_bound_device(shards, token, payload.device_id)
+
+    holder = LeaseHolder(session_id=uuid7(), device_id=payload.device_id)
+    takeover = session_leases.take_over(bound.qr_id, holder)
+    evicted = takeover.evicted
+
+    now = datetime.utcnow()
+    client_host = request.client.host if request.client else ""
+    session = shards.for_token(token)
+    session.add(
+        PlaySession(
+            id=holder.session_id,
+            qr_id=bound.qr_id,
+            device_id=payload.device_id,
+            started_at=now.replace(tzinfo=timezone.utc),
+            ip_hash=hashlib.sha256(client_host.encode("utf-8")).hexdigest(),
+        )
+    )
+    if evicted is not None:
+        _end_session(session, evicted.session_id, bound.qr_id, now, now)
+    if takeover.lapsed is not None and takeover.lapsed_seen_at is not None:
+        _end_session(session, takeover.lapsed.session_id, bound.qr_id, takeover.lapsed_seen_at, now)
+    # Anything still open and older than a lease is not the session that
+    # just lost the lease to a concurrent start.
+    lease_ttl = timedelta(seconds=get_settings().play_lease_ttl_seconds)
+    _close_abandoned_sessions(session, bound.qr_id, holder.session_id, now - lease_ttl, now)
+    session.commit()
+
+    if evicted is not None:
+        play_events.publish(
+            bound.qr_id,
+            {
+                "type": "evicted",
+                "session_id": str(evicted.session_id),
+                "by_device_id": str(payload.device_id),
+            },
+        )
+
+    ttl = get_settings().play_lease_ttl_seconds
+    return PlayStartResponse(
+        session_id=holder.session_id,
+        lease_ttl_seconds=ttl,
+        heartbeat_interval_seconds=ttl / 3,
+    )
+
+
+@router.post("/heartbeat", response_model=PlaySessionResponse)
+def heartbeat(
+    payload: PlaySessionRequest,
+    shards: ShardSessions = Depends(get_shard_sessions),
+) -> PlaySessionResponse:
+    """Extend the session's lease without touching the database.
+
+    A session that lost its lease, to another device or by letting it expire,
+    gets ``409`` and must call ``/play/start`` again.
+    """
+
+    token = payload.token.strip()
+    bound = require_bound_device(shards, token, payload.device_id)
+
+    holder = LeaseHolder(session_id=payload.session_id, device_id=payload.device_id)
+    if not session_leases.renew(bound.qr_id, holder):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Session no longer holds the lease",
+        )
+    return PlaySessionResponse(status="active")
+
+
+@router.post("/stop", response_model=PlaySessionResponse)
+def stop_playback(
+    payload: PlaySessionRequest,
+    shards: ShardSessions = Depends(get_shard_sessions),
+) -> PlaySessionResponse:
+    """Release the session's lease and record when it ended."""
+
+    token = payload.token.strip()
+    bound = require_bound_device(shards, token, payload.device_id)
+
+    session_leases.release(
+        bound.qr_id, LeaseHolder(session_id=payload.session_id, device_id=payload.device_id)
+    )
+    session = shards.for_token(token)
+    now = datetime.utcnow()
+    _end_session(session, payload.session_id, bound.qr_id, now, now)
+    session.commit()
+    return PlaySessionResponse(status="stopped")
+
+
+class PlayControlRequest(BaseModel):
+    """Remote-control command for whichever session is playing the QR."""
+
+    token: str = Field(..., min_length=1)
+    device_id: uuid.UUID
+    action: Literal["pause", "resume", "stop"]
+
+
+@router.post("/control", response_model=PlaySessionResponse)
+def control_playback(
+    payload: PlayControlRequest,
+    shards: ShardSessions = Depends(get_shard_sessions),
+) -> PlaySessionResponse:
+    """Push a control command to the active session over its event stream."""
+
+    token = payload.token.strip()
+    bound = require_bound_device(shards, token, payload.device_id)
+
+    holder = session_leases.holder(bound.qr_id)
+    if holder is None:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="No active play session")
+
+    play_events.publish(
+        bound.qr_id,
+        {"type": "control", "action": payload.action, "session_id": str(holder.session_id)},
+    )
+    return PlaySessionResponse(status="active")
+
+
+def _format_event(event: PlayEvent) -> str:
+    return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+
+async def session_event_stream(
+    qr_id: uuid.UUID,
+    session_id: uuid.UUID,
+    device_id: uuid.UUID,
+    keepalive_seconds: float,
+) -> AsyncIterator[str]:
+    """Yield server-sent events for one play session until it is evicted.
+
+    The stream subscribes before checking the lease, so a takeover that
+    happens in between is still delivered.
+    """
+
+    async with play_events.subscribe(qr_id) as queue:
+        yield "retry: 5000\n\n"
+
+        holder = await run_in_threadpool(session_leases.holder, qr_id)
+        if holder != LeaseHolder(session_id=session_id, device_id=device_id):
+            yield _format_event({"type": "evicted", "session_id": str(session_id)})
+            return
+
+        yield _format_event({"type": "ready", "session_id": str(session_id)})
+
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), timeout=keepalive_seconds)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+
+            target = event.get("session_id")
+            if target is not None and target != str(session_id):
+                continue
+            yield _format_event(event)
+            if event["type"] == "evicted":
+                return
+
+
+def _resolve_for_stream(token: str, device_id: uuid.UUID) -> BoundDevice:
+    # The stream outlives the request's dependencies, so the lookup uses its
+    # own short-lived sessions instead of holding one open for the stream.
+    shards = ShardSessions(get_shard_router())
+    try:
+        return require_bound_device(shards, token, device_id)
+    finally:
+        shards.close()
+
+
+@router.get("/events")
+async def stream_play_events(
+    token: str = Query(..., min_length=1),
+    device_id: uuid.UUID = Query(...),
+    session_id: uuid.UUID = Query(...),
+) -> StreamingResponse:
+    """Server-sent events telling a player it was evicted or remote-controlled.
+
+    Players keep this stream open instead of polling; the connection is idle
+    apart from periodic keepalive comments.
+    """
+
+    token = token.strip()
+    bound = await run_in_threadpool(_resolve_for_stream, token, device_id)
+
+    return StreamingResponse(
+        session_event_stream(
+            bound.qr_id,
+            session_id,
+            device_id,
+            get_settings().play_events_keepalive_seconds,
+        ),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
-@router.get("/placeholder")
-async def placeholder() -> dict[str, str]:
-    """Temporary endpoint that confirms the module is wired."""
 
-    return {"module": "play", "status": "pending"}
+__all__ = ["play_events", "router", "session_event_stream", "session_leases"]
@@ -1,12 +1,57 @@
-"""Placeholder module for the \"preview\" API endpoints."""
+"""Sampler playlists for listeners who have not registered a QR code."""
 
-from fastapi import APIRouter
+from __future__ import annotations
+
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.responses import Response
+from sqlmodel import select
+
+from app.core.database import ShardSessions, get_shard_sessions
+from app.core.redis import get_redis_client
+from app.models import QrCode, QrStatus
+from app.services.hls import PLAYLIST_MEDIA_TYPE
+from app.services.media_catalog import media_catalog
+from app.services.sampler import SamplerCache, build_sampler_manifest
+from app.services.storage import StorageBackend, get_storage
 
 router = APIRouter(prefix="/preview")
 
+sampler_cache = SamplerCache(redis_client=get_redis_client())
+
+
+@router.get("/{token}.m3u8", response_model=None)
+def sampler_manifest(
+    token: str,
+    request: Request,
+    storage: StorageBackend = Depends(get_storage),
+    shards: ShardSessions = Depends(get_shard_sessions),
+) -> Response:
+    """Return the HLS sampler playlist covering the opening of a token's product.
+
+    The playlist is rendered for the token on every request from the cached
+    segment list. It is identical within a window, so it carries an ETag and
+    a ``Cache-Control`` lifetime running to the end of that window.
+    """
+
+    session = shards.for_token(token, read_only=True)
+    qr_code = session.exec(select(QrCode).where(QrCode.token == token)).first()
+    if qr_code is None or qr_code.status is QrStatus.BLOCKED or qr_code.product_id is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No preview for this token")
+
+    try:
+        manifest = build_sampler_manifest(
+            token, qr_code.product_id, storage=storage, cache=sampler_cache, catalog=media_catalog
+        )
+    except FileNotFoundError:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="No preview for this product"
+        ) from None
+
+    headers = {"ETag": manifest.etag, "Cache-Control": f"public, max-age={manifest.max_age()}"}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None and manifest.etag in {tag.strip() for tag in if_none_match.split(",")}:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(manifest.body, media_type=PLAYLIST_MEDIA_TYPE, headers=headers)
 
-@router.get("/placeholder")
-async def placeholder() -> dict[str, str]:
-    """Temporary endpoint that confirms the module is wired."""
 
-    return {"module": "preview", "status": "pending"}
+__all__ = ["router", "sampler_cache"]
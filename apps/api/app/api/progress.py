@@ -0,0 +1,271 @@
+"""Listening progress endpoints."""
+
+from __future__ import annotations
+
+import base64
+import binascii
+import json
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Literal, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from pydantic import BaseModel, Field
+from sqlalchemy import tuple_
+from sqlalchemy.exc import SQLAlchemyError
+from sqlmodel import select
+from sqlmodel.sql.expression import SelectOfScalar
+
+from app.core.config import get_settings
+from app.core.database import ShardSessions, get_shard_sessions
+from app.core.redis import get_redis_client
+from app.models import ListeningProgress
+from app.services.bindings import BoundDevice, resolve_bound_device
+from app.services.progress_buffer import ProgressBuffer, ProgressFlusher, ProgressUpdate
+from app.services.resume_cache import ResumePositionCache
+
+router = APIRouter(prefix="/progress")
+
+SYNC_PAGE_DEFAULT = 100
+SYNC_PAGE_MAX = 500
+
+progress_buffer = ProgressBuffer(redis_client=get_redis_client())
+progress_flusher = ProgressFlusher(progress_buffer)
+resume_cache = ResumePositionCache(redis_client=get_redis_client())
+
+
+class ProgressUpdateRequest(BaseModel):
+    """Position report sent periodically by the player."""
+
+    token: str = Field(..., min_length=1)
+    device_id: uuid.UUID
+    track_id: str = Field(..., min_length=1, max_length=200)
+    position_ms: int = Field(..., ge=0)
+    event: Literal["tick", "pause", "end"] = "tick"
+
+
+class ProgressUpdateResponse(BaseModel):
+    """Whether the update was buffered or already written."""
+
+    status: Literal["buffered", "stored"]
+
+
+def require_bound_device(shards: ShardSessions, token: str, device_id: uuid.UUID) -> BoundDevice:
+    """Return the device's binding for ``token`` or reject the request."""
+
+    bound = resolve_bound_device(shards, token, device_id)
+    if bound is None:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Device is not registered for this token",
+        )
+    return bound
+
+
+@router.post("", response_model=ProgressUpdateResponse, status_code=status.HTTP_202_ACCEPTED)
+def report_progress(
+    payload: ProgressUpdateRequest,
+    shards: ShardSessions = Depends(get_shard_sessions),
+) -> ProgressUpdateResponse:
+    """Record the player's position for a track.
+
+    Ticks are buffered and written by the background flusher; pause and end
+    events are written on their own before the response is sent.
+    """
+
+    token = payload.token.strip()
+    bound = require_bound_device(shards, token, payload.device_id)
+
+    update = ProgressUpdate(
+        token=token,
+        qr_id=bound.qr_id,
+        device_id=payload.device_id,
+        track_id=payload.track_id,
+        position_ms=payload.position_ms,
+        account_id=bound.account_id,
+        completed=payload.event == "end",
+    )
+    resume_cache.set(bound.qr_id, payload.device_id, payload.track_id, payload.position_ms)
+
+    if payload.event != "tick":
+        try:
+            progress_flusher.write_now(update)
+        except SQLAlchemyError:
+            # The update stays buffered and is retried by the background flusher.
+            progress_buffer.add(update)
+            return ProgressUpdateResponse(status="buffered")
+        return ProgressUpdateResponse(status="stored")
+
+    progress_flusher.notify(progress_buffer.add(update))
+    return ProgressUpdateResponse(status="buffered")
+
+
+class ResumePositionResponse(BaseModel):
+    """Where playback of a track should resume."""
+
+    track_id: str
+    position_ms: int
+
+
+@router.get("/position", response_model=ResumePositionResponse)
+def get_resume_position(
+    token: str = Query(..., min_length=1),
+    device_id: uuid.UUID = Query(...),
+    track_id: str = Query(..., min_length=1, max_length=200),
+    shards: ShardSessions = Depends(get_shard_sessions),
+) -> ResumePositionResponse:
+    """Return the last reported position of a track for this device.
+
+    The cache is read first; a miss falls back to a primary-key lookup on the
+    token's shard and warms the cache, so the cost does not grow with the size
+    of ``listening_progress``.
+    """
+
+    token = token.strip()
+    bound = require_bound_device(shards, token, device_id)
+
+    position = resume_cache.get(bound.qr_id, device_id, track_id)
+    if position is None:
+        progress = shards.for_token(token).get(ListeningProgress, (bound.qr_id, device_id, track_id))
+        position = progress.position_ms if progress is not None else 0
+        resume_cache.set(bound.qr_id, device_id, track_id, position)
+
+    return ResumePositionResponse(track_id=track_id, position_ms=position)
+
+
+@dataclass(slots=True, frozen=True)
+class SyncCursor:
+    """Keyset position in a QR's progress ordered by update time."""
+
+    updated_at: datetime
+    qr_id: uuid.UUID
+    device_id: uuid.UUID
+    track_id: str
+
+    def encode(self) -> str:
+        raw = json.dumps(
+            [self.updated_at.isoformat(), str(self.qr_id), str(self.device_id), self.track_id]
+        )
+        return base64.urlsafe_b64encode(raw.encode("utf-8")).rstrip(b"=").decode("ascii")
+
+    @classmethod
+    def decode(cls, value: str) -> "SyncCursor":
+        try:
+            raw = base64.urlsafe_b64decode(value + "=" * (-len(value) % 4))
+            updated_at, qr_id, device_id, track_id = json.loads(raw)
+            return cls(
+                updated_at=datetime.fromisoformat(updated_at),
+                qr_id=uuid.UUID(qr_id),
+                device_id=uuid.UUID(device_id),
+                track_id=str(track_id),
+            )
+        except (binascii.Error, TypeError, ValueError) as exc:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid sync cursor"
+            ) from exc
+
+
+def _progress_changed_since_query(
+    qr_id: uuid.UUID,
+    cursor: Optional[SyncCursor],
+    until: datetime,
+    limit: int,
+) -> SelectOfScalar[ListeningProgress]:
+    statement = (
+        select(ListeningProgress)
+        .where(ListeningProgress.qr_id == qr_id)
+        .where(ListeningProgress.updated_at <= until)
+    )
+    if cursor is not None:
+        statement = statement.where(
+            tuple_(ListeningProgress.updated_at, ListeningProgress.device_id, ListeningProgress.track_id)
+            > tuple_(cursor.updated_at, cursor.device_id, cursor.track_id)
+        )
+    return statement.order_by(
+        ListeningProgress.updated_at,
+        ListeningProgress.device_id,
+        ListeningProgress.track_id,
+    ).limit(limit)
+
+
+class ProgressSyncItem(BaseModel):
+    """One position that changed since the client's cursor."""
+
+    device_id: uuid.UUID
+    track_id: str
+    position_ms: int
+    updated_at: datetime
+
+
+class ProgressSyncResponse(BaseModel):
+    """A page of changed positions and the cursor to continue from."""
+
+    items: list[ProgressSyncItem]
+    next_cursor: Optional[str]
+    has_more: bool
+
+
+@router.get("/sync", response_model=ProgressSyncResponse)
+def sync_progress(
+    token: str = Query(..., min_length=1),
+    device_id: uuid.UUID = Query(...),
+    cursor: Optional[str] = Query(default=None),
+    limit: int = Query(default=SYNC_PAGE_DEFAULT, ge=1, le=SYNC_PAGE_MAX),
+    shards: ShardSessions = Depends(get_shard_sessions),
+) -> ProgressSyncResponse:
+    """Return positions for every device of this QR that changed since ``cursor``.
+
+    Pages are read with keyset pagination on ``(updated_at, device_id,
+    track_id)``, so a sync costs what changed since the cursor rather than the
+    QR's whole history. Pass ``next_cursor`` back until ``has_more`` is false
+    and keep it for the next sync. Rows younger than
+    ``progress_sync_settle_seconds`` are held back so a flush that commits
+    late cannot land behind a cursor that has already moved past it.
+    """
+
+    token = token.strip()
+    bound = require_bound_device(shards, token, device_id)
+
+    after = SyncCursor.decode(cursor) if cursor else None
+    if after is not None and after.qr_id != bound.qr_id:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid sync cursor")
+
+    until = datetime.utcnow() - timedelta(seconds=get_settings().progress_sync_settle_seconds)
+    rows = shards.for_token(token).exec(
+        _progress_changed_since_query(bound.qr_id, after, until, limit + 1)
+    ).all()
+
+    page = rows[:limit]
+    if page:
+        last = page[-1]
+        after = SyncCursor(
+            updated_at=last.updated_at,
+            qr_id=last.qr_id,
+            device_id=last.device_id,
+            track_id=last.track_id,
+        )
+
+    return ProgressSyncResponse(
+        items=[
+            ProgressSyncItem(
+                device_id=row.device_id,
+                track_id=row.track_id,
+                position_ms=row.position_ms,
+                updated_at=row.updated_at,
+            )
+            for row in page
+        ],
+        next_cursor=after.encode() if after is not None else None,
+        has_more=len(rows) > limit,
+    )
+
+
+__all__ = [
+    "SyncCursor",
+    "progress_buffer",
+    "progress_flusher",
+    "require_bound_device",
+    "resume_cache",
+    "router",
+]
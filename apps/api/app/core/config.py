@@ -3,6 +3,7 @@
 from __future__ import annotations
 
 from functools import lru_cache
+from typing import Literal
 
 from pydantic import Field
 from pydantic_settings import BaseSettings, SettingsConfigDict
@@ -22,9 +23,152 @@ class Settings(BaseSettings):
         default=True, description="Enable debug mode during development"
     )
     database_url: str = Field(default="postgresql+psycopg://avook:avook@db:5432/avook")
+    database_shard_urls: list[str] = Field(
+        default_factory=list,
+        description="JSON list of database URLs that share qr_code rows by token hash",
+    )
+    sqlite_synchronous: str = Field(
+        default="NORMAL", description="PRAGMA synchronous level for SQLite deployments"
+    )
+    sqlite_cache_size_kib: int = Field(
+        default=65536, description="Page cache size per SQLite connection, in KiB"
+    )
+    sqlite_mmap_size_bytes: int = Field(
+        default=268435456, description="Memory-mapped I/O window for SQLite databases"
+    )
+    sqlite_busy_timeout_ms: int = Field(
+        default=5000, description="How long SQLite writers wait for the write lock"
+    )
+    migration_lock_timeout_ms: int = Field(
+        default=5000,
+        description="lock_timeout applied to migration sessions so DDL never queues behind traffic",
+    )
+    progress_flush_interval_seconds: float = Field(
+        default=5.0,
+        description="Longest time a buffered progress update waits before it is written",
+    )
+    progress_buffer_max_entries: int = Field(
+        default=5000, description="Pending progress updates that trigger an early flush"
+    )
+    progress_flush_batch_size: int = Field(
+        default=500, description="Rows per multi-row progress UPSERT statement"
+    )
+    binding_cache_ttl_seconds: float = Field(
+        default=60.0,
+        description="How long a token/device binding check is reused by player requests",
+    )
+    progress_sync_settle_seconds: float = Field(
+        default=5.0,
+        description="Age a progress row must reach before delta sync returns it, so concurrent flushes commit first",
+    )
+    play_lease_ttl_seconds: float = Field(
+        default=45.0,
+        description="How long a play session keeps its lease without a heartbeat",
+    )
+    play_lease_history_seconds: float = Field(
+        default=30 * 24 * 3600.0,
+        description="How long the last heartbeat of a lapsed lease is kept to close its play session",
+    )
+    play_events_keepalive_seconds: float = Field(
+        default=15.0, description="Interval between keepalive comments on idle play event streams"
+    )
+    play_session_partition_months_ahead: int = Field(
+        default=3, description="Monthly play_session partitions created ahead of time at startup"
+    )
+    resume_cache_ttl_seconds: int = Field(
+        default=7 * 24 * 3600, description="Lifetime of cached resume positions in Redis"
+    )
+    resume_cache_local_ttl_seconds: float = Field(
+        default=30.0,
+        description="Lifetime of resume positions cached in process memory when Redis is unavailable",
+    )
+    retention_play_session_days: int = Field(
+        default=365, description="Age after which ended play sessions are deleted"
+    )
+    retention_revoked_binding_days: int = Field(
+        default=90, description="Age after which revoked QR bindings are deleted"
+    )
+    retention_blocked_progress_days: int = Field(
+        default=180, description="Idle time after which progress of blocked QR codes is deleted"
+    )
+    retention_batch_size: int = Field(
+        default=1000, description="Primary keys scanned per retention delete batch"
+    )
+    retention_batch_pause_seconds: float = Field(
+        default=0.2, description="Pause between retention batches"
+    )
+    retention_max_replica_lag_seconds: float = Field(
+        default=10.0, description="Replica lag at which the retention runner waits before continuing"
+    )
+    analytics_rollup_settle_seconds: float = Field(
+        default=60.0,
+        description="How far behind now the listening rollup watermark stays, so late commits are not skipped",
+    )
+    activation_stats_slots: int = Field(
+        default=16, description="Rows each batch/product activation counter is spread over to avoid lock contention"
+    )
+    admin_api_key: str = Field(
+        default="", description="Key expected in X-Admin-Key by the analytics endpoints; empty disables them"
+    )
     redis_url: str = Field(default="redis://cache:6379/0")
     jwt_secret: str = Field(default="change-me")
     hmac_media_secret: str = Field(default="change-me-too")
+    media_url_mode: Literal["api", "secure_link"] = Field(
+        default="api",
+        description="Issue media URLs for the API's /api/media endpoint or for nginx secure_link",
+    )
+    media_link_secret: str = Field(
+        default="change-me-media", description="Secret shared with nginx's secure_link_md5 expression"
+    )
+    media_public_base_url: str = Field(
+        default="", description="Origin prepended to issued media URLs, e.g. the nginx host"
+    )
+    media_url_ttl_seconds: int = Field(default=6 * 3600, description="How long issued media URLs stay valid")
+    preview_max_seconds: int = Field(
+        default=600, description="Length of the opening of a product covered by sampler playlists"
+    )
+    preview_segment_cache_seconds: int = Field(
+        default=3600, description="Lifetime of cached sampler segment lists in Redis and process memory"
+    )
+    preview_manifest_window_seconds: int = Field(
+        default=300,
+        description="Sampler playlists are identical, and cacheable, within windows of this length",
+    )
+    media_catalog_cache_seconds: float = Field(
+        default=300.0, description="Lifetime of media metadata cached in process memory"
+    )
+    media_catalog_missing_seconds: float = Field(
+        default=10.0, description="Lifetime of cached answers that a media file does not exist"
+    )
+    media_storage_backend: Literal["local", "s3"] = Field(
+        default="local", description="Where media files are read from"
+    )
+    media_storage_root: str = Field(
+        default="/srv/media", description="Directory the media endpoint serves audio files from"
+    )
+    media_s3_endpoint: str = Field(default="https://s3.amazonaws.com", description="S3-compatible endpoint URL")
+    media_s3_bucket: str = Field(default="", description="Bucket holding media objects")
+    media_s3_region: str = Field(default="us-east-1", description="Region used to sign S3 requests")
+    media_s3_access_key: str = Field(default="")
+    media_s3_secret_key: str = Field(default="")
+    media_s3_max_connections: int = Field(
+        default=64, description="Keep-alive connections pooled per worker for S3 reads"
+    )
+    media_disk_cache_root: str = Field(
+        default="", description="Local directory caching blocks of S3 media (empty disables the cache)"
+    )
+    media_disk_cache_max_bytes: int = Field(
+        default=10 * 1024**3, description="Size cap of the local media disk cache"
+    )
+    media_disk_cache_block_size: int = Field(
+        default=1024 * 1024, description="Size of the blocks the media disk cache fetches and stores"
+    )
+    media_hot_cache_bytes: int = Field(
+        default=64 * 1024**2, description="Memory budget for hot S3 media ranges per worker (0 disables the cache)"
+    )
+    media_hot_cache_max_entry_bytes: int = Field(
+        default=2 * 1024**2, description="Largest range the in-memory media cache keeps"
+    )
 
 
 @lru_cache
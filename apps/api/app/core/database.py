@@ -2,18 +2,116 @@
 
 from __future__ import annotations
 
-from collections.abc import Iterator
-from typing import Optional
+import bisect
+import hashlib
+import threading
+import uuid
+from collections import OrderedDict
+from collections.abc import Callable, Iterable, Iterator, Sequence
+from dataclasses import dataclass, field
+from typing import Any, Optional
 
-from sqlalchemy.engine import Engine
+from sqlalchemy import event
+from sqlalchemy.engine import Connection, Engine, make_url
 from sqlalchemy.orm import sessionmaker
 from sqlmodel import Session, create_engine
 
-from .config import get_settings
+from app.models import QrCode
+
+from .config import Settings, get_settings
 
 _engine: Optional[Engine] = None
 _session_factory: Optional[sessionmaker] = None
 
+READ_ONLY_OPTION = "avook_read_only"
+
+
+def is_sqlite_url(url: str) -> bool:
+    """Return True when the database URL targets SQLite."""
+
+    return make_url(url).get_backend_name() == "sqlite"
+
+
+def read_only_engine(engine: Engine) -> Engine:
+    """Return a view of ``engine`` for transactions that never write.
+
+    On SQLite these transactions neither take ``BEGIN IMMEDIATE`` nor queue on
+    the writer lock; other databases ignore the distinction.
+    """
+
+    return engine.execution_options(**{READ_ONLY_OPTION: True})
+
+
+def create_sqlite_engine(url: str, settings: Optional[Settings] = None) -> Engine:
+    """Create an engine tuned for single-node SQLite deployments.
+
+    Every connection switches the database to WAL journaling and applies the
+    ``synchronous``/``cache_size``/``mmap_size`` pragmas from the settings, with
+    foreign keys enforced as they are on PostgreSQL. SQLite allows a single
+    writer, so transactions start with ``BEGIN IMMEDIATE`` to take the write
+    lock up front (a deferred read-then-write transaction could otherwise fail
+    with ``SQLITE_BUSY`` when upgrading its lock) and threads of this process
+    queue on a lock instead of spinning in SQLite's busy handler. Transactions
+    on a :func:`read_only_engine` view of the engine begin deferred and skip the lock,
+    so reads run alongside the writer on their WAL snapshot.
+    """
+
+    settings = settings or get_settings()
+    busy_timeout = settings.sqlite_busy_timeout_ms / 1000
+
+    engine = create_engine(
+        url,
+        connect_args={"check_same_thread": False, "timeout": busy_timeout},
+    )
+    writer_lock = threading.Lock()
+
+    @event.listens_for(engine, "connect")
+    def _configure_connection(dbapi_connection: Any, _record: Any) -> None:
+        # Hand transaction control to the "begin" hook below instead of
+        # letting pysqlite emit its own deferred BEGIN.
+        dbapi_connection.isolation_level = None
+
+        cursor = dbapi_connection.cursor()
+        try:
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute(f"PRAGMA synchronous={settings.sqlite_synchronous}")
+            cursor.execute(f"PRAGMA cache_size=-{int(settings.sqlite_cache_size_kib)}")
+            cursor.execute(f"PRAGMA mmap_size={int(settings.sqlite_mmap_size_bytes)}")
+            cursor.execute(f"PRAGMA busy_timeout={int(settings.sqlite_busy_timeout_ms)}")
+            cursor.execute("PRAGMA foreign_keys=ON")
+        finally:
+            cursor.close()
+
+    @event.listens_for(engine, "begin")
+    def _begin_immediate(connection: Connection) -> None:
+        if connection.get_execution_options().get(READ_ONLY_OPTION):
+            connection.exec_driver_sql("BEGIN")
+            return
+        acquired = writer_lock.acquire(timeout=busy_timeout)
+        connection.info["sqlite_writer_lock"] = acquired
+        try:
+            connection.exec_driver_sql("BEGIN IMMEDIATE")
+        except Exception:
+            _release_writer(connection)
+            raise
+
+    def _release_writer(connection: Connection) -> None:
+        if connection.info.pop("sqlite_writer_lock", False):
+            writer_lock.release()
+
+    event.listen(engine, "commit", _release_writer)
+    event.listen(engine, "rollback", _release_writer)
+
+    return engine
+
+
+def create_engine_for_url(url: str, settings: Optional[Settings] = None) -> Engine:
+    """Create an engine for ``url`` using the deployment defaults for its dialect."""
+
+    if is_sqlite_url(url):
+        return create_sqlite_engine(url, settings)
+    return create_engine(url, pool_pre_ping=True)
+
 
 def _initialise_engine() -> None:
     """Initialise the SQLModel engine and session factory."""
@@ -24,7 +122,7 @@ def _initialise_engine() -> None:
         return
 
     settings = get_settings()
-    engine = create_engine(settings.database_url, pool_pre_ping=True)
+    engine = create_engine_for_url(settings.database_url, settings)
     factory = sessionmaker(bind=engine, class_=Session, expire_on_commit=False)
 
     _engine = engine
@@ -63,4 +161,231 @@ def get_session() -> Iterator[Session]:
         yield session
 
 
-__all__ = ["configure_engine", "get_engine", "get_session"]
+def _hash_key(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+@dataclass(eq=False)
+class Shard:
+    """A database that owns a slice of the QR token space."""
+
+    name: str
+    url: Optional[str] = None
+    engine_getter: Optional[Callable[[], Engine]] = None
+    _engine: Optional[Engine] = field(default=None, repr=False)
+    _session_factory: Optional[sessionmaker] = field(default=None, repr=False)
+
+    @property
+    def engine(self) -> Engine:
+        if self.engine_getter is not None:
+            return self.engine_getter()
+        if self._engine is None:
+            assert self.url is not None  # pragma: no cover - enforced by the router
+            self._engine = create_engine_for_url(self.url)
+        return self._engine
+
+    def session(self, *, read_only: bool = False) -> Session:
+        """Open a new session on this shard, on a :func:`read_only_engine` view if ``read_only``."""
+
+        if read_only:
+            return Session(read_only_engine(self.engine), expire_on_commit=False)
+        if self.engine_getter is not None:
+            return Session(self.engine, expire_on_commit=False)
+        if self._session_factory is None:
+            self._session_factory = sessionmaker(bind=self.engine, class_=Session, expire_on_commit=False)
+        return self._session_factory()
+
+    def dispose(self) -> None:
+        if self._engine is not None:
+            self._engine.dispose()
+            self._engine = None
+            self._session_factory = None
+
+
+class ShardRouter:
+    """Route QR tokens to database shards with a consistent-hash ring.
+
+    Each shard is placed on the ring at ``virtual_nodes`` points derived from
+    its name (the URL without its password), and a token belongs to the first
+    shard clockwise from the token's hash. Adding a shard therefore moves only
+    the tokens that land on the new shard's points, roughly ``1/N`` of them.
+    Rows keyed by ``qr_id`` live on the same shard as their QR token; lookups
+    by ``qr_id`` alone are resolved through a small directory cache that falls
+    back to probing every shard's primary key.
+    """
+
+    def __init__(
+        self,
+        shards: Sequence[Shard],
+        *,
+        virtual_nodes: int = 128,
+        directory_size: int = 65536,
+    ) -> None:
+        if not shards:
+            raise ValueError("ShardRouter requires at least one shard")
+
+        self.shards: list[Shard] = list(shards)
+        ring = sorted(
+            (_hash_key(f"{shard.name}#{replica}"), index)
+            for index, shard in enumerate(self.shards)
+            for replica in range(virtual_nodes)
+        )
+        self._ring_points = [point for point, _ in ring]
+        self._ring_shards = [index for _, index in ring]
+        self._directory: OrderedDict[uuid.UUID, Shard] = OrderedDict()
+        self._directory_size = directory_size
+        self._directory_lock = threading.Lock()
+
+    @classmethod
+    def from_urls(cls, urls: Sequence[str], **kwargs: Any) -> "ShardRouter":
+        """Build a router with one shard per database URL."""
+
+        shards = [
+            Shard(name=make_url(url).render_as_string(hide_password=True), url=url)
+            for url in urls
+        ]
+        return cls(shards, **kwargs)
+
+    @property
+    def is_sharded(self) -> bool:
+        return len(self.shards) > 1
+
+    def shard_for_token(self, token: str) -> Shard:
+        """Return the shard that owns ``token``."""
+
+        if len(self.shards) == 1:
+            return self.shards[0]
+
+        position = bisect.bisect(self._ring_points, _hash_key(token)) % len(self._ring_points)
+        return self.shards[self._ring_shards[position]]
+
+    def remember_qr(self, qr_id: uuid.UUID, shard: Shard) -> None:
+        """Record which shard holds ``qr_id`` for later ``qr_id`` lookups."""
+
+        with self._directory_lock:
+            self._directory[qr_id] = shard
+            self._directory.move_to_end(qr_id)
+            while len(self._directory) > self._directory_size:
+                self._directory.popitem(last=False)
+
+    def forget_qr(self, qr_ids: Iterable[uuid.UUID]) -> None:
+        """Drop directory entries, e.g. for QR codes moved to another shard."""
+
+        with self._directory_lock:
+            for qr_id in qr_ids:
+                self._directory.pop(qr_id, None)
+
+    def shard_for_qr_id(self, qr_id: uuid.UUID) -> Optional[Shard]:
+        """Return the shard holding ``qr_id``, or ``None`` if no shard has it."""
+
+        if len(self.shards) == 1:
+            return self.shards[0]
+
+        with self._directory_lock:
+            shard = self._directory.get(qr_id)
+            if shard is not None:
+                self._directory.move_to_end(qr_id)
+                return shard
+
+        for candidate in self.shards:
+            with candidate.session() as session:
+                if session.get(QrCode, qr_id) is not None:
+                    self.remember_qr(qr_id, candidate)
+                    return candidate
+        return None
+
+    def dispose(self) -> None:
+        for shard in self.shards:
+            shard.dispose()
+
+
+class ShardSessions:
+    """Request-scoped sessions opened lazily on whichever shards are needed."""
+
+    def __init__(self, router: ShardRouter) -> None:
+        self.router = router
+        self._sessions: dict[tuple[int, bool], Session] = {}
+
+    def _session(self, shard: Shard, read_only: bool = False) -> Session:
+        key = (id(shard), read_only)
+        session = self._sessions.get(key)
+        if session is None:
+            session = shard.session(read_only=read_only)
+            self._sessions[key] = session
+        return session
+
+    def for_token(self, token: str, *, read_only: bool = False) -> Session:
+        """Return the session for the shard that owns ``token``.
+
+        Handlers that only read ask for a ``read_only`` session, which does
+        not serialise behind writers on SQLite.
+        """
+
+        return self._session(self.router.shard_for_token(token), read_only)
+
+    def for_qr_id(self, qr_id: uuid.UUID) -> Optional[Session]:
+        """Return the session for the shard holding ``qr_id``, if any."""
+
+        shard = self.router.shard_for_qr_id(qr_id)
+        return self._session(shard) if shard is not None else None
+
+    def close(self) -> None:
+        for session in self._sessions.values():
+            session.close()
+        self._sessions.clear()
+
+
+_shard_router: Optional[ShardRouter] = None
+
+
+def get_shard_router() -> ShardRouter:
+    """Return the process-wide shard router.
+
+    Without ``DATABASE_SHARD_URLS`` the router has a single shard backed by
+    the regular engine, so unsharded deployments and tests are unaffected.
+    """
+
+    global _shard_router
+
+    if _shard_router is None:
+        urls = get_settings().database_shard_urls
+        if urls:
+            _shard_router = ShardRouter.from_urls(urls)
+        else:
+            _shard_router = ShardRouter([Shard(name="default", engine_getter=get_engine)])
+    return _shard_router
+
+
+def configure_shard_router(router: Optional[ShardRouter]) -> None:
+    """Override the shard router (or reset it to the settings with ``None``)."""
+
+    global _shard_router
+
+    _shard_router = router
+
+
+def get_shard_sessions() -> Iterator[ShardSessions]:
+    """Provide shard-aware sessions for request handlers."""
+
+    sessions = ShardSessions(get_shard_router())
+    try:
+        yield sessions
+    finally:
+        sessions.close()
+
+
+__all__ = [
+    "Shard",
+    "ShardRouter",
+    "ShardSessions",
+    "configure_engine",
+    "configure_shard_router",
+    "create_engine_for_url",
+    "create_sqlite_engine",
+    "get_engine",
+    "get_session",
+    "get_shard_router",
+    "get_shard_sessions",
+    "is_sqlite_url",
+    "read_only_engine",
+]
@@ -0,0 +1,76 @@
+"""Identifier generation helpers for the Audiovook API."""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Optional
+
+_UUID7_VERSION = 0x7
+_UUID_VARIANT_RFC4122 = 0b10
+_COUNTER_BITS = 12
+_COUNTER_MAX = (1 << _COUNTER_BITS) - 1
+
+_lock = threading.Lock()
+_last_timestamp_ms = 0
+_counter = 0
+
+
+def _next_timestamp_and_counter() -> tuple[int, int]:
+    """Return a monotonic ``(unix_ms, counter)`` pair for the next UUIDv7."""
+
+    global _last_timestamp_ms, _counter
+
+    with _lock:
+        timestamp_ms = time.time_ns() // 1_000_000
+        if timestamp_ms > _last_timestamp_ms:
+            _last_timestamp_ms = timestamp_ms
+            # Seed the counter with random bits but keep the top bit clear so a
+            # burst within one millisecond has room to increment (RFC 9562 §6.2).
+            _counter = int.from_bytes(os.urandom(2), "big") & (_COUNTER_MAX >> 1)
+        else:
+            _counter += 1
+            if _counter > _COUNTER_MAX:
+                # Counter exhausted (or the clock went backwards): borrow the
+                # next millisecond rather than emitting an out-of-order id.
+                _last_timestamp_ms += 1
+                _counter = 0
+
+        return _last_timestamp_ms, _counter
+
+
+def uuid7() -> uuid.UUID:
+    """Return a time-ordered UUID (version 7) as described in RFC 9562.
+
+    The first 48 bits hold the Unix timestamp in milliseconds, followed by a
+    12-bit monotonic counter and 62 random bits. Ids generated by a single
+    process sort in creation order, so inserts append to the right-hand side
+    of B-tree indexes instead of landing on random pages like ``uuid4``.
+    """
+
+    timestamp_ms, counter = _next_timestamp_and_counter()
+    random_bits = int.from_bytes(os.urandom(8), "big") & ((1 << 62) - 1)
+
+    value = (timestamp_ms & ((1 << 48) - 1)) << 80
+    value |= _UUID7_VERSION << 76
+    value |= counter << 64
+    value |= _UUID_VARIANT_RFC4122 << 62
+    value |= random_bits
+
+    return uuid.UUID(int=value)
+
+
+def uuid7_timestamp(value: uuid.UUID) -> Optional[datetime]:
+    """Return the creation time embedded in a UUIDv7, or ``None`` for other versions."""
+
+    if value.version != _UUID7_VERSION:
+        return None
+
+    timestamp_ms = value.int >> 80
+    return datetime.fromtimestamp(timestamp_ms / 1000, tz=timezone.utc)
+
+
+__all__ = ["uuid7", "uuid7_timestamp"]
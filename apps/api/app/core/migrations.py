@@ -3,6 +3,8 @@
 from __future__ import annotations
 
 import logging
+from collections.abc import Iterator
+from contextlib import contextmanager
 from pathlib import Path
 from threading import Lock
 
@@ -40,6 +42,29 @@ def _build_alembic_config(engine: Engine) -> Config:
     return config
 
 
+MIGRATION_ADVISORY_LOCK_KEY = 0x61766F6F6B  # "avook"
+
+
+@contextmanager
+def _migration_advisory_lock(connection: Connection) -> Iterator[None]:
+    """Serialise migrations across API workers that start at the same time."""
+
+    if connection.dialect.name != "postgresql":
+        yield
+        return
+
+    lock_params = {"key": MIGRATION_ADVISORY_LOCK_KEY}
+    connection.execute(text("SELECT pg_advisory_lock(:key)"), lock_params)
+    connection.commit()
+    try:
+        yield
+    finally:
+        if connection.in_transaction():
+            connection.rollback()
+        connection.execute(text("SELECT pg_advisory_unlock(:key)"), lock_params)
+        connection.commit()
+
+
 def _database_at_head(engine: Engine, script: ScriptDirectory) -> bool:
     """Return True if the database already matches the latest revision."""
 
@@ -70,6 +95,23 @@ def _needs_stamp(engine: Engine) -> bool:
     return EXPECTED_TABLES.issubset(table_names)
 
 
+def _bootstrap_sqlite_schema(engine: Engine) -> None:
+    """Create the schema from model metadata on a fresh SQLite database.
+
+    The Alembic history targets PostgreSQL types, so single-node SQLite
+    installs start from ``metadata.create_all`` and are then stamped at head
+    by the regular flow below. Later revisions run against SQLite through
+    Alembic's batch mode.
+    """
+
+    inspector = inspect(engine)
+    if inspector.has_table("alembic_version") or inspector.get_table_names():
+        return
+
+    logger.info("Creating SQLite schema from model metadata")
+    model_metadata.create_all(engine)
+
+
 def _normalize_qr_status_enum(connection: Connection) -> None:
     """Ensure the qr_status enum uses lowercase labels."""
 
@@ -120,15 +162,12 @@ def run_migrations() -> None:
 
         engine = get_engine()
 
-        # SQLite is only used in tests where tables are created via metadata.
-        if engine.dialect.name == "sqlite":
-            logger.info("Skipping automatic migrations for SQLite engine")
-            _migrations_applied = True
-            return
-
         config = _build_alembic_config(engine)
         script = ScriptDirectory.from_config(config)
 
+        if engine.dialect.name == "sqlite":
+            _bootstrap_sqlite_schema(engine)
+
         if _database_at_head(engine, script):
             logger.info("Database already at latest Alembic revision")
             _migrations_applied = True
@@ -146,13 +185,21 @@ def run_migrations() -> None:
             _migrations_applied = True
             return
 
-        try:
-            with engine.begin() as connection:
-                _normalize_qr_status_enum(connection)
+        # Alembic manages the transactions itself (one per revision) so
+        # revisions can leave them for CREATE INDEX CONCURRENTLY and friends.
+        with engine.connect() as connection, _migration_advisory_lock(connection):
+            try:
+                if _database_at_head(engine, script):
+                    logger.info("Database migrated by another worker")
+                    _migrations_applied = True
+                    return
+
+                with connection.begin():
+                    _normalize_qr_status_enum(connection)
                 config.attributes["connection"] = connection
                 command.upgrade(config, "head")
-        finally:
-            config.attributes.pop("connection", None)
+            finally:
+                config.attributes.pop("connection", None)
 
         logger.info("Applied pending Alembic migrations")
         _migrations_applied = True
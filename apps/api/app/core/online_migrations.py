@@ -0,0 +1,452 @@
+"""Lock-avoiding schema change helpers for Alembic revisions.
+
+Large tables such as ``qr_binding``, ``listening_progress`` and
+``play_session`` must stay writable while a deploy migrates them. A plain
+``CREATE INDEX`` blocks writes for the whole build, and any DDL that queues
+for an ``ACCESS EXCLUSIVE`` lock behind a long-running query stalls every
+statement that arrives after it. Revisions should therefore use these helpers
+instead of the raw ``op`` calls:
+
+* :func:`create_index_concurrently` / :func:`drop_index_concurrently` build
+  and drop indexes outside the migration transaction;
+  :func:`create_partitioned_index` does the same for a partitioned table.
+* :func:`add_check_constraint_not_valid`, :func:`add_foreign_key_not_valid`
+  and :func:`validate_constraint` split constraint creation into a metadata
+  change and a separate validation scan that does not block writes.
+* :func:`add_column` and :func:`execute_with_lock_retry` run short DDL under a
+  ``lock_timeout`` and retry with backoff instead of queueing indefinitely.
+
+On dialects other than PostgreSQL (the single-node SQLite mode) the helpers
+fall back to the equivalent plain operations.
+"""
+
+from __future__ import annotations
+
+import logging
+import time
+from collections.abc import Callable, Iterator, Sequence
+from contextlib import contextmanager
+from typing import Any, Optional, TypeVar
+
+from alembic import op
+from sqlalchemy import Column, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.exc import DBAPIError
+
+logger = logging.getLogger("app.migrations")
+
+T = TypeVar("T")
+
+LOCK_NOT_AVAILABLE = "55P03"
+
+DEFAULT_LOCK_TIMEOUT_MS = 2000
+DEFAULT_ATTEMPTS = 10
+DEFAULT_BACKOFF_SECONDS = 0.5
+MAX_BACKOFF_SECONDS = 10.0
+
+
+class LockRetriesExhausted(RuntimeError):
+    """Raised when a DDL statement could not acquire its lock in time."""
+
+
+def _is_postgresql(connection: Connection) -> bool:
+    return connection.dialect.name == "postgresql"
+
+
+def _is_lock_timeout(exc: DBAPIError) -> bool:
+    # Not QUERY_CANCELED: statement timeouts and pg_cancel_backend() must surface.
+    sqlstate = getattr(exc.orig, "sqlstate", None) or getattr(exc.orig, "pgcode", None)
+    return sqlstate == LOCK_NOT_AVAILABLE
+
+
+def _quote(connection: Connection, name: str) -> str:
+    return connection.dialect.identifier_preparer.quote(name)
+
+
+@contextmanager
+def _session_lock_timeout(connection: Connection, lock_timeout_ms: int) -> Iterator[None]:
+    """Apply a session-level ``lock_timeout`` for statements in autocommit mode."""
+
+    previous = connection.exec_driver_sql("SHOW lock_timeout").scalar()
+    connection.exec_driver_sql(f"SET lock_timeout = {int(lock_timeout_ms)}")
+    try:
+        yield
+    finally:
+        connection.execute(text("SELECT set_config('lock_timeout', :value, false)"), {"value": previous})
+
+
+def retry_on_lock_timeout(
+    operation: Callable[[], T],
+    *,
+    attempts: int = DEFAULT_ATTEMPTS,
+    backoff_seconds: float = DEFAULT_BACKOFF_SECONDS,
+    description: str = "DDL statement",
+) -> T:
+    """Call ``operation`` until it stops failing with a lock timeout.
+
+    Waits grow exponentially from ``backoff_seconds`` up to
+    :data:`MAX_BACKOFF_SECONDS`. :class:`LockRetriesExhausted` is raised after
+    ``attempts`` failures so the deploy aborts instead of stalling traffic.
+    """
+
+    for attempt in range(1, attempts + 1):
+        try:
+            return operation()
+        except DBAPIError as exc:
+            if not _is_lock_timeout(exc):
+                raise
+            if attempt == attempts:
+                raise LockRetriesExhausted(
+                    f"{description} could not acquire its lock after {attempts} attempts"
+                ) from exc
+
+            delay = min(backoff_seconds * 2 ** (attempt - 1), MAX_BACKOFF_SECONDS)
+            logger.warning(
+                "Lock timeout on %s (attempt %d/%d); retrying in %.1fs",
+                description,
+                attempt,
+                attempts,
+                delay,
+            )
+            time.sleep(delay)
+
+    raise AssertionError("unreachable")  # pragma: no cover - loop always returns or raises
+
+
+def execute_with_lock_retry(
+    statement: str,
+    *,
+    lock_timeout_ms: int = DEFAULT_LOCK_TIMEOUT_MS,
+    attempts: int = DEFAULT_ATTEMPTS,
+    backoff_seconds: float = DEFAULT_BACKOFF_SECONDS,
+    parameters: Optional[dict[str, Any]] = None,
+) -> None:
+    """Run short DDL inside the migration transaction under a lock timeout.
+
+    Each attempt runs in a savepoint with ``SET LOCAL lock_timeout`` so a
+    timed-out attempt rolls back only itself and the migration can retry
+    without restarting.
+    """
+
+    connection = op.get_bind()
+    if not _is_postgresql(connection):
+        connection.execute(text(statement), parameters or {})
+        return
+
+    def attempt() -> None:
+        with connection.begin_nested():
+            connection.exec_driver_sql(f"SET LOCAL lock_timeout = {int(lock_timeout_ms)}")
+            connection.execute(text(statement), parameters or {})
+
+    retry_on_lock_timeout(
+        attempt,
+        attempts=attempts,
+        backoff_seconds=backoff_seconds,
+        description=statement.split("\n", 1)[0][:80],
+    )
+
+
+def _index_state(connection: Connection, index_name: str) -> Optional[bool]:
+    """Return ``None`` if the index is missing, otherwise whether it is valid."""
+
+    return connection.execute(
+        text(
+            """
+            SELECT i.indisvalid
+            FROM pg_index AS i
+            JOIN pg_class AS c ON c.oid = i.indexrelid
+            WHERE c.relname = :name AND pg_table_is_visible(c.oid)
+            """
+        ),
+        {"name": index_name},
+    ).scalar()
+
+
+def create_index_concurrently(
+    index_name: str,
+    table_name: str,
+    columns: Sequence[str],
+    *,
+    unique: bool = False,
+    lock_timeout_ms: int = DEFAULT_LOCK_TIMEOUT_MS,
+    attempts: int = DEFAULT_ATTEMPTS,
+    **kw: Any,
+) -> None:
+    """Build an index without blocking writes to ``table_name``.
+
+    The current migration transaction is committed and the index is built
+    with ``CREATE INDEX CONCURRENTLY`` in autocommit mode. An invalid index
+    left behind by an interrupted build is dropped and rebuilt, and a valid
+    one is kept, so the revision can be re-run safely.
+    """
+
+    context = op.get_context()
+    connection = op.get_bind()
+    if not _is_postgresql(connection):
+        op.create_index(index_name, table_name, list(columns), unique=unique, **kw)
+        return
+
+    def build() -> None:
+        state = _index_state(connection, index_name)
+        if state is True:
+            logger.info("Index %s already exists; skipping", index_name)
+            return
+        if state is False:
+            logger.warning("Dropping invalid index %s left by an interrupted build", index_name)
+            connection.exec_driver_sql(
+                f"DROP INDEX CONCURRENTLY IF EXISTS {_quote(connection, index_name)}"
+            )
+        op.create_index(
+            index_name,
+            table_name,
+            list(columns),
+            unique=unique,
+            postgresql_concurrently=True,
+            **kw,
+        )
+
+    with context.autocommit_block(), _session_lock_timeout(connection, lock_timeout_ms):
+        retry_on_lock_timeout(build, attempts=attempts, description=f"create index {index_name}")
+
+
+def _partitions(connection: Connection, table_name: str) -> Optional[list[str]]:
+    """Return the partitions of ``table_name``, or ``None`` if it is not partitioned."""
+
+    partitioned = connection.execute(
+        text(
+            "SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+            "WHERE c.relname = :name AND pg_table_is_visible(c.oid)"
+        ),
+        {"name": table_name},
+    ).scalar()
+    if not partitioned:
+        return None
+    return list(
+        connection.execute(
+            text(
+                "SELECT c.relname FROM pg_inherits i "
+                "JOIN pg_class c ON c.oid = i.inhrelid "
+                "JOIN pg_class p ON p.oid = i.inhparent "
+                "WHERE p.relname = :name AND pg_table_is_visible(p.oid) ORDER BY c.relname"
+            ),
+            {"name": table_name},
+        ).scalars()
+    )
+
+
+def create_partitioned_index(
+    index_name: str,
+    table_name: str,
+    columns: Sequence[str],
+    *,
+    lock_timeout_ms: int = DEFAULT_LOCK_TIMEOUT_MS,
+    attempts: int = DEFAULT_ATTEMPTS,
+) -> None:
+    """Index a partitioned ``table_name`` without blocking writes.
+
+    ``CREATE INDEX CONCURRENTLY`` is not supported on a partitioned table, so
+    the parent index is created ``ON ONLY`` the parent (an instant catalog
+    change) and each partition's index is built concurrently and attached.
+    Partitions created afterwards get the index automatically. Tables that
+    are not partitioned get :func:`create_index_concurrently`.
+    """
+
+    context = op.get_context()
+    connection = op.get_bind()
+    children = _partitions(connection, table_name) if _is_postgresql(connection) else None
+    if children is None:
+        create_index_concurrently(
+            index_name, table_name, columns, lock_timeout_ms=lock_timeout_ms, attempts=attempts
+        )
+        return
+
+    column_list = ", ".join(_quote(connection, column) for column in columns)
+    with context.autocommit_block(), _session_lock_timeout(connection, lock_timeout_ms):
+        retry_on_lock_timeout(
+            lambda: connection.exec_driver_sql(
+                f"CREATE INDEX IF NOT EXISTS {_quote(connection, index_name)} "
+                f"ON ONLY {_quote(connection, table_name)} ({column_list})"
+            ),
+            attempts=attempts,
+            description=f"create index {index_name}",
+        )
+        for child in children:
+            child_index = f"{child}_{'_'.join(columns)}_idx"
+            retry_on_lock_timeout(
+                lambda child=child, child_index=child_index: connection.exec_driver_sql(
+                    f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {_quote(connection, child_index)} "
+                    f"ON {_quote(connection, child)} ({column_list})"
+                ),
+                attempts=attempts,
+                description=f"create index {child_index}",
+            )
+            attached = connection.execute(
+                text(
+                    "SELECT 1 FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+                    "WHERE c.relname = :name"
+                ),
+                {"name": child_index},
+            ).scalar()
+            if not attached:
+                retry_on_lock_timeout(
+                    lambda child_index=child_index: connection.exec_driver_sql(
+                        f"ALTER INDEX {_quote(connection, index_name)} "
+                        f"ATTACH PARTITION {_quote(connection, child_index)}"
+                    ),
+                    attempts=attempts,
+                    description=f"attach index {child_index}",
+                )
+
+
+def drop_index_concurrently(
+    index_name: str,
+    table_name: str,
+    *,
+    lock_timeout_ms: int = DEFAULT_LOCK_TIMEOUT_MS,
+    attempts: int = DEFAULT_ATTEMPTS,
+) -> None:
+    """Drop an index without blocking reads or writes on ``table_name``."""
+
+    context = op.get_context()
+    connection = op.get_bind()
+    if not _is_postgresql(connection):
+        op.drop_index(index_name, table_name=table_name)
+        return
+
+    with context.autocommit_block(), _session_lock_timeout(connection, lock_timeout_ms):
+        retry_on_lock_timeout(
+            lambda: connection.exec_driver_sql(
+                f"DROP INDEX CONCURRENTLY IF EXISTS {_quote(connection, index_name)}"
+            ),
+            attempts=attempts,
+            description=f"drop index {index_name}",
+        )
+
+
+def add_column(
+    table_name: str,
+    column: Column[Any],
+    *,
+    lock_timeout_ms: int = DEFAULT_LOCK_TIMEOUT_MS,
+    attempts: int = DEFAULT_ATTEMPTS,
+) -> None:
+    """Add a column under a lock timeout with retries.
+
+    Only nullable columns, or columns with a constant default, are safe: on
+    PostgreSQL 11+ they are a catalog-only change. Volatile defaults rewrite
+    the table and must be backfilled separately instead.
+    """
+
+    connection = op.get_bind()
+    if not _is_postgresql(connection):
+        with op.batch_alter_table(table_name) as batch:
+            batch.add_column(column)
+        return
+
+    def attempt() -> None:
+        with connection.begin_nested():
+            connection.exec_driver_sql(f"SET LOCAL lock_timeout = {int(lock_timeout_ms)}")
+            op.add_column(table_name, column)
+
+    retry_on_lock_timeout(attempt, attempts=attempts, description=f"add column {table_name}.{column.name}")
+
+
+def add_check_constraint_not_valid(
+    constraint_name: str,
+    table_name: str,
+    condition: str,
+    **kw: Any,
+) -> None:
+    """Add a CHECK constraint that only applies to new rows until validated."""
+
+    connection = op.get_bind()
+    if not _is_postgresql(connection):
+        with op.batch_alter_table(table_name) as batch:
+            batch.create_check_constraint(constraint_name, text(condition))
+        return
+
+    execute_with_lock_retry(
+        f"ALTER TABLE {_quote(connection, table_name)} "
+        f"ADD CONSTRAINT {_quote(connection, constraint_name)} CHECK ({condition}) NOT VALID",
+        **kw,
+    )
+
+
+def add_foreign_key_not_valid(
+    constraint_name: str,
+    source_table: str,
+    referent_table: str,
+    local_columns: Sequence[str],
+    remote_columns: Sequence[str],
+    *,
+    ondelete: Optional[str] = None,
+    **kw: Any,
+) -> None:
+    """Add a foreign key without scanning existing rows under a write lock."""
+
+    connection = op.get_bind()
+    if not _is_postgresql(connection):
+        with op.batch_alter_table(source_table) as batch:
+            batch.create_foreign_key(
+                constraint_name,
+                referent_table,
+                list(local_columns),
+                list(remote_columns),
+                ondelete=ondelete,
+            )
+        return
+
+    local = ", ".join(_quote(connection, column) for column in local_columns)
+    remote = ", ".join(_quote(connection, column) for column in remote_columns)
+    on_delete = f" ON DELETE {ondelete}" if ondelete else ""
+    execute_with_lock_retry(
+        f"ALTER TABLE {_quote(connection, source_table)} "
+        f"ADD CONSTRAINT {_quote(connection, constraint_name)} FOREIGN KEY ({local}) "
+        f"REFERENCES {_quote(connection, referent_table)} ({remote}){on_delete} NOT VALID",
+        **kw,
+    )
+
+
+def validate_constraint(
+    table_name: str,
+    constraint_name: str,
+    *,
+    lock_timeout_ms: int = DEFAULT_LOCK_TIMEOUT_MS,
+    attempts: int = DEFAULT_ATTEMPTS,
+) -> None:
+    """Validate a ``NOT VALID`` constraint in its own short transaction.
+
+    ``VALIDATE CONSTRAINT`` scans the table under a SHARE UPDATE EXCLUSIVE
+    lock, which does not block reads or writes. Running it in autocommit mode
+    keeps the locks taken earlier in the migration from being held during the
+    scan.
+    """
+
+    context = op.get_context()
+    connection = op.get_bind()
+    if not _is_postgresql(connection):
+        return
+
+    with context.autocommit_block(), _session_lock_timeout(connection, lock_timeout_ms):
+        retry_on_lock_timeout(
+            lambda: connection.exec_driver_sql(
+                f"ALTER TABLE {_quote(connection, table_name)} "
+                f"VALIDATE CONSTRAINT {_quote(connection, constraint_name)}"
+            ),
+            attempts=attempts,
+            description=f"validate constraint {constraint_name}",
+        )
+
+
+__all__ = [
+    "LockRetriesExhausted",
+    "add_check_constraint_not_valid",
+    "add_column",
+    "add_foreign_key_not_valid",
+    "create_index_concurrently",
+    "create_partitioned_index",
+    "drop_index_concurrently",
+    "execute_with_lock_retry",
+    "retry_on_lock_timeout",
+    "validate_constraint",
+]
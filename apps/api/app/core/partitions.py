@@ -0,0 +1,283 @@
+"""Monthly range partitions for ``play_session``.
+
+On PostgreSQL ``play_session`` is partitioned by ``started_at`` into one
+partition per calendar month (``play_session_y2026m10``) plus a default
+partition that only catches rows outside every range. Databases that were
+partitioned by migration also keep their original table as
+``play_session_legacy``, one partition covering everything before the first
+month. These helpers create upcoming partitions ahead of time and detach old
+ones so they can be archived or dropped without deleting rows one by one.
+Other dialects have no partitions and the helpers do nothing.
+
+PostgreSQL refuses to create a partition while the default partition holds
+rows in its range. When a missed run has let sessions land there, the
+month's partition is split out of the default partition instead (see
+:func:`split_default_partition`).
+"""
+
+from __future__ import annotations
+
+import logging
+import re
+from datetime import date, datetime, timezone
+from typing import Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+from sqlalchemy.exc import SQLAlchemyError
+
+from .config import get_settings
+from .database import ShardRouter, get_shard_router
+from .online_migrations import DEFAULT_LOCK_TIMEOUT_MS, LockRetriesExhausted, retry_on_lock_timeout
+
+logger = logging.getLogger("app.partitions")
+
+PARENT_TABLE = "play_session"
+DEFAULT_PARTITION = "play_session_default"
+LEGACY_PARTITION = "play_session_legacy"
+DEFAULT_MONTHS_AHEAD = 3
+
+_PARTITION_NAME = re.compile(r"^play_session_y(\d{4})m(\d{2})$")
+_UPPER_BOUND = re.compile(r"TO \('([^']+)'\)")
+
+
+def month_start(value: date | datetime) -> date:
+    return date(value.year, value.month, 1)
+
+
+def add_months(value: date, months: int) -> date:
+    index = value.year * 12 + value.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"{PARENT_TABLE}_y{month.year:04d}m{month.month:02d}"
+
+
+def _bound(month: date) -> str:
+    return f"'{month.isoformat()} 00:00:00+00'"
+
+
+def is_partitioned(connection: Connection) -> bool:
+    """Return True when ``play_session`` is a partitioned table."""
+
+    if connection.dialect.name != "postgresql":
+        return False
+    return bool(
+        connection.execute(
+            text(
+                "SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+                "WHERE c.relname = :name AND pg_table_is_visible(c.oid)"
+            ),
+            {"name": PARENT_TABLE},
+        ).scalar()
+    )
+
+
+def list_partitions(connection: Connection) -> dict[date, str]:
+    """Return the monthly partitions currently attached, keyed by month."""
+
+    names = connection.execute(
+        text(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "JOIN pg_class p ON p.oid = i.inhparent "
+            "WHERE p.relname = :name AND pg_table_is_visible(p.oid)"
+        ),
+        {"name": PARENT_TABLE},
+    ).scalars()
+
+    partitions: dict[date, str] = {}
+    for name in names:
+        match = _PARTITION_NAME.match(name)
+        if match:
+            partitions[date(int(match.group(1)), int(match.group(2)), 1)] = name
+    return partitions
+
+
+def legacy_partition_end(connection: Connection) -> Optional[date]:
+    """Return the month ``play_session_legacy`` ends before, if it is attached."""
+
+    bound = connection.execute(
+        text(
+            "SELECT pg_get_expr(c.relpartbound, c.oid) FROM pg_class c "
+            "WHERE c.relname = :name AND c.relispartition AND pg_table_is_visible(c.oid)"
+        ),
+        {"name": LEGACY_PARTITION},
+    ).scalar()
+    match = _UPPER_BOUND.search(bound) if bound else None
+    if match is None:
+        return None
+    # Rendered in the session time zone, e.g. '2026-11-30 19:00:00-05'.
+    return month_start(datetime.fromisoformat(match.group(1)).astimezone(timezone.utc))
+
+
+def create_partition(connection: Connection, month: date) -> None:
+    """Create the partition for ``month`` inside the current transaction."""
+
+    connection.exec_driver_sql(
+        f"CREATE TABLE IF NOT EXISTS {partition_name(month)} PARTITION OF {PARENT_TABLE} "
+        f"FOR VALUES FROM ({_bound(month)}) TO ({_bound(add_months(month, 1))})"
+    )
+
+
+def _default_holds(connection: Connection, month: date) -> bool:
+    """Return True when the default partition has rows that belong to ``month``."""
+
+    if connection.execute(text("SELECT to_regclass(:name)"), {"name": DEFAULT_PARTITION}).scalar() is None:
+        return False
+    return bool(
+        connection.exec_driver_sql(
+            f"SELECT 1 FROM {DEFAULT_PARTITION} "
+            f"WHERE started_at >= {_bound(month)} AND started_at < {_bound(add_months(month, 1))} LIMIT 1"
+        ).scalar()
+    )
+
+
+def split_default_partition(connection: Connection, month: date) -> int:
+    """Create the partition for ``month`` and move its rows out of the default one.
+
+    Runs inside the current transaction: the default partition is detached,
+    the month's partition created, the rows moved across and the default
+    partition attached again, so readers never see the rows missing or twice.
+    Returns the number of rows moved.
+    """
+
+    connection.exec_driver_sql(f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {DEFAULT_PARTITION}")
+    create_partition(connection, month)
+    moved = connection.exec_driver_sql(
+        f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} "
+        f"WHERE started_at >= {_bound(month)} AND started_at < {_bound(add_months(month, 1))} "
+        f"RETURNING *) INSERT INTO {partition_name(month)} SELECT * FROM moved"
+    ).rowcount
+    connection.exec_driver_sql(f"ALTER TABLE {PARENT_TABLE} ATTACH PARTITION {DEFAULT_PARTITION} DEFAULT")
+    return moved
+
+
+def ensure_partitions(
+    connection: Connection,
+    *,
+    start: Optional[date] = None,
+    months_ahead: int = DEFAULT_MONTHS_AHEAD,
+    lock_timeout_ms: int = DEFAULT_LOCK_TIMEOUT_MS,
+    today: Optional[date] = None,
+) -> list[str]:
+    """Create missing monthly partitions from ``start`` to ``months_ahead`` out.
+
+    ``connection`` must not be inside a transaction: each partition is
+    created in its own short transaction under ``lock_timeout`` and retried,
+    because attaching a partition briefly locks the parent table. Months whose
+    sessions already landed in the default partition are split out of it.
+    Returns the names of the partitions that were created.
+    """
+
+    if not is_partitioned(connection):
+        return []
+
+    current = month_start(today or datetime.utcnow())
+    first = month_start(start) if start is not None else current
+    existing = list_partitions(connection)
+    legacy_end = legacy_partition_end(connection)
+    if legacy_end is not None:
+        first = max(first, legacy_end)
+    connection.commit()
+
+    created: list[str] = []
+    month = first
+    while month <= add_months(current, months_ahead):
+        if month not in existing:
+
+            def attempt(month: date = month) -> None:
+                with connection.begin():
+                    connection.exec_driver_sql(f"SET LOCAL lock_timeout = {int(lock_timeout_ms)}")
+                    if _default_holds(connection, month):
+                        moved = split_default_partition(connection, month)
+                        logger.info(
+                            "Moved %d rows of %s out of %s", moved, partition_name(month), DEFAULT_PARTITION
+                        )
+                    else:
+                        create_partition(connection, month)
+
+            retry_on_lock_timeout(attempt, description=f"create partition {partition_name(month)}")
+            created.append(partition_name(month))
+            logger.info("Created partition %s", partition_name(month))
+        month = add_months(month, 1)
+    return created
+
+
+def ensure_shard_partitions(router: Optional[ShardRouter] = None) -> None:
+    """Create upcoming partitions on every shard, logging instead of failing.
+
+    Called at startup so deployments keep ``play_session_partition_months_ahead``
+    months of partitions ready. After a missed run new sessions land in the
+    default partition; the next run moves them into their month's partition.
+    """
+
+    months_ahead = get_settings().play_session_partition_months_ahead
+    for shard in (router or get_shard_router()).shards:
+        try:
+            with shard.engine.connect() as connection:
+                ensure_partitions(connection, months_ahead=months_ahead)
+        except (SQLAlchemyError, LockRetriesExhausted):
+            logger.exception("Could not create play_session partitions on shard %s", shard.name)
+
+
+def detach_partitions_before(
+    connection: Connection,
+    cutoff: date,
+    *,
+    drop: bool = False,
+    lock_timeout_ms: int = DEFAULT_LOCK_TIMEOUT_MS,
+) -> list[str]:
+    """Detach every monthly partition that ends on or before ``cutoff``.
+
+    ``play_session_legacy`` is detached the same way once its range ends on
+    or before ``cutoff``. Detached partitions become ordinary tables that can
+    be dumped and archived; with ``drop`` they are dropped instead. Detaching only touches
+    the catalog, but it locks ``play_session`` exclusively for that moment
+    (``CONCURRENTLY`` is not allowed alongside a default partition), so each
+    detach runs in its own transaction under ``lock_timeout`` and is retried.
+    """
+
+    if not is_partitioned(connection):
+        return []
+
+    ends = [(add_months(month, 1), name) for month, name in list_partitions(connection).items()]
+    legacy_end = legacy_partition_end(connection)
+    if legacy_end is not None:
+        ends.append((legacy_end, LEGACY_PARTITION))
+    connection.commit()
+
+    detached: list[str] = []
+    for end, name in sorted(ends):
+        if end > month_start(cutoff):
+            continue
+
+        def attempt(name: str = name) -> None:
+            with connection.begin():
+                connection.exec_driver_sql(f"SET LOCAL lock_timeout = {int(lock_timeout_ms)}")
+                connection.exec_driver_sql(f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {name}")
+                if drop:
+                    connection.exec_driver_sql(f"DROP TABLE {name}")
+
+        retry_on_lock_timeout(attempt, description=f"detach partition {name}")
+        detached.append(name)
+        logger.info("%s partition %s", "Dropped" if drop else "Detached", name)
+    return detached
+
+
+__all__ = [
+    "DEFAULT_PARTITION",
+    "LEGACY_PARTITION",
+    "add_months",
+    "create_partition",
+    "detach_partitions_before",
+    "ensure_partitions",
+    "ensure_shard_partitions",
+    "is_partitioned",
+    "legacy_partition_end",
+    "list_partitions",
+    "month_start",
+    "partition_name",
+    "split_default_partition",
+]
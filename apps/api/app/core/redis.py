@@ -7,6 +7,7 @@ from functools import lru_cache
 from typing import Optional
 
 from redis import Redis
+from redis.asyncio import Redis as AsyncRedis
 from redis.exceptions import RedisError
 
 from .config import get_settings
@@ -41,4 +42,18 @@ def get_redis_client() -> Optional[Redis]:
     return client
 
 
-__all__ = ["get_redis_client"]
+@lru_cache
+def get_async_redis_client() -> Optional[AsyncRedis]:
+    """Return an asyncio Redis client when Redis is reachable.
+
+    Used by long-lived asyncio consumers such as pub/sub listeners. Reachability
+    is decided by :func:`get_redis_client` so both clients agree on whether to
+    fall back to in-memory handling.
+    """
+
+    if get_redis_client() is None:
+        return None
+    return AsyncRedis.from_url(get_settings().redis_url)
+
+
+__all__ = ["get_async_redis_client", "get_redis_client"]
@@ -3,8 +3,11 @@
 from sqlmodel import SQLModel
 
 from .account import Account, AccountProvider
+from .analytics import BatchActivationStats, ListeningDailyRollup
 from .binding import QrBinding
 from .device import Device
+from .job import JobCheckpoint
+from .media import MediaAsset
 from .progress import ListeningProgress
 from .qr import QrCode, QrStatus
 from .session import PlaySession
@@ -14,8 +17,12 @@ metadata = SQLModel.metadata
 __all__ = [
     "Account",
     "AccountProvider",
+    "BatchActivationStats",
     "Device",
+    "JobCheckpoint",
+    "ListeningDailyRollup",
     "ListeningProgress",
+    "MediaAsset",
     "PlaySession",
     "QrBinding",
     "QrCode",
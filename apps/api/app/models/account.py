@@ -11,6 +11,8 @@ from sqlalchemy import Column, DateTime, Enum as SAEnum, Text, func
 from sqlalchemy.dialects.postgresql import UUID
 from sqlmodel import Field, SQLModel
 
+from app.core.ids import uuid7
+
 
 class AccountProvider(str, Enum):
     """Supported identity providers for Audiovook accounts."""
@@ -27,7 +29,7 @@ class Account(SQLModel, table=True):
     __tablename__ = "account"
 
     id: uuid.UUID = Field(
-        default_factory=uuid.uuid4,
+        default_factory=uuid7,
         sa_column=Column(UUID(as_uuid=True), primary_key=True, nullable=False),
     )
     email: Optional[str] = Field(
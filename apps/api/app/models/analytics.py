@@ -0,0 +1,93 @@
+"""Analytics rollup model definitions using SQLModel."""
+
+from __future__ import annotations
+
+from datetime import date, datetime
+
+from sqlalchemy import BigInteger, Column, Date, DateTime, Integer, func, text
+from sqlmodel import Field, SQLModel
+
+
+class ListeningDailyRollup(SQLModel, table=True):
+    """Listening totals per product and UTC day, maintained incrementally."""
+
+    __tablename__ = "listening_daily_rollup"
+
+    product_id: int = Field(
+        sa_column=Column(Integer, primary_key=True, nullable=False),
+    )
+    day: date = Field(
+        sa_column=Column(Date, primary_key=True, nullable=False),
+    )
+    sessions: int = Field(
+        default=0,
+        sa_column=Column(Integer, nullable=False, server_default=text("0")),
+    )
+    listening_ms: int = Field(
+        default=0,
+        sa_column=Column(BigInteger, nullable=False, server_default=text("0")),
+    )
+    completions: int = Field(
+        default=0,
+        sa_column=Column(Integer, nullable=False, server_default=text("0")),
+    )
+    updated_at: datetime = Field(
+        sa_column=Column(
+            DateTime(timezone=True),
+            nullable=False,
+            server_default=func.now(),
+        ),
+    )
+
+
+class BatchActivationStats(SQLModel, table=True):
+    """Activation counters for one print batch and product.
+
+    Each pair is split over a few ``slot`` rows so concurrent registrations
+    from the same batch do not queue on a single row lock; readers add the
+    slots up. ``new``/``active``/``blocked`` count QR codes currently in
+    that status, ``reregistrations`` and ``cooldowns`` count events. QR codes
+    without a batch or product are recorded under ``0``.
+    """
+
+    __tablename__ = "batch_activation_stats"
+
+    batch_id: int = Field(
+        sa_column=Column(Integer, primary_key=True, nullable=False),
+    )
+    product_id: int = Field(
+        sa_column=Column(Integer, primary_key=True, nullable=False),
+    )
+    slot: int = Field(
+        sa_column=Column(Integer, primary_key=True, nullable=False),
+    )
+    new: int = Field(
+        default=0,
+        sa_column=Column(Integer, nullable=False, server_default=text("0")),
+    )
+    active: int = Field(
+        default=0,
+        sa_column=Column(Integer, nullable=False, server_default=text("0")),
+    )
+    blocked: int = Field(
+        default=0,
+        sa_column=Column(Integer, nullable=False, server_default=text("0")),
+    )
+    reregistrations: int = Field(
+        default=0,
+        sa_column=Column(Integer, nullable=False, server_default=text("0")),
+    )
+    cooldowns: int = Field(
+        default=0,
+        sa_column=Column(Integer, nullable=False, server_default=text("0")),
+    )
+    updated_at: datetime = Field(
+        sa_column=Column(
+            DateTime(timezone=True),
+            nullable=False,
+            server_default=func.now(),
+        ),
+    )
+
+
+__all__ = ["BatchActivationStats", "ListeningDailyRollup"]
@@ -15,7 +15,10 @@ class QrBinding(SQLModel, table=True):
     """Represents the relationship between a QR code and a device/account."""
 
     __tablename__ = "qr_binding"
-    __table_args__ = (Index("idx_binding_qr_active", "qr_id", "active"),)
+    __table_args__ = (
+        Index("idx_binding_qr_active", "qr_id", "active"),
+        Index("idx_binding_revoked_at", "revoked_at", "qr_id", "device_id"),
+    )
 
     qr_id: uuid.UUID = Field(
         sa_column=Column(
@@ -10,6 +10,8 @@ from sqlalchemy import Column, DateTime, ForeignKey, Text, func
 from sqlalchemy.dialects.postgresql import UUID
 from sqlmodel import Field, SQLModel
 
+from app.core.ids import uuid7
+
 
 class Device(SQLModel, table=True):
     """Represents a client device that interacts with Audiovook."""
@@ -17,7 +19,7 @@ class Device(SQLModel, table=True):
     __tablename__ = "device"
 
     id: uuid.UUID = Field(
-        default_factory=uuid.uuid4,
+        default_factory=uuid7,
         sa_column=Column(UUID(as_uuid=True), primary_key=True, nullable=False),
     )
     account_id: Optional[uuid.UUID] = Field(
@@ -0,0 +1,33 @@
+"""Checkpoints for resumable maintenance jobs."""
+
+from __future__ import annotations
+
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import Column, DateTime, Text, func
+from sqlmodel import Field, SQLModel
+
+
+class JobCheckpoint(SQLModel, table=True):
+    """Where a batched background job stopped, so a rerun can resume there."""
+
+    __tablename__ = "job_checkpoint"
+
+    name: str = Field(
+        sa_column=Column(Text, primary_key=True, nullable=False),
+    )
+    position: Optional[str] = Field(
+        default=None,
+        sa_column=Column(Text, nullable=True),
+    )
+    updated_at: datetime = Field(
+        sa_column=Column(
+            DateTime(timezone=True),
+            nullable=False,
+            server_default=func.now(),
+        ),
+    )
+
+
+__all__ = ["JobCheckpoint"]
@@ -0,0 +1,37 @@
+"""Media asset catalog model definitions using SQLModel."""
+
+from __future__ import annotations
+
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import BigInteger, Column, DateTime, Double, Index, Integer, String, func
+from sqlmodel import Field, SQLModel
+
+
+class MediaAsset(SQLModel, table=True):
+    """Metadata of one file in media storage.
+
+    Filled by ``ingest_hls`` and ``rescan_media`` so request handlers need no
+    storage round trip to learn a file's size or validators. ``mtime`` is
+    kept as the float the storage backend reports, so ETags derived from it
+    match those computed from a direct ``stat``.
+    """
+
+    __tablename__ = "media_asset"
+    __table_args__ = (Index("idx_media_asset_product", "product_id"),)
+
+    path: str = Field(sa_column=Column(String(512), primary_key=True, nullable=False))
+    product_id: Optional[int] = Field(default=None, sa_column=Column(Integer, nullable=True))
+    size: int = Field(sa_column=Column(BigInteger, nullable=False))
+    mtime: Optional[float] = Field(default=None, sa_column=Column(Double, nullable=True))
+    duration_ms: Optional[int] = Field(default=None, sa_column=Column(Integer, nullable=True))
+    bitrate: Optional[int] = Field(default=None, sa_column=Column(Integer, nullable=True))
+    sha256: Optional[str] = Field(default=None, sa_column=Column(String(64), nullable=True))
+    updated_at: datetime = Field(
+        sa_column=Column(
+            DateTime(timezone=True),
+            nullable=False,
+            server_default=func.now(),
+        ),
+    )
@@ -15,7 +15,10 @@ class ListeningProgress(SQLModel, table=True):
     """Tracks the playback progress for a QR/account/device combination."""
 
     __tablename__ = "listening_progress"
-    __table_args__ = (Index("idx_progress_updated_at", "updated_at"),)
+    __table_args__ = (
+        Index("idx_progress_updated_at", "updated_at", "qr_id", "device_id", "track_id"),
+        Index("idx_progress_qr_updated", "qr_id", "updated_at", "device_id", "track_id"),
+    )
 
     qr_id: uuid.UUID = Field(
         sa_column=Column(
@@ -54,6 +57,10 @@ class ListeningProgress(SQLModel, table=True):
             server_default=func.now(),
         ),
     )
+    completed_at: Optional[datetime] = Field(
+        default=None,
+        sa_column=Column(DateTime(timezone=True), nullable=True),
+    )
 
 
 __all__ = ["ListeningProgress"]
@@ -11,6 +11,8 @@ from sqlalchemy import Column, DateTime, Enum as SAEnum, Index, Integer, Text, f
 from sqlalchemy.dialects.postgresql import UUID
 from sqlmodel import Field, SQLModel
 
+from app.core.ids import uuid7
+
 
 class QrStatus(str, Enum):
     """Lifecycle status for QR codes."""
@@ -27,7 +29,7 @@ class QrCode(SQLModel, table=True):
     __table_args__ = (Index("idx_qr_token", "token"),)
 
     id: uuid.UUID = Field(
-        default_factory=uuid.uuid4,
+        default_factory=uuid7,
         sa_column=Column(UUID(as_uuid=True), primary_key=True, nullable=False),
     )
     token: str = Field(
@@ -6,18 +6,31 @@ import uuid
 from datetime import datetime
 from typing import Optional
 
-from sqlalchemy import Column, DateTime, ForeignKey, Text, func
+from sqlalchemy import Column, DateTime, ForeignKey, Index, Text, func
 from sqlalchemy.dialects.postgresql import UUID
 from sqlmodel import Field, SQLModel
 
+from app.core.ids import uuid7
+
 
 class PlaySession(SQLModel, table=True):
-    """Represents an active playback session for a QR/device pair."""
+    """Represents an active playback session for a QR/device pair.
+
+    On PostgreSQL the table is range-partitioned by month on ``started_at``
+    (see :mod:`app.core.partitions`), which is why the timestamp is part of
+    the primary key.
+    """
 
     __tablename__ = "play_session"
+    __table_args__ = (
+        Index("idx_play_session_qr_started", "qr_id", "started_at"),
+        Index("idx_play_session_device_started", "device_id", "started_at"),
+        Index("idx_play_session_ended", "ended_at"),
+        Index("idx_play_session_closed", "closed_at"),
+    )
 
     id: uuid.UUID = Field(
-        default_factory=uuid.uuid4,
+        default_factory=uuid7,
         sa_column=Column(UUID(as_uuid=True), primary_key=True, nullable=False),
     )
     qr_id: uuid.UUID = Field(
@@ -37,6 +50,7 @@ class PlaySession(SQLModel, table=True):
     started_at: datetime = Field(
         sa_column=Column(
             DateTime(timezone=True),
+            primary_key=True,
             nullable=False,
             server_default=func.now(),
         ),
@@ -45,6 +59,12 @@ class PlaySession(SQLModel, table=True):
         default=None,
         sa_column=Column(DateTime(timezone=True), nullable=True),
     )
+    # When the session was closed. ``ended_at`` may be backdated to the last
+    # heartbeat; this is the time the close was written.
+    closed_at: Optional[datetime] = Field(
+        default=None,
+        sa_column=Column(DateTime(timezone=True), nullable=True),
+    )
     ip_hash: str = Field(
         sa_column=Column(Text, nullable=False),
     )
@@ -0,0 +1,77 @@
+"""Export play sessions or listening progress for a time range as CSV.
+
+Rows are streamed in short keyset chunks from every shard, or from the
+databases given with ``--source`` (for example read replicas), so the export
+keeps memory flat and holds no long transaction. A ``.gz`` output is
+compressed as it is written.
+
+Usage::
+
+    python -m app.scripts.export_analytics play_session \\
+        --start 2026-10-01 --end 2026-11-01 --output sessions-2026-10.csv.gz
+"""
+
+from __future__ import annotations
+
+import argparse
+import gzip
+import sys
+from collections.abc import Sequence
+from datetime import datetime, timezone
+from typing import BinaryIO
+
+from app.core.database import create_engine_for_url, get_shard_router
+from app.services.exports import DEFAULT_CHUNK_ROWS, EXPORTS, iter_csv_chunks
+
+
+def _timestamp(value: str) -> datetime:
+    parsed = datetime.fromisoformat(value)
+    return parsed.replace(tzinfo=timezone.utc) if parsed.tzinfo is None else parsed
+
+
+def _open_output(path: str) -> BinaryIO:
+    if path == "-":
+        return sys.stdout.buffer
+    if path.endswith(".gz"):
+        return gzip.open(path, "wb")  # type: ignore[return-value]
+    return open(path, "wb")
+
+
+def main(argv: Sequence[str] | None = None) -> None:
+    """Entrypoint for the analytics export."""
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("table", choices=sorted(EXPORTS))
+    parser.add_argument("--start", type=_timestamp, required=True, help="inclusive, ISO 8601 (UTC if naive)")
+    parser.add_argument("--end", type=_timestamp, required=True, help="exclusive, ISO 8601 (UTC if naive)")
+    parser.add_argument("--output", default="-", help="file to write, '-' for stdout; '.gz' compresses")
+    parser.add_argument("--chunk-rows", type=int, default=DEFAULT_CHUNK_ROWS, help="rows read per transaction")
+    parser.add_argument(
+        "--source",
+        action="append",
+        default=[],
+        metavar="URL",
+        help="database to read instead of the configured shards (repeatable)",
+    )
+    args = parser.parse_args(argv)
+
+    if args.start >= args.end:
+        parser.error("--start must precede --end")
+
+    router = get_shard_router()
+    sources = [create_engine_for_url(url) for url in args.source]
+    output = _open_output(args.output)
+    try:
+        engines = sources or (shard.engine for shard in router.shards)
+        for chunk in iter_csv_chunks(engines, EXPORTS[args.table], args.start, args.end, chunk_rows=args.chunk_rows):
+            output.write(chunk)
+    finally:
+        if output is not sys.stdout.buffer:
+            output.close()
+        for engine in sources:
+            engine.dispose()
+        router.dispose()
+
+
+if __name__ == "__main__":  # pragma: no cover - manual execution helper
+    main()
@@ -0,0 +1,318 @@
+"""Segment product audio into HLS playlists in media storage.
+
+Sources are read from ``SOURCE/<product_id>/``; each audio file there is a
+chapter, in file-name order. MP3 and AAC (ADTS) files are split in pure
+Python on frame boundaries. Other formats (``.m4a``, ``.m4b``) are remuxed
+to ADTS with a local ``ffmpeg`` first. Segments are written to
+``hls/<product_id>/`` with the playlist ``index.m3u8`` that the sampler and
+players read, and recorded in the ``media_asset`` catalog.
+
+Files are segmented in parallel across a process pool. After each file the
+script records its checksum and segments in ``hls/<product_id>/ingest.json``.
+An interrupted run picks up where it stopped, and unchanged files are
+skipped. Segment names start with the source checksum, so a re-ingested
+chapter never overwrites segments a player may be fetching; segments of
+replaced sources are left for cleanup.
+
+Usage::
+
+    python -m app.scripts.ingest_hls /data/masters --workers 8
+    python -m app.scripts.ingest_hls /data/masters --product 42 --storage-root /srv/media
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import io
+import json
+import logging
+import mmap
+import multiprocessing
+import os
+import shutil
+import subprocess
+from collections.abc import Sequence
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Optional
+
+from app.core.redis import get_redis_client
+from app.services.hls import (
+    HLS_PREFIX,
+    PLAYLIST_MEDIA_TYPE,
+    PLAYLIST_NAME,
+    SEGMENT_EXTENSIONS,
+    SEGMENT_MEDIA_TYPES,
+    Codec,
+    detect_codec,
+    render_media_playlist,
+    split_segments,
+    timestamp_tag,
+)
+from app.services.media_catalog import AssetInfo, MediaCatalog, describe_bytes
+from app.services.sampler import SamplerCache
+from app.services.storage import Buffer, LocalStorage, StorageBackend, configure_storage, get_storage
+
+logger = logging.getLogger("app.ingest_hls")
+
+STATE_NAME = "ingest.json"
+NATIVE_SUFFIXES = {".mp3": "mp3", ".aac": "aac"}
+REMUX_SUFFIXES = frozenset({".m4a", ".m4b", ".mp4"})
+DEFAULT_SEGMENT_SECONDS = 6.0
+
+
+@dataclass(frozen=True)
+class Job:
+    """One source file to segment."""
+
+    product_id: int
+    source: str
+    previous_checksum: Optional[str]
+    segment_seconds: float
+    ffmpeg: Optional[str]
+
+
+@dataclass
+class Outcome:
+    """What a worker did with a source file."""
+
+    product_id: int
+    name: str
+    checksum: str
+    segments: list[tuple[str, float]] = field(default_factory=list)
+    assets: list[AssetInfo] = field(default_factory=list)
+    skipped: bool = False
+
+
+def _checksum(path: str) -> str:
+    with open(path, "rb") as handle:
+        return hashlib.file_digest(handle, "sha256").hexdigest()
+
+
+def _remux(ffmpeg: str, path: str) -> bytes:
+    """Return the AAC track of ``path`` as ADTS without re-encoding."""
+
+    result = subprocess.run(
+        [ffmpeg, "-nostdin", "-v", "error", "-i", path, "-vn", "-c:a", "copy", "-f", "adts", "-"],
+        check=True,
+        capture_output=True,
+    )
+    return result.stdout
+
+
+def _load(job: Job) -> tuple[Buffer, Codec]:
+    suffix = Path(job.source).suffix.lower()
+    if suffix in REMUX_SUFFIXES:
+        if job.ffmpeg is None:
+            raise RuntimeError(f"{job.source}: {suffix} sources need ffmpeg")
+        return _remux(job.ffmpeg, job.source), "aac"
+    with open(job.source, "rb") as handle:
+        if os.fstat(handle.fileno()).st_size == 0:
+            return b"", NATIVE_SUFFIXES[suffix]  # type: ignore[return-value]
+        data = memoryview(mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ))
+    return data, detect_codec(data)
+
+
+def segment_file(job: Job) -> Outcome:
+    """Split one source into segments and write them to storage."""
+
+    name = Path(job.source).name
+    checksum = _checksum(job.source)
+    if checksum == job.previous_checksum:
+        return Outcome(job.product_id, name, checksum, skipped=True)
+
+    data, codec = _load(job)
+    storage = get_storage()
+    prefix = checksum[:16]
+    outcome = Outcome(job.product_id, name, checksum)
+    for index, span in enumerate(split_segments(data, codec, job.segment_seconds)):
+        uri = f"{prefix}-{index:05d}{SEGMENT_EXTENSIONS[codec]}"
+        path = f"{HLS_PREFIX}/{job.product_id}/{uri}"
+        body = timestamp_tag(span.start_seconds) + data[span.start : span.end]
+        storage.write(path, body, content_type=SEGMENT_MEDIA_TYPES[codec])
+        stat = storage.stat(path)
+        outcome.segments.append((uri, round(span.duration, 3)))
+        outcome.assets.append(
+            AssetInfo(
+                path=path,
+                size=stat.size,
+                mtime=stat.mtime,
+                product_id=job.product_id,
+                duration_ms=round(span.duration * 1000),
+                bitrate=round(len(body) * 8 / span.duration),
+                sha256=hashlib.sha256(body).hexdigest(),
+            )
+        )
+    return outcome
+
+
+def _init_worker(storage_root: Optional[str]) -> None:
+    if storage_root is not None:
+        configure_storage(LocalStorage(storage_root))
+
+
+def _load_state(storage: StorageBackend, product_id: int, segment_seconds: float) -> dict[str, Any]:
+    path = f"{HLS_PREFIX}/{product_id}/{STATE_NAME}"
+    try:
+        with storage.open(path) as handle:
+            state = json.loads(handle.read())
+    except FileNotFoundError:
+        state = None
+    if not state or state.get("segment_seconds") != segment_seconds:
+        return {"segment_seconds": segment_seconds, "files": {}}
+    return state
+
+
+def _save_state(storage: StorageBackend, product_id: int, state: dict[str, Any]) -> None:
+    storage.write(
+        f"{HLS_PREFIX}/{product_id}/{STATE_NAME}",
+        json.dumps(state, indent=1, sort_keys=True).encode("utf-8"),
+        content_type="application/json",
+    )
+
+
+def _sources(product_dir: Path) -> list[Path]:
+    suffixes = set(NATIVE_SUFFIXES) | REMUX_SUFFIXES
+    return sorted(path for path in product_dir.iterdir() if path.is_file() and path.suffix.lower() in suffixes)
+
+
+def ingest(
+    source_root: Path,
+    *,
+    products: Optional[Sequence[int]] = None,
+    workers: int = os.cpu_count() or 1,
+    segment_seconds: float = DEFAULT_SEGMENT_SECONDS,
+    storage_root: Optional[str] = None,
+    ffmpeg: Optional[str] = None,
+    catalog: Optional[MediaCatalog] = None,
+) -> tuple[int, int, int]:
+    """Segment every product under ``source_root``; return (segmented, skipped, failed) file counts.
+
+    Segments and playlists written are recorded in ``catalog`` when given.
+    """
+
+    storage = LocalStorage(storage_root) if storage_root is not None else get_storage()
+    if not storage.writable:
+        raise io.UnsupportedOperation(f"cannot ingest into read-only storage {type(storage).__name__}")
+    product_ids = sorted(
+        int(entry.name) for entry in source_root.iterdir() if entry.is_dir() and entry.name.isdigit()
+    )
+    if products:
+        wanted = set(products)
+        product_ids = [product_id for product_id in product_ids if product_id in wanted]
+
+    sources = {product_id: _sources(source_root / str(product_id)) for product_id in product_ids}
+    states = {product_id: _load_state(storage, product_id, segment_seconds) for product_id in product_ids}
+    pending = {product_id: len(files) for product_id, files in sources.items()}
+    changed = {product_id: False for product_id in product_ids}
+    failed_products: set[int] = set()
+    counts = {"segmented": 0, "skipped": 0, "failed": 0}
+    cache = SamplerCache(redis_client=get_redis_client())
+
+    def finish(product_id: int) -> None:
+        state = states[product_id]
+        names = [path.name for path in sources[product_id]]
+        playlist = f"{HLS_PREFIX}/{product_id}/{PLAYLIST_NAME}"
+        if product_id in failed_products or not names:
+            return
+        if not changed[product_id] and set(state["files"]) == set(names) and storage.exists(playlist):
+            return
+        state["files"] = {name: state["files"][name] for name in names}
+        chapters = [[tuple(segment) for segment in state["files"][name]["segments"]] for name in names]
+        body = render_media_playlist(chapters).encode("utf-8")
+        storage.write(playlist, body, content_type=PLAYLIST_MEDIA_TYPE)
+        if catalog is not None:
+            stat = storage.stat(playlist)
+            catalog.record([describe_bytes(playlist, body, stat)])
+        _save_state(storage, product_id, state)
+        cache.invalidate(product_id)
+        logger.info("product %d: wrote %s", product_id, playlist)
+
+    for product_id in product_ids:
+        if not sources[product_id]:
+            logger.warning("product %d: no audio files", product_id)
+
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(
+        max_workers=max(workers, 1), mp_context=context, initializer=_init_worker, initargs=(storage_root,)
+    ) as pool:
+        futures = {
+            pool.submit(
+                segment_file,
+                Job(
+                    product_id,
+                    str(path),
+                    states[product_id]["files"].get(path.name, {}).get("sha256"),
+                    segment_seconds,
+                    ffmpeg,
+                ),
+            ): (product_id, path)
+            for product_id in product_ids
+            for path in sources[product_id]
+        }
+        for future in as_completed(futures):
+            product_id, path = futures[future]
+            try:
+                outcome = future.result()
+            except Exception:
+                logger.exception("product %d: failed to segment %s", product_id, path)
+                failed_products.add(product_id)
+                counts["failed"] += 1
+            else:
+                if outcome.skipped:
+                    counts["skipped"] += 1
+                else:
+                    counts["segmented"] += 1
+                    changed[product_id] = True
+                    states[product_id]["files"][outcome.name] = {
+                        "sha256": outcome.checksum,
+                        "segments": outcome.segments,
+                    }
+                    if catalog is not None:
+                        catalog.record(outcome.assets)
+                    # Saved per file so an interrupted run resumes after it.
+                    _save_state(storage, product_id, states[product_id])
+            pending[product_id] -= 1
+            if pending[product_id] == 0:
+                finish(product_id)
+
+    return counts["segmented"], counts["skipped"], counts["failed"]
+
+
+def main(argv: Sequence[str] | None = None) -> None:
+    """Entrypoint for HLS ingest."""
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("source", type=Path, help="directory holding one sub-directory per product id")
+    parser.add_argument("--product", type=int, action="append", default=[], help="only this product (repeatable)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="worker processes")
+    parser.add_argument(
+        "--segment-seconds", type=float, default=DEFAULT_SEGMENT_SECONDS, help="minimum audio per segment"
+    )
+    parser.add_argument("--storage-root", help="write to this directory instead of the configured storage")
+    parser.add_argument("--ffmpeg", default=shutil.which("ffmpeg"), help="ffmpeg used to remux .m4a/.m4b sources")
+    parser.add_argument(
+        "--no-catalog", action="store_true", help="do not record written files in the media_asset catalog"
+    )
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+
+    segmented, skipped, failed = ingest(
+        args.source,
+        products=args.product,
+        workers=args.workers,
+        segment_seconds=args.segment_seconds,
+        storage_root=args.storage_root,
+        ffmpeg=args.ffmpeg,
+        catalog=None if args.no_catalog else MediaCatalog(),
+    )
+    print(f"{segmented} files segmented, {skipped} unchanged, {failed} failed")
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":  # pragma: no cover - manual execution helper
+    main()
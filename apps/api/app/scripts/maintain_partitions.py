@@ -0,0 +1,82 @@
+"""Create upcoming play_session partitions and detach old ones.
+
+Run from cron (for example daily) on every shard::
+
+    python -m app.scripts.maintain_partitions --months-ahead 3 --detach-before 2026-01-01
+
+Detached partitions are left in place as ordinary tables named after their
+month so they can be dumped and dropped later; pass ``--drop`` to drop them
+straight away.
+"""
+
+from __future__ import annotations
+
+import argparse
+import logging
+from collections.abc import Sequence
+from datetime import date
+
+from app.core.config import get_settings
+from app.core.database import ShardRouter, get_shard_router
+from app.core.partitions import detach_partitions_before, ensure_partitions
+
+logger = logging.getLogger("app.partitions")
+
+
+def maintain(
+    router: ShardRouter,
+    *,
+    months_ahead: int,
+    detach_before: date | None = None,
+    drop: bool = False,
+) -> dict[str, tuple[list[str], list[str]]]:
+    """Return the partitions created and detached on each shard, by shard name."""
+
+    results: dict[str, tuple[list[str], list[str]]] = {}
+    for shard in router.shards:
+        with shard.engine.connect() as connection:
+            created = ensure_partitions(connection, months_ahead=months_ahead)
+            detached: list[str] = []
+            if detach_before is not None:
+                detached = detach_partitions_before(connection, detach_before, drop=drop)
+        results[shard.name] = (created, detached)
+    return results
+
+
+def main(argv: Sequence[str] | None = None) -> None:
+    """Entrypoint for the partition maintenance tool."""
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--months-ahead",
+        type=int,
+        default=get_settings().play_session_partition_months_ahead,
+        help="months of partitions to keep ready after the current one",
+    )
+    parser.add_argument(
+        "--detach-before",
+        type=date.fromisoformat,
+        help="detach partitions for months that end on or before this date (YYYY-MM-DD)",
+    )
+    parser.add_argument("--drop", action="store_true", help="drop detached partitions instead of keeping them")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+
+    router = get_shard_router()
+    try:
+        results = maintain(
+            router,
+            months_ahead=args.months_ahead,
+            detach_before=args.detach_before,
+            drop=args.drop,
+        )
+    finally:
+        router.dispose()
+
+    for name, (created, detached) in sorted(results.items()):
+        print(f"{name}: created {len(created)}, {'dropped' if args.drop else 'detached'} {len(detached)}")
+
+
+if __name__ == "__main__":  # pragma: no cover - manual execution helper
+    main()
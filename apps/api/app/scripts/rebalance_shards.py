@@ -0,0 +1,235 @@
+"""Move QR codes and their dependent rows between database shards.
+
+Run this after changing ``DATABASE_SHARD_URLS``. Every ``qr_code`` row on the
+old shards is assigned to a shard of the new consistent-hash ring, and rows
+whose owner changed are copied to their new shard together with their
+bindings, listening progress and play sessions (plus the devices and accounts
+those rows reference), then deleted from the old shard.
+
+Each batch is committed on the target before it is deleted from the source,
+and the copy replaces whatever the target already holds for those tokens, so
+an interrupted run can simply be restarted. The target databases must already
+be migrated to the current schema. Listening rollup totals for the moved
+sessions and completions move with them, so neither shard counts them twice.
+
+While a batch moves, its ``qr_code`` rows and dependent rows stay locked on
+the source (``SELECT ... FOR UPDATE``; on SQLite the transaction holds the
+write lock) from the copy until the delete commits. Writes to those QR codes
+wait instead of landing between the copy and the delete and being lost.
+Once the batch is gone they fail on the source, so run the API with the new
+shard list while rebalancing: requests routed by token already reach the new
+owner. The ``qr_id`` directory of the routers passed in forgets the moved
+codes.
+
+Usage::
+
+    python -m app.scripts.rebalance_shards \\
+        --from postgresql+psycopg://avook@db1/avook postgresql+psycopg://avook@db2/avook \\
+        --to postgresql+psycopg://avook@db1/avook postgresql+psycopg://avook@db2/avook \\
+             postgresql+psycopg://avook@db3/avook
+"""
+
+from __future__ import annotations
+
+import argparse
+import logging
+import uuid
+from collections import Counter, defaultdict
+from collections.abc import Iterable, Sequence
+from typing import Any
+
+from sqlalchemy import Table, delete, or_, select
+from sqlalchemy.engine import Connection, Engine
+
+from app.core.database import Shard, ShardRouter
+from app.models import metadata
+from app.services.analytics import shift_rolled_up
+
+logger = logging.getLogger("app.rebalance")
+
+QR_TABLE = metadata.tables["qr_code"]
+CHILD_TABLES: tuple[Table, ...] = tuple(
+    metadata.tables[name] for name in ("qr_binding", "listening_progress", "play_session")
+)
+ACCOUNT_TABLE = metadata.tables["account"]
+DEVICE_TABLE = metadata.tables["device"]
+
+Row = dict[str, Any]
+
+
+def _referenced_ids(table: Table, rows: Iterable[Row], referent: Table) -> set[Any]:
+    columns = [
+        foreign_key.parent.name
+        for foreign_key in table.foreign_keys
+        if foreign_key.column.table is referent
+    ]
+    return {row[column] for row in rows for column in columns if row[column] is not None}
+
+
+def _fetch(
+    connection: Connection, table: Table, column: str, values: Iterable[Any], *, lock: bool = False
+) -> list[Row]:
+    values = list(values)
+    if not values:
+        return []
+    query = select(table).where(table.c[column].in_(values))
+    if lock:
+        query = query.with_for_update()
+    return [dict(row._mapping) for row in connection.execute(query)]
+
+
+def _insert_missing(connection: Connection, table: Table, rows: Sequence[Row]) -> None:
+    """Insert shared rows (devices, accounts) the target does not have yet."""
+
+    if not rows:
+        return
+    existing = set(
+        connection.execute(
+            select(table.c.id).where(table.c.id.in_([row["id"] for row in rows]))
+        ).scalars()
+    )
+    missing = [row for row in rows if row["id"] not in existing]
+    if missing:
+        connection.execute(table.insert(), missing)
+
+
+def _delete_qr_codes(connection: Connection, qr_ids: Sequence[uuid.UUID]) -> None:
+    for table in CHILD_TABLES:
+        connection.execute(delete(table).where(table.c.qr_id.in_(qr_ids)))
+    connection.execute(delete(QR_TABLE).where(QR_TABLE.c.id.in_(qr_ids)))
+
+
+def _move_batch(source: Engine, target: Engine, qr_rows: Sequence[Row]) -> list[uuid.UUID]:
+    """Copy ``qr_rows`` and their dependants to ``target``, then drop them from ``source``.
+
+    Returns the ids that were moved; QR codes deleted since the scan are skipped.
+    """
+
+    with source.begin() as source_connection:
+        # Locks are held until the delete below commits; foreign-key checks of
+        # new dependent rows wait on the locked qr_code rows.
+        qr_rows = _fetch(source_connection, QR_TABLE, "id", [row["id"] for row in qr_rows], lock=True)
+        if not qr_rows:
+            return []
+        qr_ids = [row["id"] for row in qr_rows]
+        tokens = [row["token"] for row in qr_rows]
+        children = {
+            table: _fetch(source_connection, table, "qr_id", qr_ids, lock=True) for table in CHILD_TABLES
+        }
+        devices = _fetch(
+            source_connection,
+            DEVICE_TABLE,
+            "id",
+            set().union(*(_referenced_ids(table, rows, DEVICE_TABLE) for table, rows in children.items())),
+        )
+        account_ids = _referenced_ids(DEVICE_TABLE, devices, ACCOUNT_TABLE).union(
+            *(_referenced_ids(table, rows, ACCOUNT_TABLE) for table, rows in children.items())
+        )
+        accounts = _fetch(source_connection, ACCOUNT_TABLE, "id", account_ids)
+
+        with target.begin() as connection:
+            stale = list(
+                connection.execute(
+                    select(QR_TABLE.c.id).where(
+                        or_(QR_TABLE.c.id.in_(qr_ids), QR_TABLE.c.token.in_(tokens))
+                    )
+                ).scalars()
+            )
+            if stale:
+                shift_rolled_up(connection, stale, arriving=False)
+                _delete_qr_codes(connection, stale)
+            _insert_missing(connection, ACCOUNT_TABLE, accounts)
+            _insert_missing(connection, DEVICE_TABLE, devices)
+            connection.execute(QR_TABLE.insert(), qr_rows)
+            for table, rows in children.items():
+                if rows:
+                    connection.execute(table.insert(), rows)
+            shift_rolled_up(connection, qr_ids, arriving=True)
+
+        shift_rolled_up(source_connection, qr_ids, arriving=False)
+        _delete_qr_codes(source_connection, qr_ids)
+    return qr_ids
+
+
+def rebalance(
+    source: ShardRouter,
+    target: ShardRouter,
+    *,
+    batch_size: int = 1000,
+    dry_run: bool = False,
+) -> Counter[tuple[str, str]]:
+    """Move every QR code to the shard ``target`` assigns it to.
+
+    Returns the number of QR codes moved (or, with ``dry_run``, that would be
+    moved) per ``(source shard, target shard)`` pair.
+    """
+
+    moved: Counter[tuple[str, str]] = Counter()
+
+    for shard in source.shards:
+        last_token = ""
+        while True:
+            with shard.engine.connect() as connection:
+                batch = [
+                    dict(row._mapping)
+                    for row in connection.execute(
+                        select(QR_TABLE)
+                        .where(QR_TABLE.c.token > last_token)
+                        .order_by(QR_TABLE.c.token)
+                        .limit(batch_size)
+                    )
+                ]
+            if not batch:
+                break
+            last_token = batch[-1]["token"]
+
+            owners: dict[str, Shard] = {}
+            grouped: defaultdict[str, list[Row]] = defaultdict(list)
+            for row in batch:
+                owner = target.shard_for_token(row["token"])
+                if owner.name != shard.name:
+                    owners[owner.name] = owner
+                    grouped[owner.name].append(row)
+
+            for name, rows in grouped.items():
+                if dry_run:
+                    moved[(shard.name, name)] += len(rows)
+                    continue
+                qr_ids = _move_batch(shard.engine, owners[name].engine, rows)
+                moved[(shard.name, name)] += len(qr_ids)
+                source.forget_qr(qr_ids)
+                target.forget_qr(qr_ids)
+
+        logger.info("Finished scanning shard %s", shard.name)
+
+    return moved
+
+
+def main(argv: Sequence[str] | None = None) -> None:
+    """Entrypoint for the shard rebalancing tool."""
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--from", dest="sources", nargs="+", required=True, help="current shard URLs")
+    parser.add_argument("--to", dest="targets", nargs="+", required=True, help="new shard URLs")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--dry-run", action="store_true", help="only report how many rows would move")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+
+    source = ShardRouter.from_urls(args.sources)
+    target = ShardRouter.from_urls(args.targets)
+    try:
+        moved = rebalance(source, target, batch_size=args.batch_size, dry_run=args.dry_run)
+    finally:
+        source.dispose()
+        target.dispose()
+
+    verb = "would move" if args.dry_run else "moved"
+    for (from_shard, to_shard), count in sorted(moved.items()):
+        print(f"{from_shard} -> {to_shard}: {verb} {count} QR codes")
+    print(f"total: {verb} {sum(moved.values())} QR codes")
+
+
+if __name__ == "__main__":  # pragma: no cover - manual execution helper
+    main()
@@ -0,0 +1,48 @@
+"""Recount per-batch activation counters from the QR codes on every shard.
+
+Run after importing a print batch, after ``rebalance_shards`` and after
+blocking codes directly in the database; the access flows keep the counters
+current in between. Re-registration and cooldown counts are kept as they are.
+
+Usage::
+
+    python -m app.scripts.rebuild_activation_stats
+"""
+
+from __future__ import annotations
+
+import argparse
+import logging
+from collections.abc import Sequence
+
+from app.core.database import get_shard_router
+from app.core.online_migrations import DEFAULT_LOCK_TIMEOUT_MS
+from app.services.activation_stats import rebuild_activation_stats
+
+
+def main(argv: Sequence[str] | None = None) -> None:
+    """Entrypoint for the activation counter rebuild."""
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--lock-timeout-ms",
+        type=int,
+        default=DEFAULT_LOCK_TIMEOUT_MS,
+        help="how long to wait for the counter table lock before retrying",
+    )
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+
+    router = get_shard_router()
+    try:
+        for shard in router.shards:
+            with shard.engine.connect() as connection:
+                pairs = rebuild_activation_stats(connection, lock_timeout_ms=args.lock_timeout_ms)
+            print(f"{shard.name}: {pairs} batch/product pairs")
+    finally:
+        router.dispose()
+
+
+if __name__ == "__main__":  # pragma: no cover - manual execution helper
+    main()
@@ -0,0 +1,101 @@
+"""Reconcile the media_asset catalog with the files in media storage.
+
+Every file under ``--prefix`` is listed with its size and modification time.
+Files the catalog already records with the same size and time are left
+alone; new or changed files are streamed to record their checksum, duration
+and bitrate. Reads go to the backend behind any cache wrappers, so a rescan
+neither fills the caches nor holds a whole file in memory. ``--prune``
+deletes catalog rows whose file is gone. Run it after copying media into
+storage by hand; ``ingest_hls`` keeps the catalog current for what it writes.
+
+Usage::
+
+    python -m app.scripts.rescan_media --prefix hls/ --prune
+"""
+
+from __future__ import annotations
+
+import argparse
+import io
+import logging
+from collections.abc import Sequence
+from typing import Optional
+
+import anyio
+
+from app.services.media_catalog import AssetInfo, MediaCatalog, describe_chunks
+from app.services.storage import (
+    DiskCachedStorage,
+    HotSegmentCache,
+    LocalStorage,
+    StorageBackend,
+    get_storage,
+)
+
+logger = logging.getLogger("app.rescan_media")
+
+DEFAULT_BATCH_SIZE = 500
+
+
+def _uncached(storage: StorageBackend) -> StorageBackend:
+    while isinstance(storage, (DiskCachedStorage, HotSegmentCache)):
+        storage = storage.backend
+    return storage
+
+
+def rescan(
+    storage: StorageBackend,
+    catalog: MediaCatalog,
+    *,
+    prefix: str = "",
+    prune: bool = False,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> tuple[int, int, int]:
+    """Return how many files were (re)described, unchanged and pruned."""
+
+    storage = _uncached(storage)
+    if not storage.listable:
+        raise io.UnsupportedOperation(f"cannot rescan {type(storage).__name__}: it does not list files")
+
+    known = catalog.fingerprints(prefix)
+
+    described = unchanged = 0
+    pending: list[AssetInfo] = []
+    seen: set[str] = set()
+    for path, stat in storage.iter_files(prefix):
+        seen.add(path)
+        if known.get(path) == (stat.size, stat.mtime):
+            unchanged += 1
+            continue
+        pending.append(anyio.run(describe_chunks, path, storage.iter_chunks(path), stat))
+        described += 1
+        if len(pending) >= batch_size:
+            catalog.record(pending)
+            pending = []
+    catalog.record(pending)
+
+    pruned = catalog.remove(sorted(set(known) - seen)) if prune else 0
+    return described, unchanged, pruned
+
+
+def main(argv: Sequence[str] | None = None) -> None:
+    """Entrypoint for the media catalog rescan."""
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--prefix", default="", help="only files whose path starts with this")
+    parser.add_argument("--prune", action="store_true", help="delete rows of files no longer in storage")
+    parser.add_argument("--storage-root", help="scan this directory instead of the configured storage")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="rows written per transaction")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+
+    storage: Optional[StorageBackend] = LocalStorage(args.storage_root) if args.storage_root else None
+    described, unchanged, pruned = rescan(
+        storage or get_storage(), MediaCatalog(), prefix=args.prefix, prune=args.prune, batch_size=args.batch_size
+    )
+    print(f"{described} files described, {unchanged} unchanged, {pruned} pruned")
+
+
+if __name__ == "__main__":  # pragma: no cover - manual execution helper
+    main()
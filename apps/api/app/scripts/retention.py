@@ -0,0 +1,388 @@
+"""Delete rows that have outlived their retention period, in small batches.
+
+Jobs (all run by default; pick some with ``--job``):
+
+``play_sessions``
+    Ended play sessions older than ``RETENTION_PLAY_SESSION_DAYS``.
+``revoked_bindings``
+    Revoked QR bindings older than ``RETENTION_REVOKED_BINDING_DAYS``.
+``blocked_progress``
+    Listening progress of blocked QR codes that has not been updated for
+    ``RETENTION_BLOCKED_PROGRESS_DAYS``.
+
+Each job walks the index on its timestamp column (``ended_at``,
+``revoked_at`` or ``updated_at``) from the oldest row up to the cutoff,
+``--batch-size`` rows at a time, so it never visits rows that cannot have
+expired. Every window is deleted in its own short transaction under
+``lock_timeout``, together with a ``job_checkpoint`` row recording the last
+key, so an interrupted run resumes where it stopped. Between windows the
+runner sleeps ``--pause`` seconds and, on a PostgreSQL primary, waits until
+replicas are less than ``--max-replica-lag`` seconds behind. With
+``--archive-dir`` the deleted rows are appended to ``<job>.jsonl`` and synced
+to disk before the deletion commits, so a crash or a full disk can never lose
+a row from both. A window retried after a lock timeout skips the rows it has
+already archived; a window retried after a crash archives them again, so
+readers should keep the last line per primary key.
+
+Usage::
+
+    python -m app.scripts.retention --archive-dir /var/backups/avook
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import os
+import time
+import uuid
+from collections import Counter
+from collections.abc import Callable, Sequence
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Optional
+
+from sqlalchemy import (
+    Column,
+    ColumnElement,
+    Select,
+    Table,
+    and_,
+    bindparam,
+    delete,
+    func,
+    insert,
+    select,
+    tuple_,
+    update,
+)
+from sqlalchemy.engine import Connection, Row
+
+from app.core.config import Settings, get_settings
+from app.core.database import ShardRouter, get_shard_router
+from app.core.online_migrations import DEFAULT_LOCK_TIMEOUT_MS, retry_on_lock_timeout
+from app.models import QrStatus, metadata
+
+logger = logging.getLogger("app.retention")
+
+SESSION_TABLE = metadata.tables["play_session"]
+BINDING_TABLE = metadata.tables["qr_binding"]
+PROGRESS_TABLE = metadata.tables["listening_progress"]
+QR_TABLE = metadata.tables["qr_code"]
+CHECKPOINT_TABLE = metadata.tables["job_checkpoint"]
+
+Key = tuple[Any, ...]
+
+
+@dataclass(frozen=True)
+class RetentionJob:
+    """Rows of ``table`` matching ``condition(cutoff)`` are past retention.
+
+    Only rows with ``scan < cutoff`` can match; they are visited in
+    ``(scan, primary key)`` order through the index on ``scan``.
+    """
+
+    name: str
+    table: Table
+    retention_days: Callable[[Settings], int]
+    scan: Column[Any]
+    condition: Callable[[datetime], ColumnElement[bool]]
+    # Optional extra bound on the scan, so PostgreSQL can skip whole
+    # partitions that cannot contain expired rows.
+    scan_bound: Optional[Callable[[datetime], ColumnElement[bool]]] = None
+
+    @property
+    def checkpoint_name(self) -> str:
+        return f"retention:{self.name}"
+
+    @property
+    def key(self) -> list[Column[Any]]:
+        return [self.scan, *self.table.primary_key.columns]
+
+
+JOBS: tuple[RetentionJob, ...] = (
+    RetentionJob(
+        name="play_sessions",
+        table=SESSION_TABLE,
+        retention_days=lambda settings: settings.retention_play_session_days,
+        scan=SESSION_TABLE.c.ended_at,
+        condition=lambda cutoff: SESSION_TABLE.c.ended_at < cutoff,
+        scan_bound=lambda cutoff: SESSION_TABLE.c.started_at < cutoff,
+    ),
+    RetentionJob(
+        name="revoked_bindings",
+        table=BINDING_TABLE,
+        retention_days=lambda settings: settings.retention_revoked_binding_days,
+        scan=BINDING_TABLE.c.revoked_at,
+        condition=lambda cutoff: and_(
+            BINDING_TABLE.c.active.is_(False), BINDING_TABLE.c.revoked_at < cutoff
+        ),
+    ),
+    RetentionJob(
+        name="blocked_progress",
+        table=PROGRESS_TABLE,
+        retention_days=lambda settings: settings.retention_blocked_progress_days,
+        scan=PROGRESS_TABLE.c.updated_at,
+        condition=lambda cutoff: and_(
+            PROGRESS_TABLE.c.updated_at < cutoff,
+            PROGRESS_TABLE.c.qr_id.in_(
+                select(QR_TABLE.c.id).where(QR_TABLE.c.status == QrStatus.BLOCKED)
+            ),
+        ),
+    ),
+)
+JOBS_BY_NAME = {job.name: job for job in JOBS}
+
+
+class JsonLinesArchive:
+    """Append deleted rows to one JSON-lines file per job."""
+
+    def __init__(self, directory: Path) -> None:
+        self._directory = directory
+        directory.mkdir(parents=True, exist_ok=True)
+
+    def write(self, job: RetentionJob, rows: Sequence[Row[Any]]) -> None:
+        path = self._directory / f"{job.name}.jsonl"
+        with path.open("a", encoding="utf-8") as handle:
+            for row in rows:
+                handle.write(json.dumps(dict(row._mapping), default=str) + "\n")
+            handle.flush()
+            os.fsync(handle.fileno())
+
+
+# ----------------------------------------------------------------------
+# Checkpoints
+# ----------------------------------------------------------------------
+def _encode_key(key: Key) -> str:
+    return json.dumps([value.isoformat() if isinstance(value, datetime) else str(value) for value in key])
+
+
+def _decode_key(job: RetentionJob, position: str) -> Optional[Key]:
+    raw_values = json.loads(position)
+    if len(raw_values) != len(job.key):
+        return None  # written by a version that scanned a different key
+    values: list[Any] = []
+    for column, raw in zip(job.key, raw_values):
+        python_type = column.type.python_type
+        if python_type is datetime:
+            values.append(datetime.fromisoformat(raw))
+        elif python_type is uuid.UUID:
+            values.append(uuid.UUID(raw))
+        else:
+            values.append(python_type(raw))
+    return tuple(values)
+
+
+def load_checkpoint(connection: Connection, job: RetentionJob) -> Optional[Key]:
+    position = connection.execute(
+        select(CHECKPOINT_TABLE.c.position).where(CHECKPOINT_TABLE.c.name == job.checkpoint_name)
+    ).scalar()
+    return _decode_key(job, position) if position else None
+
+
+def _save_checkpoint(connection: Connection, job: RetentionJob, key: Optional[Key]) -> None:
+    values = {
+        "position": _encode_key(key) if key is not None else None,
+        "updated_at": datetime.now(timezone.utc),
+    }
+    updated = connection.execute(
+        update(CHECKPOINT_TABLE).where(CHECKPOINT_TABLE.c.name == job.checkpoint_name).values(**values)
+    )
+    if updated.rowcount == 0:
+        connection.execute(insert(CHECKPOINT_TABLE).values(name=job.checkpoint_name, **values))
+
+
+# ----------------------------------------------------------------------
+# Throttling
+# ----------------------------------------------------------------------
+def replica_lag_seconds(connection: Connection) -> float:
+    """Return how far the slowest streaming replica is behind this primary."""
+
+    if connection.dialect.name != "postgresql":
+        return 0.0
+    lag = connection.exec_driver_sql(
+        "SELECT coalesce(max(extract(epoch FROM replay_lag)), 0) FROM pg_stat_replication"
+    ).scalar()
+    connection.commit()
+    return float(lag or 0.0)
+
+
+def _throttle(
+    connection: Connection,
+    pause_seconds: float,
+    max_replica_lag_seconds: float,
+    sleep: Callable[[float], None],
+) -> None:
+    if pause_seconds > 0:
+        sleep(pause_seconds)
+    while (lag := replica_lag_seconds(connection)) > max_replica_lag_seconds:
+        logger.info("Replicas are %.1fs behind; waiting before the next batch", lag)
+        sleep(max(pause_seconds, 1.0))
+
+
+# ----------------------------------------------------------------------
+# Runner
+# ----------------------------------------------------------------------
+def window_query(job: RetentionJob, cutoff: datetime, after: Optional[Key], batch_size: int) -> Select[Any]:
+    """Select the keys of the next ``batch_size`` candidate rows after ``after``."""
+
+    key = job.key
+    window = select(*key).where(job.scan < cutoff).order_by(*key).limit(batch_size)
+    if job.scan_bound is not None:
+        window = window.where(job.scan_bound(cutoff))
+    if after is not None:
+        bound = [bindparam(None, value, type_=column.type) for column, value in zip(key, after)]
+        # An index over the whole key turns this into a seek, even across
+        # rows that share a timestamp.
+        window = window.where(tuple_(*key) > tuple_(*bound))
+    return window
+
+
+def run_job(
+    connection: Connection,
+    job: RetentionJob,
+    *,
+    now: Optional[datetime] = None,
+    batch_size: int = 1000,
+    pause_seconds: float = 0.0,
+    max_replica_lag_seconds: float = 10.0,
+    lock_timeout_ms: int = DEFAULT_LOCK_TIMEOUT_MS,
+    archive: Optional[JsonLinesArchive] = None,
+    dry_run: bool = False,
+    max_batches: Optional[int] = None,
+    sleep: Callable[[float], None] = time.sleep,
+) -> int:
+    """Delete ``job``'s expired rows and return how many were (or would be) removed.
+
+    ``connection`` must not be inside a transaction. The checkpoint is cleared
+    once the scan reaches the end of the table, so the next run starts over
+    and picks up rows that have expired since.
+    """
+
+    cutoff = (now or datetime.now(timezone.utc)) - timedelta(days=job.retention_days(get_settings()))
+    key = job.key
+    position = None if dry_run else load_checkpoint(connection, job)
+    connection.commit()
+    if position is not None:
+        logger.info("Resuming %s after %s", job.name, position)
+
+    # Rows of the current window already archived by an attempt that was
+    # rolled back; the retry deletes them again but does not re-archive them.
+    archived: set[Key] = set()
+    primary_key = list(job.table.primary_key.columns)
+
+    def run_batch(after: Optional[Key]) -> tuple[int, Optional[Key], bool]:
+        window = window_query(job, cutoff, after, batch_size)
+        with connection.begin():
+            if connection.dialect.name == "postgresql":
+                connection.exec_driver_sql(f"SET LOCAL lock_timeout = {int(lock_timeout_ms)}")
+            keys = [tuple(row) for row in connection.execute(window)]
+            if not keys:
+                if not dry_run:
+                    _save_checkpoint(connection, job, None)
+                return 0, None, True
+
+            last = keys[-1]
+            done = len(keys) < batch_size
+            expired = and_(tuple_(*key).in_(keys), job.condition(cutoff))
+            if dry_run:
+                count = connection.execute(select(func.count()).select_from(job.table).where(expired)).scalar()
+                return int(count or 0), last, done
+
+            rows = connection.execute(delete(job.table).where(expired).returning(*job.table.c)).all()
+            if archive is not None:
+                fresh = []
+                for row in rows:
+                    row_key = tuple(row._mapping[column.name] for column in primary_key)
+                    if row_key not in archived:
+                        archived.add(row_key)
+                        fresh.append(row)
+                # Synced before the commit: if it fails, the delete rolls back.
+                if fresh:
+                    archive.write(job, fresh)
+            _save_checkpoint(connection, job, None if done else last)
+            return len(rows), last, done
+
+    removed = 0
+    batches = 0
+    while True:
+        count, position, done = retry_on_lock_timeout(
+            lambda: run_batch(position), description=f"retention batch for {job.name}"
+        )
+        archived.clear()
+        removed += count
+        batches += 1
+        if done or (max_batches is not None and batches >= max_batches):
+            break
+        _throttle(connection, pause_seconds, max_replica_lag_seconds, sleep)
+
+    logger.info("%s: %s %d rows in %d batches", job.name, "found" if dry_run else "removed", removed, batches)
+    return removed
+
+
+def run_retention(
+    router: ShardRouter,
+    jobs: Sequence[RetentionJob] = JOBS,
+    **options: Any,
+) -> Counter[tuple[str, str]]:
+    """Run ``jobs`` on every shard; return rows removed per (shard, job)."""
+
+    removed: Counter[tuple[str, str]] = Counter()
+    for shard in router.shards:
+        with shard.engine.connect() as connection:
+            for job in jobs:
+                removed[(shard.name, job.name)] += run_job(connection, job, **options)
+    return removed
+
+
+def main(argv: Sequence[str] | None = None) -> None:
+    """Entrypoint for the retention runner."""
+
+    settings = get_settings()
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--job", dest="jobs", action="append", choices=sorted(JOBS_BY_NAME))
+    parser.add_argument("--batch-size", type=int, default=settings.retention_batch_size)
+    parser.add_argument(
+        "--pause",
+        type=float,
+        default=settings.retention_batch_pause_seconds,
+        help="seconds to sleep between batches",
+    )
+    parser.add_argument(
+        "--max-replica-lag",
+        type=float,
+        default=settings.retention_max_replica_lag_seconds,
+        help="wait while streaming replicas are further behind than this many seconds",
+    )
+    parser.add_argument("--archive-dir", type=Path, help="append deleted rows to JSON-lines files here")
+    parser.add_argument("--max-batches", type=int, help="stop each job after this many batches")
+    parser.add_argument("--dry-run", action="store_true", help="only count the rows that would be removed")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+
+    jobs = [JOBS_BY_NAME[name] for name in args.jobs] if args.jobs else list(JOBS)
+    router = get_shard_router()
+    try:
+        removed = run_retention(
+            router,
+            jobs,
+            batch_size=args.batch_size,
+            pause_seconds=args.pause,
+            max_replica_lag_seconds=args.max_replica_lag,
+            archive=JsonLinesArchive(args.archive_dir) if args.archive_dir else None,
+            dry_run=args.dry_run,
+            max_batches=args.max_batches,
+        )
+    finally:
+        router.dispose()
+
+    verb = "would remove" if args.dry_run else "removed"
+    for (shard, job), count in sorted(removed.items()):
+        print(f"{shard} {job}: {verb} {count} rows")
+
+
+if __name__ == "__main__":  # pragma: no cover - manual execution helper
+    main()
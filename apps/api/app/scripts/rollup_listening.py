@@ -0,0 +1,54 @@
+"""Fold new play sessions and completions into the daily listening rollup.
+
+Run from cron every few minutes; each run continues from the watermark left
+by the previous one on every shard, so runs are cheap and can overlap with
+traffic. The first run backfills the whole history one window at a time.
+
+Usage::
+
+    python -m app.scripts.rollup_listening --max-window-hours 24
+"""
+
+from __future__ import annotations
+
+import argparse
+import logging
+from collections.abc import Sequence
+from datetime import timedelta
+
+from app.core.database import get_shard_router
+from app.services.analytics import update_listening_rollup
+
+
+def main(argv: Sequence[str] | None = None) -> None:
+    """Entrypoint for the listening rollup job."""
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--max-window-hours",
+        type=float,
+        default=24.0,
+        help="longest stretch of history folded in per transaction",
+    )
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+
+    router = get_shard_router()
+    try:
+        for shard in router.shards:
+            with shard.engine.connect() as connection:
+                run = update_listening_rollup(
+                    connection, max_window=timedelta(hours=args.max_window_hours)
+                )
+            watermark = run.watermark.isoformat() if run.watermark else "-"
+            print(
+                f"{shard.name}: {run.sessions} sessions, {run.completions} completions "
+                f"in {run.windows} windows; watermark {watermark}"
+            )
+    finally:
+        router.dispose()
+
+
+if __name__ == "__main__":  # pragma: no cover - manual execution helper
+    main()
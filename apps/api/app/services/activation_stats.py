@@ -0,0 +1,234 @@
+"""Activation counters per print batch and product.
+
+``batch_activation_stats`` keeps, per ``qr_code.batch_id`` and
+``product_id``, how many QR codes are currently new, active or blocked and
+how many re-registrations and cooldowns happened. The access flows call
+:func:`record_transition` in the same transaction as the status change, so
+the counters never drift from the rows they describe and a report is a
+primary-key lookup instead of a scan over ``qr_code``.
+
+Every pair is spread over ``activation_stats_slots`` rows picked from the QR
+id, so registrations from one freshly shipped batch do not all queue on the
+same row lock. Individual slots may go negative after a rebuild; only their
+sum is meaningful.
+
+QR codes are imported outside the API, so :func:`rebuild_activation_stats`
+recounts the status columns from ``qr_code`` (keeping the event counters,
+which cannot be derived) and is meant to run after each import, after a
+shard rebalance and whenever codes are blocked by hand.
+"""
+
+from __future__ import annotations
+
+import logging
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Optional
+
+from sqlalchemy import String, cast, delete, func, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Connection
+from sqlmodel import Session
+
+from app.core.config import get_settings
+from app.core.online_migrations import DEFAULT_LOCK_TIMEOUT_MS, retry_on_lock_timeout
+from app.models import BatchActivationStats, QrCode, QrStatus
+
+logger = logging.getLogger("app.activation_stats")
+
+STATS_TABLE = BatchActivationStats.__table__
+QR_TABLE = QrCode.__table__
+
+UNASSIGNED = 0
+STATUS_COUNTERS = {QrStatus.NEW: "new", QrStatus.ACTIVE: "active", QrStatus.BLOCKED: "blocked"}
+EVENT_COUNTERS = ("reregistrations", "cooldowns")
+COUNTERS = (*STATUS_COUNTERS.values(), *EVENT_COUNTERS)
+
+
+@dataclass(slots=True)
+class ActivationCounts:
+    """Activation counters of one batch and product."""
+
+    new: int = 0
+    active: int = 0
+    blocked: int = 0
+    reregistrations: int = 0
+    cooldowns: int = 0
+
+
+def stats_slot(qr_id: uuid.UUID, slots: Optional[int] = None) -> int:
+    """Return the counter row a QR code's transitions are recorded on."""
+
+    slots = slots or get_settings().activation_stats_slots
+    return qr_id.int % max(slots, 1)
+
+
+def _upsert(connection: Connection, rows: list[dict[str, object]]) -> None:
+    dialect = postgresql if connection.dialect.name == "postgresql" else sqlite
+    statement = dialect.insert(STATS_TABLE)
+    statement = statement.on_conflict_do_update(
+        index_elements=[STATS_TABLE.c.batch_id, STATS_TABLE.c.product_id, STATS_TABLE.c.slot],
+        set_={
+            **{name: STATS_TABLE.c[name] + statement.excluded[name] for name in COUNTERS},
+            "updated_at": statement.excluded.updated_at,
+        },
+    )
+    connection.execute(statement, rows)
+
+
+def record_transition(
+    session: Session,
+    qr_code: QrCode,
+    previous: Optional[QrStatus],
+    *,
+    reregistration: bool = False,
+    cooldown: bool = False,
+) -> None:
+    """Add one QR code's transition to its batch counters.
+
+    ``previous`` is the status before the change (``None`` for a code that
+    did not exist) and ``qr_code.status`` the status after it. The increment
+    joins the session's transaction and is committed with the change itself.
+    """
+
+    deltas = dict.fromkeys(COUNTERS, 0)
+    if previous is not qr_code.status:
+        if previous is not None:
+            deltas[STATUS_COUNTERS[previous]] -= 1
+        deltas[STATUS_COUNTERS[qr_code.status]] += 1
+    deltas["reregistrations"] += int(reregistration)
+    deltas["cooldowns"] += int(cooldown)
+    if not any(deltas.values()):
+        return
+
+    _upsert(
+        session.connection(),
+        [
+            {
+                "batch_id": qr_code.batch_id or UNASSIGNED,
+                "product_id": qr_code.product_id or UNASSIGNED,
+                "slot": stats_slot(qr_code.id),
+                **deltas,
+                "updated_at": datetime.now(timezone.utc),
+            }
+        ],
+    )
+
+
+def read_activation_stats(
+    connection: Connection, batch_id: int, product_id: Optional[int] = None
+) -> dict[int, ActivationCounts]:
+    """Return the counters of ``batch_id`` per product, slots added up."""
+
+    query = (
+        select(STATS_TABLE.c.product_id, *(func.sum(STATS_TABLE.c[name]) for name in COUNTERS))
+        .where(STATS_TABLE.c.batch_id == batch_id)
+        .group_by(STATS_TABLE.c.product_id)
+    )
+    if product_id is not None:
+        query = query.where(STATS_TABLE.c.product_id == product_id)
+    return {
+        row[0]: ActivationCounts(**{name: int(value or 0) for name, value in zip(COUNTERS, row[1:])})
+        for row in connection.execute(query)
+    }
+
+
+def _count_statuses(connection: Connection) -> dict[tuple[int, int], ActivationCounts]:
+    batch = func.coalesce(QR_TABLE.c.batch_id, UNASSIGNED)
+    product = func.coalesce(QR_TABLE.c.product_id, UNASSIGNED)
+    # Read the raw label: databases built by ``create_all`` store enum
+    # names, migrated ones the lowercase values.
+    status = cast(QR_TABLE.c.status, String)
+    counts: dict[tuple[int, int], ActivationCounts] = {}
+    statuses = connection.execute(select(batch, product, status, func.count()).group_by(batch, product, status))
+    for batch_id, product_id, label, count in statuses:
+        entry = counts.setdefault((batch_id, product_id), ActivationCounts())
+        setattr(entry, STATUS_COUNTERS[QrStatus(label.lower())], count)
+    return counts
+
+
+def _stored_counts(connection: Connection) -> dict[tuple[int, int], ActivationCounts]:
+    rows = connection.execute(
+        select(
+            STATS_TABLE.c.batch_id,
+            STATS_TABLE.c.product_id,
+            *(func.sum(STATS_TABLE.c[name]) for name in COUNTERS),
+        ).group_by(STATS_TABLE.c.batch_id, STATS_TABLE.c.product_id)
+    )
+    return {
+        (row[0], row[1]): ActivationCounts(**{name: int(value or 0) for name, value in zip(COUNTERS, row[2:])})
+        for row in rows
+    }
+
+
+def rebuild_activation_stats(
+    connection: Connection, *, lock_timeout_ms: int = DEFAULT_LOCK_TIMEOUT_MS
+) -> int:
+    """Recount the status counters from ``qr_code`` and return the number of pairs.
+
+    The count runs without locks, in one snapshot that also reads the stored
+    counters. On PostgreSQL the stats table is then locked against writers
+    only to swap in the new rows: transitions committed since the snapshot
+    changed the stored counters as well, so that difference is added to the
+    recount. ``connection`` must not be inside a transaction.
+    """
+
+    postgres = connection.dialect.name == "postgresql"
+
+    with connection.begin():
+        if postgres:
+            connection.exec_driver_sql("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY")
+        counted = _count_statuses(connection)
+        seen = _stored_counts(connection)
+
+    def swap() -> int:
+        with connection.begin():
+            if postgres:
+                connection.exec_driver_sql(f"SET LOCAL lock_timeout = {int(lock_timeout_ms)}")
+                connection.exec_driver_sql("LOCK TABLE batch_activation_stats IN EXCLUSIVE MODE")
+
+            current = _stored_counts(connection)
+            totals: dict[tuple[int, int], ActivationCounts] = {}
+            for pair in counted.keys() | current.keys():
+                now, before, recount = (
+                    counts.get(pair, ActivationCounts()) for counts in (current, seen, counted)
+                )
+                totals[pair] = ActivationCounts(
+                    **{
+                        name: getattr(recount, name) + getattr(now, name) - getattr(before, name)
+                        for name in STATUS_COUNTERS.values()
+                    },
+                    **{name: getattr(now, name) for name in EVENT_COUNTERS},
+                )
+
+            connection.execute(delete(STATS_TABLE))
+            stamp = datetime.now(timezone.utc)
+            if totals:
+                _upsert(
+                    connection,
+                    [
+                        {
+                            "batch_id": batch_id,
+                            "product_id": product_id,
+                            "slot": 0,
+                            **{name: getattr(entry, name) for name in COUNTERS},
+                            "updated_at": stamp,
+                        }
+                        for (batch_id, product_id), entry in totals.items()
+                    ],
+                )
+            return len(totals)
+
+    pairs = retry_on_lock_timeout(swap, description="rebuild batch_activation_stats")
+    logger.info("Rebuilt activation counters for %d batch/product pairs", pairs)
+    return pairs
+
+
+__all__ = [
+    "ActivationCounts",
+    "read_activation_stats",
+    "rebuild_activation_stats",
+    "record_transition",
+    "stats_slot",
+]
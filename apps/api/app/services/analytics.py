@@ -0,0 +1,333 @@
+"""Daily listening rollups per product.
+
+``listening_daily_rollup`` holds, per product and UTC day, the number of
+finished play sessions, their total listening time and the number of
+completed tracks. :func:`update_listening_rollup` folds in whatever changed
+since the watermark stored in ``job_checkpoint``:
+
+* play sessions closed in the window, counted on the day they *started*, so
+  a session that ends after midnight (or after the previous run) is added to
+  the right day. The window is matched against ``closed_at``, the time the
+  close was written, because ``ended_at`` is backdated for sessions closed at
+  their last heartbeat or at their start; rows closed before ``closed_at``
+  existed fall back to ``ended_at``;
+* progress rows whose ``completed_at`` falls in the window, found through
+  the ``updated_at`` index (it is stamped together with ``completed_at`` and
+  only moves forward).
+
+The window stops ``analytics_rollup_settle_seconds`` before now so rows
+written by transactions that commit late are still ahead of the watermark.
+Each window's counts are added to the stored totals and the watermark
+advances in the same transaction, so every session and completion is counted
+exactly once. Reports read only the rollup table.
+
+When a rebalance moves QR codes to another shard, :func:`shift_rolled_up`
+moves the totals the watermarks already cover along with them, so the new
+shard does not count those sessions a second time.
+"""
+
+from __future__ import annotations
+
+import logging
+import uuid
+from collections.abc import Sequence
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Optional
+
+from sqlalchemy import ColumnElement, and_, extract, func, or_, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Connection
+
+from app.core.config import get_settings
+from app.models import JobCheckpoint, ListeningDailyRollup, ListeningProgress, PlaySession, QrCode
+
+logger = logging.getLogger("app.analytics")
+
+ROLLUP_TABLE = ListeningDailyRollup.__table__
+SESSION_TABLE = PlaySession.__table__
+PROGRESS_TABLE = ListeningProgress.__table__
+QR_TABLE = QrCode.__table__
+CHECKPOINT_TABLE = JobCheckpoint.__table__
+
+WATERMARK_NAME = "rollup:listening_daily"
+DEFAULT_MAX_WINDOW = timedelta(days=1)
+
+RollupKey = tuple[int, date]
+
+
+@dataclass(slots=True)
+class RollupTotals:
+    """Counts added to (or read from) one product and day."""
+
+    sessions: int = 0
+    listening_ms: int = 0
+    completions: int = 0
+
+
+@dataclass(slots=True)
+class RollupRun:
+    """What one :func:`update_listening_rollup` call folded in."""
+
+    windows: int
+    sessions: int
+    completions: int
+    watermark: Optional[datetime]
+
+
+def _utc_day(connection: Connection, column: Any) -> ColumnElement[Any]:
+    if connection.dialect.name == "postgresql":
+        return func.date(func.timezone("UTC", column))
+    return func.date(column)
+
+
+def _duration_ms(connection: Connection) -> ColumnElement[Any]:
+    started, ended = SESSION_TABLE.c.started_at, SESSION_TABLE.c.ended_at
+    if connection.dialect.name == "postgresql":
+        return extract("epoch", ended - started) * 1000
+    return (func.julianday(ended) - func.julianday(started)) * 86_400_000
+
+
+def _as_date(value: Any) -> date:
+    return value if isinstance(value, date) else date.fromisoformat(str(value))
+
+
+def _as_utc(value: datetime) -> datetime:
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+
+def load_watermark(connection: Connection, *, lock: bool = False) -> Optional[datetime]:
+    """Return the stored watermark; ``lock`` holds its row until the transaction ends."""
+
+    query = select(CHECKPOINT_TABLE.c.position).where(CHECKPOINT_TABLE.c.name == WATERMARK_NAME)
+    if lock:
+        query = query.with_for_update()
+    position = connection.execute(query).scalar()
+    return datetime.fromisoformat(position) if position else None
+
+
+def _save_watermark(connection: Connection, watermark: datetime) -> None:
+    values = {"position": watermark.isoformat(), "updated_at": datetime.now(timezone.utc)}
+    updated = connection.execute(
+        update(CHECKPOINT_TABLE).where(CHECKPOINT_TABLE.c.name == WATERMARK_NAME).values(**values)
+    )
+    if updated.rowcount == 0:
+        connection.execute(CHECKPOINT_TABLE.insert().values(name=WATERMARK_NAME, **values))
+
+
+def _closed_in(start: Optional[datetime], end: datetime) -> ColumnElement[bool]:
+    """Match sessions closed in ``(start, end]``."""
+
+    def within(column: Any) -> ColumnElement[bool]:
+        return column <= end if start is None else and_(column > start, column <= end)
+
+    closed_at, ended_at = SESSION_TABLE.c.closed_at, SESSION_TABLE.c.ended_at
+    return or_(within(closed_at), and_(closed_at.is_(None), within(ended_at)))
+
+
+def _earliest_change(connection: Connection) -> Optional[datetime]:
+    candidates = [
+        connection.execute(select(func.min(SESSION_TABLE.c.closed_at))).scalar(),
+        connection.execute(
+            select(func.min(SESSION_TABLE.c.ended_at)).where(SESSION_TABLE.c.closed_at.is_(None))
+        ).scalar(),
+        connection.execute(select(func.min(PROGRESS_TABLE.c.updated_at))).scalar(),
+    ]
+    present = [_as_utc(value) for value in candidates if value is not None]
+    return min(present) if present else None
+
+
+def collect_window(connection: Connection, start: datetime, end: datetime) -> dict[RollupKey, RollupTotals]:
+    """Aggregate sessions and completions that changed in ``(start, end]``."""
+
+    return _collect(connection, start, end)
+
+
+def _collect(
+    connection: Connection,
+    start: Optional[datetime],
+    end: datetime,
+    qr_ids: Optional[Sequence[uuid.UUID]] = None,
+) -> dict[RollupKey, RollupTotals]:
+    totals: dict[RollupKey, RollupTotals] = {}
+
+    session_day = _utc_day(connection, SESSION_TABLE.c.started_at)
+    sessions = (
+        select(QR_TABLE.c.product_id, session_day, func.count(), func.sum(_duration_ms(connection)))
+        .select_from(SESSION_TABLE.join(QR_TABLE, QR_TABLE.c.id == SESSION_TABLE.c.qr_id))
+        .where(_closed_in(start, end))
+        .where(QR_TABLE.c.product_id.is_not(None))
+        .group_by(QR_TABLE.c.product_id, session_day)
+    )
+    if qr_ids is not None:
+        sessions = sessions.where(SESSION_TABLE.c.qr_id.in_(qr_ids))
+    for product_id, day, count, duration_ms in connection.execute(sessions):
+        entry = totals.setdefault((product_id, _as_date(day)), RollupTotals())
+        entry.sessions += count
+        entry.listening_ms += max(int(round(duration_ms or 0)), 0)
+
+    completion_day = _utc_day(connection, PROGRESS_TABLE.c.completed_at)
+    completions = (
+        select(QR_TABLE.c.product_id, completion_day, func.count())
+        .select_from(PROGRESS_TABLE.join(QR_TABLE, QR_TABLE.c.id == PROGRESS_TABLE.c.qr_id))
+        .where(PROGRESS_TABLE.c.completed_at <= end)
+        .where(QR_TABLE.c.product_id.is_not(None))
+        .group_by(QR_TABLE.c.product_id, completion_day)
+    )
+    if start is not None:
+        # ``updated_at`` never precedes ``completed_at``; it is only bounded
+        # below because later position updates may have moved it on since.
+        completions = completions.where(PROGRESS_TABLE.c.updated_at > start).where(
+            PROGRESS_TABLE.c.completed_at > start
+        )
+    if qr_ids is not None:
+        completions = completions.where(PROGRESS_TABLE.c.qr_id.in_(qr_ids))
+    for product_id, day, count in connection.execute(completions):
+        totals.setdefault((product_id, _as_date(day)), RollupTotals()).completions += count
+
+    return totals
+
+
+def _add_totals(connection: Connection, totals: dict[RollupKey, RollupTotals], stamp: datetime) -> None:
+    if not totals:
+        return
+    dialect = postgresql if connection.dialect.name == "postgresql" else sqlite
+    statement = dialect.insert(ROLLUP_TABLE)
+    statement = statement.on_conflict_do_update(
+        index_elements=[ROLLUP_TABLE.c.product_id, ROLLUP_TABLE.c.day],
+        set_={
+            "sessions": ROLLUP_TABLE.c.sessions + statement.excluded.sessions,
+            "listening_ms": ROLLUP_TABLE.c.listening_ms + statement.excluded.listening_ms,
+            "completions": ROLLUP_TABLE.c.completions + statement.excluded.completions,
+            "updated_at": statement.excluded.updated_at,
+        },
+    )
+    connection.execute(
+        statement,
+        [
+            {
+                "product_id": product_id,
+                "day": day,
+                "sessions": entry.sessions,
+                "listening_ms": entry.listening_ms,
+                "completions": entry.completions,
+                "updated_at": stamp,
+            }
+            for (product_id, day), entry in totals.items()
+        ],
+    )
+
+
+def update_listening_rollup(
+    connection: Connection,
+    *,
+    now: Optional[datetime] = None,
+    max_window: timedelta = DEFAULT_MAX_WINDOW,
+) -> RollupRun:
+    """Fold changes since the watermark into ``listening_daily_rollup``.
+
+    Catching up is split into windows of at most ``max_window``, each
+    committed on its own, so a first run over a long history neither holds
+    one huge transaction nor loses its progress if interrupted.
+    ``connection`` must not be inside a transaction.
+    """
+
+    now = _as_utc(now or datetime.now(timezone.utc))
+    target = now - timedelta(seconds=get_settings().analytics_rollup_settle_seconds)
+
+    watermark = load_watermark(connection)
+    if watermark is None:
+        earliest = _earliest_change(connection)
+        watermark = earliest - timedelta(microseconds=1) if earliest is not None else target
+    connection.commit()
+
+    run = RollupRun(windows=0, sessions=0, completions=0, watermark=watermark)
+    while watermark < target:
+        end = min(watermark + max_window, target)
+        with connection.begin():
+            # Serialises with :func:`shift_rolled_up`; a rebalance may have
+            # set the watermark since it was read.
+            stored = load_watermark(connection, lock=True)
+            if stored is not None and stored != watermark:
+                watermark = stored
+                continue
+            totals = collect_window(connection, watermark, end)
+            _add_totals(connection, totals, now)
+            _save_watermark(connection, end)
+        run.windows += 1
+        run.sessions += sum(entry.sessions for entry in totals.values())
+        run.completions += sum(entry.completions for entry in totals.values())
+        watermark = end
+    run.watermark = watermark
+
+    if run.windows:
+        logger.info(
+            "Rolled up %d sessions and %d completions in %d windows up to %s",
+            run.sessions,
+            run.completions,
+            run.windows,
+            watermark.isoformat(),
+        )
+    return run
+
+
+def shift_rolled_up(connection: Connection, qr_ids: Sequence[uuid.UUID], *, arriving: bool) -> None:
+    """Keep this shard's rollup right while the rows of ``qr_ids`` move between shards.
+
+    Call it in the transaction that inserts those rows (``arriving``, after the
+    insert) or deletes them (before the delete). Sessions and completions the
+    watermark already covers are added to or subtracted from the stored
+    totals: the shard that loses them no longer counts them, and the shard that
+    gains them will not fold them in again, since they lie behind its
+    watermark. Rows past the watermark are left to the next run. A shard that
+    never ran the rollup gets the watermark its first run would have picked,
+    so that run cannot start after the arriving rows.
+    """
+
+    watermark = load_watermark(connection, lock=True)
+    if watermark is None:
+        earliest = _earliest_change(connection) if arriving else None
+        if earliest is not None:
+            _save_watermark(connection, earliest - timedelta(microseconds=1))
+        return
+
+    totals = _collect(connection, None, watermark, qr_ids)
+    if not arriving:
+        totals = {
+            key: RollupTotals(-entry.sessions, -entry.listening_ms, -entry.completions)
+            for key, entry in totals.items()
+        }
+    _add_totals(connection, totals, datetime.now(timezone.utc))
+
+
+def read_listening_rollup(
+    connection: Connection, product_id: int, start: date, end: date
+) -> dict[date, RollupTotals]:
+    """Return stored totals for ``product_id`` between ``start`` and ``end`` inclusive."""
+
+    rows = connection.execute(
+        select(
+            ROLLUP_TABLE.c.day,
+            ROLLUP_TABLE.c.sessions,
+            ROLLUP_TABLE.c.listening_ms,
+            ROLLUP_TABLE.c.completions,
+        )
+        .where(ROLLUP_TABLE.c.product_id == product_id)
+        .where(ROLLUP_TABLE.c.day >= start)
+        .where(ROLLUP_TABLE.c.day <= end)
+    )
+    return {
+        _as_date(day): RollupTotals(sessions=sessions, listening_ms=listening_ms, completions=completions)
+        for day, sessions, listening_ms, completions in rows
+    }
+
+
+__all__ = [
+    "RollupRun",
+    "RollupTotals",
+    "collect_window",
+    "load_watermark",
+    "read_listening_rollup",
+    "shift_rolled_up",
+    "update_listening_rollup",
+]
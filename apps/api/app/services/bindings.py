@@ -0,0 +1,156 @@
+"""Cached lookups of active QR bindings for high-frequency player requests."""
+
+from __future__ import annotations
+
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+from redis import Redis
+from redis.exceptions import RedisError
+from sqlmodel import select
+
+from app.core.config import get_settings
+from app.core.database import ShardSessions
+from app.core.redis import get_redis_client
+from app.models import QrBinding, QrCode, QrStatus
+
+
+@dataclass(slots=True, frozen=True)
+class BoundDevice:
+    """The QR a device is actively bound to through a token."""
+
+    qr_id: uuid.UUID
+    account_id: Optional[uuid.UUID]
+
+
+class BindingCache:
+    """Short-lived cache of token/device pairs known to hold an active binding.
+
+    Players send progress reports and heartbeats every few seconds, so the
+    binding check is reused for ``binding_cache_ttl_seconds`` instead of
+    hitting the database each time.
+
+    Entries live in process memory. When a token's bindings change,
+    :meth:`invalidate` drops them here and records the time in Redis; a
+    cached entry looked up before that time is a miss in every worker.
+    """
+
+    def __init__(self, redis_client: Optional[Redis] = None, max_entries: int = 100_000) -> None:
+        self._redis: Optional[Redis] = redis_client
+        # (token, device) -> (expires at, looked up at, bound device)
+        self._entries: OrderedDict[tuple[str, uuid.UUID], tuple[float, float, BoundDevice]] = OrderedDict()
+        self._max_entries = max_entries
+        self._lock = threading.Lock()
+
+    def configure_redis(self, redis_client: Optional[Redis]) -> None:
+        """Replace the Redis client that shares invalidations between workers."""
+
+        self._redis = redis_client
+
+    @staticmethod
+    def _format_key(token: str) -> str:
+        return f"binding:changed:{token}"
+
+    def _changed_at(self, token: str) -> Optional[float]:
+        redis_client = self._redis
+        if redis_client is None:
+            return None
+        try:
+            value = redis_client.get(self._format_key(token))
+        except RedisError:
+            self.configure_redis(None)
+            return None
+        return float(value) if value is not None else None
+
+    def get(self, token: str, device_id: uuid.UUID) -> Optional[BoundDevice]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get((token, device_id))
+            if entry is None:
+                return None
+            expires_at, looked_up_at, bound = entry
+            if expires_at <= now:
+                del self._entries[(token, device_id)]
+                return None
+
+        changed_at = self._changed_at(token)
+        if changed_at is not None and changed_at >= looked_up_at:
+            with self._lock:
+                self._entries.pop((token, device_id), None)
+            return None
+        return bound
+
+    def put(
+        self,
+        token: str,
+        device_id: uuid.UUID,
+        bound: BoundDevice,
+        ttl_seconds: float,
+        *,
+        looked_up_at: Optional[float] = None,
+    ) -> None:
+        """Cache ``bound``; ``looked_up_at`` is the wall-clock time before the query."""
+
+        looked_up_at = time.time() if looked_up_at is None else looked_up_at
+        with self._lock:
+            self._entries[(token, device_id)] = (time.monotonic() + ttl_seconds, looked_up_at, bound)
+            self._entries.move_to_end((token, device_id))
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, token: str) -> None:
+        """Forget every cached binding of ``token``; call after the change commits."""
+
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == token]:
+                del self._entries[key]
+
+        redis_client = self._redis
+        if redis_client is None:
+            return
+        ttl = max(int(get_settings().binding_cache_ttl_seconds) + 1, 1)
+        try:
+            redis_client.set(self._format_key(token), repr(time.time()), ex=ttl)
+        except RedisError:
+            self.configure_redis(None)
+
+    def reset(self) -> None:
+        """Clear all cached bindings (primarily for tests)."""
+
+        with self._lock:
+            self._entries.clear()
+
+
+binding_cache = BindingCache(redis_client=get_redis_client())
+
+
+def resolve_bound_device(shards: ShardSessions, token: str, device_id: uuid.UUID) -> Optional[BoundDevice]:
+    """Return the QR ``device_id`` is actively bound to via ``token``, if any."""
+
+    bound = binding_cache.get(token, device_id)
+    if bound is not None:
+        return bound
+
+    looked_up_at = time.time()
+    row = shards.for_token(token).exec(
+        select(QrCode.id, QrCode.status, QrBinding.account_id)
+        .join(QrBinding, QrBinding.qr_id == QrCode.id)
+        .where(QrCode.token == token)
+        .where(QrBinding.device_id == device_id)
+        .where(QrBinding.active.is_(True))
+    ).first()
+    if row is None or row.status is QrStatus.BLOCKED:
+        return None
+
+    bound = BoundDevice(qr_id=row.id, account_id=row.account_id)
+    binding_cache.put(
+        token, device_id, bound, get_settings().binding_cache_ttl_seconds, looked_up_at=looked_up_at
+    )
+    return bound
+
+
+__all__ = ["BindingCache", "BoundDevice", "binding_cache", "resolve_bound_device"]
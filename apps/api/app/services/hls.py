@@ -0,0 +1,359 @@
+"""Split MP3 and AAC (ADTS) audio into HLS packed-audio segments.
+
+Segments are cut on frame boundaries once they hold ``target_seconds`` of
+audio, so every segment decodes on its own. Each segment starts with the ID3
+``PRIV`` timestamp tag HLS requires of packed audio, giving the presentation
+time of its first frame. Frames are located by parsing their headers; no
+decoder is involved.
+"""
+
+from __future__ import annotations
+
+import math
+import struct
+from collections.abc import Iterator, Sequence
+from dataclasses import dataclass
+from typing import Literal, Optional
+
+from app.services.storage import Buffer
+
+Codec = Literal["mp3", "aac"]
+
+HLS_PREFIX = "hls"
+PLAYLIST_NAME = "index.m3u8"
+PLAYLIST_MEDIA_TYPE = "application/vnd.apple.mpegurl"
+
+SEGMENT_EXTENSIONS: dict[str, str] = {"mp3": ".mp3", "aac": ".aac"}
+SEGMENT_MEDIA_TYPES: dict[str, str] = {"mp3": "audio/mpeg", "aac": "audio/aac"}
+TIMESTAMP_OWNER = b"com.apple.streaming.transportStreamTimestamp\x00"
+MPEG_CLOCK_HZ = 90_000
+
+# MPEG audio bitrates in kbit/s, keyed by the header's layer bits (3 = Layer I, 1 = Layer III).
+_MPEG1_BITRATES = {
+    3: (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+    2: (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    1: (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+}
+_MPEG2_BITRATES = {
+    3: (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    2: (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    1: (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+_MPEG_SAMPLE_RATES = {3: (44100, 48000, 32000), 2: (22050, 24000, 16000), 0: (11025, 12000, 8000)}
+_ADTS_SAMPLE_RATES = (96000, 88200, 64000, 48000, 44100, 32000, 24000, 22050, 16000, 12000, 11025, 8000, 7350)
+
+
+def product_playlist_path(product_id: int) -> str:
+    """Return the storage path of a product's full HLS media playlist."""
+
+    return f"{HLS_PREFIX}/{product_id}/{PLAYLIST_NAME}"
+
+
+def product_id_for(path: str) -> Optional[int]:
+    """Return the product an ``hls/<product_id>/...`` path belongs to."""
+
+    parts = path.split("/", 2)
+    if len(parts) == 3 and parts[0] == HLS_PREFIX and parts[1].isdigit():
+        return int(parts[1])
+    return None
+
+
+class UnsupportedAudio(ValueError):
+    """Raised when a file is not MP3 or ADTS audio, or has no frames."""
+
+
+@dataclass(frozen=True, slots=True)
+class Frame:
+    """One audio frame: its byte span and the audio it holds."""
+
+    offset: int
+    length: int
+    samples: int
+    sample_rate: int
+
+
+@dataclass(frozen=True, slots=True)
+class SegmentSpan:
+    """A run of whole frames forming one segment."""
+
+    start: int
+    end: int
+    start_seconds: float
+    duration: float
+
+
+def _mpeg_frame(data: Buffer, offset: int) -> Optional[Frame]:
+    if offset + 4 > len(data):
+        return None
+    b0, b1, b2 = data[offset], data[offset + 1], data[offset + 2]
+    if b0 != 0xFF or b1 & 0xE0 != 0xE0:
+        return None
+    version, layer = (b1 >> 3) & 3, (b1 >> 1) & 3
+    bitrate_index, rate_index, padding = b2 >> 4, (b2 >> 2) & 3, (b2 >> 1) & 1
+    if version == 1 or layer == 0 or bitrate_index in (0, 15) or rate_index == 3:
+        return None
+    bitrate = (_MPEG1_BITRATES if version == 3 else _MPEG2_BITRATES)[layer][bitrate_index] * 1000
+    sample_rate = _MPEG_SAMPLE_RATES[version][rate_index]
+    if layer == 3:
+        samples = 384
+        length = (12 * bitrate // sample_rate + padding) * 4
+    else:
+        samples = 576 if layer == 1 and version != 3 else 1152
+        length = samples // 8 * bitrate // sample_rate + padding
+    return Frame(offset, length, samples, sample_rate)
+
+
+def _adts_frame(data: Buffer, offset: int) -> Optional[Frame]:
+    if offset + 7 > len(data):
+        return None
+    b1, b2, b3, b4, b5, b6 = (data[offset + index] for index in range(1, 7))
+    if data[offset] != 0xFF or b1 & 0xF6 != 0xF0:
+        return None
+    rate_index = (b2 >> 2) & 0xF
+    length = ((b3 & 3) << 11) | (b4 << 3) | (b5 >> 5)
+    if rate_index >= len(_ADTS_SAMPLE_RATES) or length < 7:
+        return None
+    return Frame(offset, length, 1024 * ((b6 & 3) + 1), _ADTS_SAMPLE_RATES[rate_index])
+
+
+_PARSERS = {"mp3": _mpeg_frame, "aac": _adts_frame}
+
+
+def skip_id3(data: Buffer) -> int:
+    """Return the offset after a leading ID3v2 tag (0 when there is none)."""
+
+    if len(data) < 10 or bytes(data[:3]) != b"ID3":
+        return 0
+    size = 0
+    for byte in data[6:10]:
+        size = (size << 7) | (byte & 0x7F)
+    footer = 10 if data[5] & 0x10 else 0
+    return 10 + size + footer
+
+
+def detect_codec(data: Buffer) -> Codec:
+    """Return whether ``data`` holds MP3 or ADTS AAC frames."""
+
+    offset = skip_id3(data)
+    for codec in ("aac", "mp3"):
+        frame = _PARSERS[codec](data, offset)
+        if frame is not None and (
+            offset + frame.length >= len(data) or _PARSERS[codec](data, offset + frame.length) is not None
+        ):
+            return codec  # type: ignore[return-value]
+    raise UnsupportedAudio("not MP3 or ADTS audio")
+
+
+def iter_frames(data: Buffer, codec: Codec) -> Iterator[Frame]:
+    """Yield the frames of ``data``, resynchronising past junk bytes.
+
+    A header right after the previous frame is trusted; after junk, a
+    header only counts when the next frame (or the end of the data) follows
+    it, so bytes that merely look like a sync word are skipped. A trailing
+    ID3v1 tag is ignored.
+    """
+
+    parse = _PARSERS[codec]
+    offset = skip_id3(data)
+    size = len(data)
+    if size >= 128 and bytes(data[size - 128 : size - 125]) == b"TAG":
+        size -= 128
+    in_sync = False
+    while offset < size:
+        frame = parse(data, offset)
+        if frame is not None and frame.length > 0 and offset + frame.length <= size:
+            following = offset + frame.length
+            if in_sync or following == size or parse(data, following) is not None:
+                yield frame
+                offset = following
+                in_sync = True
+                continue
+        in_sync = False
+        next_sync = bytes(data[offset + 1 : offset + 65536]).find(b"\xff")
+        if next_sync < 0:
+            offset += 65536
+        else:
+            offset += next_sync + 1
+
+
+def split_segments(data: Buffer, codec: Codec, target_seconds: float) -> list[SegmentSpan]:
+    """Group frames into segments of at least ``target_seconds`` (the last may be shorter)."""
+
+    spans: list[SegmentSpan] = []
+    start: Optional[int] = None
+    end = 0
+    elapsed = 0.0
+    duration = 0.0
+    for frame in iter_frames(data, codec):
+        if start is None:
+            start = frame.offset
+        if frame.offset != end and duration:
+            # Junk between frames stays out of the segment.
+            spans.append(SegmentSpan(start, end, elapsed, duration))
+            elapsed += duration
+            start, duration = frame.offset, 0.0
+        end = frame.offset + frame.length
+        duration += frame.samples / frame.sample_rate
+        if duration >= target_seconds:
+            spans.append(SegmentSpan(start, end, elapsed, duration))
+            elapsed += duration
+            start, duration = None, 0.0
+    if start is not None and duration:
+        spans.append(SegmentSpan(start, end, elapsed, duration))
+    if not spans:
+        raise UnsupportedAudio("no audio frames found")
+    return spans
+
+
+def audio_duration(data: Buffer) -> Optional[float]:
+    """Return the seconds of MP3 or ADTS audio in ``data``, or ``None`` for other data."""
+
+    try:
+        codec = detect_codec(data)
+    except UnsupportedAudio:
+        return None
+    return sum(frame.samples / frame.sample_rate for frame in iter_frames(data, codec))
+
+
+class DurationCounter:
+    """Add up the audio in a file fed as consecutive chunks.
+
+    The result equals :func:`audio_duration` of the whole file, but only the
+    unparsed tail is kept: frames are parsed once ``LOOKAHEAD`` bytes follow
+    them (enough for a resynchronisation scan), and the rest in
+    :meth:`finish`.
+    """
+
+    LOOKAHEAD = 128 * 1024
+
+    def __init__(self) -> None:
+        self._data = bytearray()
+        self._offset: Optional[int] = None
+        self._codec: Optional[Codec] = None
+        self._unsupported = False
+        self._in_sync = False
+        self._seconds = 0.0
+
+    def feed(self, chunk: Buffer) -> None:
+        """Append the next ``chunk`` of the file."""
+
+        if self._unsupported:
+            return
+        self._data += chunk
+        self._advance(final=False)
+
+    def finish(self) -> Optional[float]:
+        """Parse what is left and return the seconds of audio, or ``None`` for other data."""
+
+        if not self._unsupported:
+            self._advance(final=True)
+        return None if self._unsupported else self._seconds
+
+    def _advance(self, *, final: bool) -> None:
+        data = self._data
+        if self._offset is None:
+            if len(data) < 10 and not final:
+                return
+            self._offset = skip_id3(data)
+        offset = self._offset
+
+        if self._codec is None:
+            if len(data) - offset < self.LOOKAHEAD and not final:
+                return
+            for codec in ("aac", "mp3"):
+                frame = _PARSERS[codec](data, offset)
+                if frame is not None and (
+                    offset + frame.length >= len(data) or _PARSERS[codec](data, offset + frame.length) is not None
+                ):
+                    self._codec = codec  # type: ignore[assignment]
+                    break
+            else:
+                self._unsupported = True
+                return
+
+        # Mirrors :func:`iter_frames`; away from the end, ``LOOKAHEAD`` bytes
+        # are always buffered past ``offset``.
+        parse = _PARSERS[self._codec]
+        size = len(data)
+        if final and size >= 128 and bytes(data[size - 128 : size - 125]) == b"TAG":
+            size -= 128
+        while offset < size if final else len(data) - offset >= self.LOOKAHEAD:
+            frame = parse(data, offset)
+            if frame is not None and frame.length > 0 and offset + frame.length <= size:
+                following = offset + frame.length
+                if self._in_sync or following == size or parse(data, following) is not None:
+                    self._seconds += frame.samples / frame.sample_rate
+                    offset = following
+                    self._in_sync = True
+                    continue
+            self._in_sync = False
+            next_sync = bytes(data[offset + 1 : offset + 65536]).find(b"\xff")
+            if next_sync < 0:
+                offset += 65536
+            else:
+                offset += next_sync + 1
+
+        consumed = min(offset, len(data))
+        del data[:consumed]
+        self._offset = offset - consumed
+
+
+def timestamp_tag(seconds: float) -> bytes:
+    """Return the ID3 tag carrying a packed-audio segment's start time."""
+
+    ticks = round(seconds * MPEG_CLOCK_HZ) & ((1 << 33) - 1)
+    body = TIMESTAMP_OWNER + struct.pack(">Q", ticks)
+    frame = b"PRIV" + _synchsafe(len(body)) + b"\x00\x00" + body
+    return b"ID3\x04\x00\x00" + _synchsafe(len(frame)) + frame
+
+
+def _synchsafe(value: int) -> bytes:
+    return bytes(((value >> shift) & 0x7F) for shift in (21, 14, 7, 0))
+
+
+def render_media_playlist(chapters: Sequence[Sequence[tuple[str, float]]]) -> str:
+    """Render a VOD playlist of ``(uri, duration)`` segments, one list per chapter.
+
+    Chapters are separated by ``#EXT-X-DISCONTINUITY`` because each restarts
+    its timestamps and may be encoded differently.
+    """
+
+    durations = [duration for chapter in chapters for _, duration in chapter]
+    lines = [
+        "#EXTM3U",
+        "#EXT-X-VERSION:3",
+        f"#EXT-X-TARGETDURATION:{max((math.ceil(value) for value in durations), default=0)}",
+        "#EXT-X-MEDIA-SEQUENCE:0",
+        "#EXT-X-PLAYLIST-TYPE:VOD",
+    ]
+    for index, chapter in enumerate(chapter for chapter in chapters if chapter):
+        if index:
+            lines.append("#EXT-X-DISCONTINUITY")
+        for uri, duration in chapter:
+            lines.append(f"#EXTINF:{duration:.3f},")
+            lines.append(uri)
+    lines.append("#EXT-X-ENDLIST")
+    return "\n".join(lines) + "\n"
+
+
+__all__ = [
+    "Codec",
+    "DurationCounter",
+    "Frame",
+    "HLS_PREFIX",
+    "PLAYLIST_MEDIA_TYPE",
+    "PLAYLIST_NAME",
+    "SEGMENT_EXTENSIONS",
+    "SEGMENT_MEDIA_TYPES",
+    "SegmentSpan",
+    "UnsupportedAudio",
+    "audio_duration",
+    "detect_codec",
+    "iter_frames",
+    "product_id_for",
+    "product_playlist_path",
+    "render_media_playlist",
+    "skip_id3",
+    "split_segments",
+    "timestamp_tag",
+]
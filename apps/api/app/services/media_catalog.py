@@ -0,0 +1,263 @@
+"""Catalog of media files and their metadata.
+
+``media_asset`` records the size, modification time, duration, bitrate and
+checksum of every file in media storage. ``ingest_hls`` records what it
+writes and ``rescan_media`` reconciles the table with storage, so request
+handlers learn a file's size and validators without a ``stat`` or S3
+``HEAD`` per request.
+
+:class:`MediaCatalog` keeps looked-up entries in process memory for
+``media_catalog_cache_seconds``. A path missing from the table is looked up
+in storage instead and the answer (including "no such file") is kept in
+memory as well, for ``media_catalog_missing_seconds`` when the file is
+absent. Files must be replaced through ingest or followed by a rescan:
+until the cached entry expires, a process keeps serving the recorded size.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import AsyncIterable, Callable, Iterable
+from dataclasses import asdict, dataclass, fields
+from datetime import datetime, timezone
+from typing import Optional
+
+from sqlalchemy import delete, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import SQLAlchemyError
+
+from app.core.config import get_settings
+from app.core.database import get_engine, read_only_engine
+from app.models import MediaAsset
+from app.services.hls import DurationCounter, audio_duration, product_id_for
+from app.services.storage import Buffer, StorageBackend, StorageStat
+
+logger = logging.getLogger("app.media_catalog")
+
+ASSET_TABLE = MediaAsset.__table__
+
+
+@dataclass(frozen=True, slots=True)
+class AssetInfo:
+    """What the catalog knows about one stored file."""
+
+    path: str
+    size: int
+    mtime: Optional[float] = None
+    product_id: Optional[int] = None
+    duration_ms: Optional[int] = None
+    bitrate: Optional[int] = None
+    sha256: Optional[str] = None
+
+    @property
+    def stat(self) -> StorageStat:
+        return StorageStat(size=self.size, mtime=self.mtime)
+
+
+def _describe(path: str, stat: StorageStat, length: int, duration: Optional[float], sha256: str) -> AssetInfo:
+    return AssetInfo(
+        path=path,
+        size=stat.size,
+        mtime=stat.mtime,
+        product_id=product_id_for(path),
+        duration_ms=round(duration * 1000) if duration else None,
+        bitrate=round(length * 8 / duration) if duration else None,
+        sha256=sha256,
+    )
+
+
+def describe_bytes(path: str, data: Buffer, stat: StorageStat) -> AssetInfo:
+    """Return catalog metadata for a file whose contents are ``data``."""
+
+    return _describe(path, stat, len(data), audio_duration(data), hashlib.sha256(data).hexdigest())
+
+
+async def describe_chunks(path: str, chunks: AsyncIterable[Buffer], stat: StorageStat) -> AssetInfo:
+    """Return catalog metadata for a file streamed as ``chunks``.
+
+    The checksum and duration are computed as the chunks arrive, so the file
+    is never held in memory as a whole.
+    """
+
+    digest = hashlib.sha256()
+    counter = DurationCounter()
+    length = 0
+    async for chunk in chunks:
+        digest.update(chunk)
+        counter.feed(chunk)
+        length += len(chunk)
+    return _describe(path, stat, length, counter.finish(), digest.hexdigest())
+
+
+def _row(asset: AssetInfo, now: datetime) -> dict[str, object]:
+    return {**asdict(asset), "updated_at": now}
+
+
+def upsert_assets(connection: Connection, assets: Iterable[AssetInfo]) -> int:
+    """Insert or replace catalog rows; return how many were written."""
+
+    now = datetime.now(timezone.utc)
+    rows = [_row(asset, now) for asset in assets]
+    if not rows:
+        return 0
+    dialect = postgresql if connection.dialect.name == "postgresql" else sqlite
+    statement = dialect.insert(ASSET_TABLE)
+    statement = statement.on_conflict_do_update(
+        index_elements=[ASSET_TABLE.c.path],
+        set_={name: statement.excluded[name] for name in rows[0] if name != "path"},
+    )
+    connection.execute(statement, rows)
+    return len(rows)
+
+
+def _asset(row: object) -> AssetInfo:
+    return AssetInfo(**{field.name: getattr(row, field.name) for field in fields(AssetInfo)})
+
+
+class MediaCatalog:
+    """Answer metadata lookups from memory, then ``media_asset``, then storage."""
+
+    def __init__(
+        self, engine_getter: Callable[[], Engine] = get_engine, *, max_entries: int = 100_000
+    ) -> None:
+        self._engine_getter = engine_getter
+        self._entries: OrderedDict[str, tuple[float, Optional[AssetInfo]]] = OrderedDict()
+        self._max_entries = max_entries
+        self._lock = threading.Lock()
+
+    def peek(self, path: str) -> Optional[AssetInfo]:
+        """Return the entry cached in memory, or ``None`` when there is none.
+
+        Raises :class:`FileNotFoundError` when the file is known to be absent.
+        """
+
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is None:
+                return None
+            expires_at, asset = entry
+            if expires_at <= now:
+                del self._entries[path]
+                return None
+            self._entries.move_to_end(path)
+        if asset is None:
+            raise FileNotFoundError(path)
+        return asset
+
+    def _remember(self, path: str, asset: Optional[AssetInfo]) -> None:
+        settings = get_settings()
+        ttl = settings.media_catalog_cache_seconds if asset is not None else settings.media_catalog_missing_seconds
+        with self._lock:
+            self._entries[path] = (time.monotonic() + ttl, asset)
+            self._entries.move_to_end(path)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+    def get(self, path: str) -> Optional[AssetInfo]:
+        """Return the catalogued metadata of ``path`` (blocking on a memory miss).
+
+        Returns ``None`` when the file is not catalogued. Database errors are
+        logged and treated as a miss.
+        """
+
+        asset = self.peek(path)
+        if asset is not None:
+            return asset
+        try:
+            with read_only_engine(self._engine_getter()).connect() as connection:
+                row = connection.execute(select(ASSET_TABLE).where(ASSET_TABLE.c.path == path)).first()
+        except SQLAlchemyError:
+            logger.warning("media catalog lookup of %s failed; falling back to storage", path, exc_info=True)
+            return None
+        if row is None:
+            return None
+        asset = _asset(row)
+        self._remember(path, asset)
+        return asset
+
+    def stat(self, storage: StorageBackend, path: str) -> StorageStat:
+        """Return the size and modification time of ``path``.
+
+        Storage is only asked about files the catalog does not know; its
+        answer is kept in memory. Raises :class:`FileNotFoundError`.
+        """
+
+        asset = self.get(path)
+        if asset is not None:
+            return asset.stat
+        try:
+            stat = storage.stat(path)
+        except (FileNotFoundError, IsADirectoryError, NotADirectoryError):
+            self._remember(path, None)
+            raise FileNotFoundError(path) from None
+        self._remember(path, AssetInfo(path, stat.size, stat.mtime, product_id_for(path)))
+        return stat
+
+    def product_assets(self, product_id: int) -> list[AssetInfo]:
+        """Return every catalogued file of a product, warming the memory cache."""
+
+        with read_only_engine(self._engine_getter()).connect() as connection:
+            rows = connection.execute(
+                select(ASSET_TABLE).where(ASSET_TABLE.c.product_id == product_id).order_by(ASSET_TABLE.c.path)
+            ).all()
+        assets = [_asset(row) for row in rows]
+        for asset in assets:
+            self._remember(asset.path, asset)
+        return assets
+
+    def fingerprints(self, prefix: str = "") -> dict[str, tuple[int, Optional[float]]]:
+        """Return the recorded size and modification time of every path under ``prefix``."""
+
+        query = select(ASSET_TABLE.c.path, ASSET_TABLE.c.size, ASSET_TABLE.c.mtime).where(
+            ASSET_TABLE.c.path.startswith(prefix, autoescape=True)
+        )
+        with read_only_engine(self._engine_getter()).connect() as connection:
+            return {row.path: (row.size, row.mtime) for row in connection.execute(query)}
+
+    def record(self, assets: Iterable[AssetInfo]) -> int:
+        """Write ``assets`` to the catalog and to this process's cache."""
+
+        assets = list(assets)
+        with self._engine_getter().begin() as connection:
+            written = upsert_assets(connection, assets)
+        for asset in assets:
+            self._remember(asset.path, asset)
+        return written
+
+    def remove(self, paths: Iterable[str]) -> int:
+        """Delete catalog rows for files that no longer exist."""
+
+        paths = list(paths)
+        if not paths:
+            return 0
+        with self._engine_getter().begin() as connection:
+            result = connection.execute(delete(ASSET_TABLE).where(ASSET_TABLE.c.path.in_(paths)))
+        with self._lock:
+            for path in paths:
+                self._entries.pop(path, None)
+        return result.rowcount or 0
+
+    def reset(self) -> None:
+        """Drop every entry cached in memory (primarily for tests)."""
+
+        with self._lock:
+            self._entries.clear()
+
+
+media_catalog = MediaCatalog()
+
+
+__all__ = [
+    "AssetInfo",
+    "MediaCatalog",
+    "describe_bytes",
+    "describe_chunks",
+    "media_catalog",
+    "upsert_assets",
+]
@@ -0,0 +1,313 @@
+"""Byte-range delivery of stored audio files.
+
+:func:`parse_range_header` and :func:`if_range_allows` implement the request
+side of RFC 9110 range requests; :class:`MediaResponse` sends the selected
+bytes without routing them through Python objects where it can:
+
+* files in :class:`LocalStorage` are sent with the ASGI ``zerocopysend``
+  extension when the server offers it, which hands the file descriptor to
+  ``os.sendfile``; otherwise they are read with ``os.pread`` in a worker
+  thread, straight from the descriptor without a buffered file object;
+* other backends are streamed with :meth:`StorageBackend.iter_chunks`,
+  which reads off the event loop.
+
+Several ranges are answered as ``multipart/byteranges``.
+"""
+
+from __future__ import annotations
+
+import mimetypes
+import os
+import secrets
+from collections.abc import AsyncIterator, Awaitable, Callable, MutableMapping
+from dataclasses import dataclass
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Any, BinaryIO, Optional
+
+import anyio
+from starlette.responses import Response
+
+from app.services.media_catalog import MediaCatalog
+from app.services.storage import Buffer, LocalStorage, StorageBackend
+
+CHUNK_SIZE = 256 * 1024
+MAX_RANGES = 16
+ZEROCOPY_EXTENSION = "http.response.zerocopysend"
+
+_MEDIA_TYPES = {
+    ".aac": "audio/aac",
+    ".m4a": "audio/mp4",
+    ".m4b": "audio/mp4",
+    ".mp3": "audio/mpeg",
+    ".ogg": "audio/ogg",
+    ".opus": "audio/ogg",
+}
+
+Send = Callable[[MutableMapping[str, Any]], Awaitable[None]]
+
+
+class RangeNotSatisfiable(ValueError):
+    """Raised when none of the requested ranges overlaps the file."""
+
+
+@dataclass(frozen=True, slots=True)
+class ByteRange:
+    """An inclusive byte range within a file."""
+
+    start: int
+    end: int
+
+    @property
+    def length(self) -> int:
+        return self.end - self.start + 1
+
+    def content_range(self, size: int) -> str:
+        return f"bytes {self.start}-{self.end}/{size}"
+
+
+@dataclass(frozen=True, slots=True)
+class MediaFile:
+    """A stored file and the validators derived from its metadata."""
+
+    storage: StorageBackend
+    path: str
+    size: int
+    mtime: Optional[float] = None
+
+    @property
+    def etag(self) -> Optional[str]:
+        if self.mtime is None:
+            return None
+        return f'"{self.size:x}-{int(self.mtime * 1_000_000):x}"'
+
+    @property
+    def last_modified(self) -> Optional[str]:
+        return formatdate(self.mtime, usegmt=True) if self.mtime is not None else None
+
+    @property
+    def media_type(self) -> str:
+        suffix = os.path.splitext(self.path)[1].lower()
+        return _MEDIA_TYPES.get(suffix) or mimetypes.guess_type(self.path)[0] or "application/octet-stream"
+
+
+def describe(storage: StorageBackend, path: str, catalog: Optional[MediaCatalog] = None) -> MediaFile:
+    """Return size and modification time of ``path`` (blocking).
+
+    With a ``catalog`` the metadata comes from it and storage is only asked
+    about files it does not know.
+    """
+
+    stat = catalog.stat(storage, path) if catalog is not None else storage.stat(path)
+    return MediaFile(storage, path, stat.size, stat.mtime)
+
+
+def parse_range_header(header: Optional[str], size: int) -> list[ByteRange]:
+    """Return the ranges a ``Range`` header selects, or ``[]`` for the whole file.
+
+    Malformed headers and units other than ``bytes`` are ignored, as the RFC
+    requires. Overlapping or adjacent ranges are coalesced, and requests for
+    more than :data:`MAX_RANGES` ranges get the whole file, so a client
+    cannot make the server send more than the file.
+    """
+
+    if not header or not header.startswith("bytes="):
+        return []
+
+    ranges: list[ByteRange] = []
+    for spec in header[len("bytes="):].split(","):
+        first, dash, last = spec.strip().partition("-")
+        if not dash:
+            return []
+        try:
+            if not first:
+                suffix = int(last)
+                if suffix < 0:
+                    return []
+                if suffix == 0 or size == 0:
+                    continue
+                ranges.append(ByteRange(max(size - suffix, 0), size - 1))
+                continue
+            start = int(first)
+            end = int(last) if last else None
+        except ValueError:
+            return []
+        if start < 0 or (end is not None and end < start):
+            return []
+        end = size - 1 if end is None else end
+        if start < size:
+            ranges.append(ByteRange(start, min(end, size - 1)))
+
+    if not ranges:
+        raise RangeNotSatisfiable(header)
+    if len(ranges) > MAX_RANGES:
+        return []
+
+    ranges.sort(key=lambda byte_range: byte_range.start)
+    merged = [ranges[0]]
+    for byte_range in ranges[1:]:
+        previous = merged[-1]
+        if byte_range.start <= previous.end + 1:
+            merged[-1] = ByteRange(previous.start, max(previous.end, byte_range.end))
+        else:
+            merged.append(byte_range)
+    return merged
+
+
+def if_range_allows(header: Optional[str], media: MediaFile) -> bool:
+    """Return whether an ``If-Range`` precondition lets the range apply.
+
+    An entity tag must match strongly; a date must equal ``Last-Modified``.
+    Without a validator to compare against, the whole file is sent.
+    """
+
+    if header is None:
+        return True
+    header = header.strip()
+    if header.startswith(('"', "W/")):
+        return media.etag is not None and header == media.etag
+    if media.mtime is None:
+        return False
+    try:
+        return int(parsedate_to_datetime(header).timestamp()) == int(media.mtime)
+    except (TypeError, ValueError):
+        return False
+
+
+class MediaResponse(Response):
+    """Send a whole file (200) or some of its ranges (206).
+
+    ``head=True`` sends the headers only.
+    """
+
+    def __init__(
+        self,
+        media: MediaFile,
+        ranges: Optional[list[ByteRange]] = None,
+        *,
+        head: bool = False,
+        headers: Optional[dict[str, str]] = None,
+    ) -> None:
+        self.media = media
+        self.ranges = ranges or []
+        self.head = head
+        self.boundary = secrets.token_hex(16)
+        self.status_code = 206 if self.ranges else 200
+        self.background = None
+
+        response_headers = {"accept-ranges": "bytes", **(headers or {})}
+        if media.etag:
+            response_headers["etag"] = media.etag
+        if media.last_modified:
+            response_headers["last-modified"] = media.last_modified
+
+        if len(self.ranges) == 1:
+            response_headers["content-range"] = self.ranges[0].content_range(media.size)
+            length = self.ranges[0].length
+            media_type = media.media_type
+        elif self.ranges:
+            length = sum(len(self._part_header(byte_range)) + byte_range.length + 2 for byte_range in self.ranges)
+            length += len(self._closing_boundary())
+            media_type = f"multipart/byteranges; boundary={self.boundary}"
+        else:
+            length = media.size
+            media_type = media.media_type
+
+        response_headers["content-length"] = str(length)
+        self.media_type = media_type
+        self.init_headers(response_headers)
+
+    def _part_header(self, byte_range: ByteRange) -> bytes:
+        return (
+            f"--{self.boundary}\r\n"
+            f"Content-Type: {self.media.media_type}\r\n"
+            f"Content-Range: {byte_range.content_range(self.media.size)}\r\n\r\n"
+        ).encode("latin-1")
+
+    def _closing_boundary(self) -> bytes:
+        return f"--{self.boundary}--\r\n".encode("latin-1")
+
+    async def __call__(self, scope: MutableMapping[str, Any], receive: Any, send: Send) -> None:
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if self.head:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+
+        zerocopy = ZEROCOPY_EXTENSION in scope.get("extensions", {})
+        handle = await anyio.to_thread.run_sync(self._open)
+        try:
+            if len(self.ranges) <= 1:
+                byte_range = self.ranges[0] if self.ranges else ByteRange(0, self.media.size - 1)
+                await self._send_range(send, handle, byte_range, zerocopy, more_body=False)
+                return
+            for byte_range in self.ranges:
+                await send({"type": "http.response.body", "body": self._part_header(byte_range), "more_body": True})
+                await self._send_range(send, handle, byte_range, zerocopy, more_body=True)
+                await send({"type": "http.response.body", "body": b"\r\n", "more_body": True})
+            await send({"type": "http.response.body", "body": self._closing_boundary(), "more_body": False})
+        finally:
+            if handle is not None:
+                await anyio.to_thread.run_sync(handle.close)
+
+    def _open(self) -> Optional[BinaryIO]:
+        storage = self.media.storage
+        if isinstance(storage, LocalStorage):
+            # Unbuffered: reads go straight to the descriptor with pread.
+            return storage.resolve(self.media.path).open("rb", buffering=0)
+        return None
+
+    async def _send_range(
+        self, send: Send, handle: Optional[BinaryIO], byte_range: ByteRange, zerocopy: bool, *, more_body: bool
+    ) -> None:
+        if byte_range.length <= 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": more_body})
+            return
+
+        if handle is None:
+            chunks = self.media.storage.iter_chunks(
+                self.media.path, byte_range.start, byte_range.end + 1, chunk_size=CHUNK_SIZE
+            )
+            await self._send_chunks(send, chunks, byte_range, more_body=more_body)
+            return
+
+        if zerocopy:
+            await send(
+                {
+                    "type": ZEROCOPY_EXTENSION,
+                    "file": handle,
+                    "offset": byte_range.start,
+                    "count": byte_range.length,
+                    "more_body": more_body,
+                }
+            )
+            return
+
+        offset, remaining = byte_range.start, byte_range.length
+        while remaining > 0:
+            chunk = await anyio.to_thread.run_sync(os.pread, handle.fileno(), min(CHUNK_SIZE, remaining), offset)
+            if not chunk:
+                raise OSError(f"{self.media.path} ended before byte {offset}")
+            offset += len(chunk)
+            remaining -= len(chunk)
+            await send({"type": "http.response.body", "body": chunk, "more_body": more_body or remaining > 0})
+
+    async def _send_chunks(
+        self, send: Send, chunks: AsyncIterator[Buffer], byte_range: ByteRange, *, more_body: bool
+    ) -> None:
+        remaining = byte_range.length
+        async for chunk in chunks:
+            remaining -= len(chunk)
+            body = chunk if isinstance(chunk, bytes) else bytes(chunk)
+            await send({"type": "http.response.body", "body": body, "more_body": more_body or remaining > 0})
+        if remaining > 0:
+            raise OSError(f"{self.media.path} ended {remaining} bytes before the end of the range")
+
+
+__all__ = [
+    "ByteRange",
+    "MediaFile",
+    "MediaResponse",
+    "RangeNotSatisfiable",
+    "describe",
+    "if_range_allows",
+    "parse_range_header",
+]
@@ -1,14 +1,202 @@
-"""Media signing helper placeholders."""
+"""Signed media URLs.
+
+Two formats are issued:
+
+* ``api``: an HMAC over the path and expiry, checked by the
+  ``/api/media`` endpoint (:func:`sign_media_url`);
+* ``secure_link``: the MD5 token understood by nginx's ``secure_link``
+  module (:func:`sign_secure_link`), so nginx validates the link and serves
+  the file itself. See ``infra/nginx/snippets/secure_media.conf``.
+
+API signatures are produced by :class:`MediaUrlSigner`, which keys the HMAC
+once and copies the keyed state for each URL, and checked by its verifier,
+which remembers recently accepted signatures so a player's repeated range
+requests against one URL cost a dictionary lookup.
+
+A ``secure_link`` URL can be bound to a device: its token then covers the
+device id, which the player must send in the ``X-Device-Id`` header. The id
+never appears in the URL, so a copied link is useless without it.
+"""
 
 from __future__ import annotations
 
-from datetime import datetime
+import base64
+import hashlib
+import hmac
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Iterable
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from typing import Optional
+from urllib.parse import quote
+
+from app.core.config import Settings, get_settings
+DEVICE_HEADER = "X-Device-Id"
+SECURE_LINK_PREFIX = "/media/"
+
+
+class MediaUrlSigner:
+    """Sign and verify API media URLs with one secret.
+
+    Signatures equal ``sign_payload(secret, f"{url}|{expires}")``. The keyed
+    HMAC state is built once; each URL costs a state copy and one update.
+    Successful verifications are kept in an LRU of ``cache_size`` entries;
+    expiry is still checked on every call.
+    """
+
+    def __init__(self, secret: str, *, cache_size: int = 4096) -> None:
+        self._mac = hmac.new(secret.encode(), digestmod=hashlib.sha256)
+        self._verified: OrderedDict[tuple[str, int, str], None] = OrderedDict()
+        self._cache_size = cache_size
+        self._lock = threading.Lock()
+
+    def signature(self, url: str, expires: int) -> str:
+        """Return the signature of ``url`` valid until the ``expires`` timestamp."""
+
+        mac = self._mac.copy()
+        mac.update(f"{url}|{expires}".encode())
+        return mac.hexdigest()
 
-from app.core.security import sign_payload
+    def sign(self, url: str, expires_at: datetime) -> str:
+        """Return ``url`` with a signature valid until ``expires_at``."""
+
+        expires = int(expires_at.timestamp())
+        return f"{url}?sig={self.signature(url, expires)}&exp={expires}"
+
+    def sign_many(self, urls: Iterable[str], expires_at: datetime) -> list[str]:
+        """Sign every URL of a manifest with the same expiry."""
+
+        expires = int(expires_at.timestamp())
+        mac = self._mac
+        signed = []
+        for url in urls:
+            state = mac.copy()
+            state.update(f"{url}|{expires}".encode())
+            signed.append(f"{url}?sig={state.hexdigest()}&exp={expires}")
+        return signed
+
+    def verify(self, url: str, signature: str, expires: int, *, now: Optional[float] = None) -> bool:
+        """Return whether ``signature`` was issued for ``url`` and has not expired.
+
+        ``url`` is the path that was signed, without the query string.
+        """
+
+        if expires < (time.time() if now is None else now):
+            return False
+        key = (url, expires, signature)
+        with self._lock:
+            if key in self._verified:
+                self._verified.move_to_end(key)
+                return True
+        if not hmac.compare_digest(self.signature(url, expires), signature):
+            return False
+        with self._lock:
+            self._verified[key] = None
+            if len(self._verified) > self._cache_size:
+                self._verified.popitem(last=False)
+        return True
+
+
+@lru_cache(maxsize=8)
+def get_media_signer(secret: str) -> MediaUrlSigner:
+    """Return the shared signer for ``secret``."""
+
+    return MediaUrlSigner(secret)
 
 
 def sign_media_url(secret: str, url: str, expires_at: datetime) -> str:
-    """Return a dummy signed URL for development purposes."""
+    """Return ``url`` with a signature valid until ``expires_at``."""
+
+    return get_media_signer(secret).sign(url, expires_at)
+
+
+def verify_media_signature(
+    secret: str, url: str, signature: str, expires: int, *, now: Optional[float] = None
+) -> bool:
+    """Return whether ``signature`` was issued for ``url`` and has not expired.
+
+    ``url`` is the path that was signed, without the query string.
+    """
+
+    return get_media_signer(secret).verify(url, signature, expires, now=now)
+
+
+def secure_link_token(secret: str, uri: str, expires: int, device_id: Optional[str] = None) -> str:
+    """Return the token nginx computes for ``secure_link_md5``.
+
+    It mirrors ``"$secure_link_expires$uri$http_x_device_id $secret"``: the
+    unpadded base64url MD5 of the expiry, the decoded request path, the
+    device id (empty when unbound) and the secret.
+    """
+
+    digest = hashlib.md5(f"{expires}{uri}{device_id or ''} {secret}".encode("utf-8")).digest()
+    return base64.urlsafe_b64encode(digest).rstrip(b"=").decode("ascii")
+
+
+def sign_secure_link(secret: str, uri: str, expires_at: datetime, *, device_id: Optional[str] = None) -> str:
+    """Return ``uri`` with the ``md5`` and ``expires`` arguments nginx checks.
+
+    ``uri`` is the decoded path nginx sees as ``$uri``; it is percent-encoded
+    in the returned URL.
+    """
+
+    expires = int(expires_at.timestamp())
+    token = secure_link_token(secret, uri, expires, device_id)
+    return f"{quote(uri)}?md5={token}&expires={expires}"
+
+
+def issue_media_urls(
+    paths: Iterable[str],
+    *,
+    device_id: Optional[str] = None,
+    expires_at: Optional[datetime] = None,
+    settings: Optional[Settings] = None,
+) -> list[str]:
+    """Return URLs for the stored files ``paths`` in the configured format.
+
+    All URLs share one expiry. ``device_id`` binds ``secure_link`` URLs to a
+    device; the API format ignores it.
+    """
+
+    settings = settings or get_settings()
+    if expires_at is None:
+        expires_at = datetime.now(timezone.utc) + timedelta(seconds=settings.media_url_ttl_seconds)
+    base = settings.media_public_base_url.rstrip("/")
+    paths = [path.lstrip("/") for path in paths]
+    if settings.media_url_mode == "secure_link":
+        signed = [
+            sign_secure_link(settings.media_link_secret, f"{SECURE_LINK_PREFIX}{path}", expires_at, device_id=device_id)
+            for path in paths
+        ]
+    else:
+        signer = get_media_signer(settings.hmac_media_secret)
+        signed = signer.sign_many([f"/api/media/{path}" for path in paths], expires_at)
+    return [f"{base}{url}" for url in signed]
+
+
+def issue_media_url(
+    path: str,
+    *,
+    device_id: Optional[str] = None,
+    expires_at: Optional[datetime] = None,
+    settings: Optional[Settings] = None,
+) -> str:
+    """Return a URL for the stored file ``path``; see :func:`issue_media_urls`."""
+
+    return issue_media_urls([path], device_id=device_id, expires_at=expires_at, settings=settings)[0]
+
 
-    signature = sign_payload(secret, f"{url}|{int(expires_at.timestamp())}")
-    return f"{url}?sig={signature}&exp={int(expires_at.timestamp())}"
+__all__ = [
+    "DEVICE_HEADER",
+    "MediaUrlSigner",
+    "SECURE_LINK_PREFIX",
+    "get_media_signer",
+    "issue_media_url",
+    "issue_media_urls",
+    "secure_link_token",
+    "sign_media_url",
+    "sign_secure_link",
+    "verify_media_signature",
+]
@@ -0,0 +1,163 @@
+"""Fan-out of playback events (evictions, remote control) to connected players.
+
+Events for a QR code are published on the Redis channel
+``play:events:<qr_id>``. Each worker keeps a single pattern subscription for
+all such channels and hands every message to the asyncio queues of the
+players connected to that worker, so thousands of idle event streams cost one
+Redis connection and a queue each. Without Redis, events are delivered to
+players connected to the publishing process only.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import threading
+import uuid
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from typing import Any, Optional
+
+from redis import Redis
+from redis.asyncio import Redis as AsyncRedis
+from redis.exceptions import RedisError
+
+logger = logging.getLogger("app.play")
+
+PlayEvent = dict[str, Any]
+
+CHANNEL_PREFIX = "play:events:"
+QUEUE_SIZE = 32
+RECONNECT_DELAY_SECONDS = 1.0
+
+
+class PlayEventBroker:
+    """Publish playback events and dispatch them to local subscribers."""
+
+    def __init__(
+        self,
+        redis_client: Optional[Redis] = None,
+        async_redis_client: Optional[AsyncRedis] = None,
+    ) -> None:
+        self._redis: Optional[Redis] = redis_client
+        self._async_redis: Optional[AsyncRedis] = async_redis_client
+        self._subscribers: dict[uuid.UUID, set[asyncio.Queue[PlayEvent]]] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._listener: Optional[asyncio.Task[None]] = None
+        self._lock = threading.Lock()
+
+    def configure_redis(
+        self,
+        redis_client: Optional[Redis],
+        async_redis_client: Optional[AsyncRedis] = None,
+    ) -> None:
+        """Replace the Redis clients used to publish and receive events."""
+
+        self._redis = redis_client
+        self._async_redis = async_redis_client
+
+    # ------------------------------------------------------------------
+    # Publishing
+    # ------------------------------------------------------------------
+    def publish(self, qr_id: uuid.UUID, event: PlayEvent) -> None:
+        """Send ``event`` to every player subscribed to ``qr_id``.
+
+        Safe to call from request threads; local delivery is scheduled on the
+        event loop the broker was started on.
+        """
+
+        redis_client = self._redis
+        if redis_client is not None and self._async_redis is not None:
+            try:
+                redis_client.publish(f"{CHANNEL_PREFIX}{qr_id}", json.dumps(event))
+                return
+            except RedisError:
+                logger.warning("Publishing play event over Redis failed; delivering locally")
+
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        loop.call_soon_threadsafe(self._dispatch, qr_id, event)
+
+    def _dispatch(self, qr_id: uuid.UUID, event: PlayEvent) -> None:
+        with self._lock:
+            queues = list(self._subscribers.get(qr_id, ()))
+        for queue in queues:
+            if queue.full():
+                # A stalled client only needs the most recent events.
+                queue.get_nowait()
+            queue.put_nowait(event)
+
+    # ------------------------------------------------------------------
+    # Subscribing
+    # ------------------------------------------------------------------
+    @asynccontextmanager
+    async def subscribe(self, qr_id: uuid.UUID) -> AsyncIterator[asyncio.Queue[PlayEvent]]:
+        """Yield a queue receiving the events published for ``qr_id``."""
+
+        queue: asyncio.Queue[PlayEvent] = asyncio.Queue(maxsize=QUEUE_SIZE)
+        with self._lock:
+            self._subscribers.setdefault(qr_id, set()).add(queue)
+        try:
+            yield queue
+        finally:
+            with self._lock:
+                queues = self._subscribers.get(qr_id)
+                if queues is not None:
+                    queues.discard(queue)
+                    if not queues:
+                        del self._subscribers[qr_id]
+
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return sum(len(queues) for queues in self._subscribers.values())
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+    async def start(self) -> None:
+        """Bind to the running loop and start the shared Redis subscription."""
+
+        self._loop = asyncio.get_running_loop()
+        if self._async_redis is not None and self._listener is None:
+            self._listener = asyncio.create_task(self._listen(), name="play-events")
+
+    async def stop(self) -> None:
+        """Stop the Redis subscription and detach from the loop."""
+
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+        self._loop = None
+
+    async def _listen(self) -> None:
+        while self._async_redis is not None:
+            pubsub = self._async_redis.pubsub()
+            try:
+                await pubsub.psubscribe(f"{CHANNEL_PREFIX}*")
+                async for message in pubsub.listen():
+                    if message.get("type") != "pmessage":
+                        continue
+                    channel = message["channel"]
+                    if isinstance(channel, bytes):
+                        channel = channel.decode("ascii")
+                    try:
+                        qr_id = uuid.UUID(channel[len(CHANNEL_PREFIX) :])
+                        event = json.loads(message["data"])
+                    except (TypeError, ValueError):
+                        logger.warning("Ignoring malformed play event on %s", channel)
+                        continue
+                    self._dispatch(qr_id, event)
+            except RedisError as exc:
+                logger.warning("Play event subscription lost: %s; reconnecting", exc)
+                await asyncio.sleep(RECONNECT_DELAY_SECONDS)
+            finally:
+                await pubsub.aclose()
+
+
+__all__ = ["PlayEvent", "PlayEventBroker"]
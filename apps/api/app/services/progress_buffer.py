@@ -0,0 +1,383 @@
+"""Write-behind buffering for listening progress updates.
+
+Players report their position every few seconds, but only the latest
+position per ``(qr_id, device_id, track_id)`` matters. :class:`ProgressBuffer`
+keeps that latest value in a Redis hash (or in memory when Redis is not
+available), so repeated updates for the same key overwrite each other instead
+of queueing. :class:`ProgressFlusher` drains the buffer periodically and
+writes it with batched multi-row ``INSERT ... ON CONFLICT DO UPDATE``
+statements on the shard that owns each QR token.
+
+A buffered update is written at most ``progress_flush_interval_seconds``
+after it arrives, or earlier once ``progress_buffer_max_entries`` updates are
+pending. Callers write pause and end events immediately with
+:meth:`ProgressFlusher.write_now`.
+
+Rows are stamped with the time their update left the buffer, and an UPSERT
+only replaces a row whose ``updated_at`` is not newer. A batch drained by one
+worker therefore cannot overwrite a position another worker wrote after it.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import threading
+import uuid
+from collections.abc import Callable, Iterable, Sequence
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Optional
+
+from redis import Redis
+from redis.exceptions import RedisError
+from sqlalchemy import func
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Connection
+from sqlalchemy.exc import SQLAlchemyError
+
+from app.core.config import get_settings
+from app.core.database import Shard, ShardRouter, get_shard_router
+from app.models import ListeningProgress
+
+logger = logging.getLogger("app.progress")
+
+PROGRESS_TABLE = ListeningProgress.__table__
+
+
+@dataclass(slots=True)
+class ProgressUpdate:
+    """The latest reported position for one QR, device and track."""
+
+    token: str
+    qr_id: uuid.UUID
+    device_id: uuid.UUID
+    track_id: str
+    position_ms: int
+    account_id: Optional[uuid.UUID] = None
+    completed: bool = False
+    # When the update left the buffer; kept if it has to be retried.
+    stamped_at: Optional[datetime] = None
+
+    @property
+    def key(self) -> str:
+        return f"{self.qr_id}:{self.device_id}:{self.track_id}"
+
+    def to_json(self) -> str:
+        return json.dumps(
+            {
+                "token": self.token,
+                "qr_id": str(self.qr_id),
+                "device_id": str(self.device_id),
+                "track_id": self.track_id,
+                "position_ms": self.position_ms,
+                "account_id": str(self.account_id) if self.account_id else None,
+                "completed": self.completed,
+            }
+        )
+
+    @classmethod
+    def from_json(cls, raw: str | bytes) -> "ProgressUpdate":
+        data = json.loads(raw)
+        return cls(
+            token=data["token"],
+            qr_id=uuid.UUID(data["qr_id"]),
+            device_id=uuid.UUID(data["device_id"]),
+            track_id=data["track_id"],
+            position_ms=int(data["position_ms"]),
+            account_id=uuid.UUID(data["account_id"]) if data["account_id"] else None,
+            completed=bool(data.get("completed", False)),
+        )
+
+
+class ProgressBuffer:
+    """Coalescing buffer of pending progress updates with in-memory fallback."""
+
+    REDIS_KEY = "progress:pending"
+
+    def __init__(self, redis_client: Optional[Redis] = None) -> None:
+        self._redis: Optional[Redis] = redis_client
+        self._pending: dict[str, ProgressUpdate] = {}
+        self._lock = threading.Lock()
+
+    def configure_redis(self, redis_client: Optional[Redis]) -> None:
+        """Replace the Redis client that holds the shared buffer."""
+
+        self._redis = redis_client
+
+    def add(self, update: ProgressUpdate) -> int:
+        """Buffer ``update``, replacing any pending one for the same key.
+
+        Returns the number of pending updates after the insert.
+        """
+
+        redis_client = self._redis
+        if redis_client is not None:
+            try:
+                pipe = redis_client.pipeline()
+                pipe.hset(self.REDIS_KEY, update.key, update.to_json())
+                pipe.hlen(self.REDIS_KEY)
+                _, pending = pipe.execute()
+                return int(pending)
+            except RedisError:
+                self.configure_redis(None)
+
+        with self._lock:
+            self._pending[update.key] = update
+            return len(self._pending)
+
+    def discard(self, key: str) -> None:
+        """Drop the pending update for ``key``, if any."""
+
+        with self._lock:
+            self._pending.pop(key, None)
+
+        redis_client = self._redis
+        if redis_client is None:
+            return
+        try:
+            redis_client.hdel(self.REDIS_KEY, key)
+        except RedisError:
+            self.configure_redis(None)
+
+    def drain(self) -> list[ProgressUpdate]:
+        """Remove and return every pending update."""
+
+        with self._lock:
+            updates = list(self._pending.values())
+            self._pending.clear()
+
+        redis_client = self._redis
+        if redis_client is None:
+            return updates
+
+        try:
+            pipe = redis_client.pipeline(transaction=True)
+            pipe.hgetall(self.REDIS_KEY)
+            pipe.delete(self.REDIS_KEY)
+            raw, _ = pipe.execute()
+        except RedisError:
+            self.configure_redis(None)
+            return updates
+
+        shared = {}
+        for value in raw.values():
+            update = ProgressUpdate.from_json(value)
+            shared[update.key] = update
+        # Updates buffered in memory during a Redis outage are older than
+        # anything Redis accepted afterwards.
+        merged = {update.key: update for update in updates}
+        merged.update(shared)
+        return list(merged.values())
+
+    def requeue(self, updates: Iterable[ProgressUpdate]) -> None:
+        """Put back updates that could not be written, unless newer ones arrived."""
+
+        with self._lock:
+            for update in updates:
+                self._pending.setdefault(update.key, update)
+
+    def __len__(self) -> int:
+        redis_client = self._redis
+        if redis_client is not None:
+            try:
+                return int(redis_client.hlen(self.REDIS_KEY)) + len(self._pending)
+            except RedisError:
+                self.configure_redis(None)
+        return len(self._pending)
+
+    def reset(self) -> None:
+        """Discard all pending updates (primarily for tests)."""
+
+        with self._lock:
+            self._pending.clear()
+
+        redis_client = self._redis
+        if redis_client is None:
+            return
+        try:
+            redis_client.delete(self.REDIS_KEY)
+        except RedisError:
+            self.configure_redis(None)
+
+
+def _upsert_statement(connection: Connection) -> Any:
+    dialect = postgresql if connection.dialect.name == "postgresql" else sqlite
+    statement = dialect.insert(PROGRESS_TABLE)
+    return statement.on_conflict_do_update(
+        index_elements=[PROGRESS_TABLE.c.qr_id, PROGRESS_TABLE.c.device_id, PROGRESS_TABLE.c.track_id],
+        set_={
+            "position_ms": statement.excluded.position_ms,
+            "account_id": statement.excluded.account_id,
+            "updated_at": statement.excluded.updated_at,
+            "completed_at": func.coalesce(statement.excluded.completed_at, PROGRESS_TABLE.c.completed_at),
+        },
+        where=PROGRESS_TABLE.c.updated_at <= statement.excluded.updated_at,
+    )
+
+
+def write_progress(
+    connection: Connection,
+    updates: Sequence[ProgressUpdate],
+    *,
+    batch_size: int = 500,
+    updated_at: Optional[datetime] = None,
+) -> None:
+    """UPSERT ``updates`` on ``connection`` with multi-row statements.
+
+    Rows get ``updated_at`` from the update's ``stamped_at``, falling back to
+    ``updated_at`` or the current time: when they are written rather than when
+    the player reported them, so rows that sat in the buffer do not appear
+    behind a reader that pages on ``updated_at``. A stored row with a newer
+    ``updated_at`` is left alone. Updates marked ``completed`` (the player's
+    end event) stamp ``completed_at`` the same way; others keep it.
+    """
+
+    if not updates:
+        return
+
+    statement = _upsert_statement(connection)
+    default_stamp = updated_at or datetime.utcnow()
+    for start in range(0, len(updates), batch_size):
+        chunk = updates[start : start + batch_size]
+        rows = []
+        for update in chunk:
+            stamp = update.stamped_at or default_stamp
+            rows.append(
+                {
+                    "qr_id": update.qr_id,
+                    "device_id": update.device_id,
+                    "track_id": update.track_id,
+                    "position_ms": update.position_ms,
+                    "account_id": update.account_id,
+                    "updated_at": stamp,
+                    "completed_at": stamp if update.completed else None,
+                }
+            )
+        connection.execute(statement.values(rows))
+
+
+class ProgressFlusher:
+    """Drain a :class:`ProgressBuffer` into the database in the background."""
+
+    def __init__(
+        self,
+        buffer: ProgressBuffer,
+        router_getter: Callable[[], ShardRouter] = get_shard_router,
+    ) -> None:
+        self.buffer = buffer
+        self._router_getter = router_getter
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def flush(self, *, raise_errors: bool = False) -> int:
+        """Write every pending update now and return how many were written.
+
+        Updates whose shard rejects the write are put back in the buffer with
+        their stamp; with ``raise_errors`` the first failure is re-raised
+        afterwards. Flushes are serialised within the process; across
+        processes the ``updated_at`` guard of the UPSERT keeps an older
+        drained batch from overwriting a newer write.
+        """
+
+        settings = get_settings()
+        with self._flush_lock:
+            stamp = datetime.utcnow()
+            updates = self.buffer.drain()
+            if not updates:
+                return 0
+            for update in updates:
+                update.stamped_at = update.stamped_at or stamp
+
+            router = self._router_getter()
+            by_shard: dict[str, tuple[Shard, list[ProgressUpdate]]] = {}
+            for update in updates:
+                shard = router.shard_for_token(update.token)
+                by_shard.setdefault(shard.name, (shard, []))[1].append(update)
+
+            written = 0
+            failure: Optional[SQLAlchemyError] = None
+            for shard, shard_updates in by_shard.values():
+                try:
+                    with shard.engine.begin() as connection:
+                        write_progress(
+                            connection,
+                            shard_updates,
+                            batch_size=settings.progress_flush_batch_size,
+                        )
+                except SQLAlchemyError as exc:
+                    failure = failure or exc
+                    logger.exception(
+                        "Failed to flush %d progress updates to %s; keeping them buffered",
+                        len(shard_updates),
+                        shard.name,
+                    )
+                    self.buffer.requeue(shard_updates)
+                    continue
+                written += len(shard_updates)
+
+            if failure is not None and raise_errors:
+                raise failure
+            return written
+
+    def write_now(self, update: ProgressUpdate) -> None:
+        """Write ``update`` alone, bypassing the buffer (for pause and end events).
+
+        Any buffered update for the same key is older and is dropped. Raises
+        :class:`SQLAlchemyError` when the write fails; the caller decides
+        whether to buffer the update instead.
+        """
+
+        update.stamped_at = datetime.utcnow()
+        self.buffer.discard(update.key)
+        shard = self._router_getter().shard_for_token(update.token)
+        with shard.engine.begin() as connection:
+            write_progress(connection, [update])
+
+    def notify(self, pending: int) -> None:
+        """Wake the background thread early once the buffer is large."""
+
+        if pending >= get_settings().progress_buffer_max_entries:
+            self._wake.set()
+
+    def start(self) -> None:
+        """Start the background flush loop if it is not already running."""
+
+        if self._thread is not None and self._thread.is_alive():
+            return
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="progress-flusher", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the background loop and write whatever is still pending."""
+
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def _run(self) -> None:
+        interval = get_settings().progress_flush_interval_seconds
+        while not self._stop.is_set():
+            self._wake.wait(interval)
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+            try:
+                self.flush()
+            except Exception:  # pragma: no cover - keep the loop alive
+                logger.exception("Progress flush failed")
+
+
+__all__ = [
+    "ProgressBuffer",
+    "ProgressFlusher",
+    "ProgressUpdate",
+    "write_progress",
+]
@@ -0,0 +1,102 @@
+"""Cache of the latest playback position per QR, device and track.
+
+Opening the player needs the last position before it can start, so the read
+must not queue behind progress writes on ``listening_progress``. Positions
+are written to the cache as soon as a progress update is accepted (before the
+write-behind flush reaches the database) and read from it first; misses fall
+back to a primary-key lookup and warm the cache.
+
+Redis keeps positions for ``resume_cache_ttl_seconds`` and is shared by all
+workers. Without Redis each process keeps its own LRU whose entries expire
+after ``resume_cache_local_ttl_seconds``, so a position written through
+another worker is picked up from the database shortly afterwards.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Optional
+
+from redis import Redis
+from redis.exceptions import RedisError
+
+from app.core.config import get_settings
+
+CacheKey = tuple[uuid.UUID, uuid.UUID, str]
+
+
+class ResumePositionCache:
+    """Resume positions in Redis with a bounded in-memory fallback."""
+
+    def __init__(self, redis_client: Optional[Redis] = None, max_entries: int = 100_000) -> None:
+        self._redis: Optional[Redis] = redis_client
+        self._entries: OrderedDict[CacheKey, tuple[float, int]] = OrderedDict()
+        self._max_entries = max_entries
+        self._lock = threading.Lock()
+
+    def configure_redis(self, redis_client: Optional[Redis]) -> None:
+        """Replace the Redis client that holds the shared cache."""
+
+        self._redis = redis_client
+
+    @staticmethod
+    def _format_key(key: CacheKey) -> str:
+        qr_id, device_id, track_id = key
+        return f"resume:{qr_id}:{device_id}:{track_id}"
+
+    def get(self, qr_id: uuid.UUID, device_id: uuid.UUID, track_id: str) -> Optional[int]:
+        """Return the cached position, or ``None`` on a miss."""
+
+        key = (qr_id, device_id, track_id)
+        redis_client = self._redis
+        if redis_client is not None:
+            try:
+                value = redis_client.get(self._format_key(key))
+            except RedisError:
+                self.configure_redis(None)
+            else:
+                return int(value) if value is not None else None
+
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, position = entry
+            if expires_at <= now:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return position
+
+    def set(self, qr_id: uuid.UUID, device_id: uuid.UUID, track_id: str, position_ms: int) -> None:
+        """Store the latest position for a QR, device and track."""
+
+        key = (qr_id, device_id, track_id)
+        settings = get_settings()
+        redis_client = self._redis
+        if redis_client is not None:
+            try:
+                redis_client.set(self._format_key(key), position_ms, ex=settings.resume_cache_ttl_seconds)
+                return
+            except RedisError:
+                self.configure_redis(None)
+
+        expires_at = time.monotonic() + settings.resume_cache_local_ttl_seconds
+        with self._lock:
+            self._entries[key] = (expires_at, position_ms)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+    def reset(self) -> None:
+        """Drop every locally cached position (primarily for tests)."""
+
+        with self._lock:
+            self._entries.clear()
+
+
+__all__ = ["ResumePositionCache"]
@@ -1,22 +1,313 @@
-"""Preview sampler helpers."""
+"""Preview sampler playlists.
+
+Every product is segmented into an HLS media playlist stored at
+``hls/<product_id>/index.m3u8`` (see :func:`product_playlist_path`). A
+sampler playlist covers the first ``preview_max_seconds`` of it and is
+issued for one QR token, with each segment URL signed for that request.
+
+The segment list is parsed from storage once and kept in Redis and in
+process memory for ``preview_segment_cache_seconds``, so a preview request
+costs no storage access: only the signatures are rendered per request. URLs
+are signed to expire at the end of the current
+``preview_manifest_window_seconds`` window plus ``media_url_ttl_seconds``, so
+a token's playlist is stable within a window and carries an ETag clients and
+proxies can revalidate until the window ends. Neither URL format has room
+for the token, so the signatures themselves cover only path and expiry.
+"""
 
 from __future__ import annotations
 
+import hashlib
+import json
+import math
+import posixpath
+import threading
+import time
+from collections import OrderedDict
 from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from redis import Redis
+from redis.exceptions import RedisError
+
+from app.core.config import Settings, get_settings
+from app.services.hls import product_playlist_path
+from app.services.media_catalog import MediaCatalog
+from app.services.media_signer import issue_media_urls
+from app.services.storage import StorageBackend
+
+
+@dataclass(frozen=True, slots=True)
+class Segment:
+    """One media segment: its storage path and duration in seconds."""
+
+    path: str
+    duration: float
+
+
+@dataclass(frozen=True, slots=True)
+class SegmentList:
+    """The segments covering the opening of a product."""
+
+    product_id: int
+    segments: tuple[Segment, ...]
+
+    @property
+    def duration_seconds(self) -> float:
+        return sum(segment.duration for segment in self.segments)
+
+    @property
+    def target_duration(self) -> int:
+        return max((math.ceil(segment.duration) for segment in self.segments), default=0)
+
+    def to_json(self) -> str:
+        return json.dumps([[segment.path, segment.duration] for segment in self.segments])
 
+    @classmethod
+    def from_json(cls, product_id: int, payload: str | bytes) -> SegmentList:
+        return cls(product_id, tuple(Segment(path, float(duration)) for path, duration in json.loads(payload)))
 
-@dataclass(slots=True)
+
+@dataclass(frozen=True, slots=True)
 class SamplerManifest:
-    """Represents a generated sampler manifest."""
+    """A sampler playlist rendered for a token and the window it is valid for."""
 
     token: str
-    duration_seconds: int
-    url: str
+    product_id: int
+    duration_seconds: float
+    body: str
+    etag: str
+    valid_until: datetime
+
+    def max_age(self, now: Optional[datetime] = None) -> int:
+        """Seconds clients may cache the playlist before it changes."""
+
+        now = now or datetime.now(timezone.utc)
+        return max(int((self.valid_until - now).total_seconds()), 0)
+
+
+def parse_media_playlist(text: str, playlist_path: str, *, max_seconds: Optional[float] = None) -> list[Segment]:
+    """Return the segments of an HLS media playlist stored at ``playlist_path``.
+
+    Segment URIs are resolved relative to the playlist. With ``max_seconds``
+    parsing stops at the first segment that reaches that much audio.
+    """
+
+    base = posixpath.dirname(playlist_path)
+    segments: list[Segment] = []
+    total = 0.0
+    duration: Optional[float] = None
+    for line in text.splitlines():
+        line = line.strip()
+        if line.startswith("#EXTINF:"):
+            duration = float(line[len("#EXTINF:"):].split(",", 1)[0])
+        elif line and not line.startswith("#"):
+            if duration is None:
+                raise ValueError(f"{playlist_path}: segment {line!r} has no #EXTINF")
+            segments.append(Segment(posixpath.normpath(posixpath.join(base, line)), duration))
+            total += duration
+            duration = None
+            if max_seconds is not None and total >= max_seconds:
+                break
+    return segments
+
+
+def load_segment_list(storage: StorageBackend, product_id: int, max_seconds: float) -> SegmentList:
+    """Read and trim a product's playlist from storage (blocking).
+
+    Raises :class:`FileNotFoundError` when the product has no playlist.
+    """
+
+    path = product_playlist_path(product_id)
+    with storage.open(path) as handle:
+        text = handle.read().decode("utf-8")
+    return SegmentList(product_id, tuple(parse_media_playlist(text, path, max_seconds=max_seconds)))
+
+
+def render_playlist(segments: SegmentList, urls: list[str]) -> str:
+    """Render a VOD media playlist for ``segments`` with the given URLs."""
 
+    lines = [
+        "#EXTM3U",
+        "#EXT-X-VERSION:3",
+        f"#EXT-X-TARGETDURATION:{segments.target_duration}",
+        "#EXT-X-MEDIA-SEQUENCE:0",
+        "#EXT-X-PLAYLIST-TYPE:VOD",
+    ]
+    for segment, url in zip(segments.segments, urls):
+        lines.append(f"#EXTINF:{segment.duration:.3f},")
+        lines.append(url)
+    lines.append("#EXT-X-ENDLIST")
+    return "\n".join(lines) + "\n"
 
-def build_sampler_manifest(token: str) -> SamplerManifest:
-    """Return a placeholder sampler manifest for early development."""
 
+class SamplerCache:
+    """Segment lists in Redis and process memory.
+
+    Without Redis every process loads segment lists from storage itself.
+    Concurrent misses for one product in a process wait for a single load.
+    """
+
+    def __init__(self, redis_client: Optional[Redis] = None, max_entries: int = 1024) -> None:
+        self._redis: Optional[Redis] = redis_client
+        self._segments: OrderedDict[int, tuple[float, SegmentList]] = OrderedDict()
+        self._loading: dict[int, threading.Lock] = {}
+        self._max_entries = max_entries
+        self._lock = threading.Lock()
+
+    def configure_redis(self, redis_client: Optional[Redis]) -> None:
+        """Replace the Redis client that holds the shared cache."""
+
+        self._redis = redis_client
+
+    @staticmethod
+    def _format_key(product_id: int) -> str:
+        return f"sampler:segments:{product_id}"
+
+    def segment_list(
+        self,
+        storage: StorageBackend,
+        product_id: int,
+        settings: Settings,
+        catalog: Optional[MediaCatalog] = None,
+    ) -> SegmentList:
+        """Return the product's sampler segments, loading them on a miss.
+
+        With a ``catalog``, products without a playlist are turned away from
+        its memory instead of storage.
+        """
+
+        cached = self._local_segments(product_id)
+        if cached is not None:
+            return cached
+        with self._lock:
+            loading = self._loading.setdefault(product_id, threading.Lock())
+        with loading:
+            cached = self._local_segments(product_id)
+            if cached is None:
+                cached = self._shared_segments(product_id)
+            if cached is None:
+                if catalog is not None:
+                    catalog.stat(storage, product_playlist_path(product_id))
+                cached = load_segment_list(storage, product_id, settings.preview_max_seconds)
+                self._store_shared(cached, settings.preview_segment_cache_seconds)
+            self._store_local(cached, settings.preview_segment_cache_seconds)
+        with self._lock:
+            self._loading.pop(product_id, None)
+        return cached
+
+    def _local_segments(self, product_id: int) -> Optional[SegmentList]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._segments.get(product_id)
+            if entry is None:
+                return None
+            expires_at, segments = entry
+            if expires_at <= now:
+                del self._segments[product_id]
+                return None
+            self._segments.move_to_end(product_id)
+            return segments
+
+    def _store_local(self, segments: SegmentList, ttl_seconds: float) -> None:
+        with self._lock:
+            self._segments[segments.product_id] = (time.monotonic() + ttl_seconds, segments)
+            self._segments.move_to_end(segments.product_id)
+            while len(self._segments) > self._max_entries:
+                self._segments.popitem(last=False)
+
+    def _shared_segments(self, product_id: int) -> Optional[SegmentList]:
+        redis_client = self._redis
+        if redis_client is None:
+            return None
+        try:
+            payload = redis_client.get(self._format_key(product_id))
+        except RedisError:
+            self.configure_redis(None)
+            return None
+        return SegmentList.from_json(product_id, payload) if payload is not None else None
+
+    def _store_shared(self, segments: SegmentList, ttl_seconds: int) -> None:
+        redis_client = self._redis
+        if redis_client is None:
+            return
+        try:
+            redis_client.set(self._format_key(segments.product_id), segments.to_json(), ex=ttl_seconds)
+        except RedisError:
+            self.configure_redis(None)
+
+    def invalidate(self, product_id: int) -> None:
+        """Forget a product's segments, e.g. after re-ingest."""
+
+        with self._lock:
+            self._segments.pop(product_id, None)
+        redis_client = self._redis
+        if redis_client is not None:
+            try:
+                redis_client.delete(self._format_key(product_id))
+            except RedisError:
+                self.configure_redis(None)
+
+    def reset(self) -> None:
+        """Drop every locally cached entry (primarily for tests)."""
+
+        with self._lock:
+            self._segments.clear()
+
+
+def window_end(settings: Settings, now: Optional[datetime] = None) -> datetime:
+    """Return the end of the manifest window containing ``now``."""
+
+    now = now or datetime.now(timezone.utc)
+    window = settings.preview_manifest_window_seconds
+    return datetime.fromtimestamp((int(now.timestamp()) // window + 1) * window, timezone.utc)
+
+
+def build_sampler_manifest(
+    token: str,
+    product_id: int,
+    *,
+    storage: StorageBackend,
+    cache: SamplerCache,
+    catalog: Optional[MediaCatalog] = None,
+    settings: Optional[Settings] = None,
+    now: Optional[datetime] = None,
+) -> SamplerManifest:
+    """Render the sampler playlist for ``token``, whose QR code is for ``product_id``.
+
+    Only the signatures are computed here; the segment list comes from
+    ``cache``. Raises :class:`FileNotFoundError` when the product has not
+    been segmented.
+    """
+
+    settings = settings or get_settings()
+    valid_until = window_end(settings, now)
+    segments = cache.segment_list(storage, product_id, settings, catalog)
+    urls = issue_media_urls(
+        [segment.path for segment in segments.segments],
+        expires_at=valid_until + timedelta(seconds=settings.media_url_ttl_seconds),
+        settings=settings,
+    )
+    body = render_playlist(segments, urls)
     return SamplerManifest(
-        token=token, duration_seconds=600, url=f"/preview/{token}.m3u8"
+        token=token,
+        product_id=product_id,
+        duration_seconds=segments.duration_seconds,
+        body=body,
+        etag=f'"{hashlib.sha256(body.encode()).hexdigest()[:32]}"',
+        valid_until=valid_until,
     )
+
+
+__all__ = [
+    "SamplerCache",
+    "SamplerManifest",
+    "Segment",
+    "SegmentList",
+    "build_sampler_manifest",
+    "load_segment_list",
+    "parse_media_playlist",
+    "render_playlist",
+    "window_end",
+]
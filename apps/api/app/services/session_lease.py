@@ -0,0 +1,268 @@
+"""Single active play session per QR code, enforced with expiring leases.
+
+Each QR has one lease key in Redis holding the active session id and device.
+Starting playback takes the lease over atomically and reports the session it
+evicted; heartbeats extend the lease's TTL and fail once the session no
+longer holds it, whether another session took it or it expired. None of this touches the database, so the ``play_session`` table is
+only written when a session starts and ends. Without Redis the leases live in
+process memory, which is only correct for single-worker deployments.
+
+A session whose player simply goes away never calls stop, and its lease just
+expires. Next to each lease a longer-lived record keeps the last holder and
+when it last renewed, so the next start on the QR can close that session as
+of its final heartbeat.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+
+from redis import Redis
+from redis.exceptions import RedisError
+
+from app.core.config import get_settings
+
+# KEYS[1] = lease key, KEYS[2] = last-seen key, ARGV[1] = new holder,
+# ARGV[2] = TTL in milliseconds, ARGV[3] = last-seen record,
+# ARGV[4] = last-seen TTL in milliseconds.
+_ACQUIRE_SCRIPT = """
+local previous = redis.call('GET', KEYS[1])
+local seen = redis.call('GET', KEYS[2])
+redis.call('SET', KEYS[1], ARGV[1], 'PX', ARGV[2])
+redis.call('SET', KEYS[2], ARGV[3], 'PX', ARGV[4])
+return {previous or false, seen or false}
+"""
+
+# Extend the lease only while the caller still holds it. A lapsed lease is not
+# re-taken: its session may already have been evicted and closed, so the
+# player has to start a new one.
+_RENEW_SCRIPT = """
+if redis.call('GET', KEYS[1]) ~= ARGV[1] then
+    return 0
+end
+redis.call('PEXPIRE', KEYS[1], ARGV[2])
+redis.call('SET', KEYS[2], ARGV[3], 'PX', ARGV[4])
+return 1
+"""
+
+_RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    redis.call('DEL', KEYS[2])
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+@dataclass(slots=True, frozen=True)
+class LeaseHolder:
+    """The session currently allowed to play a QR code."""
+
+    session_id: uuid.UUID
+    device_id: uuid.UUID
+
+    def encode(self) -> str:
+        return f"{self.session_id}:{self.device_id}"
+
+    @classmethod
+    def decode(cls, value: str | bytes) -> "LeaseHolder":
+        if isinstance(value, bytes):
+            value = value.decode("ascii")
+        session_id, device_id = value.split(":", 1)
+        return cls(session_id=uuid.UUID(session_id), device_id=uuid.UUID(device_id))
+
+
+@dataclass(slots=True, frozen=True)
+class LeaseTakeover:
+    """The sessions a new holder replaced when it acquired a lease.
+
+    ``evicted`` still held a live lease. ``lapsed`` held the lease last but let
+    it expire; ``lapsed_seen_at`` is its final renewal (naive UTC).
+    """
+
+    evicted: Optional[LeaseHolder] = None
+    lapsed: Optional[LeaseHolder] = None
+    lapsed_seen_at: Optional[datetime] = None
+
+
+def _seen_record(holder: LeaseHolder, now: float) -> str:
+    return f"{holder.encode()}@{int(now * 1000)}"
+
+
+def _decode_seen(value: str | bytes) -> tuple[LeaseHolder, float]:
+    if isinstance(value, bytes):
+        value = value.decode("ascii")
+    encoded, seen_ms = value.rsplit("@", 1)
+    return LeaseHolder.decode(encoded), int(seen_ms) / 1000
+
+
+def _takeover(
+    holder: LeaseHolder, previous: Optional[LeaseHolder], seen: Optional[tuple[LeaseHolder, float]]
+) -> LeaseTakeover:
+    evicted = previous if previous is not None and previous != holder else None
+    if seen is None or seen[0] in (holder, previous):
+        return LeaseTakeover(evicted=evicted)
+    return LeaseTakeover(
+        evicted=evicted, lapsed=seen[0], lapsed_seen_at=datetime.utcfromtimestamp(seen[1])
+    )
+
+
+class SessionLeaseManager:
+    """Redis-backed play session leases with an in-memory fallback."""
+
+    def __init__(self, redis_client: Optional[Redis] = None) -> None:
+        self._redis: Optional[Redis] = redis_client
+        self._leases: dict[uuid.UUID, tuple[float, LeaseHolder]] = {}
+        self._seen: dict[uuid.UUID, tuple[LeaseHolder, float]] = {}
+        self._lock = threading.Lock()
+
+    def configure_redis(self, redis_client: Optional[Redis]) -> None:
+        """Replace the Redis client that stores the leases."""
+
+        self._redis = redis_client
+
+    @staticmethod
+    def _format_key(qr_id: uuid.UUID) -> str:
+        return f"lease:qr:{qr_id}"
+
+    @staticmethod
+    def _format_seen_key(qr_id: uuid.UUID) -> str:
+        return f"lease:qr:{qr_id}:seen"
+
+    @staticmethod
+    def _ttl_ms() -> int:
+        return int(get_settings().play_lease_ttl_seconds * 1000)
+
+    @staticmethod
+    def _seen_ttl_ms() -> int:
+        return int(get_settings().play_lease_history_seconds * 1000)
+
+    def acquire(self, qr_id: uuid.UUID, holder: LeaseHolder) -> Optional[LeaseHolder]:
+        """Make ``holder`` the active session and return the one it evicted."""
+
+        return self.take_over(qr_id, holder).evicted
+
+    def take_over(self, qr_id: uuid.UUID, holder: LeaseHolder) -> LeaseTakeover:
+        """Make ``holder`` the active session and report whom it replaced."""
+
+        now = time.time()
+        redis_client = self._redis
+        if redis_client is not None:
+            try:
+                previous, seen = redis_client.eval(
+                    _ACQUIRE_SCRIPT,
+                    2,
+                    self._format_key(qr_id),
+                    self._format_seen_key(qr_id),
+                    holder.encode(),
+                    self._ttl_ms(),
+                    _seen_record(holder, now),
+                    self._seen_ttl_ms(),
+                )
+            except RedisError:
+                self.configure_redis(None)
+            else:
+                return _takeover(
+                    holder,
+                    LeaseHolder.decode(previous) if previous is not None else None,
+                    _decode_seen(seen) if seen is not None else None,
+                )
+
+        monotonic = time.monotonic()
+        with self._lock:
+            entry = self._leases.get(qr_id)
+            seen_entry = self._seen.get(qr_id)
+            self._leases[qr_id] = (monotonic + self._ttl_ms() / 1000, holder)
+            self._seen[qr_id] = (holder, now)
+        live = entry[1] if entry is not None and entry[0] > monotonic else None
+        return _takeover(holder, live, seen_entry)
+
+    def renew(self, qr_id: uuid.UUID, holder: LeaseHolder) -> bool:
+        """Extend ``holder``'s lease; return ``False`` if it no longer holds a live one."""
+
+        now = time.time()
+        redis_client = self._redis
+        if redis_client is not None:
+            try:
+                renewed = redis_client.eval(
+                    _RENEW_SCRIPT,
+                    2,
+                    self._format_key(qr_id),
+                    self._format_seen_key(qr_id),
+                    holder.encode(),
+                    self._ttl_ms(),
+                    _seen_record(holder, now),
+                    self._seen_ttl_ms(),
+                )
+            except RedisError:
+                self.configure_redis(None)
+            else:
+                return bool(renewed)
+
+        monotonic = time.monotonic()
+        with self._lock:
+            entry = self._leases.get(qr_id)
+            if entry is None or entry[0] <= monotonic or entry[1] != holder:
+                return False
+            self._leases[qr_id] = (monotonic + self._ttl_ms() / 1000, holder)
+            self._seen[qr_id] = (holder, now)
+            return True
+
+    def release(self, qr_id: uuid.UUID, holder: LeaseHolder) -> bool:
+        """Drop ``holder``'s lease; return ``False`` if it no longer held it."""
+
+        redis_client = self._redis
+        if redis_client is not None:
+            try:
+                released = redis_client.eval(
+                    _RELEASE_SCRIPT,
+                    2,
+                    self._format_key(qr_id),
+                    self._format_seen_key(qr_id),
+                    holder.encode(),
+                )
+            except RedisError:
+                self.configure_redis(None)
+            else:
+                return bool(released)
+
+        with self._lock:
+            entry = self._leases.get(qr_id)
+            if entry is None or entry[1] != holder:
+                return False
+            del self._leases[qr_id]
+            self._seen.pop(qr_id, None)
+            return entry[0] > time.monotonic()
+
+    def holder(self, qr_id: uuid.UUID) -> Optional[LeaseHolder]:
+        """Return the session currently holding the lease, if any."""
+
+        redis_client = self._redis
+        if redis_client is not None:
+            try:
+                value = redis_client.get(self._format_key(qr_id))
+            except RedisError:
+                self.configure_redis(None)
+            else:
+                return LeaseHolder.decode(value) if value is not None else None
+
+        with self._lock:
+            entry = self._leases.get(qr_id)
+        if entry is None or entry[0] <= time.monotonic():
+            return None
+        return entry[1]
+
+    def reset(self) -> None:
+        """Forget all in-memory leases (primarily for tests)."""
+
+        with self._lock:
+            self._leases.clear()
+            self._seen.clear()
+
+
+__all__ = ["LeaseHolder", "LeaseTakeover", "SessionLeaseManager"]
@@ -1 +1,76 @@
 """Storage backends for Audiovook media assets."""
+
+from __future__ import annotations
+
+from typing import Optional
+
+from app.core.config import get_settings
+
+from .base import DEFAULT_CHUNK_SIZE, Buffer, LocalStorage, RangeReader, StorageBackend, StorageStat
+from .disk_cache import DiskCachedStorage, DiskCacheStats
+from .hot_cache import HotCacheStats, HotSegmentCache
+from .s3 import S3Settings, S3Storage
+
+_storage: Optional[StorageBackend] = None
+
+
+def get_storage() -> StorageBackend:
+    """Return the process-wide media storage backend."""
+
+    global _storage
+
+    if _storage is None:
+        settings = get_settings()
+        if settings.media_storage_backend == "s3":
+            _storage = S3Storage(
+                S3Settings(
+                    endpoint=settings.media_s3_endpoint,
+                    access_key=settings.media_s3_access_key,
+                    secret_key=settings.media_s3_secret_key,
+                    bucket=settings.media_s3_bucket,
+                    region=settings.media_s3_region,
+                    max_connections=settings.media_s3_max_connections,
+                )
+            )
+            if settings.media_disk_cache_root:
+                _storage = DiskCachedStorage(
+                    _storage,
+                    settings.media_disk_cache_root,
+                    max_bytes=settings.media_disk_cache_max_bytes,
+                    block_size=settings.media_disk_cache_block_size,
+                )
+            if settings.media_hot_cache_bytes > 0:
+                _storage = HotSegmentCache(
+                    _storage,
+                    max_bytes=settings.media_hot_cache_bytes,
+                    max_entry_bytes=settings.media_hot_cache_max_entry_bytes,
+                )
+        else:
+            _storage = LocalStorage(settings.media_storage_root)
+    return _storage
+
+
+def configure_storage(storage: Optional[StorageBackend]) -> None:
+    """Override the storage backend (or reset it to the settings with ``None``)."""
+
+    global _storage
+
+    _storage = storage
+
+
+__all__ = [
+    "Buffer",
+    "DEFAULT_CHUNK_SIZE",
+    "DiskCacheStats",
+    "DiskCachedStorage",
+    "HotCacheStats",
+    "HotSegmentCache",
+    "LocalStorage",
+    "RangeReader",
+    "S3Settings",
+    "S3Storage",
+    "StorageBackend",
+    "StorageStat",
+    "configure_storage",
+    "get_storage",
+]
@@ -2,13 +2,47 @@
 
 from __future__ import annotations
 
+import contextlib
+import io
+import mmap
+import os
+import tempfile
+import threading
 from abc import ABC, abstractmethod
+from collections import OrderedDict
+from collections.abc import AsyncIterator, Iterator
+from dataclasses import dataclass
 from pathlib import Path
-from typing import BinaryIO
+from typing import Any, BinaryIO, Optional, Union
+
+import anyio
+
+DEFAULT_CHUNK_SIZE = 256 * 1024
+
+Buffer = Union[bytes, memoryview]
+
+
+@dataclass(frozen=True, slots=True)
+class StorageStat:
+    """Size and, when the backend knows it, modification time of a stored file."""
+
+    size: int
+    mtime: Optional[float] = None
 
 
 class StorageBackend(ABC):
-    """Define the contract for media storage operations."""
+    """Define the contract for media storage operations.
+
+    ``stat``, ``read_range`` and ``iter_chunks`` have implementations built
+    on :meth:`open`; backends override them when they can do better.
+    Writing and listing are optional: backends that accept new files set
+    :attr:`writable` and implement :meth:`write`, and backends that can
+    enumerate their contents set :attr:`listable` and implement
+    :meth:`iter_files`. Otherwise both raise :class:`io.UnsupportedOperation`.
+    """
+
+    writable: bool = False
+    listable: bool = False
 
     @abstractmethod
     def open(self, path: str) -> BinaryIO:
@@ -18,15 +52,243 @@ class StorageBackend(ABC):
     def exists(self, path: str) -> bool:
         """Return whether the media asset exists."""
 
+    def write(self, path: str, data: Buffer, *, content_type: Optional[str] = None) -> None:
+        """Store ``data`` at ``path``, replacing any existing file atomically."""
+
+        raise io.UnsupportedOperation(f"{type(self).__name__} is read-only")
+
+    def iter_files(self, prefix: str = "") -> Iterator[tuple[str, StorageStat]]:
+        """Yield every stored file under ``prefix`` with its metadata, in path order."""
+
+        raise io.UnsupportedOperation(f"{type(self).__name__} cannot list files")
+
+    def stat(self, path: str) -> StorageStat:
+        """Return the size (and modification time, if known) of ``path``."""
+
+        with self.open(path) as handle:
+            return StorageStat(size=handle.seek(0, os.SEEK_END))
+
+    def read_range(self, path: str, start: int, end: int) -> Buffer:
+        """Return bytes ``start`` up to (excluding) ``end``, clamped to the file."""
+
+        with self.open(path) as handle:
+            handle.seek(start)
+            return handle.read(max(end - start, 0))
+
+    async def iter_chunks(
+        self,
+        path: str,
+        start: int = 0,
+        end: Optional[int] = None,
+        *,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+    ) -> AsyncIterator[Buffer]:
+        """Yield ``[start, end)`` of ``path`` in chunks, reading off the event loop."""
+
+        handle = await anyio.to_thread.run_sync(self.open, path)
+        try:
+            await anyio.to_thread.run_sync(handle.seek, start)
+            remaining = None if end is None else end - start
+            while remaining is None or remaining > 0:
+                size = chunk_size if remaining is None else min(chunk_size, remaining)
+                chunk = await anyio.to_thread.run_sync(handle.read, size)
+                if not chunk:
+                    return
+                if remaining is not None:
+                    remaining -= len(chunk)
+                yield chunk
+        finally:
+            await anyio.to_thread.run_sync(handle.close)
+
+
+class RangeReader(io.RawIOBase):
+    """Raw, seekable reader over a stored file, serving each read with ``read_range``.
+
+    Wrap it in :class:`io.BufferedReader` to implement :meth:`StorageBackend.open`.
+    """
+
+    def __init__(self, storage: StorageBackend, path: str, size: int) -> None:
+        self._storage = storage
+        self._path = path
+        self._size = size
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._position, io.SEEK_END: self._size}[whence]
+        self._position = max(base + offset, 0)
+        return self._position
+
+    def readinto(self, buffer: Any) -> int:
+        if self._position >= self._size:
+            return 0
+        data = self._storage.read_range(self._path, self._position, self._position + len(buffer))
+        buffer[: len(data)] = data
+        self._position += len(data)
+        return len(data)
+
+    def readall(self) -> bytes:
+        data = bytes(self._storage.read_range(self._path, self._position, self._size))
+        self._position += len(data)
+        return data
+
 
 class LocalStorage(StorageBackend):
-    """Simple local filesystem storage backend."""
+    """Simple local filesystem storage backend.
+
+    Ranged reads return ``memoryview`` slices of a memory map, so callers
+    parse or forward stored bytes without copying them. Maps are kept for
+    the ``max_maps`` most recently read files and replaced when a file's
+    inode, size or modification time changes. Files must therefore be
+    updated by renaming a new file over them, never rewritten in place:
+    views of a file truncated under its map fault when read.
+    """
+
+    writable = True
+    listable = True
 
-    def __init__(self, root: str | Path) -> None:
+    def __init__(self, root: str | Path, *, max_maps: int = 256) -> None:
         self.root = Path(root)
+        self._real_root = os.path.realpath(self.root)
+        self._maps: OrderedDict[str, tuple[tuple[int, int, int], mmap.mmap]] = OrderedDict()
+        self._max_maps = max_maps
+        self._lock = threading.Lock()
+
+    def resolve(self, path: str) -> Path:
+        """Return the file for ``path``, refusing paths that escape the root.
+
+        The check is lexical, so it costs no system calls; symlinks placed
+        inside the root by an operator are followed.
+        """
+
+        return Path(self._real_path(path))
+
+    def _real_path(self, path: str) -> str:
+        resolved = os.path.normpath(os.path.join(self._real_root, path))
+        if not resolved.startswith(self._real_root + os.sep):
+            raise FileNotFoundError(path)
+        return resolved
 
     def open(self, path: str) -> BinaryIO:
-        return (self.root / path).open("rb")
+        return self.resolve(path).open("rb")
 
     def exists(self, path: str) -> bool:
-        return (self.root / path).exists()
+        try:
+            return self.resolve(path).is_file()
+        except FileNotFoundError:
+            return False
+
+    def write(self, path: str, data: Buffer, *, content_type: Optional[str] = None) -> None:
+        """Write to a temporary file beside ``path`` and rename it into place."""
+
+        target = self._real_path(path)
+        directory = os.path.dirname(target)
+        os.makedirs(directory, exist_ok=True)
+        descriptor, temporary = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+        try:
+            with os.fdopen(descriptor, "wb") as handle:
+                handle.write(data)
+            os.chmod(temporary, 0o644)
+            os.replace(temporary, target)
+        except BaseException:
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(temporary)
+            raise
+
+    def iter_files(self, prefix: str = "") -> Iterator[tuple[str, StorageStat]]:
+        top = self._real_root
+        for directory, directories, files in os.walk(top):
+            directories.sort()
+            relative = os.path.relpath(directory, top)
+            for name in sorted(files):
+                if name.startswith(".tmp-"):
+                    continue
+                path = name if relative == "." else f"{relative}/{name}".replace(os.sep, "/")
+                if not path.startswith(prefix):
+                    continue
+                result = os.stat(os.path.join(directory, name))
+                yield path, StorageStat(size=result.st_size, mtime=result.st_mtime)
+
+    def stat(self, path: str) -> StorageStat:
+        result = self.resolve(path).stat()
+        return StorageStat(size=result.st_size, mtime=result.st_mtime)
+
+    def _map(self, path: str) -> Optional[mmap.mmap]:
+        """Return a read-only map of ``path``, or ``None`` for an empty file."""
+
+        resolved = self._real_path(path)
+        result = os.stat(resolved)
+        version = (result.st_ino, result.st_size, result.st_mtime_ns)
+        with self._lock:
+            cached = self._maps.get(resolved)
+            if cached is not None and cached[0] == version:
+                self._maps.move_to_end(resolved)
+                return cached[1]
+        if result.st_size == 0:
+            return None
+
+        with open(resolved, "rb") as handle:
+            result = os.fstat(handle.fileno())
+            if result.st_size == 0:
+                return None
+            mapped = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        with self._lock:
+            self._maps[resolved] = ((result.st_ino, result.st_size, result.st_mtime_ns), mapped)
+            self._maps.move_to_end(resolved)
+            # Evicted maps are not closed: slices handed out may still
+            # reference them, and the map is released with the last one.
+            while len(self._maps) > self._max_maps:
+                self._maps.popitem(last=False)
+        return mapped
+
+    def read_range(self, path: str, start: int, end: int) -> Buffer:
+        mapped = self._map(path)
+        if mapped is None:
+            return b""
+        return memoryview(mapped)[max(start, 0):max(min(end, len(mapped)), 0)]
+
+    async def iter_chunks(
+        self,
+        path: str,
+        start: int = 0,
+        end: Optional[int] = None,
+        *,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+    ) -> AsyncIterator[Buffer]:
+        mapped = await anyio.to_thread.run_sync(self._map, path)
+        if mapped is None:
+            return
+        end = len(mapped) if end is None else min(end, len(mapped))
+        view = memoryview(mapped)
+        offset = max(start, 0)
+        while offset < end:
+            stop = min(offset + chunk_size, end)
+            # Fault the pages in from a worker thread so a cold read does not
+            # stall the event loop when the consumer touches the slice.
+            await anyio.to_thread.run_sync(_prefetch, mapped, offset, stop)
+            yield view[offset:stop]
+            offset = stop
+
+    def close(self) -> None:
+        """Forget cached maps (they are released once no slice uses them)."""
+
+        with self._lock:
+            self._maps.clear()
+
+
+def _prefetch(mapped: mmap.mmap, start: int, stop: int) -> None:
+    """Read ``[start, stop)`` of ``mapped`` into memory by touching each page."""
+
+    page = mmap.PAGESIZE
+    aligned = start - start % page
+    mapped.madvise(mmap.MADV_WILLNEED, aligned, stop - aligned)
+    for offset in range(aligned, stop, page):
+        mapped[offset]
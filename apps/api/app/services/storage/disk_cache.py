@@ -0,0 +1,336 @@
+"""Local disk read-through cache in front of a remote storage backend.
+
+:class:`DiskCachedStorage` keeps the blocks of remote files it has served in
+a local directory, so repeated range reads of popular audiobooks do not go
+back to the object store. Files are split into aligned ``block_size`` blocks
+and each block is stored as its own file, named after the file's path, size
+and modification time: a replaced object gets new blocks and the old ones
+age out.
+
+Blocks are written to a temporary file and renamed into place, so readers,
+other threads and other worker processes sharing the directory never see a
+partial block. Within a process, concurrent misses for one block wait for a
+single fetch.
+
+The directory is kept under ``max_bytes`` across all the processes sharing
+it. A hit touches the block's modification time, so the times order blocks
+by their last use in any process. Each process sweeps the directory after it
+has written a sixteenth of ``max_bytes``. The sweep holds an ``flock`` on
+``.lock`` in the directory, totals the block files and removes the least
+recently used ones until a sixteenth of the cap is free again, so a full
+cache is swept once per sixteenth written rather than on every miss. Between
+sweeps the directory can exceed the cap by at most a sixteenth of it for
+every process but one.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import fcntl
+import hashlib
+import io
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import AsyncIterator, Iterator
+from dataclasses import dataclass, replace
+from pathlib import Path
+from typing import BinaryIO, Optional
+
+import anyio
+
+from .base import DEFAULT_CHUNK_SIZE, Buffer, RangeReader, StorageBackend, StorageStat
+
+logger = logging.getLogger("app.storage.disk_cache")
+
+DEFAULT_BLOCK_SIZE = 1024 * 1024
+STALE_TEMPORARY_SECONDS = 3600.0
+SWEEP_FRACTION = 16
+LOCK_NAME = ".lock"
+
+
+@dataclass(slots=True)
+class DiskCacheStats:
+    """Counters of a disk cache since it was created."""
+
+    hits: int = 0
+    misses: int = 0
+    hit_bytes: int = 0
+    miss_bytes: int = 0
+    evictions: int = 0
+    evicted_bytes: int = 0
+    cached_bytes: int = 0
+
+    @property
+    def hit_ratio(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class DiskCachedStorage(StorageBackend):
+    """Serve reads of ``backend`` from local disk blocks, fetching misses once."""
+
+    def __init__(
+        self,
+        backend: StorageBackend,
+        root: str | Path,
+        *,
+        max_bytes: int,
+        block_size: int = DEFAULT_BLOCK_SIZE,
+        stat_ttl_seconds: float = 60.0,
+    ) -> None:
+        self.backend = backend
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.block_size = block_size
+        self._stat_ttl = stat_ttl_seconds
+        self._stats_cache: dict[str, tuple[float, StorageStat]] = {}
+        self._blocks: OrderedDict[str, int] = OrderedDict()
+        self._fills: dict[str, threading.Lock] = {}
+        self._counters = DiskCacheStats()
+        self._lock = threading.Lock()
+        self._sweep_lock = threading.Lock()
+        self._sweep_bytes = max_bytes // SWEEP_FRACTION
+        self._low_water = max_bytes - self._sweep_bytes
+        self._written = 0
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._sweep()
+
+    def __repr__(self) -> str:  # pragma: no cover - debug helper
+        return f"DiskCachedStorage({self.backend!r}, root={str(self.root)!r})"
+
+    def _scan(self) -> list[tuple[float, str, int]]:
+        """Return ``(mtime, name, size)`` of every block, dropping abandoned temporaries."""
+
+        found: list[tuple[float, str, int]] = []
+        now = time.time()
+        for directory, _, files in os.walk(self.root):
+            for name in files:
+                full = os.path.join(directory, name)
+                try:
+                    result = os.stat(full)
+                except FileNotFoundError:
+                    continue
+                if name.startswith(".tmp-"):
+                    if now - result.st_mtime > STALE_TEMPORARY_SECONDS:
+                        with contextlib.suppress(FileNotFoundError):
+                            os.unlink(full)
+                    continue
+                if directory == str(self.root) and name == LOCK_NAME:
+                    continue
+                found.append((result.st_mtime, os.path.relpath(full, self.root), result.st_size))
+        return found
+
+    def _sweep(self) -> None:
+        """Trim the shared directory to its low watermark and re-index what is left.
+
+        Blocks are removed oldest first by modification time. Ties, common
+        with coarse file timestamps, are broken by this process's own LRU
+        order; blocks it has not seen count as older than the ones it has.
+        """
+
+        with self._sweep_lock, open(self.root / LOCK_NAME, "a+b") as lock_file:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            found = self._scan()
+            with self._lock:
+                rank = {name: index for index, name in enumerate(self._blocks)}
+                self._written = 0
+            found.sort(key=lambda block: (block[0], rank.get(block[1], -1)))
+            total = sum(size for _, _, size in found)
+            evicted: list[tuple[str, int]] = []
+            for _, name, size in found:
+                if total <= self._low_water:
+                    break
+                with contextlib.suppress(FileNotFoundError):
+                    os.unlink(self.root / name)
+                evicted.append((name, size))
+                total -= size
+
+        gone = {name for name, _ in evicted}
+        with self._lock:
+            seen = {name for _, name, _ in found}
+            blocks: OrderedDict[str, int] = OrderedDict(
+                (name, size) for _, name, size in found if name not in gone
+            )
+            # Blocks stored by other threads after the scan stay indexed.
+            for name, size in self._blocks.items():
+                if name not in seen:
+                    blocks[name] = size
+            self._blocks = blocks
+            self._counters.cached_bytes = sum(blocks.values())
+            self._counters.evictions += len(evicted)
+            self._counters.evicted_bytes += sum(size for _, size in evicted)
+
+    def stats(self) -> DiskCacheStats:
+        """Return a snapshot of the hit, miss and eviction counters."""
+
+        with self._lock:
+            return replace(self._counters)
+
+    # Metadata ---------------------------------------------------------------
+
+    def stat(self, path: str) -> StorageStat:
+        now = time.monotonic()
+        cached = self._stats_cache.get(path)
+        if cached is not None and cached[0] > now:
+            return cached[1]
+        stat = self.backend.stat(path)
+        self._stats_cache[path] = (now + self._stat_ttl, stat)
+        return stat
+
+    def exists(self, path: str) -> bool:
+        try:
+            self.stat(path)
+        except FileNotFoundError:
+            return False
+        return True
+
+    @property
+    def writable(self) -> bool:  # type: ignore[override]
+        return self.backend.writable
+
+    @property
+    def listable(self) -> bool:  # type: ignore[override]
+        return self.backend.listable
+
+    def iter_files(self, prefix: str = "") -> Iterator[tuple[str, StorageStat]]:
+        return self.backend.iter_files(prefix)
+
+    def write(self, path: str, data: Buffer, *, content_type: Optional[str] = None) -> None:
+        self.backend.write(path, data, content_type=content_type)
+        self._stats_cache.pop(path, None)
+
+    # Blocks -----------------------------------------------------------------
+
+    def _block_name(self, path: str, stat: StorageStat, index: int) -> str:
+        key = hashlib.sha256(f"{path}\0{stat.size}\0{stat.mtime}".encode("utf-8")).hexdigest()[:40]
+        return os.path.join(key[:2], f"{key}-{index}")
+
+    def _read_block(self, name: str) -> Optional[bytes]:
+        try:
+            with open(self.root / name, "rb", buffering=0) as handle:
+                data = handle.readall()
+        except FileNotFoundError:
+            with self._lock:
+                size = self._blocks.pop(name, None)
+                if size is not None:
+                    self._counters.cached_bytes -= size
+            return None
+        with contextlib.suppress(OSError):
+            os.utime(self.root / name)
+        with self._lock:
+            if name in self._blocks:
+                self._blocks.move_to_end(name)
+            else:
+                # Written by another process sharing the directory.
+                self._blocks[name] = len(data)
+                self._counters.cached_bytes += len(data)
+            self._counters.hits += 1
+            self._counters.hit_bytes += len(data)
+        return data
+
+    def _store_block(self, name: str, data: bytes) -> None:
+        target = self.root / name
+        target.parent.mkdir(exist_ok=True)
+        descriptor, temporary = tempfile.mkstemp(dir=target.parent, prefix=".tmp-")
+        try:
+            with os.fdopen(descriptor, "wb") as handle:
+                handle.write(data)
+            os.replace(temporary, target)
+        except BaseException:
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(temporary)
+            raise
+        with self._lock:
+            previous = self._blocks.pop(name, None)
+            self._counters.cached_bytes += len(data) - (previous or 0)
+            self._blocks[name] = len(data)
+            self._written += len(data)
+            due = self._written >= self._sweep_bytes
+        if due:
+            self._sweep()
+
+    def _block(self, path: str, stat: StorageStat, index: int) -> bytes:
+        """Return block ``index`` of ``path`` from disk, fetching it on a miss."""
+
+        name = self._block_name(path, stat, index)
+        data = self._read_block(name)
+        if data is not None:
+            return data
+
+        with self._lock:
+            fill = self._fills.setdefault(name, threading.Lock())
+        try:
+            with fill:
+                # Another thread may have fetched the block while this one waited.
+                data = self._read_block(name)
+                if data is not None:
+                    return data
+                start = index * self.block_size
+                end = min(start + self.block_size, stat.size)
+                data = bytes(self.backend.read_range(path, start, end))
+                if len(data) != end - start:
+                    raise OSError(f"{path} returned {len(data)} bytes for block {index}, expected {end - start}")
+                with self._lock:
+                    self._counters.misses += 1
+                    self._counters.miss_bytes += len(data)
+                try:
+                    self._store_block(name, data)
+                except OSError:
+                    logger.warning("could not cache block %d of %s", index, path, exc_info=True)
+                return data
+        finally:
+            with self._lock:
+                self._fills.pop(name, None)
+
+    # Reads ------------------------------------------------------------------
+
+    def read_range(self, path: str, start: int, end: int) -> Buffer:
+        stat = self.stat(path)
+        start, end = max(start, 0), min(end, stat.size)
+        if start >= end:
+            return b""
+        first, last = start // self.block_size, (end - 1) // self.block_size
+        offset = first * self.block_size
+        if first == last:
+            return memoryview(self._block(path, stat, first))[start - offset : end - offset]
+        joined = b"".join(self._block(path, stat, index) for index in range(first, last + 1))
+        return memoryview(joined)[start - offset : end - offset]
+
+    def open(self, path: str) -> BinaryIO:
+        raw = RangeReader(self, path, self.stat(path).size)
+        return io.BufferedReader(raw, buffer_size=self.block_size)  # type: ignore[return-value]
+
+    async def iter_chunks(
+        self,
+        path: str,
+        start: int = 0,
+        end: Optional[int] = None,
+        *,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+    ) -> AsyncIterator[Buffer]:
+        stat = await anyio.to_thread.run_sync(self.stat, path)
+        start, end = max(start, 0), stat.size if end is None else min(end, stat.size)
+        offset = start
+        while offset < end:
+            index = offset // self.block_size
+            block = memoryview(await anyio.to_thread.run_sync(self._block, path, stat, index))
+            block_start = index * self.block_size
+            stop = min(block_start + len(block), end)
+            while offset < stop:
+                step = min(offset + chunk_size, stop)
+                yield block[offset - block_start : step - block_start]
+                offset = step
+
+    def close(self) -> None:
+        """Close the wrapped backend."""
+
+        close = getattr(self.backend, "close", None)
+        if close is not None:
+            close()
+
+
+__all__ = ["DEFAULT_BLOCK_SIZE", "DiskCacheStats", "DiskCachedStorage"]
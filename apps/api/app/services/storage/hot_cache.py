@@ -0,0 +1,337 @@
+"""In-memory cache of hot byte ranges in front of a storage backend.
+
+Most listeners fetch the same sampler segments and the opening of the same
+chapters. :class:`HotSegmentCache` keeps those ranges in process memory,
+keyed by ``(path, start, end)``, and serves them as ``memoryview`` slices of
+the cached bytes without copying.
+
+Memory is bounded by ``max_bytes`` and shared by every cached range. Eviction
+follows W-TinyLFU: new ranges enter a small LRU window, and a range leaving
+the window only displaces ranges of the main LRU area when a count-min
+sketch of recent requests says it is requested more often than they are.
+One-off reads of long chapters therefore pass through without flushing the
+sampler segments everybody asks for. The sketch halves its counters every
+``10 * capacity`` requests, so past popularity fades.
+
+Cached ranges carry the size and modification time of their file, checked
+against a ``stat`` remembered for ``stat_ttl_seconds``; a replaced file is
+read again once that expires.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import AsyncIterator, Iterator
+from dataclasses import dataclass, replace
+from typing import BinaryIO, Optional
+
+import anyio
+
+from .base import DEFAULT_CHUNK_SIZE, Buffer, StorageBackend, StorageStat
+
+RangeKey = tuple[str, int, int]
+
+_SKETCH_DEPTH = 4
+_SKETCH_SEEDS = (0x9E3779B97F4A7C15, 0xC2B2AE3D27D4EB4F, 0x165667B19E3779F9, 0xD6E8FEB86659FD93)
+_SKETCH_MAX = 15
+_MASK64 = (1 << 64) - 1
+
+
+class FrequencySketch:
+    """Count-min sketch of recent request frequencies, with periodic halving."""
+
+    def __init__(self, capacity: int) -> None:
+        width = 16
+        while width < capacity:
+            width <<= 1
+        self._width_mask = width - 1
+        self._counters = [bytearray(width) for _ in range(_SKETCH_DEPTH)]
+        self._sample_size = 10 * width
+        self._additions = 0
+
+    def _indexes(self, key: RangeKey) -> Iterator[int]:
+        # Not hash(): string hashes change with each process's PYTHONHASHSEED.
+        path, start, end = key
+        digest = hashlib.blake2b(f"{path}\0{start}\0{end}".encode("utf-8"), digest_size=8).digest()
+        value = int.from_bytes(digest, "little")
+        for seed in _SKETCH_SEEDS:
+            mixed = (value * seed) & _MASK64
+            yield (mixed ^ (mixed >> 31)) & self._width_mask
+
+    def increment(self, key: RangeKey) -> None:
+        for row, index in zip(self._counters, self._indexes(key)):
+            if row[index] < _SKETCH_MAX:
+                row[index] += 1
+        self._additions += 1
+        if self._additions >= self._sample_size:
+            self._age()
+
+    def estimate(self, key: RangeKey) -> int:
+        return min(row[index] for row, index in zip(self._counters, self._indexes(key)))
+
+    def _age(self) -> None:
+        halve = bytes(value >> 1 for value in range(256))
+        for row in self._counters:
+            row[:] = row.translate(halve)
+        self._additions //= 2
+
+
+@dataclass(slots=True)
+class HotCacheStats:
+    """Counters of a hot segment cache since it was created."""
+
+    hits: int = 0
+    misses: int = 0
+    hit_bytes: int = 0
+    miss_bytes: int = 0
+    admitted: int = 0
+    rejected: int = 0
+    evictions: int = 0
+    cached_bytes: int = 0
+    entries: int = 0
+
+    @property
+    def hit_ratio(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+@dataclass(frozen=True, slots=True)
+class _Entry:
+    data: bytes
+    stat: StorageStat
+
+
+class HotSegmentCache(StorageBackend):
+    """Serve repeated range reads of ``backend`` from a shared memory budget."""
+
+    def __init__(
+        self,
+        backend: StorageBackend,
+        *,
+        max_bytes: int,
+        max_entry_bytes: Optional[int] = None,
+        window_fraction: float = 0.01,
+        stat_ttl_seconds: float = 5.0,
+        expected_entry_bytes: int = 64 * 1024,
+    ) -> None:
+        self.backend = backend
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes if max_entry_bytes is not None else max(max_bytes // 16, 1)
+        self._window_max = max(int(max_bytes * window_fraction), self.max_entry_bytes)
+        self._main_max = max(max_bytes - self._window_max, 0)
+        self._window: OrderedDict[RangeKey, _Entry] = OrderedDict()
+        self._main: OrderedDict[RangeKey, _Entry] = OrderedDict()
+        self._window_bytes = 0
+        self._main_bytes = 0
+        self._sketch = FrequencySketch(max(max_bytes // expected_entry_bytes, 1))
+        self._stat_ttl = stat_ttl_seconds
+        self._stats_cache: dict[str, tuple[float, StorageStat]] = {}
+        self._counters = HotCacheStats()
+        self._lock = threading.Lock()
+
+    def __repr__(self) -> str:  # pragma: no cover - debug helper
+        return f"HotSegmentCache({self.backend!r}, max_bytes={self.max_bytes})"
+
+    def stats(self) -> HotCacheStats:
+        """Return a snapshot of the hit, miss and admission counters."""
+
+        with self._lock:
+            return replace(
+                self._counters,
+                cached_bytes=self._window_bytes + self._main_bytes,
+                entries=len(self._window) + len(self._main),
+            )
+
+    # Metadata ---------------------------------------------------------------
+
+    def _fresh_stat(self, path: str) -> Optional[StorageStat]:
+        cached = self._stats_cache.get(path)
+        if cached is not None and cached[0] > time.monotonic():
+            return cached[1]
+        return None
+
+    def stat(self, path: str) -> StorageStat:
+        stat = self._fresh_stat(path)
+        if stat is None:
+            stat = self.backend.stat(path)
+            self._stats_cache[path] = (time.monotonic() + self._stat_ttl, stat)
+        return stat
+
+    def exists(self, path: str) -> bool:
+        try:
+            self.stat(path)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def open(self, path: str) -> BinaryIO:
+        return self.backend.open(path)
+
+    @property
+    def writable(self) -> bool:  # type: ignore[override]
+        return self.backend.writable
+
+    @property
+    def listable(self) -> bool:  # type: ignore[override]
+        return self.backend.listable
+
+    def iter_files(self, prefix: str = "") -> Iterator[tuple[str, StorageStat]]:
+        return self.backend.iter_files(prefix)
+
+    def write(self, path: str, data: Buffer, *, content_type: Optional[str] = None) -> None:
+        self.backend.write(path, data, content_type=content_type)
+        self.invalidate(path)
+
+    def invalidate(self, path: str) -> None:
+        """Drop every cached range of ``path`` and its remembered ``stat``."""
+
+        self._stats_cache.pop(path, None)
+        with self._lock:
+            for area in (self._window, self._main):
+                for key in [key for key in area if key[0] == path]:
+                    self._remove(area, key)
+
+    def reset(self) -> None:
+        """Drop every cached range (primarily for tests)."""
+
+        self._stats_cache.clear()
+        with self._lock:
+            self._window.clear()
+            self._main.clear()
+            self._window_bytes = self._main_bytes = 0
+
+    # Cache ------------------------------------------------------------------
+
+    def _remove(self, area: OrderedDict[RangeKey, _Entry], key: RangeKey) -> None:
+        entry = area.pop(key)
+        if area is self._window:
+            self._window_bytes -= len(entry.data)
+        else:
+            self._main_bytes -= len(entry.data)
+
+    def _lookup(self, key: RangeKey, stat: StorageStat, *, record_miss: bool = True) -> Optional[memoryview]:
+        """Return the cached bytes of ``key`` and count the request (caller holds the lock)."""
+
+        for area in (self._window, self._main):
+            entry = area.get(key)
+            if entry is None:
+                continue
+            if entry.stat != stat:
+                self._remove(area, key)
+                break
+            area.move_to_end(key)
+            self._sketch.increment(key)
+            self._counters.hits += 1
+            self._counters.hit_bytes += len(entry.data)
+            return memoryview(entry.data)
+        if record_miss:
+            self._sketch.increment(key)
+            self._counters.misses += 1
+        return None
+
+    def _admit(self, key: RangeKey, entry: _Entry) -> None:
+        """Add a fetched range to the window, moving the window's overflow to the main area."""
+
+        size = len(entry.data)
+        self._counters.miss_bytes += size
+        if size > self.max_entry_bytes or key in self._window or key in self._main:
+            return
+        self._window[key] = entry
+        self._window_bytes += size
+        while self._window_bytes > self._window_max:
+            candidate, candidate_entry = self._window.popitem(last=False)
+            self._window_bytes -= len(candidate_entry.data)
+            self._promote(candidate, candidate_entry)
+
+    def _promote(self, key: RangeKey, entry: _Entry) -> None:
+        size = len(entry.data)
+        needed = self._main_bytes + size - self._main_max
+        victims: list[RangeKey] = []
+        if needed > 0:
+            frequency = self._sketch.estimate(key)
+            for victim, victim_entry in self._main.items():
+                if self._sketch.estimate(victim) >= frequency:
+                    self._counters.rejected += 1
+                    return
+                victims.append(victim)
+                needed -= len(victim_entry.data)
+                if needed <= 0:
+                    break
+            if needed > 0:
+                self._counters.rejected += 1
+                return
+        for victim in victims:
+            self._remove(self._main, victim)
+        self._counters.evictions += len(victims)
+        self._counters.admitted += 1
+        self._main[key] = entry
+        self._main_bytes += size
+
+    def _span(self, stat: StorageStat, start: int, end: Optional[int]) -> tuple[int, int]:
+        return max(start, 0), stat.size if end is None else min(end, stat.size)
+
+    def cached_range(self, path: str, start: int, end: Optional[int]) -> Optional[memoryview]:
+        """Return a cached range without touching the backend, or ``None``.
+
+        Only hits are counted; a caller that gets ``None`` reads the range
+        with :meth:`read_range`, which counts the miss.
+        """
+
+        stat = self._fresh_stat(path)
+        if stat is None:
+            return None
+        start, end = self._span(stat, start, end)
+        with self._lock:
+            return self._lookup((path, start, end), stat, record_miss=False)
+
+    def read_range(self, path: str, start: int, end: int) -> Buffer:
+        stat = self.stat(path)
+        start, end = self._span(stat, start, end)
+        if start >= end:
+            return b""
+        key = (path, start, end)
+        with self._lock:
+            cached = self._lookup(key, stat)
+        if cached is not None:
+            return cached
+        data = bytes(self.backend.read_range(path, start, end))
+        with self._lock:
+            self._admit(key, _Entry(data, stat))
+        return memoryview(data)
+
+    async def iter_chunks(
+        self,
+        path: str,
+        start: int = 0,
+        end: Optional[int] = None,
+        *,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+    ) -> AsyncIterator[Buffer]:
+        # Hits are served without a thread hop.
+        data = self.cached_range(path, start, end)
+        if data is None:
+            stat = await anyio.to_thread.run_sync(self.stat, path)
+            start, end = self._span(stat, start, end)
+            if end - start > self.max_entry_bytes:
+                with self._lock:
+                    self._counters.misses += 1
+                async for chunk in self.backend.iter_chunks(path, start, end, chunk_size=chunk_size):
+                    yield chunk
+                return
+            data = memoryview(await anyio.to_thread.run_sync(self.read_range, path, start, end))
+        for offset in range(0, len(data), chunk_size):
+            yield data[offset : offset + chunk_size]
+
+    def close(self) -> None:
+        """Close the wrapped backend."""
+
+        close = getattr(self.backend, "close", None)
+        if close is not None:
+            close()
+
+
+__all__ = ["FrequencySketch", "HotCacheStats", "HotSegmentCache"]
@@ -0,0 +1,4 @@
+"""Standalone performance benchmarks for the Audiovook API.
+
+Run them from ``apps/api`` with ``python -m benchmarks.<name> --help``.
+"""
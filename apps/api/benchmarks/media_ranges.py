@@ -0,0 +1,184 @@
+"""Measure ranged audio delivery from one API worker under many listeners.
+
+The benchmark writes a ``--size-mb`` audio file to a temporary directory,
+starts a single uvicorn worker serving only the media router in a child
+process and runs ``--listeners`` concurrent clients. Each client keeps
+requesting the next ``--range-kb`` of the file, as a player buffering ahead
+does, for ``--seconds``. It reports throughput, request rate, latency and the
+worker's CPU time per gigabyte sent.
+
+``--backend stream`` serves the file through a non-local storage wrapper, to
+compare the ``os.pread`` path with the chunked fallback used for other
+backends.
+
+Usage::
+
+    python -m benchmarks.media_ranges --listeners 500 --seconds 20
+    python -m benchmarks.media_ranges --backend stream
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import BinaryIO
+
+import uvicorn
+from fastapi import FastAPI
+
+from app.api import media
+from app.core.config import get_settings
+from app.services.media_signer import sign_media_url
+from app.services.storage import LocalStorage, StorageBackend, configure_storage
+
+SECRET = "benchmark-secret"
+FILE_NAME = "book.mp3"
+
+
+class StreamingStorage(StorageBackend):
+    """Expose a local directory as if it were a remote backend."""
+
+    def __init__(self, root: str) -> None:
+        self.local = LocalStorage(root)
+
+    def open(self, path: str) -> BinaryIO:
+        return self.local.open(path)
+
+    def exists(self, path: str) -> bool:
+        return self.local.exists(path)
+
+
+def serve(root: str, port: int, backend: str) -> None:
+    get_settings().hmac_media_secret = SECRET
+    configure_storage(LocalStorage(root) if backend == "local" else StreamingStorage(root))
+    app = FastAPI()
+    app.include_router(media.router, prefix="/api")
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="warning", access_log=False)
+
+
+def _free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def _request(
+    reader: asyncio.StreamReader, writer: asyncio.StreamWriter, target: str, headers: str
+) -> tuple[int, int]:
+    """Send one keep-alive GET and return its status and body length."""
+
+    writer.write(f"GET {target} HTTP/1.1\r\nHost: bench\r\n{headers}\r\n".encode("latin-1"))
+    await writer.drain()
+    head = await reader.readuntil(b"\r\n\r\n")
+    status = int(head.split(b" ", 2)[1])
+    length = 0
+    for line in head.split(b"\r\n")[1:]:
+        name, _, value = line.partition(b":")
+        if name.lower() == b"content-length":
+            length = int(value)
+    await reader.readexactly(length)
+    return status, length
+
+
+async def _connect(port: int) -> tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+    for _ in range(100):
+        try:
+            return await asyncio.open_connection("127.0.0.1", port, limit=1 << 20)
+        except OSError:
+            await asyncio.sleep(0.1)
+    raise RuntimeError("server did not start")
+
+
+async def _listener(
+    port: int, target: str, size: int, chunk: int, offset: int, deadline: float, latencies: list[float]
+) -> int:
+    # A plain HTTP/1.1 client: a full-featured one costs more CPU per
+    # request than the worker being measured.
+    reader, writer = await _connect(port)
+    sent = 0
+    try:
+        while time.perf_counter() < deadline:
+            end = min(offset + chunk, size) - 1
+            started = time.perf_counter()
+            status, length = await _request(reader, writer, target, f"Range: bytes={offset}-{end}\r\n")
+            latencies.append(time.perf_counter() - started)
+            if status != 206:
+                raise RuntimeError(f"unexpected status {status}")
+            sent += length
+            offset = end + 1 if end + 1 < size else 0
+    finally:
+        writer.close()
+    return sent
+
+
+async def _drive(url: str, args: argparse.Namespace, size: int) -> tuple[int, list[float], float]:
+    target = sign_media_url(SECRET, url, datetime.now() + timedelta(hours=1))
+    reader, writer = await _connect(args.port)
+    await _request(reader, writer, target, "Range: bytes=0-0\r\n")
+    writer.close()
+
+    latencies: list[float] = []
+    started = time.perf_counter()
+    deadline = started + args.seconds
+    step = size // args.listeners
+    sent = await asyncio.gather(
+        *(
+            _listener(args.port, target, size, args.range_kb * 1024, index * step, deadline, latencies)
+            for index in range(args.listeners)
+        )
+    )
+    return sum(sent), latencies, time.perf_counter() - started
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--listeners", type=int, default=200)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--size-mb", type=int, default=64)
+    parser.add_argument("--range-kb", type=int, default=256)
+    parser.add_argument("--backend", choices=("local", "stream"), default="local")
+    parser.add_argument("--serve", metavar="ROOT", help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, default=0, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve, args.port, args.backend)
+        return
+
+    args.port = args.port or _free_port()
+    with tempfile.TemporaryDirectory() as tmp:
+        size = args.size_mb * 1024 * 1024
+        Path(tmp, FILE_NAME).write_bytes(os.urandom(size))
+        server = subprocess.Popen(
+            [sys.executable, "-m", "benchmarks.media_ranges", "--serve", tmp, "--port", str(args.port),
+             "--backend", args.backend]
+        )
+        try:
+            total, latencies, elapsed = asyncio.run(_drive(f"/api/media/{FILE_NAME}", args, size))
+        finally:
+            server.send_signal(signal.SIGTERM)
+            _, _, usage = os.wait4(server.pid, 0)
+
+    cpu = usage.ru_utime + usage.ru_stime
+    latencies.sort()
+    print(
+        f"{args.backend}: {args.listeners} listeners, {len(latencies):,} requests in {elapsed:.1f}s\n"
+        f"  throughput {total / elapsed / 1e6:.1f} MB/s, {len(latencies) / elapsed:,.0f} req/s per worker\n"
+        f"  latency p50 {statistics.median(latencies) * 1000:.1f} ms, "
+        f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:.1f} ms\n"
+        f"  worker CPU {cpu:.1f}s ({cpu / (total / 1e9):.1f} CPU-s per GB sent)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+"""Measure the incremental listening rollup over a large synthetic history.
+
+The benchmark creates the schema in an empty database and generates
+``--sessions`` finished play sessions spread over ``--days`` days and
+``--products`` products, plus ``--completions`` completed progress rows, with
+set-based SQL. It then times:
+
+1. the initial backfill, one transaction per ``--window-hours``;
+2. an incremental run after ``--late`` sessions that started days earlier
+   end (late updates) alongside as many new ones;
+3. a 30-day product report read from the rollup, compared with the same
+   report aggregated ad hoc from ``play_session``.
+
+After each run the rollup totals are checked against a full aggregate.
+
+Usage::
+
+    python -m benchmarks.rollup --sessions 20000000
+    python -m benchmarks.rollup --url postgresql+psycopg://avook@localhost/bench --sessions 20000000
+"""
+
+from __future__ import annotations
+
+import argparse
+import tempfile
+import time
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+
+from sqlalchemy import create_engine, func, select, text
+from sqlalchemy.engine import Connection, Engine
+
+from app.models import metadata
+from app.services.analytics import (
+    QR_TABLE,
+    ROLLUP_TABLE,
+    SESSION_TABLE,
+    read_listening_rollup,
+    update_listening_rollup,
+)
+
+START = datetime(2026, 1, 1, tzinfo=timezone.utc)
+CHUNK = 1_000_000
+QR_CODES = 50_000
+
+_POSTGRES_QRS = """
+INSERT INTO qr_code (id, token, status, product_id)
+SELECT md5('qr' || g)::uuid, 'BENCH-' || g, 'ACTIVE', 1 + g % :products
+FROM generate_series(0, :count - 1) AS g
+"""
+_POSTGRES_DEVICE = "INSERT INTO device (id, ua_hash) VALUES (md5('device')::uuid, 'bench')"
+_POSTGRES_SESSIONS = """
+INSERT INTO play_session (id, qr_id, device_id, started_at, ended_at, ip_hash)
+SELECT md5(:tag || g)::uuid, md5('qr' || (g % :qrs))::uuid, md5('device')::uuid,
+       s.started, s.started + ((g % 3600) + 60) * interval '1 second', 'ip'
+FROM (
+    SELECT g, :start + (g::float8 * :step) * interval '1 second' AS started
+    FROM generate_series(:low, :high - 1) AS g
+) AS s
+"""
+_POSTGRES_COMPLETIONS = """
+INSERT INTO listening_progress (qr_id, device_id, track_id, position_ms, updated_at, completed_at)
+SELECT md5('qr' || (g % :qrs))::uuid, md5('device')::uuid, 'ch-' || g, 1,
+       :start + (g::float8 * :step) * interval '1 second',
+       :start + (g::float8 * :step) * interval '1 second'
+FROM generate_series(:low, :high - 1) AS g
+"""
+
+# SQLite gives the UUID columns NUMERIC affinity, so generated ids start with
+# a letter to stay text.
+_SQLITE_SEQUENCE = "WITH RECURSIVE seq(g) AS (SELECT :low UNION ALL SELECT g + 1 FROM seq WHERE g + 1 < :high) "
+_SQLITE_QRS = _SQLITE_SEQUENCE + """
+INSERT INTO qr_code (id, token, status, product_id, max_reactivations, created_at)
+SELECT printf('a%031x', g), 'BENCH-' || g, 'ACTIVE', 1 + g % :products, 999, '2026-01-01 00:00:00'
+FROM seq
+"""
+_SQLITE_DEVICE = (
+    "INSERT INTO device (id, ua_hash, created_at) VALUES (printf('d%031x', 0), 'bench', '2026-01-01 00:00:00')"
+)
+_SQLITE_SESSIONS = _SQLITE_SEQUENCE + """
+INSERT INTO play_session (id, qr_id, device_id, started_at, ended_at, ip_hash)
+SELECT printf('%s%031x', :tag, g), printf('a%031x', g % :qrs), printf('d%031x', 0),
+       datetime(:start_epoch + g * :step, 'unixepoch'),
+       datetime(:start_epoch + g * :step + (g % 3600) + 60, 'unixepoch'), 'ip'
+FROM seq
+"""
+_SQLITE_COMPLETIONS = _SQLITE_SEQUENCE + """
+INSERT INTO listening_progress (qr_id, device_id, track_id, position_ms, updated_at, completed_at)
+SELECT printf('a%031x', g % :qrs), printf('d%031x', 0), 'ch-' || g, 1,
+       datetime(:start_epoch + g * :step, 'unixepoch'), datetime(:start_epoch + g * :step, 'unixepoch')
+FROM seq
+"""
+
+
+def _fill(engine: Engine, statement: str, total: int, params: dict[str, object], label: str) -> float:
+    started = time.perf_counter()
+    for low in range(0, total, CHUNK):
+        with engine.begin() as connection:
+            connection.execute(text(statement), {**params, "low": low, "high": min(low + CHUNK, total)})
+        print(f"  {label}: {min(low + CHUNK, total):,}/{total:,}", end="\r", flush=True)
+    elapsed = time.perf_counter() - started
+    print(f"  {label}: {total:,} rows in {elapsed:.1f}s" + " " * 10)
+    return elapsed
+
+
+def _seed(engine: Engine, args: argparse.Namespace, span_seconds: float) -> None:
+    postgres = engine.dialect.name == "postgresql"
+    common = {
+        "qrs": QR_CODES,
+        "products": args.products,
+        "start": START,
+        "start_epoch": START.timestamp(),
+    }
+    with engine.begin() as connection:
+        connection.execute(
+            text(_POSTGRES_QRS if postgres else _SQLITE_QRS),
+            {**common, "count": QR_CODES, "low": 0, "high": QR_CODES},
+        )
+        connection.execute(text(_POSTGRES_DEVICE if postgres else _SQLITE_DEVICE))
+
+    _fill(
+        engine,
+        _POSTGRES_SESSIONS if postgres else _SQLITE_SESSIONS,
+        args.sessions,
+        {**common, "tag": "s" if postgres else "f", "step": span_seconds / args.sessions},
+        "play_session",
+    )
+    _fill(
+        engine,
+        _POSTGRES_COMPLETIONS if postgres else _SQLITE_COMPLETIONS,
+        args.completions,
+        {**common, "step": span_seconds / max(args.completions, 1)},
+        "listening_progress",
+    )
+    with engine.begin() as connection:
+        connection.execute(text("ANALYZE"))
+
+
+def _add_late_sessions(engine: Engine, args: argparse.Namespace, now: datetime) -> None:
+    """Sessions that started days ago and end now, plus brand-new ones."""
+
+    postgres = engine.dialect.name == "postgresql"
+    with engine.begin() as connection:
+        for index in range(args.late):
+            started_late = now - timedelta(days=1 + index % 5, minutes=index % 60)
+            started_new = now - timedelta(minutes=20)
+            for tag, started in (("late", started_late), ("new", started_new)):
+                connection.execute(
+                    text(
+                        "INSERT INTO play_session (id, qr_id, device_id, started_at, ended_at, ip_hash) "
+                        + (
+                            "VALUES (md5(:tag || :i)::uuid, md5('qr' || :qr)::uuid, md5('device')::uuid, "
+                            ":started, :ended, 'ip')"
+                            if postgres
+                            else "VALUES (printf('%s%031x', :prefix, :i), printf('a%031x', :qr), "
+                            "printf('d%031x', 0), :started, :ended, 'ip')"
+                        )
+                    ),
+                    {
+                        "tag": tag,
+                        "prefix": "b" if tag == "late" else "c",
+                        "i": index,
+                        "qr": index % QR_CODES,
+                        "started": started if postgres else started.strftime("%Y-%m-%d %H:%M:%S"),
+                        "ended": (now + timedelta(minutes=5)) if postgres
+                        else (now + timedelta(minutes=5)).strftime("%Y-%m-%d %H:%M:%S"),
+                    },
+                )
+
+
+def _check(connection: Connection, watermark: datetime) -> tuple[int, int]:
+    bound = watermark if connection.dialect.name == "postgresql" else watermark.strftime("%Y-%m-%d %H:%M:%S.%f")
+    expected = connection.execute(
+        select(func.count())
+        .select_from(SESSION_TABLE.join(QR_TABLE, QR_TABLE.c.id == SESSION_TABLE.c.qr_id))
+        .where(SESSION_TABLE.c.ended_at <= bound)
+    ).scalar()
+    rolled = connection.execute(select(func.coalesce(func.sum(ROLLUP_TABLE.c.sessions), 0))).scalar()
+    connection.commit()
+    return int(expected or 0), int(rolled or 0)
+
+
+def _timed_rollup(connection: Connection, now: datetime, window: timedelta, label: str) -> None:
+    started = time.perf_counter()
+    run = update_listening_rollup(connection, now=now, max_window=window)
+    elapsed = time.perf_counter() - started
+    assert run.watermark is not None
+    expected, rolled = _check(connection, run.watermark)
+    status = "ok" if expected == rolled else f"MISMATCH (expected {expected:,})"
+    print(
+        f"{label}: {run.sessions:,} sessions, {run.completions:,} completions in {run.windows} windows, "
+        f"{elapsed:.2f}s; rollup total {rolled:,} {status}"
+    )
+
+
+def _compare_report(connection: Connection, end: date) -> None:
+    start = end - timedelta(days=29)
+    started = time.perf_counter()
+    from_rollup = read_listening_rollup(connection, 1, start, end)
+    rollup_ms = (time.perf_counter() - started) * 1000
+
+    low = datetime.combine(start, datetime.min.time(), timezone.utc)
+    high = datetime.combine(end + timedelta(days=1), datetime.min.time(), timezone.utc)
+    if connection.dialect.name != "postgresql":
+        low, high = low.strftime("%Y-%m-%d %H:%M:%S"), high.strftime("%Y-%m-%d %H:%M:%S")
+    started = time.perf_counter()
+    adhoc = connection.execute(
+        select(func.count())
+        .select_from(SESSION_TABLE.join(QR_TABLE, QR_TABLE.c.id == SESSION_TABLE.c.qr_id))
+        .where(QR_TABLE.c.product_id == 1)
+        .where(SESSION_TABLE.c.started_at >= low)
+        .where(SESSION_TABLE.c.started_at < high)
+        .where(SESSION_TABLE.c.ended_at.is_not(None))
+    ).scalar()
+    adhoc_ms = (time.perf_counter() - started) * 1000
+    connection.commit()
+
+    rolled = sum(entry.sessions for entry in from_rollup.values())
+    print(
+        f"30-day report for product 1: rollup {rollup_ms:.1f} ms ({rolled:,} sessions), "
+        f"ad hoc scan {adhoc_ms:.1f} ms ({adhoc:,} sessions)"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", help="empty database to use (default: a temporary SQLite file)")
+    parser.add_argument("--sessions", type=int, default=20_000_000)
+    parser.add_argument("--completions", type=int, default=2_000_000)
+    parser.add_argument("--products", type=int, default=200)
+    parser.add_argument("--days", type=int, default=180)
+    parser.add_argument("--late", type=int, default=1000)
+    parser.add_argument("--window-hours", type=float, default=24.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        url = args.url or f"sqlite:///{Path(tmp) / 'rollup.db'}"
+        engine = create_engine(url)
+        metadata.create_all(engine)
+        span = timedelta(days=args.days)
+        print(f"Seeding {engine.dialect.name} database")
+        _seed(engine, args, span.total_seconds())
+
+        now = START + span + timedelta(hours=1)
+        window = timedelta(hours=args.window_hours)
+        with engine.connect() as connection:
+            _timed_rollup(connection, now, window, "backfill")
+            _add_late_sessions(engine, args, now)
+            _timed_rollup(connection, now + timedelta(hours=1), window, "incremental")
+            _timed_rollup(connection, now + timedelta(hours=2), window, "idle")
+            _compare_report(connection, (START + span).date())
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""Measure access endpoint throughput on the single-node SQLite deployment mode.
+
+The benchmark creates a fresh database file, seeds QR tokens and drives the
+``/api/access`` endpoints through the ASGI app with many concurrent clients:
+a read-only ``validate`` phase, one ``register`` per token and one
+``reregister`` per token. It prints requests per second, latency percentiles
+and error counts for each phase.
+
+Pass ``--engine plain`` to compare against an untuned SQLite engine
+(rollback journal, deferred transactions, no writer serialisation).
+
+Usage::
+
+    python -m benchmarks.sqlite_access --tokens 2000 --concurrency 32
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import random
+import statistics
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+import httpx
+from sqlmodel import Session, create_engine
+
+from app import create_app
+from app.api.access import enforce_access_rate_limit
+from app.core import migrations
+from app.core.database import configure_engine, create_sqlite_engine
+from app.models import QrCode, QrStatus, metadata
+
+
+async def _run_phase(
+    client: httpx.AsyncClient,
+    name: str,
+    requests: list[tuple[str, dict[str, str]]],
+    concurrency: int,
+) -> None:
+    queue: asyncio.Queue[tuple[str, dict[str, str]]] = asyncio.Queue()
+    for item in requests:
+        queue.put_nowait(item)
+
+    latencies: list[float] = []
+    errors = 0
+
+    async def worker() -> None:
+        nonlocal errors
+        while True:
+            try:
+                path, payload = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            started = time.perf_counter()
+            response = await client.post(path, json=payload)
+            latencies.append(time.perf_counter() - started)
+            if response.status_code >= 500:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    p50 = statistics.median(latencies) * 1000
+    p99 = latencies[int(len(latencies) * 0.99) - 1] * 1000
+    print(
+        f"{name:<11} {len(requests):>7} req {len(requests) / elapsed:>9.0f} req/s "
+        f"p50 {p50:>6.1f} ms  p99 {p99:>7.1f} ms  errors {errors}"
+    )
+
+
+async def _benchmark(args: argparse.Namespace, database_path: Path) -> None:
+    url = f"sqlite:///{database_path}"
+    if args.engine == "tuned":
+        engine = create_sqlite_engine(url)
+    else:
+        engine = create_engine(url, connect_args={"check_same_thread": False})
+    configure_engine(engine)
+    metadata.create_all(engine)
+    migrations._migrations_applied = True
+
+    tokens = [f"BENCH-{index:07d}" for index in range(args.tokens)]
+    with Session(engine) as session:
+        for token in tokens:
+            session.add(QrCode(token=token, status=QrStatus.NEW, product_id=1))
+        session.commit()
+
+    app = create_app()
+    app.dependency_overrides[enforce_access_rate_limit] = lambda: None
+
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        rng = random.Random(42)
+        validate = [
+            ("/api/access/validate", {"token": rng.choice(tokens)})
+            for _ in range(args.tokens * 4)
+        ]
+        register = [
+            ("/api/access/register", {"token": token, "device_id": str(uuid.uuid4())})
+            for token in tokens
+        ]
+        reregister = [
+            ("/api/access/reregister", {"token": token, "new_device_id": str(uuid.uuid4())})
+            for token in tokens
+        ]
+
+        print(f"engine={args.engine} tokens={args.tokens} concurrency={args.concurrency}")
+        await _run_phase(client, "validate", validate, args.concurrency)
+        await _run_phase(client, "register", register, args.concurrency)
+        await _run_phase(client, "reregister", reregister, args.concurrency)
+
+    engine.dispose()
+
+
+def main() -> None:
+    """Entrypoint for the SQLite access benchmark."""
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tokens", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--engine", choices=("tuned", "plain"), default="tuned")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        asyncio.run(_benchmark(args, Path(directory) / "avook.db"))
+
+
+if __name__ == "__main__":  # pragma: no cover - manual execution helper
+    main()
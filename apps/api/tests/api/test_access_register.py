@@ -237,3 +237,20 @@ def test_register_logs_hashed_token(client: TestClient, caplog: pytest.LogCaptur
     assert status_code == 200
     assert expected_hash in caplog.text
     assert token not in caplog.text
+
+
+def test_reregister_cuts_off_the_old_device_immediately(client: TestClient) -> None:
+    token = "DEMO-NEW"
+    device_a = uuid.uuid4()
+    device_b = uuid.uuid4()
+    _post_json(client, "/api/access/register", {"token": token, "device_id": str(device_a)})
+
+    status_code, _ = _post_json(client, "/api/play/start", {"token": token, "device_id": str(device_a)})
+    assert status_code == 200  # caches device A's binding
+
+    _post_json(client, "/api/access/reregister", {"token": token, "new_device_id": str(device_b)})
+
+    status_code, _ = _post_json(client, "/api/play/start", {"token": token, "device_id": str(device_a)})
+    assert status_code == 403
+    status_code, _ = _post_json(client, "/api/play/start", {"token": token, "device_id": str(device_b)})
+    assert status_code == 200
@@ -0,0 +1,88 @@
+"""Tests for the publisher analytics endpoints."""
+
+from __future__ import annotations
+
+import uuid
+from datetime import date
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import Session
+
+from app.core import config
+from app.core.database import get_engine
+from app.models import ListeningDailyRollup
+from app.services.activation_stats import rebuild_activation_stats
+
+
+@pytest.fixture()
+def admin_key(monkeypatch: pytest.MonkeyPatch) -> str:
+    monkeypatch.setattr(config.get_settings(), "admin_api_key", "secret-admin-key")
+    return "secret-admin-key"
+
+
+def test_listening_report_requires_the_admin_key(client: TestClient, admin_key: str) -> None:
+    assert client.get("/api/analytics/listening", params={"product_id": 2}).status_code == 403
+    response = client.get(
+        "/api/analytics/listening", params={"product_id": 2}, headers={"X-Admin-Key": "wrong"}
+    )
+    assert response.status_code == 403
+
+
+def test_listening_report_reads_rollups(client: TestClient, admin_key: str) -> None:
+    with Session(get_engine()) as session:
+        session.add(ListeningDailyRollup(product_id=2, day=date(2026, 10, 1), sessions=3, listening_ms=5_400_000, completions=2))
+        session.add(ListeningDailyRollup(product_id=2, day=date(2026, 10, 3), sessions=1, listening_ms=1_800_000, completions=0))
+        session.add(ListeningDailyRollup(product_id=9, day=date(2026, 10, 1), sessions=8, listening_ms=1, completions=8))
+        session.commit()
+
+    response = client.get(
+        "/api/analytics/listening",
+        params={"product_id": 2, "start": "2026-10-01", "end": "2026-10-31"},
+        headers={"X-Admin-Key": admin_key},
+    )
+
+    assert response.status_code == 200
+    body = response.json()
+    assert [day["day"] for day in body["days"]] == ["2026-10-01", "2026-10-03"]
+    assert body["days"][0] == {"day": "2026-10-01", "sessions": 3, "listening_hours": 1.5, "completions": 2}
+    assert (body["sessions"], body["listening_hours"], body["completions"]) == (4, 2.0, 2)
+
+
+def test_listening_report_limits_the_range(client: TestClient, admin_key: str) -> None:
+    response = client.get(
+        "/api/analytics/listening",
+        params={"product_id": 2, "start": "2025-01-01", "end": "2026-10-01"},
+        headers={"X-Admin-Key": admin_key},
+    )
+    assert response.status_code == 422
+
+
+def test_activation_report_follows_registrations(client: TestClient, admin_key: str) -> None:
+    device_id, other_device_id = uuid.uuid4(), uuid.uuid4()
+    with get_engine().connect() as connection:
+        rebuild_activation_stats(connection)
+
+    client.post("/api/access/register", json={"token": "DEMO-NEW", "device_id": str(device_id)})
+    client.post("/api/access/reregister", json={"token": "DEMO-NEW", "new_device_id": str(other_device_id)})
+
+    response = client.get("/api/analytics/activations", params={"batch_id": 0}, headers={"X-Admin-Key": admin_key})
+
+    assert response.status_code == 200
+    body = response.json()
+    assert [product["product_id"] for product in body["products"]] == [1, 2, 3]
+    assert body["products"][0] == {
+        "product_id": 1, "new": 0, "active": 1, "blocked": 0, "reregistrations": 1, "cooldowns": 0,
+    }
+    assert (body["totals"]["new"], body["totals"]["active"], body["totals"]["blocked"]) == (0, 2, 1)
+
+
+def test_export_streams_csv(client: TestClient, admin_key: str) -> None:
+    params = {"start": "2026-10-01T00:00:00", "end": "2026-10-02T00:00:00"}
+    response = client.get("/api/analytics/export/play_session.csv", params=params, headers={"X-Admin-Key": admin_key})
+    unknown = client.get("/api/analytics/export/qr_code.csv", params=params, headers={"X-Admin-Key": admin_key})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    assert response.text.splitlines()[0].startswith("id,")
+    assert unknown.status_code == 404
@@ -0,0 +1,96 @@
+"""Tests for the signed media endpoint."""
+
+from __future__ import annotations
+
+from collections.abc import Iterator
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import BinaryIO
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core.config import get_settings
+from app.services.media_signer import sign_media_url
+from app.services.storage import LocalStorage, StorageBackend, configure_storage
+
+AUDIO = bytes(range(256)) * 40
+
+
+@pytest.fixture()
+def media_root(tmp_path: Path) -> Iterator[Path]:
+    (tmp_path / "books").mkdir()
+    (tmp_path / "books" / "chapter-1.mp3").write_bytes(AUDIO)
+    configure_storage(LocalStorage(tmp_path))
+    yield tmp_path
+    configure_storage(None)
+
+
+def _url(path: str, expires_in: timedelta = timedelta(minutes=5)) -> str:
+    return sign_media_url(get_settings().hmac_media_secret, f"/api/media/{path}", datetime.now() + expires_in)
+
+
+def test_whole_file_and_single_range(client: TestClient, media_root: Path) -> None:
+    url = _url("books/chapter-1.mp3")
+
+    whole = client.get(url)
+    partial = client.get(url, headers={"Range": "bytes=100-199"})
+
+    assert whole.status_code == 200
+    assert whole.content == AUDIO
+    assert whole.headers["content-type"] == "audio/mpeg"
+    assert whole.headers["accept-ranges"] == "bytes"
+    assert partial.status_code == 206
+    assert partial.headers["content-range"] == f"bytes 100-199/{len(AUDIO)}"
+    assert partial.content == AUDIO[100:200]
+
+
+def test_multiple_ranges_are_multipart(client: TestClient, media_root: Path) -> None:
+    response = client.get(_url("books/chapter-1.mp3"), headers={"Range": "bytes=0-9,-10"})
+
+    assert response.status_code == 206
+    boundary = response.headers["content-type"].split("boundary=")[1]
+    parts = response.content.split(f"--{boundary}".encode())
+    assert len(response.content) == int(response.headers["content-length"])
+    assert parts[1].endswith(b"\r\n\r\n" + AUDIO[:10] + b"\r\n")
+    assert f"Content-Range: bytes {len(AUDIO) - 10}-{len(AUDIO) - 1}/{len(AUDIO)}".encode() in parts[2]
+    assert parts[2].endswith(AUDIO[-10:] + b"\r\n")
+    assert parts[3] == b"--\r\n"
+
+
+def test_unsatisfiable_range_and_stale_if_range(client: TestClient, media_root: Path) -> None:
+    url = _url("books/chapter-1.mp3")
+    etag = client.head(url).headers["etag"]
+
+    unsatisfiable = client.get(url, headers={"Range": f"bytes={len(AUDIO)}-"})
+    fresh = client.get(url, headers={"Range": "bytes=0-3", "If-Range": etag})
+    stale = client.get(url, headers={"Range": "bytes=0-3", "If-Range": '"old"'})
+
+    assert unsatisfiable.status_code == 416
+    assert unsatisfiable.headers["content-range"] == f"bytes */{len(AUDIO)}"
+    assert fresh.status_code == 206
+    assert stale.status_code == 200
+    assert stale.content == AUDIO
+
+
+def test_signature_and_path_are_checked(client: TestClient, media_root: Path) -> None:
+    assert client.get(_url("books/chapter-1.mp3", timedelta(minutes=-1))).status_code == 403
+    assert client.get(_url("books/chapter-1.mp3").replace("chapter-1", "chapter-2")).status_code == 403
+    assert client.get(_url("books/missing.mp3")).status_code == 404
+    assert client.get(_url("../secrets.txt")).status_code in {403, 404}
+
+
+def test_other_backends_are_streamed_in_chunks(client: TestClient, media_root: Path) -> None:
+    class RemoteStorage(StorageBackend):
+        def open(self, path: str) -> BinaryIO:
+            return (media_root / path).open("rb")
+
+        def exists(self, path: str) -> bool:
+            return (media_root / path).exists()
+
+    configure_storage(RemoteStorage())
+    response = client.get(_url("books/chapter-1.mp3"), headers={"Range": "bytes=1000-8999"})
+
+    assert response.status_code == 206
+    assert response.content == AUDIO[1000:9000]
+    assert "etag" not in response.headers
@@ -0,0 +1,172 @@
+"""Tests for the play session endpoints."""
+
+from __future__ import annotations
+
+import asyncio
+import time
+import uuid
+from datetime import datetime
+from typing import Any
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from sqlmodel import Session, select
+
+from app.api.play import play_events, session_event_stream, session_leases
+from app.core.config import get_settings
+from app.core.database import get_engine
+from app.models import PlaySession, QrCode
+from app.services.session_lease import LeaseHolder
+
+
+def _register(client: TestClient) -> uuid.UUID:
+    device_id = uuid.uuid4()
+    response = client.post("/api/access/register", json={"token": "DEMO-NEW", "device_id": str(device_id)})
+    assert response.status_code == 200
+    return device_id
+
+
+def _start(client: TestClient, device_id: uuid.UUID) -> str:
+    response = client.post("/api/play/start", json={"token": "DEMO-NEW", "device_id": str(device_id)})
+    assert response.status_code == 200
+    return response.json()["session_id"]
+
+
+def _session_call(client: TestClient, action: str, device_id: uuid.UUID, session_id: str) -> int:
+    response = client.post(
+        f"/api/play/{action}",
+        json={"token": "DEMO-NEW", "device_id": str(device_id), "session_id": session_id},
+    )
+    return response.status_code
+
+
+def _sessions() -> dict[str, PlaySession]:
+    with Session(get_engine()) as session:
+        return {str(row.id): row for row in session.exec(select(PlaySession)).all()}
+
+
+def test_starting_playback_evicts_the_previous_session(client: TestClient) -> None:
+    device_id = _register(client)
+
+    first = _start(client, device_id)
+    second = _start(client, device_id)
+
+    assert _session_call(client, "heartbeat", device_id, first) == 409
+    assert _session_call(client, "heartbeat", device_id, second) == 200
+
+    sessions = _sessions()
+    assert sessions[first].ended_at is not None
+    assert sessions[second].ended_at is None
+
+
+def test_heartbeats_do_not_touch_the_database(client: TestClient) -> None:
+    device_id = _register(client)
+    session_id = _start(client, device_id)
+
+    statements: list[str] = []
+
+    def record(_conn: Any, _cursor: Any, statement: str, *_args: Any) -> None:
+        statements.append(statement)
+
+    event.listen(get_engine(), "before_cursor_execute", record)
+    try:
+        for _ in range(5):
+            assert _session_call(client, "heartbeat", device_id, session_id) == 200
+    finally:
+        event.remove(get_engine(), "before_cursor_execute", record)
+
+    assert statements == []
+
+
+def test_stop_releases_the_lease_and_ends_the_session(client: TestClient) -> None:
+    device_id = _register(client)
+    session_id = _start(client, device_id)
+
+    assert _session_call(client, "stop", device_id, session_id) == 200
+
+    assert _sessions()[session_id].ended_at is not None
+    response = client.post("/api/play/start", json={"token": "DEMO-NEW", "device_id": str(device_id)})
+    assert response.status_code == 200
+
+
+def test_unbound_device_cannot_start_playback(client: TestClient) -> None:
+    _register(client)
+
+    response = client.post("/api/play/start", json={"token": "DEMO-NEW", "device_id": str(uuid.uuid4())})
+
+    assert response.status_code == 403
+    assert _sessions() == {}
+
+
+def test_event_stream_of_an_evicted_session_ends_immediately(client: TestClient) -> None:
+    device_id = _register(client)
+    first = _start(client, device_id)
+    _start(client, device_id)
+
+    response = client.get(
+        "/api/play/events",
+        params={"token": "DEMO-NEW", "device_id": str(device_id), "session_id": first},
+    )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert "event: evicted" in response.text
+
+
+def test_event_stream_pushes_control_and_eviction() -> None:
+    qr_id, device_id = uuid.uuid4(), uuid.uuid4()
+    holder = LeaseHolder(session_id=uuid.uuid4(), device_id=device_id)
+
+    async def scenario() -> list[str]:
+        await play_events.start()
+        session_leases.acquire(qr_id, holder)
+        stream = session_event_stream(qr_id, holder.session_id, device_id, keepalive_seconds=0.05)
+        chunks = [await stream.__anext__(), await stream.__anext__()]
+        chunks.append(await stream.__anext__())  # keepalive while idle
+
+        play_events.publish(qr_id, {"type": "control", "action": "pause", "session_id": "someone-else"})
+        play_events.publish(qr_id, {"type": "control", "action": "pause", "session_id": str(holder.session_id)})
+        play_events.publish(qr_id, {"type": "evicted", "session_id": str(holder.session_id)})
+        chunks.extend([chunk async for chunk in stream if not chunk.startswith(":")])
+        await play_events.stop()
+        return chunks
+
+    try:
+        chunks = asyncio.run(scenario())
+    finally:
+        session_leases.reset()
+
+    assert chunks[0].startswith("retry:")
+    assert chunks[1].startswith("event: ready")
+    assert chunks[2] == ": keepalive\n\n"
+    assert [chunk.split("\n", 1)[0] for chunk in chunks[3:]] == ["event: control", "event: evicted"]
+    assert "someone-else" not in "".join(chunks)
+
+
+def test_sessions_left_behind_by_lapsed_leases_are_closed(
+    client: TestClient, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    device_id = _register(client)
+    with Session(get_engine()) as session:
+        qr_id = session.exec(select(QrCode.id).where(QrCode.token == "DEMO-NEW")).one()
+        abandoned_start = datetime(2026, 1, 1, 12, 0)
+        session.add(
+            PlaySession(qr_id=qr_id, device_id=device_id, started_at=abandoned_start, ip_hash="x")
+        )
+        session.commit()
+
+    monkeypatch.setattr(get_settings(), "play_lease_ttl_seconds", 0.05)
+    first = _start(client, device_id)
+    time.sleep(0.1)
+    second = _start(client, device_id)
+
+    sessions = _sessions()
+    lapsed = sessions[first]
+    assert lapsed.ended_at is not None and lapsed.ended_at < sessions[second].started_at
+    # Both closes are backdated, but stamped with when they were written.
+    assert lapsed.closed_at == sessions[second].started_at
+    assert sessions[second].ended_at is None
+    abandoned = next(row for key, row in sessions.items() if key not in (first, second))
+    assert abandoned.ended_at == abandoned.started_at
+    assert abandoned.closed_at == lapsed.started_at
@@ -0,0 +1,46 @@
+"""Tests for the sampler playlist endpoint."""
+
+from __future__ import annotations
+
+from collections.abc import Iterator
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.services.storage import LocalStorage, configure_storage
+
+
+@pytest.fixture()
+def media_root(tmp_path: Path) -> Iterator[Path]:
+    (tmp_path / "hls" / "2").mkdir(parents=True)
+    (tmp_path / "hls" / "2" / "index.m3u8").write_text(
+        "#EXTM3U\n#EXT-X-TARGETDURATION:7\n#EXTINF:6.5,\nseg-00000.mp3\n#EXTINF:6.5,\nseg-00001.mp3\n#EXT-X-ENDLIST\n"
+    )
+    (tmp_path / "hls" / "2" / "seg-00000.mp3").write_bytes(b"\xff\xfb" * 100)
+    configure_storage(LocalStorage(tmp_path))
+    yield tmp_path
+    configure_storage(None)
+
+
+def test_sampler_manifest_is_cacheable_and_signed(client: TestClient, media_root: Path) -> None:
+    response = client.get("/api/preview/DEMO-ACTIVE.m3u8")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/vnd.apple.mpegurl"
+    assert response.headers["cache-control"].startswith("public, max-age=")
+    first_segment = next(line for line in response.text.splitlines() if line.startswith("/api/media/"))
+    assert client.get(first_segment).content == b"\xff\xfb" * 100
+
+    revalidated = client.get(
+        "/api/preview/DEMO-ACTIVE.m3u8", headers={"If-None-Match": response.headers["etag"]}
+    )
+    assert revalidated.status_code == 304
+    assert revalidated.headers["etag"] == response.headers["etag"]
+
+
+def test_sampler_manifest_needs_a_token_with_preview(client: TestClient, media_root: Path) -> None:
+    assert client.get("/api/preview/UNKNOWN.m3u8").status_code == 404
+    assert client.get("/api/preview/DEMO-BLOCKED.m3u8").status_code == 404
+    # DEMO-NEW is for product 1, which has not been segmented.
+    assert client.get("/api/preview/DEMO-NEW.m3u8").status_code == 404
@@ -0,0 +1,215 @@
+"""Tests for the write-behind progress ingestion endpoint."""
+
+from __future__ import annotations
+
+import uuid
+from datetime import datetime
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import Session, select
+
+from app.api.progress import progress_buffer, progress_flusher, resume_cache
+from app.core import config
+from app.core.database import get_engine
+from app.models import ListeningProgress
+from app.services.progress_buffer import write_progress
+
+
+def _register(client: TestClient, token: str = "DEMO-NEW") -> uuid.UUID:
+    device_id = uuid.uuid4()
+    response = client.post("/api/access/register", json={"token": token, "device_id": str(device_id)})
+    assert response.status_code == 200
+    return device_id
+
+
+def _report(
+    client: TestClient,
+    device_id: uuid.UUID,
+    position_ms: int,
+    event: str = "tick",
+    track_id: str = "track-1",
+) -> tuple[int, dict[str, object]]:
+    response = client.post(
+        "/api/progress",
+        json={
+            "token": "DEMO-NEW",
+            "device_id": str(device_id),
+            "track_id": track_id,
+            "position_ms": position_ms,
+            "event": event,
+        },
+    )
+    return response.status_code, response.json()
+
+
+def _stored_positions() -> dict[str, int]:
+    with Session(get_engine()) as session:
+        rows = session.exec(select(ListeningProgress)).all()
+    return {row.track_id: row.position_ms for row in rows}
+
+
+def test_ticks_are_buffered_and_coalesced(client: TestClient) -> None:
+    device_id = _register(client)
+
+    for position in (15_000, 30_000, 45_000):
+        status_code, payload = _report(client, device_id, position)
+        assert status_code == 202
+        assert payload == {"status": "buffered"}
+    _report(client, device_id, 5_000, track_id="track-2")
+
+    assert len(progress_buffer) == 2
+    assert _stored_positions() == {}
+
+    assert progress_flusher.flush() == 2
+    assert _stored_positions() == {"track-1": 45_000, "track-2": 5_000}
+
+
+def test_flush_updates_existing_rows(client: TestClient) -> None:
+    device_id = _register(client)
+
+    _report(client, device_id, 10_000)
+    progress_flusher.flush()
+    _report(client, device_id, 20_000)
+    progress_flusher.flush()
+
+    assert _stored_positions() == {"track-1": 20_000}
+
+
+def test_pause_and_end_are_written_immediately(client: TestClient) -> None:
+    device_id = _register(client)
+
+    _report(client, device_id, 10_000, track_id="track-2")
+    status_code, payload = _report(client, device_id, 61_000, event="pause")
+
+    assert status_code == 202
+    assert payload == {"status": "stored"}
+    # Only the paused track is written; other ticks wait for the flusher.
+    assert len(progress_buffer) == 1
+    assert _stored_positions() == {"track-1": 61_000}
+
+
+def test_an_older_drained_batch_does_not_overwrite_a_newer_write(client: TestClient) -> None:
+    device_id = _register(client)
+
+    _report(client, device_id, 10_000)
+    # Another worker drains the tick and is slow to write it.
+    drained = progress_buffer.drain()
+    for update in drained:
+        update.stamped_at = datetime.utcnow()
+    _report(client, device_id, 61_000, event="pause")
+
+    with get_engine().begin() as connection:
+        write_progress(connection, drained)
+    assert _stored_positions() == {"track-1": 61_000}
+
+
+def test_end_event_marks_the_track_completed(client: TestClient) -> None:
+    device_id = _register(client)
+
+    _report(client, device_id, 30_000, event="pause")
+    _report(client, device_id, 90_000, event="end")
+    _report(client, device_id, 1_000, event="pause")
+
+    with Session(get_engine()) as session:
+        row = session.exec(select(ListeningProgress)).one()
+    assert row.position_ms == 1_000
+    assert row.completed_at is not None
+
+
+def test_unbound_device_is_rejected(client: TestClient) -> None:
+    _register(client)
+
+    status_code, _ = _report(client, uuid.uuid4(), 10_000)
+
+    assert status_code == 403
+    assert len(progress_buffer) == 0
+
+
+def _resume_position(client: TestClient, device_id: uuid.UUID, track_id: str = "track-1") -> int:
+    response = client.get(
+        "/api/progress/position",
+        params={"token": "DEMO-NEW", "device_id": str(device_id), "track_id": track_id},
+    )
+    assert response.status_code == 200
+    return response.json()["position_ms"]
+
+
+def test_resume_position_is_served_before_the_flush(client: TestClient) -> None:
+    device_id = _register(client)
+
+    _report(client, device_id, 42_000)
+
+    assert _stored_positions() == {}
+    assert _resume_position(client, device_id) == 42_000
+
+
+def test_resume_position_falls_back_to_the_database(client: TestClient) -> None:
+    device_id = _register(client)
+    _report(client, device_id, 42_000)
+    progress_flusher.flush()
+    resume_cache.reset()
+
+    assert _resume_position(client, device_id) == 42_000
+    assert _resume_position(client, device_id, track_id="track-9") == 0
+
+    qr_id = next(iter(resume_cache._entries))[0]
+    assert resume_cache.get(qr_id, device_id, "track-1") == 42_000
+
+
+def _sync(
+    client: TestClient, device_id: uuid.UUID, cursor: str | None = None, limit: int = 2
+) -> dict[str, object]:
+    params: dict[str, object] = {"token": "DEMO-NEW", "device_id": str(device_id), "limit": limit}
+    if cursor is not None:
+        params["cursor"] = cursor
+    response = client.get("/api/progress/sync", params=params)
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_sync_pages_through_changes_with_a_cursor(
+    client: TestClient, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(config.get_settings(), "progress_sync_settle_seconds", 0.0)
+    device_id = _register(client)
+    for index in range(5):
+        _report(client, device_id, index * 1000, track_id=f"track-{index}")
+    progress_flusher.flush()
+
+    seen: list[str] = []
+    cursor = None
+    while True:
+        page = _sync(client, device_id, cursor)
+        seen.extend(item["track_id"] for item in page["items"])
+        cursor = page["next_cursor"]
+        if not page["has_more"]:
+            break
+
+    assert seen == [f"track-{index}" for index in range(5)]
+    assert _sync(client, device_id, cursor) == {"items": [], "next_cursor": cursor, "has_more": False}
+
+    _report(client, device_id, 99_000, track_id="track-3")
+    progress_flusher.flush()
+
+    page = _sync(client, device_id, cursor)
+    assert [(item["track_id"], item["position_ms"]) for item in page["items"]] == [("track-3", 99_000)]
+
+
+def test_sync_holds_back_rows_that_have_not_settled(client: TestClient) -> None:
+    device_id = _register(client)
+    _report(client, device_id, 1000)
+    progress_flusher.flush()
+
+    assert _sync(client, device_id)["items"] == []
+
+
+def test_sync_rejects_malformed_cursor(client: TestClient) -> None:
+    device_id = _register(client)
+
+    response = client.get(
+        "/api/progress/sync",
+        params={"token": "DEMO-NEW", "device_id": str(device_id), "cursor": "not-a-cursor"},
+    )
+
+    assert response.status_code == 400
@@ -2,20 +2,28 @@
 
 from __future__ import annotations
 
+from collections.abc import Iterator
+
 import pytest
 from fastapi.testclient import TestClient
+from sqlalchemy.engine import Engine
 from sqlalchemy.pool import StaticPool
 from sqlmodel import Session, create_engine
 
 from app import create_app
 from app.api.access import rate_limiter
+from app.api.play import session_leases
+from app.api.preview import sampler_cache
+from app.api.progress import progress_buffer, resume_cache
 from app.core.database import configure_engine
 from app.models import QrCode, QrStatus, metadata
+from app.services.bindings import binding_cache
+from app.services.media_catalog import media_catalog
 
 
 @pytest.fixture()
-def client() -> TestClient:
-    """Provide a FastAPI test client backed by an in-memory database."""
+def engine() -> Iterator[Engine]:
+    """Provide an in-memory SQLite database with the schema created."""
 
     engine = create_engine(
         "sqlite:///:memory:",
@@ -23,8 +31,23 @@ def client() -> TestClient:
         poolclass=StaticPool,
     )
     metadata.create_all(engine)
+    yield engine
+    metadata.drop_all(engine)
+    engine.dispose()
+
+
+@pytest.fixture()
+def client(engine: Engine) -> TestClient:
+    """Provide a FastAPI test client backed by the in-memory database."""
+
     configure_engine(engine)
     rate_limiter.reset()
+    progress_buffer.reset()
+    binding_cache.reset()
+    resume_cache.reset()
+    session_leases.reset()
+    sampler_cache.reset()
+    media_catalog.reset()
 
     with Session(engine) as session:
         session.add(QrCode(token="DEMO-NEW", status=QrStatus.NEW, product_id=1))
@@ -35,5 +58,3 @@ def client() -> TestClient:
     app = create_app()
     with TestClient(app) as test_client:
         yield test_client
-
-    metadata.drop_all(engine)
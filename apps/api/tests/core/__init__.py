@@ -0,0 +1 @@
+"""Core utility tests package."""
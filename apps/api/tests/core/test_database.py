@@ -0,0 +1,121 @@
+"""Tests for the single-node SQLite deployment mode."""
+
+from __future__ import annotations
+
+import threading
+import time
+import uuid
+from collections.abc import Iterator
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+from sqlmodel import Session
+
+from app import create_app
+from app.api.access import rate_limiter
+from app.core import database, migrations
+from app.core.database import configure_engine, create_sqlite_engine, is_sqlite_url
+from app.models import QrCode, QrStatus
+
+
+@pytest.fixture()
+def sqlite_engine(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Iterator[Engine]:
+    """Provide a tuned engine on a fresh database file wired into the app."""
+
+    monkeypatch.setattr(database, "_engine", None)
+    monkeypatch.setattr(database, "_session_factory", None)
+    monkeypatch.setattr(migrations, "_migrations_applied", False)
+
+    engine = create_sqlite_engine(f"sqlite:///{tmp_path / 'avook.db'}")
+    configure_engine(engine)
+    yield engine
+    engine.dispose()
+
+
+def test_is_sqlite_url() -> None:
+    assert is_sqlite_url("sqlite:///var/lib/avook/avook.db")
+    assert not is_sqlite_url("postgresql+psycopg://avook:avook@db:5432/avook")
+
+
+def test_connections_apply_tuned_pragmas(sqlite_engine: Engine) -> None:
+    with sqlite_engine.connect() as connection:
+        assert connection.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+        assert connection.execute(text("PRAGMA synchronous")).scalar() == 1  # NORMAL
+        assert connection.execute(text("PRAGMA cache_size")).scalar() == -65536
+        assert connection.execute(text("PRAGMA mmap_size")).scalar() == 268435456
+        assert connection.execute(text("PRAGMA foreign_keys")).scalar() == 1
+
+
+def test_concurrent_read_modify_write_transactions_are_serialised(sqlite_engine: Engine) -> None:
+    """Writers queue for the lock instead of failing or losing updates."""
+
+    with sqlite_engine.begin() as connection:
+        connection.execute(text("CREATE TABLE counter (id INTEGER PRIMARY KEY, value INTEGER)"))
+        connection.execute(text("INSERT INTO counter (id, value) VALUES (1, 0)"))
+
+    errors: list[BaseException] = []
+
+    def worker() -> None:
+        try:
+            for _ in range(25):
+                with sqlite_engine.begin() as connection:
+                    value = connection.execute(text("SELECT value FROM counter WHERE id = 1")).scalar_one()
+                    connection.execute(text("UPDATE counter SET value = :value WHERE id = 1"), {"value": value + 1})
+        except BaseException as exc:  # pragma: no cover - surfaced below
+            errors.append(exc)
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    with sqlite_engine.connect() as connection:
+        assert connection.execute(text("SELECT value FROM counter")).scalar_one() == 200
+
+
+def test_startup_creates_schema_and_serves_access_flows(sqlite_engine: Engine) -> None:
+    """A fresh SQLite file is bootstrapped, stamped and usable by the API."""
+
+    rate_limiter.reset()
+    app = create_app()
+
+    inspector = inspect(sqlite_engine)
+    assert {"qr_code", "qr_binding", "alembic_version"}.issubset(inspector.get_table_names())
+
+    with Session(sqlite_engine) as session:
+        session.add(QrCode(token="KIOSK-001", status=QrStatus.NEW, product_id=7))
+        session.commit()
+
+    with TestClient(app) as client:
+        response = client.post(
+            "/api/access/register",
+            json={"token": "KIOSK-001", "device_id": str(uuid.uuid4())},
+        )
+        assert response.status_code == 200
+        assert response.json()["status"] == "registered"
+
+        response = client.post("/api/access/validate", json={"token": "KIOSK-001"})
+        assert response.json()["status"] == "registered"
+
+
+def test_read_only_transactions_do_not_wait_for_the_writer(sqlite_engine: Engine) -> None:
+    """Reads see the last committed snapshot while a write transaction is open."""
+
+    with sqlite_engine.begin() as connection:
+        connection.execute(text("CREATE TABLE counter (id INTEGER PRIMARY KEY, value INTEGER)"))
+        connection.execute(text("INSERT INTO counter (id, value) VALUES (1, 0)"))
+
+    with sqlite_engine.begin() as writer:
+        writer.execute(text("UPDATE counter SET value = 1 WHERE id = 1"))
+        with database.read_only_engine(sqlite_engine).connect() as reader:
+            started = time.monotonic()
+            assert reader.execute(text("SELECT value FROM counter")).scalar_one() == 0
+            assert time.monotonic() - started < 1.0
+
+    with database.read_only_engine(sqlite_engine).connect() as reader:
+        assert reader.execute(text("SELECT value FROM counter")).scalar_one() == 1
@@ -0,0 +1,50 @@
+"""Tests for the identifier generation helpers."""
+
+from __future__ import annotations
+
+import time
+import uuid
+from datetime import datetime, timezone
+
+from app.core.ids import uuid7, uuid7_timestamp
+from app.models import Account, Device, PlaySession, QrCode
+
+
+def test_uuid7_sets_version_and_variant() -> None:
+    """Generated ids advertise version 7 and the RFC 4122 variant."""
+
+    value = uuid7()
+    assert value.version == 7
+    assert value.variant == uuid.RFC_4122
+
+
+def test_uuid7_is_monotonic_within_a_burst() -> None:
+    """Ids generated back-to-back sort in creation order."""
+
+    values = [uuid7() for _ in range(10_000)]
+    assert values == sorted(values)
+    assert len(set(values)) == len(values)
+
+
+def test_uuid7_timestamp_round_trips() -> None:
+    """The embedded timestamp matches the wall clock at generation time."""
+
+    before = datetime.fromtimestamp(time.time() - 1, tz=timezone.utc)
+    created = uuid7_timestamp(uuid7())
+    after = datetime.fromtimestamp(time.time() + 1, tz=timezone.utc)
+
+    assert created is not None
+    assert before <= created <= after
+    assert uuid7_timestamp(uuid.uuid4()) is None
+
+
+def test_models_default_to_uuid7() -> None:
+    """Write-heavy models generate time-ordered primary keys."""
+
+    qr_code = QrCode(token="UUID7-CHECK")
+    device = Device(ua_hash="ua")
+    account = Account(provider="guest")
+    session = PlaySession(qr_id=qr_code.id, device_id=device.id, ip_hash="ip")
+
+    for instance in (qr_code, device, account, session):
+        assert instance.id.version == 7
@@ -0,0 +1,22 @@
+"""Unit tests for the play_session partition helpers."""
+
+from __future__ import annotations
+
+from datetime import date, datetime
+
+from sqlalchemy import create_engine
+
+from app.core.partitions import add_months, ensure_partitions, month_start, partition_name
+
+
+def test_month_arithmetic_wraps_years() -> None:
+    assert month_start(datetime(2026, 12, 31, 23, 59)) == date(2026, 12, 1)
+    assert add_months(date(2026, 11, 1), 3) == date(2027, 2, 1)
+    assert add_months(date(2026, 1, 1), -1) == date(2025, 12, 1)
+    assert partition_name(date(2027, 2, 1)) == "play_session_y2027m02"
+
+
+def test_helpers_do_nothing_without_partitioning() -> None:
+    engine = create_engine("sqlite://")
+    with engine.connect() as connection:
+        assert ensure_partitions(connection) == []
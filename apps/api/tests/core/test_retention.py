@@ -0,0 +1,191 @@
+"""Tests for the batched retention runner."""
+
+from __future__ import annotations
+
+import json
+from collections.abc import Sequence
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any
+
+import pytest
+from sqlalchemy import event, func
+from sqlalchemy.engine import Connection, Engine, Row
+from sqlalchemy.exc import OperationalError
+from sqlmodel import Session, select
+
+from app.models import (
+    Device,
+    ListeningProgress,
+    PlaySession,
+    QrBinding,
+    QrCode,
+    QrStatus,
+)
+from app.scripts import retention
+from app.scripts.retention import (
+    JOBS,
+    JOBS_BY_NAME,
+    JsonLinesArchive,
+    RetentionJob,
+    load_checkpoint,
+    run_job,
+)
+
+NOW = datetime(2026, 10, 19, 12, 0)
+
+
+class LockTimeout(Exception):
+    sqlstate = "55P03"
+
+
+@pytest.fixture()
+def engine(engine: Engine) -> Engine:
+    active = QrCode(token="RETAIN-ACTIVE", status=QrStatus.ACTIVE)
+    blocked = QrCode(token="RETAIN-BLOCKED", status=QrStatus.BLOCKED)
+    device = Device(ua_hash="ua")
+    long_ago = NOW - timedelta(days=400)
+    recently = NOW - timedelta(days=1)
+
+    with Session(engine) as session:
+        session.add_all([active, blocked, device])
+        session.flush()
+        for minutes in range(5):
+            started = long_ago + timedelta(minutes=minutes)
+            session.add(
+                PlaySession(
+                    qr_id=active.id, device_id=device.id, started_at=started,
+                    ended_at=started + timedelta(minutes=1), ip_hash="expired",
+                )
+            )
+        session.add(PlaySession(qr_id=active.id, device_id=device.id, started_at=long_ago, ip_hash="open"))
+        session.add(
+            PlaySession(
+                qr_id=active.id, device_id=device.id, started_at=recently, ended_at=recently, ip_hash="recent"
+            )
+        )
+        session.add(
+            QrBinding(qr_id=blocked.id, device_id=device.id, active=False, created_at=long_ago, revoked_at=long_ago)
+        )
+        session.add(QrBinding(qr_id=active.id, device_id=device.id, active=True, created_at=long_ago))
+        for qr_code, track in ((blocked, "expired"), (active, "kept")):
+            session.add(
+                ListeningProgress(
+                    qr_id=qr_code.id, device_id=device.id, track_id=track, position_ms=1, updated_at=long_ago
+                )
+            )
+        session.add(
+            ListeningProgress(
+                qr_id=blocked.id, device_id=device.id, track_id="recent", position_ms=1, updated_at=recently
+            )
+        )
+        session.commit()
+    return engine
+
+
+def _remaining(engine: Engine, model: type) -> int:
+    with Session(engine) as session:
+        return session.exec(select(func.count()).select_from(model)).one()
+
+
+def test_jobs_remove_only_expired_rows(engine: Engine) -> None:
+    with engine.connect() as connection:
+        removed = {job.name: run_job(connection, job, now=NOW, batch_size=2) for job in JOBS}
+
+    assert removed == {"play_sessions": 5, "revoked_bindings": 1, "blocked_progress": 1}
+    assert _remaining(engine, PlaySession) == 2
+    assert _remaining(engine, QrBinding) == 1
+    assert _remaining(engine, ListeningProgress) == 2
+    with engine.connect() as connection:
+        assert all(load_checkpoint(connection, job) is None for job in JOBS)
+
+
+def test_interrupted_run_resumes_from_checkpoint(engine: Engine) -> None:
+    job = JOBS_BY_NAME["play_sessions"]
+    with engine.connect() as connection:
+        first = run_job(connection, job, now=NOW, batch_size=2, max_batches=1)
+        checkpoint = load_checkpoint(connection, job)
+        rest = run_job(connection, job, now=NOW, batch_size=2)
+
+    assert first == 2
+    assert checkpoint is not None
+    assert rest == 3
+    assert _remaining(engine, PlaySession) == 2
+
+
+def test_dry_run_counts_and_archive_keeps_deleted_rows(engine: Engine, tmp_path: Path) -> None:
+    job = JOBS_BY_NAME["play_sessions"]
+    with engine.connect() as connection:
+        would_remove = run_job(connection, job, now=NOW, batch_size=4, dry_run=True)
+        assert _remaining(engine, PlaySession) == 7
+        removed = run_job(connection, job, now=NOW, batch_size=4, archive=JsonLinesArchive(tmp_path))
+
+    archived = [json.loads(line) for line in (tmp_path / "play_sessions.jsonl").read_text().splitlines()]
+    assert would_remove == removed == 5
+    assert {row["ip_hash"] for row in archived} == {"expired"}
+    assert len(archived) == 5
+
+
+def test_windows_only_visit_rows_older_than_the_cutoff(engine: Engine) -> None:
+    job = JOBS_BY_NAME["play_sessions"]
+    statements: list[str] = []
+
+    def record(_conn: Any, _cursor: Any, statement: str, *_args: Any) -> None:
+        if statement.startswith("SELECT play_session.ended_at"):
+            statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        with engine.connect() as connection:
+            removed = run_job(connection, job, now=NOW, batch_size=2, max_batches=3)
+            checkpoint = load_checkpoint(connection, job)
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+    # Five expired sessions fill three windows; the open and recent ones are never read.
+    assert removed == 5 and checkpoint is None
+    assert len(statements) == 3
+    assert all("play_session.ended_at <" in statement for statement in statements)
+
+
+def test_rows_are_archived_before_their_deletion_commits(
+    engine: Engine, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    job = JOBS_BY_NAME["play_sessions"]
+    in_transaction: list[bool] = []
+    failures = iter([True])
+    save_checkpoint = retention._save_checkpoint
+
+    def save_once_timing_out(connection: Connection, job: RetentionJob, key: Any) -> None:
+        if next(failures, False):
+            raise OperationalError("UPDATE job_checkpoint", {}, LockTimeout())
+        save_checkpoint(connection, job, key)
+
+    monkeypatch.setattr(retention, "_save_checkpoint", save_once_timing_out)
+    with engine.connect() as connection:
+
+        class RecordingArchive(JsonLinesArchive):
+            def write(self, job: RetentionJob, rows: Sequence[Row[Any]]) -> None:
+                in_transaction.append(connection.in_transaction())
+                super().write(job, rows)
+
+        removed = run_job(connection, job, now=NOW, batch_size=2, archive=RecordingArchive(tmp_path))
+
+    archived = [json.loads(line) for line in (tmp_path / "play_sessions.jsonl").read_text().splitlines()]
+    assert removed == 5
+    assert in_transaction == [True, True, True]
+    # The first window was rolled back after archiving and retried without duplicates.
+    assert len({row["id"] for row in archived}) == len(archived) == 5
+
+
+def test_rows_stay_when_the_archive_cannot_be_written(engine: Engine, tmp_path: Path) -> None:
+    job = JOBS_BY_NAME["play_sessions"]
+
+    class FullDisk(JsonLinesArchive):
+        def write(self, job: RetentionJob, rows: Sequence[Row[Any]]) -> None:
+            raise OSError(28, "No space left on device")
+
+    with engine.connect() as connection, pytest.raises(OSError):
+        run_job(connection, job, now=NOW, batch_size=2, archive=FullDisk(tmp_path))
+
+    assert _remaining(engine, PlaySession) == 7
@@ -0,0 +1,289 @@
+"""Tests for token-hash sharding and shard rebalancing."""
+
+from __future__ import annotations
+
+import threading
+import time
+import uuid
+from collections import Counter
+from collections.abc import Callable, Iterator
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import func, update
+from sqlmodel import select
+
+from app import create_app
+from app.api.access import rate_limiter
+from app.core import database, migrations
+from app.core.database import Shard, ShardRouter, configure_shard_router
+from app.models import ListeningProgress, PlaySession, QrBinding, QrCode, QrStatus, metadata
+from app.scripts import rebalance_shards
+from app.scripts.rebalance_shards import rebalance
+from app.services.analytics import read_listening_rollup, update_listening_rollup
+
+RouterFactory = Callable[[int], ShardRouter]
+
+TOKENS = [f"TOKEN-{index:06d}" for index in range(10_000)]
+
+
+def _shard_urls(tmp_path: Path, count: int) -> list[str]:
+    return [f"sqlite:///{tmp_path / f'shard{index}.db'}" for index in range(count)]
+
+
+@pytest.fixture()
+def make_router(tmp_path: Path) -> Iterator[RouterFactory]:
+    """Build routers over SQLite file shards with the schema created."""
+
+    routers: list[ShardRouter] = []
+
+    def factory(count: int) -> ShardRouter:
+        router = ShardRouter.from_urls(_shard_urls(tmp_path, count))
+        for shard in router.shards:
+            metadata.create_all(shard.engine)
+        routers.append(router)
+        return router
+
+    yield factory
+
+    configure_shard_router(None)
+    for router in routers:
+        router.dispose()
+
+
+def test_single_shard_router_uses_default_engine(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(database, "_shard_router", None)
+    router = database.get_shard_router()
+
+    assert not router.is_sharded
+    assert router.shard_for_token("DEMO-NEW").engine is database.get_engine()
+
+
+def test_tokens_spread_evenly_across_shards(tmp_path: Path) -> None:
+    router = ShardRouter.from_urls(_shard_urls(tmp_path, 4))
+    counts = Counter(router.shard_for_token(token).name for token in TOKENS)
+
+    assert len(counts) == 4
+    assert max(counts.values()) < 1.25 * len(TOKENS) / 4
+
+
+def test_adding_a_shard_moves_only_its_share_of_tokens(tmp_path: Path) -> None:
+    before = ShardRouter.from_urls(_shard_urls(tmp_path, 3))
+    after = ShardRouter.from_urls(_shard_urls(tmp_path, 4))
+    new_shard = after.shards[-1].name
+
+    moved = [
+        token
+        for token in TOKENS
+        if before.shard_for_token(token).name != after.shard_for_token(token).name
+    ]
+
+    assert all(after.shard_for_token(token).name == new_shard for token in moved)
+    assert 0.15 * len(TOKENS) < len(moved) < 0.35 * len(TOKENS)
+
+
+def test_access_endpoints_use_the_token_shard(
+    make_router: RouterFactory, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    # The shards already carry the schema; skip startup migrations of the
+    # default database.
+    monkeypatch.setattr(migrations, "_migrations_applied", True)
+    router = make_router(2)
+    tokens = {router.shard_for_token(token).name: token for token in TOKENS[:50]}
+    assert len(tokens) == 2
+
+    for shard in router.shards:
+        with shard.session() as session:
+            session.add(QrCode(token=tokens[shard.name], status=QrStatus.NEW, product_id=1))
+            session.commit()
+
+    configure_shard_router(router)
+    rate_limiter.reset()
+
+    with TestClient(create_app()) as client:
+        for token in tokens.values():
+            response = client.post(
+                "/api/access/register",
+                json={"token": token, "device_id": str(uuid.uuid4())},
+            )
+            assert response.status_code == 200
+            assert response.json()["status"] == "registered"
+
+    for shard in router.shards:
+        with shard.session() as session:
+            binding_tokens = session.exec(
+                select(QrCode.token).join(QrBinding, QrBinding.qr_id == QrCode.id)
+            ).all()
+        assert binding_tokens == [tokens[shard.name]]
+
+
+def test_shard_for_qr_id_probes_and_caches(make_router: RouterFactory) -> None:
+    router = make_router(3)
+    shard = router.shard_for_token("TOKEN-000042")
+    qr = QrCode(token="TOKEN-000042", status=QrStatus.NEW, product_id=1)
+    with shard.session() as session:
+        session.add(qr)
+        session.commit()
+
+    assert router.shard_for_qr_id(qr.id) is shard
+    assert router._directory[qr.id] is shard
+    assert router.shard_for_qr_id(uuid.uuid4()) is None
+
+    router.forget_qr([qr.id])
+    assert qr.id not in router._directory
+
+
+def test_rebalance_moves_rows_to_their_new_shard(make_router: RouterFactory) -> None:
+    source = make_router(2)
+    tokens = TOKENS[:300]
+    device_id = uuid.uuid4()
+
+    for shard in source.shards:
+        with shard.session() as session:
+            session.exec(
+                metadata.tables["device"].insert().values(id=device_id, ua_hash="ua")
+            )
+            session.commit()
+
+    for token in tokens:
+        shard = source.shard_for_token(token)
+        with shard.session() as session:
+            qr = QrCode(token=token, status=QrStatus.ACTIVE, product_id=1)
+            session.add(qr)
+            session.flush()
+            session.add(QrBinding(qr_id=qr.id, device_id=device_id, active=True))
+            session.add(
+                ListeningProgress(qr_id=qr.id, device_id=device_id, track_id="t1", position_ms=1000)
+            )
+            session.commit()
+
+    target = make_router(3)
+    new_shard = target.shards[-1]
+
+    planned = rebalance(source, target, batch_size=50, dry_run=True)
+    assert set(planned) <= {(shard.name, new_shard.name) for shard in source.shards}
+    assert sum(planned.values()) > 0
+
+    moved = rebalance(source, target, batch_size=50)
+    assert moved == planned
+    assert rebalance(source, target, batch_size=50) == Counter()
+
+    for shard in target.shards:
+        with shard.session() as session:
+            stored = session.exec(select(QrCode.token)).all()
+            bindings = session.exec(select(func.count()).select_from(QrBinding)).one()
+            progress = session.exec(select(func.count()).select_from(ListeningProgress)).one()
+        assert stored
+        assert all(target.shard_for_token(token).name == shard.name for token in stored)
+        assert bindings == progress == len(stored)
+
+    with new_shard.session() as session:
+        assert session.exec(select(func.count()).select_from(QrCode)).one() == sum(moved.values())
+
+
+def test_rebalance_holds_writes_to_moving_rows_until_they_are_deleted(
+    make_router: RouterFactory, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    source = make_router(1)
+    target = make_router(2)
+    token = next(token for token in TOKENS if target.shard_for_token(token) is target.shards[1])
+    device_id = uuid.uuid4()
+    with source.shards[0].session() as session:
+        session.exec(metadata.tables["device"].insert().values(id=device_id, ua_hash="ua"))
+        qr = QrCode(token=token, status=QrStatus.ACTIVE, product_id=1)
+        session.add(qr)
+        session.flush()
+        session.add(ListeningProgress(qr_id=qr.id, device_id=device_id, track_id="t1", position_ms=1000))
+        session.commit()
+    source.shard_for_qr_id(qr.id)
+
+    updated: list[int] = []
+    writer = threading.Thread(
+        target=lambda: updated.append(_update_position(source.shards[0], qr.id, 5000))
+    )
+    original = rebalance_shards._insert_missing
+
+    def copy_while_a_write_arrives(*args: Any) -> None:
+        if not writer.is_alive() and not updated:
+            writer.start()
+            time.sleep(0.2)
+            assert not updated
+        original(*args)
+
+    monkeypatch.setattr(rebalance_shards, "_insert_missing", copy_while_a_write_arrives)
+    assert rebalance(source, target) == Counter({(source.shards[0].name, target.shards[1].name): 1})
+    writer.join()
+
+    # The write ran after the delete instead of between the copy and the delete.
+    assert updated == [0]
+    with target.shards[1].session() as session:
+        assert session.exec(select(ListeningProgress.position_ms)).one() == 1000
+    assert qr.id not in source._directory
+
+
+def test_rebalance_carries_rollup_totals_with_moved_sessions(make_router: RouterFactory) -> None:
+    day = datetime(2026, 10, 18, tzinfo=timezone.utc)
+    two_shards = make_router(2)
+    three_shards = make_router(3)
+    tokens = TOKENS[:60]
+    device_id = uuid.uuid4()
+    for shard in two_shards.shards:
+        with shard.session() as session:
+            session.exec(metadata.tables["device"].insert().values(id=device_id, ua_hash="ua"))
+            session.commit()
+    for token in tokens:
+        with two_shards.shard_for_token(token).session() as session:
+            qr = QrCode(token=token, status=QrStatus.ACTIVE, product_id=1)
+            session.add(qr)
+            session.flush()
+            for started, ended in ((1, 2), (23, 25)):
+                session.add(
+                    PlaySession(
+                        qr_id=qr.id, device_id=device_id, ip_hash="ip",
+                        started_at=day + timedelta(hours=started), ended_at=day + timedelta(hours=ended),
+                    )
+                )
+            session.add(
+                ListeningProgress(
+                    qr_id=qr.id, device_id=device_id, track_id="t1", position_ms=1,
+                    updated_at=day + timedelta(hours=3), completed_at=day + timedelta(hours=3),
+                )
+            )
+            session.commit()
+
+    def roll_up(router: ShardRouter, now: datetime) -> None:
+        for shard in router.shards:
+            with shard.engine.connect() as connection:
+                update_listening_rollup(connection, now=now)
+
+    def report(router: ShardRouter) -> tuple[int, int]:
+        sessions = completions = 0
+        for shard in router.shards:
+            with shard.engine.connect() as connection:
+                stored = read_listening_rollup(connection, 1, day.date(), day.date()).get(day.date())
+            if stored is not None:
+                sessions += stored.sessions
+                completions += stored.completions
+        return sessions, completions
+
+    # The late sessions end after this run's watermark.
+    roll_up(two_shards, day + timedelta(days=1))
+    assert report(two_shards) == (60, 60)
+
+    # Onto a shard that never ran the rollup, then back onto shards that did.
+    assert rebalance(two_shards, three_shards)
+    roll_up(three_shards, day + timedelta(days=1, hours=12))
+    assert report(three_shards) == (120, 60)
+    assert rebalance(three_shards, two_shards)
+    roll_up(two_shards, day + timedelta(days=2))
+    assert report(two_shards) == (120, 60)
+
+
+def _update_position(shard: Shard, qr_id: uuid.UUID, position_ms: int) -> int:
+    with shard.engine.begin() as connection:
+        return connection.execute(
+            update(ListeningProgress).where(ListeningProgress.qr_id == qr_id).values(position_ms=position_ms)
+        ).rowcount
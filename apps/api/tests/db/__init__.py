@@ -0,0 +1 @@
+"""Database-level tests that run against a real PostgreSQL server."""
@@ -0,0 +1,90 @@
+"""Fixtures that provision a throwaway local PostgreSQL server.
+
+Set ``AVOOK_TEST_POSTGRES_URL`` to reuse an existing server (for example the
+``db`` service from ``infra/docker-compose.yml``). Otherwise the fixtures look
+for ``initdb``/``pg_ctl`` on ``PATH`` and start a temporary cluster. Tests are
+skipped when neither is available.
+"""
+
+from __future__ import annotations
+
+import os
+import shutil
+import socket
+import subprocess
+import uuid
+from collections.abc import Iterator
+from pathlib import Path
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import Engine, make_url
+
+POSTGRES_URL_ENV = "AVOOK_TEST_POSTGRES_URL"
+
+
+def _free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _start_local_cluster(base_dir: Path) -> tuple[str, Path]:
+    initdb = shutil.which("initdb")
+    pg_ctl = shutil.which("pg_ctl")
+    if initdb is None or pg_ctl is None:
+        pytest.skip(f"PostgreSQL binaries not found; set {POSTGRES_URL_ENV} to run")
+    if hasattr(os, "geteuid") and os.geteuid() == 0:
+        pytest.skip(f"PostgreSQL refuses to run as root; set {POSTGRES_URL_ENV} to run")
+
+    data_dir = base_dir / "data"
+    port = _free_port()
+    subprocess.run(
+        [initdb, "-D", str(data_dir), "-U", "avook", "-E", "UTF8", "--locale=C", "--auth=trust"],
+        check=True,
+        capture_output=True,
+    )
+    options = f"-p {port} -k {base_dir} -c listen_addresses=127.0.0.1 -c fsync=off"
+    subprocess.run(
+        [pg_ctl, "-D", str(data_dir), "-o", options, "-l", str(base_dir / "server.log"), "-w", "start"],
+        check=True,
+        capture_output=True,
+    )
+    return f"postgresql+psycopg://avook@127.0.0.1:{port}/postgres", data_dir
+
+
+@pytest.fixture(scope="session")
+def postgres_url(tmp_path_factory: pytest.TempPathFactory) -> Iterator[str]:
+    """Return the URL of a PostgreSQL server's maintenance database."""
+
+    configured = os.environ.get(POSTGRES_URL_ENV)
+    if configured:
+        yield configured
+        return
+
+    url, data_dir = _start_local_cluster(tmp_path_factory.mktemp("postgres"))
+    try:
+        yield url
+    finally:
+        pg_ctl = shutil.which("pg_ctl")
+        assert pg_ctl is not None  # pragma: no cover - checked at startup
+        subprocess.run([pg_ctl, "-D", str(data_dir), "-m", "immediate", "stop"], capture_output=True)
+
+
+@pytest.fixture(scope="module")
+def postgres_engine(postgres_url: str) -> Iterator[Engine]:
+    """Provide an engine bound to a scratch database dropped after the module."""
+
+    admin_engine = create_engine(postgres_url, isolation_level="AUTOCOMMIT")
+    database = f"avook_test_{uuid.uuid4().hex[:12]}"
+    with admin_engine.connect() as connection:
+        connection.execute(text(f'CREATE DATABASE "{database}"'))
+
+    engine = create_engine(make_url(postgres_url).set(database=database))
+    try:
+        yield engine
+    finally:
+        engine.dispose()
+        with admin_engine.connect() as connection:
+            connection.execute(text(f'DROP DATABASE IF EXISTS "{database}" WITH (FORCE)'))
+        admin_engine.dispose()
@@ -0,0 +1,77 @@
+"""Activation counter rebuild against a migrated PostgreSQL schema."""
+
+from __future__ import annotations
+
+import uuid
+from typing import Any
+
+import pytest
+from alembic import command
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+from sqlmodel import Session
+
+from app.core import migrations
+from app.models import QrCode, QrStatus
+from app.services import activation_stats
+from app.services.activation_stats import (
+    ActivationCounts,
+    read_activation_stats,
+    rebuild_activation_stats,
+    record_transition,
+)
+
+
+def _upgrade(engine: Engine) -> None:
+    config = migrations._build_alembic_config(engine)
+    with engine.connect() as connection:
+        config.attributes["connection"] = connection
+        command.upgrade(config, "head")
+        connection.commit()
+
+
+def test_rebuild_reads_migrated_status_labels(postgres_engine: Engine) -> None:
+    _upgrade(postgres_engine)
+
+    with postgres_engine.begin() as connection:
+        for index, status in enumerate(("new", "new", "active", "blocked")):
+            connection.execute(
+                text("INSERT INTO qr_code (id, token, status, batch_id, product_id) VALUES (:id, :token, :status, 5, 8)"),
+                {"id": uuid.uuid4(), "token": f"STATS-{index}", "status": status},
+            )
+
+    with postgres_engine.connect() as connection:
+        rebuild_activation_stats(connection, lock_timeout_ms=500)
+        assert read_activation_stats(connection, 5) == {8: ActivationCounts(new=2, active=1, blocked=1)}
+
+
+def test_transitions_committed_during_the_count_are_kept(
+    postgres_engine: Engine, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    _upgrade(postgres_engine)
+    qr_ids = [uuid.uuid4() for _ in range(3)]
+    with postgres_engine.begin() as connection:
+        for index, qr_id in enumerate(qr_ids):
+            connection.execute(
+                text("INSERT INTO qr_code (id, token, status, batch_id, product_id) VALUES (:id, :token, 'new', 6, 8)"),
+                {"id": qr_id, "token": f"COUNT-{index}"},
+            )
+
+    original = activation_stats._count_statuses
+
+    def count_while_a_code_activates(connection: Connection) -> Any:
+        counted = original(connection)
+        # Not blocked: the stats table is only locked for the swap.
+        with Session(postgres_engine) as session:
+            session.execute(text("UPDATE qr_code SET status = 'active' WHERE id = :id"), {"id": qr_ids[0]})
+            activated = QrCode(id=qr_ids[0], token="COUNT-0", status=QrStatus.ACTIVE, batch_id=6, product_id=8)
+            record_transition(session, activated, QrStatus.NEW, reregistration=True)
+            session.commit()
+        return counted
+
+    monkeypatch.setattr(activation_stats, "_count_statuses", count_while_a_code_activates)
+    with postgres_engine.connect() as connection:
+        rebuild_activation_stats(connection, lock_timeout_ms=500)
+        assert read_activation_stats(connection, 6) == {
+            8: ActivationCounts(new=2, active=1, reregistrations=1)
+        }
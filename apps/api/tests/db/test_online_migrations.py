@@ -0,0 +1,196 @@
+"""Tests for the lock-avoiding migration helpers and startup migrations."""
+
+from __future__ import annotations
+
+import threading
+from collections.abc import Iterator
+
+import pytest
+from alembic.operations import Operations
+from alembic.runtime.migration import MigrationContext
+from alembic.script import ScriptDirectory
+from sqlalchemy import Column, Integer, create_engine, inspect, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import DBAPIError, IntegrityError
+
+from app.core import database, migrations
+from app.core.database import configure_engine
+from app.core.online_migrations import (
+    LockRetriesExhausted,
+    add_check_constraint_not_valid,
+    add_column,
+    create_index_concurrently,
+    retry_on_lock_timeout,
+    validate_constraint,
+)
+
+
+@pytest.fixture()
+def scratch_table(postgres_engine: Engine) -> Iterator[Engine]:
+    with postgres_engine.begin() as connection:
+        connection.execute(text("DROP TABLE IF EXISTS online_ops"))
+        connection.execute(text("CREATE TABLE online_ops (id integer PRIMARY KEY, value integer)"))
+        connection.execute(text("INSERT INTO online_ops SELECT g, g % 10 FROM generate_series(1, 1000) AS g"))
+    yield postgres_engine
+    with postgres_engine.begin() as connection:
+        connection.execute(text("DROP TABLE IF EXISTS online_ops"))
+
+
+def _run_revision(engine: Engine, upgrade) -> None:  # type: ignore[no-untyped-def]
+    """Run ``upgrade`` the way env.py runs a revision."""
+
+    with engine.connect() as connection:
+        context = MigrationContext.configure(connection)
+        with Operations.context(context), context.begin_transaction():
+            upgrade()
+
+
+def _hold_lock(engine: Engine, mode: str) -> Connection:
+    blocker = engine.connect()
+    blocker.execute(text(f"LOCK TABLE online_ops IN {mode} MODE"))
+    return blocker
+
+
+def _index_valid(engine: Engine, name: str) -> bool | None:
+    with engine.connect() as connection:
+        return connection.execute(
+            text(
+                "SELECT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+                "WHERE c.relname = :name"
+            ),
+            {"name": name},
+        ).scalar()
+
+
+def test_create_index_concurrently_retries_until_lock_is_free(scratch_table: Engine) -> None:
+    blocker = _hold_lock(scratch_table, "SHARE ROW EXCLUSIVE")
+    release = threading.Timer(0.3, blocker.commit)
+    release.start()
+    try:
+        _run_revision(
+            scratch_table,
+            lambda: create_index_concurrently(
+                "idx_online_ops_value", "online_ops", ["value"], lock_timeout_ms=100, attempts=5
+            ),
+        )
+    finally:
+        release.join()
+        blocker.close()
+
+    assert _index_valid(scratch_table, "idx_online_ops_value") is True
+
+
+def test_create_index_concurrently_gives_up_instead_of_stalling(scratch_table: Engine) -> None:
+    blocker = _hold_lock(scratch_table, "SHARE ROW EXCLUSIVE")
+    try:
+        with pytest.raises(LockRetriesExhausted):
+            _run_revision(
+                scratch_table,
+                lambda: create_index_concurrently(
+                    "idx_online_ops_value", "online_ops", ["value"], lock_timeout_ms=50, attempts=2
+                ),
+            )
+    finally:
+        blocker.rollback()
+        blocker.close()
+
+    assert _index_valid(scratch_table, "idx_online_ops_value") is None
+
+
+def test_statement_timeouts_are_not_retried(postgres_engine: Engine) -> None:
+    calls = 0
+
+    def slow() -> None:
+        nonlocal calls
+        calls += 1
+        with postgres_engine.begin() as connection:
+            connection.execute(text("SET LOCAL statement_timeout = 10"))
+            connection.execute(text("SELECT pg_sleep(1)"))
+
+    with pytest.raises(DBAPIError):
+        retry_on_lock_timeout(slow, attempts=3, backoff_seconds=0)
+    assert calls == 1
+
+
+def test_create_index_concurrently_rebuilds_invalid_index(scratch_table: Engine) -> None:
+    with scratch_table.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        with pytest.raises(IntegrityError):
+            connection.execute(text("CREATE UNIQUE INDEX CONCURRENTLY idx_online_ops_value ON online_ops (value)"))
+    assert _index_valid(scratch_table, "idx_online_ops_value") is False
+
+    _run_revision(
+        scratch_table,
+        lambda: create_index_concurrently("idx_online_ops_value", "online_ops", ["value"]),
+    )
+
+    assert _index_valid(scratch_table, "idx_online_ops_value") is True
+
+
+def test_not_valid_constraint_is_validated_separately(scratch_table: Engine) -> None:
+    def upgrade() -> None:
+        add_check_constraint_not_valid("ck_online_ops_value", "online_ops", "value >= 0")
+        validate_constraint("online_ops", "ck_online_ops_value")
+
+    _run_revision(scratch_table, upgrade)
+
+    with scratch_table.connect() as connection:
+        validated = connection.execute(
+            text("SELECT convalidated FROM pg_constraint WHERE conname = 'ck_online_ops_value'")
+        ).scalar()
+    assert validated is True
+
+
+def test_add_column_retries_behind_reader(scratch_table: Engine) -> None:
+    blocker = _hold_lock(scratch_table, "ACCESS SHARE")
+    release = threading.Timer(0.3, blocker.commit)
+    release.start()
+    try:
+        _run_revision(
+            scratch_table,
+            lambda: add_column("online_ops", Column("extra", Integer, nullable=True), lock_timeout_ms=100),
+        )
+    finally:
+        release.join()
+        blocker.close()
+
+    columns = {column["name"] for column in inspect(scratch_table).get_columns("online_ops")}
+    assert "extra" in columns
+
+
+def test_helpers_fall_back_to_plain_operations_on_sqlite() -> None:
+    engine = create_engine("sqlite://")
+    with engine.begin() as connection:
+        connection.execute(text("CREATE TABLE online_ops (id integer PRIMARY KEY, value integer)"))
+
+    def upgrade() -> None:
+        create_index_concurrently("idx_online_ops_value", "online_ops", ["value"])
+        add_column("online_ops", Column("extra", Integer, nullable=True))
+
+    _run_revision(engine, upgrade)
+
+    inspector = inspect(engine)
+    assert [index["name"] for index in inspector.get_indexes("online_ops")] == ["idx_online_ops_value"]
+    assert "extra" in {column["name"] for column in inspector.get_columns("online_ops")}
+
+
+def test_run_migrations_upgrades_fresh_postgres_database(
+    postgres_engine: Engine, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(database, "_engine", None)
+    monkeypatch.setattr(database, "_session_factory", None)
+    monkeypatch.setattr(migrations, "_migrations_applied", False)
+    configure_engine(postgres_engine)
+
+    migrations.run_migrations()
+
+    script = ScriptDirectory.from_config(migrations._build_alembic_config(postgres_engine))
+    with postgres_engine.connect() as connection:
+        current = MigrationContext.configure(connection).get_current_revision()
+        tokens = connection.execute(text("SELECT count(*) FROM qr_code")).scalar()
+        held = connection.execute(
+            text("SELECT count(*) FROM pg_locks WHERE locktype = 'advisory'")
+        ).scalar()
+
+    assert current == script.get_current_head()
+    assert tokens == 3
+    assert held == 0
@@ -0,0 +1,244 @@
+"""Monthly partitioning of ``play_session`` on PostgreSQL."""
+
+from __future__ import annotations
+
+import re
+import uuid
+from datetime import datetime, timezone
+
+import pytest
+from alembic import command
+from sqlalchemy import event, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import ProgrammingError
+from sqlmodel import Session
+
+from app.api.play import _end_session
+from app.core import migrations
+from app.core.ids import uuid7
+from app.core.partitions import (
+    DEFAULT_PARTITION,
+    LEGACY_PARTITION,
+    add_months,
+    detach_partitions_before,
+    ensure_partitions,
+    is_partitioned,
+    legacy_partition_end,
+    list_partitions,
+    month_start,
+    partition_name,
+)
+
+PRE_PARTITION_REVISION = "202610190001"
+LEGACY_SESSION_ID = uuid.UUID("00000000-0000-4000-8000-000000000001")
+LEGACY_STARTED_AT = datetime(2025, 12, 15, 12, 0, tzinfo=timezone.utc)
+QR_ID = uuid.UUID("00000000-0000-4000-8000-0000000000a1")
+DEVICE_ID = uuid.UUID("00000000-0000-4000-8000-0000000000d1")
+
+_PARTITION_IN_PLAN = re.compile(r"\bplay_session_(?:y\d{4}m\d{2}|default|legacy)\b")
+
+
+@pytest.fixture(scope="module")
+def partitioned_engine(postgres_engine: Engine) -> Engine:
+    """Migrate to the partitioned schema with a session already recorded.
+
+    The partitioning revision is run twice, the first time failing part-way,
+    so every test also covers a retried migration.
+    """
+
+    config = migrations._build_alembic_config(postgres_engine)
+    with postgres_engine.connect() as connection:
+        config.attributes["connection"] = connection
+        command.upgrade(config, PRE_PARTITION_REVISION)
+        connection.commit()
+        with connection.begin():
+            connection.execute(
+                text("INSERT INTO qr_code (id, token) VALUES (:id, 'PARTITION-QR')"), {"id": QR_ID}
+            )
+            connection.execute(
+                text("INSERT INTO device (id, ua_hash) VALUES (:id, 'ua')"), {"id": DEVICE_ID}
+            )
+            connection.execute(
+                text(
+                    "INSERT INTO play_session (id, qr_id, device_id, started_at, ip_hash) "
+                    "VALUES (:id, :qr, :device, :started_at, 'ip')"
+                ),
+                {"id": LEGACY_SESSION_ID, "qr": QR_ID, "device": DEVICE_ID, "started_at": LEGACY_STARTED_AT},
+            )
+            # Makes the first attempt fail after its index builds have committed.
+            connection.execute(
+                text("ALTER TABLE play_session ADD CONSTRAINT play_session_legacy_bound CHECK (true)")
+            )
+        with pytest.raises(ProgrammingError):
+            command.upgrade(config, "head")
+        connection.rollback()
+        with connection.begin():
+            connection.execute(text("ALTER TABLE play_session DROP CONSTRAINT play_session_legacy_bound"))
+        command.upgrade(config, "head")
+    return postgres_engine
+
+
+def test_migration_attaches_the_existing_table_as_a_partition(partitioned_engine: Engine) -> None:
+    with partitioned_engine.connect() as connection:
+        assert is_partitioned(connection)
+        months = sorted(list_partitions(connection))
+        legacy_end = legacy_partition_end(connection)
+        location = connection.execute(
+            text("SELECT tableoid::regclass::text FROM play_session WHERE id = :id"),
+            {"id": LEGACY_SESSION_ID},
+        ).scalar()
+        checks = connection.execute(
+            text("SELECT count(*) FROM pg_constraint WHERE conname = 'play_session_legacy_bound'")
+        ).scalar()
+        # The bound is rendered in the session time zone.
+        connection.exec_driver_sql("SET TimeZone = 'America/New_York'")
+        assert legacy_partition_end(connection) == legacy_end
+
+    current = month_start(datetime.now(timezone.utc))
+    assert legacy_end is not None and legacy_end > current
+    assert months[0] == legacy_end
+    assert months[-1] == add_months(current, 3)
+    assert location == LEGACY_PARTITION
+    assert checks == 0
+
+
+@pytest.mark.parametrize(
+    ("index", "column"), [("idx_play_session_ended", "ended_at"), ("idx_play_session_closed", "closed_at")]
+)
+def test_close_time_indexes_cover_every_partition(partitioned_engine: Engine, index: str, column: str) -> None:
+    with partitioned_engine.connect() as connection:
+        valid = connection.execute(
+            text(
+                "SELECT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+                "WHERE c.relname = :index"
+            ),
+            {"index": index},
+        ).scalar()
+        unindexed = connection.execute(
+            text(
+                "SELECT count(*) FROM pg_inherits i JOIN pg_class p ON p.oid = i.inhparent "
+                "WHERE p.relname = 'play_session' AND NOT EXISTS ("
+                "  SELECT 1 FROM pg_index x JOIN pg_attribute a "
+                "    ON a.attrelid = x.indrelid AND a.attnum = x.indkey[0] "
+                "  WHERE x.indrelid = i.inhrelid AND a.attname = :column)"
+            ),
+            {"column": column},
+        ).scalar()
+
+    assert valid is True
+    assert unindexed == 0
+
+
+def test_ending_a_session_touches_a_single_partition(partitioned_engine: Engine) -> None:
+    session_id = uuid7()
+    with partitioned_engine.begin() as connection:
+        connection.execute(
+            text(
+                "INSERT INTO play_session (id, qr_id, device_id, started_at, ip_hash) "
+                "VALUES (:id, :qr, :device, :started_at, 'ip')"
+            ),
+            {"id": session_id, "qr": QR_ID, "device": DEVICE_ID, "started_at": datetime.now(timezone.utc)},
+        )
+
+    captured: list[tuple[str, object]] = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):  # type: ignore[no-untyped-def]
+        if statement.startswith("UPDATE play_session"):
+            captured.append((statement, parameters))
+
+    event.listen(partitioned_engine, "before_cursor_execute", capture)
+    try:
+        with Session(partitioned_engine) as session:
+            now = datetime.utcnow()
+            _end_session(session, session_id, QR_ID, now, now)
+            session.commit()
+    finally:
+        event.remove(partitioned_engine, "before_cursor_execute", capture)
+
+    [(statement, parameters)] = captured
+    with partitioned_engine.connect() as connection:
+        plan = "\n".join(connection.exec_driver_sql(f"EXPLAIN {statement}", parameters).scalars())
+        ended_at, location = connection.execute(
+            text("SELECT ended_at, tableoid::regclass::text FROM play_session WHERE id = :id"),
+            {"id": session_id},
+        ).one()
+
+    # This month is still covered by the legacy partition.
+    assert location == LEGACY_PARTITION
+    assert set(_PARTITION_IN_PLAN.findall(plan)) == {location}
+    assert ended_at is not None
+
+
+def test_ensure_partitions_creates_upcoming_months_once(partitioned_engine: Engine) -> None:
+    later = add_months(month_start(datetime.utcnow()), 5)
+    with partitioned_engine.connect() as connection:
+        # Months the legacy partition still covers are not created again.
+        assert ensure_partitions(connection, months_ahead=0) == []
+        created = ensure_partitions(connection, months_ahead=1, today=later)
+        again = ensure_partitions(connection, months_ahead=1, today=later)
+
+    assert created == [
+        later.strftime("play_session_y%Ym%m"),
+        add_months(later, 1).strftime("play_session_y%Ym%m"),
+    ]
+    assert again == []
+
+
+def test_missed_months_are_split_out_of_the_default_partition(partitioned_engine: Engine) -> None:
+    missed = add_months(month_start(datetime.utcnow()), 9)
+    session_ids = [uuid7() for _ in range(2)]
+    with partitioned_engine.begin() as connection:
+        for index, session_id in enumerate(session_ids):
+            connection.execute(
+                text(
+                    "INSERT INTO play_session (id, qr_id, device_id, started_at, ip_hash) "
+                    "VALUES (:id, :qr, :device, :started_at, 'ip')"
+                ),
+                {
+                    "id": session_id,
+                    "qr": QR_ID,
+                    "device": DEVICE_ID,
+                    "started_at": datetime(missed.year, missed.month, 3 + index, tzinfo=timezone.utc),
+                },
+            )
+
+    with partitioned_engine.connect() as connection:
+        created = ensure_partitions(connection, start=missed, months_ahead=1, today=missed)
+        locations = connection.execute(
+            text("SELECT DISTINCT tableoid::regclass::text FROM play_session WHERE id = ANY(:ids)"),
+            {"ids": session_ids},
+        ).scalars().all()
+        default_attached = connection.execute(
+            text(
+                "SELECT pg_get_expr(c.relpartbound, c.oid) FROM pg_class c "
+                "WHERE c.relname = :name AND c.relispartition"
+            ),
+            {"name": DEFAULT_PARTITION},
+        ).scalar()
+
+    assert created == [partition_name(missed), partition_name(add_months(missed, 1))]
+    assert locations == [partition_name(missed)]
+    assert default_attached == "DEFAULT"
+
+
+def test_detaching_old_months_keeps_their_rows_outside_the_table(partitioned_engine: Engine) -> None:
+    with partitioned_engine.connect() as connection:
+        legacy_end = legacy_partition_end(connection)
+        assert legacy_end is not None
+        assert detach_partitions_before(connection, add_months(legacy_end, -1)) == []
+
+        detached = detach_partitions_before(connection, legacy_end)
+        remaining = connection.execute(
+            text("SELECT count(*) FROM play_session WHERE id = :id"), {"id": LEGACY_SESSION_ID}
+        ).scalar()
+        archived = connection.execute(
+            text(f"SELECT count(*) FROM {LEGACY_PARTITION} WHERE id = :id"), {"id": LEGACY_SESSION_ID}
+        ).scalar()
+        months = list_partitions(connection)
+        after = legacy_partition_end(connection)
+
+    assert detached == [LEGACY_PARTITION]
+    assert remaining == 0
+    assert archived == 1
+    assert after is None
+    assert min(months) == legacy_end
@@ -0,0 +1,64 @@
+"""Tests for the batched progress UPSERT on PostgreSQL."""
+
+from __future__ import annotations
+
+import uuid
+from datetime import datetime
+
+from sqlalchemy import func, select, text
+from sqlalchemy.engine import Engine
+
+from app.models import ListeningProgress, metadata
+from app.services.progress_buffer import ProgressUpdate, write_progress
+
+
+def test_write_progress_upserts_in_batches(postgres_engine: Engine) -> None:
+    metadata.create_all(postgres_engine)
+    qr_id = uuid.uuid4()
+    device_id = uuid.uuid4()
+    with postgres_engine.begin() as connection:
+        connection.execute(
+            text(
+                "INSERT INTO qr_code (id, token, status, max_reactivations) "
+                "VALUES (:id, 'PG-PROGRESS', 'ACTIVE', 3)"
+            ),
+            {"id": qr_id},
+        )
+        connection.execute(
+            text("INSERT INTO device (id, ua_hash) VALUES (:id, 'ua')"), {"id": device_id}
+        )
+
+    def updates(position: int) -> list[ProgressUpdate]:
+        return [
+            ProgressUpdate(
+                token="PG-PROGRESS",
+                qr_id=qr_id,
+                device_id=device_id,
+                track_id=f"track-{index}",
+                position_ms=position + index,
+            )
+            for index in range(1200)
+        ]
+
+    with postgres_engine.begin() as connection:
+        write_progress(connection, updates(0), batch_size=500)
+    with postgres_engine.begin() as connection:
+        write_progress(connection, updates(10_000), batch_size=500)
+
+    table = ListeningProgress.__table__
+    with postgres_engine.connect() as connection:
+        count, minimum = connection.execute(
+            select(func.count(), func.min(table.c.position_ms))
+        ).one()
+
+    assert count == 1200
+    assert minimum == 10_000
+
+    # A batch stamped before the last write leaves the rows alone.
+    stale = updates(5_000)
+    for update in stale:
+        update.stamped_at = datetime(2020, 1, 1)
+    with postgres_engine.begin() as connection:
+        write_progress(connection, stale, batch_size=500)
+    with postgres_engine.connect() as connection:
+        assert connection.execute(select(func.min(table.c.position_ms))).scalar_one() == 10_000
@@ -0,0 +1,309 @@
+"""Query-plan regression tests for the hot access and progress queries.
+
+The suite loads a synthetic dataset shaped like production traffic into a
+scratch PostgreSQL database, runs ``EXPLAIN (ANALYZE, BUFFERS)`` on each hot
+query and asserts that the expected index is used and that the planner's row
+estimates stay within an order of magnitude of reality. It also checks the
+schema for indexes that merely duplicate another index or constraint.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import uuid
+from collections.abc import Iterator
+from datetime import datetime, timedelta
+from typing import Any
+
+import pytest
+from sqlalchemy import PrimaryKeyConstraint, Table, UniqueConstraint, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.sql import Executable
+from sqlmodel import select
+
+from app.api.access import (
+    _active_binding_query,
+    _qr_by_token_query,
+    _recent_reactivations_query,
+    _total_bindings_query,
+)
+from app.api.progress import SyncCursor, _progress_changed_since_query
+from app.models import ListeningProgress, metadata
+from app.scripts.retention import JOBS_BY_NAME, window_query
+
+QR_ROWS = 100_000
+DEVICE_ROWS = 50_000
+# A QR with a long listening history (many chapters synced over months).
+LONG_HISTORY_QR = 7
+LONG_HISTORY_TRACKS = 5_000
+ROW_ESTIMATE_FACTOR = 10
+
+# Indexes that are known to duplicate another index or constraint. Each entry
+# should be removed by a migration; the strict xfail below turns green (and
+# therefore fails) as soon as that happens so the allowlist stays honest.
+KNOWN_REDUNDANT_INDEXES = {"idx_qr_token": "qr_code_token_key"}
+
+DATASET_SQL = (
+    """
+    INSERT INTO qr_code (id, token, status, product_id, batch_id, created_at, max_reactivations)
+    SELECT md5('qr' || g)::uuid,
+           'TOKEN-' || lpad(g::text, 8, '0'),
+           (CASE WHEN g % 10 = 0 THEN 'NEW' WHEN g % 97 = 0 THEN 'BLOCKED' ELSE 'ACTIVE' END)::qr_status,
+           g % 500,
+           g % 50,
+           now() - make_interval(secs => g),
+           999
+    FROM generate_series(1, :qr_rows) AS g
+    """,
+    """
+    INSERT INTO device (id, ua_hash, created_at)
+    SELECT md5('device' || g)::uuid, md5(g::text), now()
+    FROM generate_series(1, :device_rows) AS g
+    """,
+    """
+    INSERT INTO qr_binding (qr_id, device_id, active, created_at)
+    SELECT md5('qr' || g)::uuid, md5('device' || (g % :device_rows + 1))::uuid, true, now()
+    FROM generate_series(1, :qr_rows) AS g
+    WHERE g % 10 <> 0
+    """,
+    """
+    INSERT INTO qr_binding (qr_id, device_id, active, created_at, revoked_at)
+    SELECT md5('qr' || g)::uuid,
+           md5('device' || ((g + r * 7919) % :device_rows + 1))::uuid,
+           false,
+           now() - interval '10 days',
+           now() - make_interval(hours => r * 12)
+    FROM generate_series(1, :qr_rows) AS g, generate_series(1, 3) AS r
+    WHERE g % 10 = 5
+    """,
+    """
+    INSERT INTO listening_progress (qr_id, device_id, track_id, position_ms, updated_at)
+    SELECT md5('qr' || g)::uuid,
+           md5('device' || (g % :device_rows + 1))::uuid,
+           'track-' || t,
+           (g * t) % 3600000,
+           now() - make_interval(secs => (g * 37 + t) % 2592000)
+    FROM generate_series(1, :qr_rows) AS g, generate_series(1, 3) AS t
+    WHERE g % 10 <> 0
+    """,
+    """
+    INSERT INTO listening_progress (qr_id, device_id, track_id, position_ms, updated_at)
+    SELECT md5('qr' || :long_history_qr)::uuid,
+           md5('device' || (:long_history_qr % :device_rows + 1))::uuid,
+           'chapter-' || t,
+           t,
+           now() - make_interval(mins => t * 10)
+    FROM generate_series(1, :long_history_tracks) AS t
+    """,
+)
+
+REDUNDANT_INDEX_SQL = """
+    SELECT i.indexrelid::regclass::text AS index_name,
+           d.indexrelid::regclass::text AS covered_by
+    FROM pg_index AS i
+    JOIN pg_index AS d
+      ON d.indrelid = i.indrelid AND d.indexrelid <> i.indexrelid
+    JOIN pg_class AS c ON c.oid = i.indrelid
+    WHERE c.relnamespace = 'public'::regnamespace
+      AND NOT i.indisunique
+      AND i.indpred IS NULL AND d.indpred IS NULL
+      AND i.indexprs IS NULL AND d.indexprs IS NULL
+      AND (d.indkey::text = i.indkey::text OR d.indkey::text LIKE i.indkey::text || ' %')
+"""
+
+
+def _qr_id(number: int) -> uuid.UUID:
+    """Return the id the dataset assigns to QR number ``number``."""
+
+    return uuid.UUID(hashlib.md5(f"qr{number}".encode()).hexdigest())
+
+
+def _device_id(number: int) -> uuid.UUID:
+    return uuid.UUID(hashlib.md5(f"device{number}".encode()).hexdigest())
+
+
+def _progress_resume_query(qr_id: uuid.UUID, device_id: uuid.UUID, track_id: str) -> Executable:
+    return (
+        select(ListeningProgress)
+        .where(ListeningProgress.qr_id == qr_id)
+        .where(ListeningProgress.device_id == device_id)
+        .where(ListeningProgress.track_id == track_id)
+    )
+
+
+@pytest.fixture(scope="module")
+def plan_connection(postgres_engine: Engine) -> Iterator[Connection]:
+    """Create the schema, load the synthetic dataset and yield a connection."""
+
+    metadata.create_all(postgres_engine)
+    params = {
+        "qr_rows": QR_ROWS,
+        "device_rows": DEVICE_ROWS,
+        "long_history_qr": LONG_HISTORY_QR,
+        "long_history_tracks": LONG_HISTORY_TRACKS,
+    }
+    with postgres_engine.begin() as connection:
+        for statement in DATASET_SQL:
+            connection.execute(text(statement), params)
+
+    with postgres_engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        connection.execute(text("ANALYZE"))
+        yield connection
+
+
+def _explain(connection: Connection, statement: Executable) -> dict[str, Any]:
+    compiled = statement.compile(dialect=connection.dialect)
+    result = connection.exec_driver_sql(
+        f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {compiled.string}",
+        compiled.params,
+    )
+    return result.scalar_one()[0]["Plan"]
+
+
+def _iter_nodes(plan: dict[str, Any], under_limit: bool = False) -> Iterator[tuple[dict[str, Any], bool]]:
+    yield plan, under_limit
+    child_under_limit = under_limit or plan["Node Type"] == "Limit"
+    for child in plan.get("Plans", []):
+        yield from _iter_nodes(child, child_under_limit)
+
+
+def _assert_plan(plan: dict[str, Any], table: str, allowed_indexes: set[str]) -> None:
+    nodes = list(_iter_nodes(plan))
+
+    sequential = [node for node, _ in nodes if node["Node Type"] == "Seq Scan" and node.get("Relation Name") == table]
+    assert not sequential, f"sequential scan on {table}"
+
+    used = {node["Index Name"] for node, _ in nodes if "Index Name" in node}
+    assert used & allowed_indexes, f"expected one of {sorted(allowed_indexes)}, plan used {sorted(used)}"
+
+    for node, under_limit in nodes:
+        if under_limit:
+            # Nodes beneath a LIMIT stop early, so their actual row counts
+            # are not comparable with the planner's estimate.
+            continue
+        loops = max(node.get("Actual Loops", 1), 1)
+        estimated = max(node["Plan Rows"], 1)
+        actual = max(node["Actual Rows"], 1)
+        ratio = max(estimated / actual, actual / estimated)
+        assert ratio <= ROW_ESTIMATE_FACTOR, (
+            f"{node['Node Type']} estimated {node['Plan Rows']} rows but returned "
+            f"{node['Actual Rows']} over {loops} loop(s)"
+        )
+
+
+def test_token_lookup_uses_token_index(plan_connection: Connection) -> None:
+    plan = _explain(plan_connection, _qr_by_token_query("TOKEN-00012345"))
+    _assert_plan(plan, "qr_code", {"qr_code_token_key", "idx_qr_token"})
+
+
+def test_active_binding_lookup_uses_qr_index(plan_connection: Connection) -> None:
+    plan = _explain(plan_connection, _active_binding_query(_qr_id(12345)))
+    _assert_plan(plan, "qr_binding", {"idx_binding_qr_active", "qr_binding_pkey"})
+
+
+def test_total_bindings_count_uses_qr_index(plan_connection: Connection) -> None:
+    plan = _explain(plan_connection, _total_bindings_query(_qr_id(12345)))
+    _assert_plan(plan, "qr_binding", {"idx_binding_qr_active", "qr_binding_pkey"})
+
+
+def test_recent_reactivations_count_uses_qr_index(plan_connection: Connection) -> None:
+    cutoff = datetime.utcnow() - timedelta(hours=24)
+    plan = _explain(plan_connection, _recent_reactivations_query(_qr_id(12345), cutoff))
+    _assert_plan(plan, "qr_binding", {"idx_binding_qr_active", "qr_binding_pkey"})
+
+
+def test_progress_resume_lookup_uses_primary_key(plan_connection: Connection) -> None:
+    statement = _progress_resume_query(_qr_id(12345), _device_id(12345 % DEVICE_ROWS + 1), "track-2")
+    plan = _explain(plan_connection, statement)
+    _assert_plan(plan, "listening_progress", {"listening_progress_pkey"})
+
+
+def test_progress_sync_first_page_uses_qr_index(plan_connection: Connection) -> None:
+    statement = _progress_changed_since_query(_qr_id(12345), None, datetime.utcnow(), 101)
+    plan = _explain(plan_connection, statement)
+    _assert_plan(plan, "listening_progress", {"idx_progress_qr_updated", "listening_progress_pkey"})
+
+
+def test_progress_sync_next_page_reads_only_changed_rows(plan_connection: Connection) -> None:
+    cursor = SyncCursor(
+        updated_at=datetime.utcnow() - timedelta(hours=2),
+        qr_id=_qr_id(LONG_HISTORY_QR),
+        device_id=_device_id(LONG_HISTORY_QR % DEVICE_ROWS + 1),
+        track_id="chapter-1",
+    )
+    statement = _progress_changed_since_query(_qr_id(LONG_HISTORY_QR), cursor, datetime.utcnow(), 101)
+    plan = _explain(plan_connection, statement)
+    _assert_plan(plan, "listening_progress", {"idx_progress_qr_updated"})
+
+    scanned = sum(
+        node.get("Actual Rows", 0) for node, _ in _iter_nodes(plan) if node.get("Index Name")
+    )
+    assert scanned < LONG_HISTORY_TRACKS / 100
+
+
+def test_retention_windows_seek_on_the_revocation_index(plan_connection: Connection) -> None:
+    job = JOBS_BY_NAME["revoked_bindings"]
+    cutoff = datetime.utcnow() - timedelta(hours=30)
+    first = plan_connection.execute(window_query(job, cutoff, None, 1000)).all()
+    assert len(first) == 1000
+
+    plan = _explain(plan_connection, window_query(job, cutoff, tuple(first[-1]), 1000))
+    _assert_plan(plan, "qr_binding", {"idx_binding_revoked_at"})
+    # The keyset comparison is an index condition rather than a filter, so a
+    # window starts where the previous one ended even inside a run of equal
+    # timestamps.
+    seeks = [
+        node.get("Index Cond", "")
+        for node, _ in _iter_nodes(plan)
+        if node.get("Index Name") == "idx_binding_revoked_at"
+    ]
+    assert any("ROW(revoked_at, qr_id, device_id) >" in condition for condition in seeks)
+
+
+def _redundant_indexes(connection: Connection) -> dict[str, str]:
+    rows = connection.execute(text(REDUNDANT_INDEX_SQL)).all()
+    return {row.index_name: row.covered_by for row in rows}
+
+
+def test_no_unexpected_redundant_indexes(plan_connection: Connection) -> None:
+    redundant = _redundant_indexes(plan_connection)
+    unexpected = {name: covered for name, covered in redundant.items() if name not in KNOWN_REDUNDANT_INDEXES}
+    assert not unexpected, f"indexes duplicating another index or constraint: {unexpected}"
+
+
+@pytest.mark.xfail(strict=True, reason="idx_qr_token duplicates the unique constraint on qr_code.token")
+def test_qr_token_index_is_not_redundant(plan_connection: Connection) -> None:
+    assert "idx_qr_token" not in _redundant_indexes(plan_connection)
+
+
+def _metadata_redundant_indexes(table: Table) -> dict[str, str]:
+    """Return non-unique indexes whose columns prefix another index or constraint."""
+
+    covering: list[tuple[str, tuple[str, ...]]] = []
+    for constraint in table.constraints:
+        columns = tuple(constraint.columns.keys())
+        if isinstance(constraint, PrimaryKeyConstraint):
+            covering.append((constraint.name or f"{table.name}_pkey", columns))
+        elif isinstance(constraint, UniqueConstraint):
+            covering.append((constraint.name or f"{table.name}_{'_'.join(columns)}_key", columns))
+    covering.extend((index.name, tuple(column.name for column in index.columns)) for index in table.indexes)
+
+    redundant: dict[str, str] = {}
+    for index in table.indexes:
+        if index.unique:
+            continue
+        columns = tuple(column.name for column in index.columns)
+        for name, other_columns in covering:
+            if name != index.name and other_columns[: len(columns)] == columns:
+                redundant[index.name] = name
+    return redundant
+
+
+def test_model_metadata_flags_redundant_indexes() -> None:
+    """The schema check also runs without PostgreSQL using the model metadata."""
+
+    redundant: dict[str, str] = {}
+    for table in metadata.sorted_tables:
+        redundant.update(_metadata_redundant_indexes(table))
+
+    assert set(redundant) == set(KNOWN_REDUNDANT_INDEXES)
@@ -0,0 +1,50 @@
+"""Listening rollups against PostgreSQL date and interval arithmetic."""
+
+from __future__ import annotations
+
+import uuid
+from datetime import date, datetime, timedelta, timezone
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+from app.models import metadata
+from app.services.analytics import read_listening_rollup, update_listening_rollup
+
+DAY = datetime(2026, 10, 18, tzinfo=timezone.utc)
+
+
+def test_rollup_buckets_by_utc_start_day(postgres_engine: Engine) -> None:
+    metadata.create_all(postgres_engine)
+    qr_id, device_id = uuid.uuid4(), uuid.uuid4()
+    sessions = [
+        # Starts before midnight UTC and ends after it: counted on the 18th.
+        (DAY + timedelta(hours=23, minutes=30), DAY + timedelta(days=1, minutes=30)),
+        (DAY + timedelta(days=1, hours=8), DAY + timedelta(days=1, hours=8, minutes=45)),
+    ]
+    with postgres_engine.begin() as connection:
+        connection.execute(text("SET LOCAL TIME ZONE 'America/New_York'"))
+        connection.execute(
+            text("INSERT INTO qr_code (id, token, status, product_id) VALUES (:id, 'ROLLUP', 'ACTIVE', 4)"),
+            {"id": qr_id},
+        )
+        connection.execute(text("INSERT INTO device (id, ua_hash) VALUES (:id, 'ua')"), {"id": device_id})
+        for started, ended in sessions:
+            connection.execute(
+                text(
+                    "INSERT INTO play_session (id, qr_id, device_id, started_at, ended_at, ip_hash) "
+                    "VALUES (:id, :qr, :device, :started, :ended, 'ip')"
+                ),
+                {"id": uuid.uuid4(), "qr": qr_id, "device": device_id, "started": started, "ended": ended},
+            )
+
+    with postgres_engine.connect() as connection:
+        connection.exec_driver_sql("SET TIME ZONE 'America/New_York'")
+        connection.commit()
+        update_listening_rollup(connection, now=DAY + timedelta(days=3))
+        stored = read_listening_rollup(connection, 4, date(2026, 10, 1), date(2026, 10, 31))
+
+    assert {day: (entry.sessions, entry.listening_ms) for day, entry in stored.items()} == {
+        date(2026, 10, 18): (1, 3_600_000),
+        date(2026, 10, 19): (1, 45 * 60_000),
+    }
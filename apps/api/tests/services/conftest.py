@@ -0,0 +1,45 @@
+"""Fixtures shared by the storage service tests."""
+
+from __future__ import annotations
+
+import socket
+from collections.abc import Iterator
+
+import httpx
+import pytest
+
+from app.services.storage.s3 import sign_request
+
+MOTO_BUCKET = "media"
+
+
+@pytest.fixture()
+def moto_endpoint() -> Iterator[str]:
+    """Start moto's S3 server with an empty ``media`` bucket and return its URL.
+
+    moto keeps its state per process, not per server, so it is reset before
+    and after each test; otherwise objects written by one test show up in the
+    next one's bucket.
+    """
+
+    moto_server = pytest.importorskip("moto.server")
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    server = moto_server.ThreadedMotoServer(ip_address="127.0.0.1", port=port)
+    server.start()
+    endpoint = f"http://127.0.0.1:{port}"
+    try:
+        with httpx.Client() as client:
+            client.post(f"{endpoint}/moto-api/reset").raise_for_status()
+            url = f"{endpoint}/{MOTO_BUCKET}"
+            headers = sign_request(
+                "PUT", url, {}, access_key="AKIDEXAMPLE", secret_key="secret", region="us-east-1",
+                payload_hash="UNSIGNED-PAYLOAD",
+            )
+            client.put(url, headers=headers).raise_for_status()
+        yield endpoint
+    finally:
+        with httpx.Client() as client:
+            client.post(f"{endpoint}/moto-api/reset")
+        server.stop()
@@ -0,0 +1,62 @@
+"""Tests for the per-batch activation counters."""
+
+from __future__ import annotations
+
+from sqlalchemy.engine import Engine
+from sqlmodel import Session
+
+from app.models import QrCode, QrStatus
+from app.services.activation_stats import (
+    ActivationCounts,
+    read_activation_stats,
+    rebuild_activation_stats,
+    record_transition,
+)
+
+
+def _codes(session: Session, count: int, status: QrStatus, batch_id: int = 7, product_id: int = 1) -> list[QrCode]:
+    codes = [
+        QrCode(token=f"BATCH-{status.value}-{product_id}-{index}", status=status, batch_id=batch_id, product_id=product_id)
+        for index in range(count)
+    ]
+    session.add_all(codes)
+    session.flush()
+    return codes
+
+
+def test_transitions_move_counts_between_statuses(engine: Engine) -> None:
+    with Session(engine) as session:
+        codes = _codes(session, 20, QrStatus.NEW)
+        for qr_code in codes:
+            record_transition(session, qr_code, None)
+        for qr_code in codes[:5]:
+            qr_code.status = QrStatus.ACTIVE
+            record_transition(session, qr_code, QrStatus.NEW)
+        record_transition(session, codes[0], QrStatus.ACTIVE, reregistration=True, cooldown=True)
+        session.commit()
+
+    with engine.connect() as connection:
+        stats = read_activation_stats(connection, 7)
+
+    assert stats == {1: ActivationCounts(new=15, active=5, reregistrations=1, cooldowns=1)}
+
+
+def test_rebuild_recounts_statuses_and_keeps_events(engine: Engine) -> None:
+    with Session(engine) as session:
+        codes = _codes(session, 3, QrStatus.ACTIVE)
+        _codes(session, 2, QrStatus.BLOCKED)
+        _codes(session, 4, QrStatus.NEW, product_id=2)
+        _codes(session, 1, QrStatus.NEW, batch_id=None, product_id=None)
+        record_transition(session, codes[0], QrStatus.ACTIVE, reregistration=True)
+        session.commit()
+
+    with engine.connect() as connection:
+        assert rebuild_activation_stats(connection) == 3
+        batch = read_activation_stats(connection, 7)
+        unassigned = read_activation_stats(connection, 0, product_id=0)
+
+    assert batch == {
+        1: ActivationCounts(active=3, blocked=2, reregistrations=1),
+        2: ActivationCounts(new=4),
+    }
+    assert unassigned == {0: ActivationCounts(new=1)}
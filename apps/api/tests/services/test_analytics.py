@@ -0,0 +1,134 @@
+"""Tests for the incremental daily listening rollup."""
+
+from __future__ import annotations
+
+from datetime import date, datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy.engine import Engine
+from sqlmodel import Session
+
+from app.core import config
+from app.models import Device, ListeningProgress, PlaySession, QrCode, QrStatus
+from app.services.analytics import load_watermark, read_listening_rollup, update_listening_rollup
+
+DAY = datetime(2026, 10, 18, tzinfo=timezone.utc)
+PRODUCT = 7
+
+
+@pytest.fixture(autouse=True)
+def settle(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(config.get_settings(), "analytics_rollup_settle_seconds", 60.0)
+
+
+def _seed(engine: Engine) -> tuple[QrCode, Device]:
+    qr_code = QrCode(token="ROLLUP", status=QrStatus.ACTIVE, product_id=PRODUCT)
+    unassigned = QrCode(token="NO-PRODUCT", status=QrStatus.ACTIVE)
+    device = Device(ua_hash="ua")
+    with Session(engine, expire_on_commit=False) as session:
+        session.add_all([qr_code, unassigned, device])
+        session.add(_session(unassigned, device, DAY, DAY + timedelta(hours=1)))
+        session.commit()
+    return qr_code, device
+
+
+def _session(qr_code: QrCode, device: Device, started: datetime, ended: datetime | None) -> PlaySession:
+    return PlaySession(qr_id=qr_code.id, device_id=device.id, started_at=started, ended_at=ended, ip_hash="ip")
+
+
+def _report(engine: Engine) -> dict[date, tuple[int, int, int]]:
+    with engine.connect() as connection:
+        stored = read_listening_rollup(connection, PRODUCT, date(2026, 10, 1), date(2026, 10, 31))
+    return {day: (entry.sessions, entry.listening_ms, entry.completions) for day, entry in stored.items()}
+
+
+def test_rollup_counts_sessions_and_completions_once(engine: Engine) -> None:
+    qr_code, device = _seed(engine)
+    with Session(engine) as session:
+        session.add(_session(qr_code, device, DAY + timedelta(hours=9), DAY + timedelta(hours=9, minutes=30)))
+        session.add(_session(qr_code, device, DAY + timedelta(hours=10), DAY + timedelta(hours=11)))
+        session.add(
+            ListeningProgress(
+                qr_id=qr_code.id, device_id=device.id, track_id="ch-1", position_ms=1,
+                updated_at=DAY + timedelta(hours=12), completed_at=DAY + timedelta(hours=12),
+            )
+        )
+        session.commit()
+
+    with engine.connect() as connection:
+        first = update_listening_rollup(connection, now=DAY + timedelta(days=1))
+        second = update_listening_rollup(connection, now=DAY + timedelta(days=1, hours=1))
+
+    assert (first.sessions, first.completions) == (2, 1)
+    assert (second.sessions, second.completions) == (0, 0)
+    assert _report(engine) == {DAY.date(): (2, 90 * 60_000, 1)}
+
+
+def test_late_endings_fold_into_the_day_they_started(engine: Engine) -> None:
+    qr_code, device = _seed(engine)
+    late = _session(qr_code, device, DAY + timedelta(hours=23), None)
+    with Session(engine, expire_on_commit=False) as session:
+        session.add(_session(qr_code, device, DAY + timedelta(hours=8), DAY + timedelta(hours=9)))
+        session.add(late)
+        session.commit()
+
+    with engine.connect() as connection:
+        update_listening_rollup(connection, now=DAY + timedelta(days=1))
+        watermark = load_watermark(connection)
+
+    # The open session ends after the watermark, on the following day.
+    with Session(engine) as session:
+        stored = session.get(PlaySession, (late.id, late.started_at))
+        stored.ended_at = DAY + timedelta(days=1, hours=2)
+        session.add(stored)
+        session.commit()
+
+    with engine.connect() as connection:
+        update_listening_rollup(connection, now=DAY + timedelta(days=2))
+
+    assert watermark == DAY + timedelta(days=1) - timedelta(minutes=1)
+    assert _report(engine) == {DAY.date(): (2, 4 * 3_600_000, 0)}
+
+
+def test_backdated_closes_behind_the_watermark_are_counted(engine: Engine) -> None:
+    qr_code, device = _seed(engine)
+    abandoned = _session(qr_code, device, DAY + timedelta(hours=10), None)
+    with Session(engine, expire_on_commit=False) as session:
+        session.add(abandoned)
+        session.commit()
+
+    with engine.connect() as connection:
+        update_listening_rollup(connection, now=DAY + timedelta(hours=12))
+
+    # Closed at its last heartbeat, long behind the watermark.
+    with Session(engine) as session:
+        stored = session.get(PlaySession, (abandoned.id, abandoned.started_at))
+        stored.ended_at = DAY + timedelta(hours=10, minutes=30)
+        stored.closed_at = DAY + timedelta(hours=12, minutes=5)
+        session.add(stored)
+        session.commit()
+
+    with engine.connect() as connection:
+        run = update_listening_rollup(connection, now=DAY + timedelta(hours=13))
+
+    assert run.sessions == 1
+    assert _report(engine) == {DAY.date(): (1, 30 * 60_000, 0)}
+
+
+def test_completion_is_counted_after_later_position_updates(engine: Engine) -> None:
+    qr_code, device = _seed(engine)
+    with Session(engine) as session:
+        # Completed in the first window, then re-opened before the rollup ran.
+        session.add(
+            ListeningProgress(
+                qr_id=qr_code.id, device_id=device.id, track_id="ch-1", position_ms=5,
+                updated_at=DAY + timedelta(days=1, hours=1), completed_at=DAY + timedelta(hours=20),
+            )
+        )
+        session.commit()
+
+    with engine.connect() as connection:
+        update_listening_rollup(connection, now=DAY + timedelta(days=1), max_window=timedelta(hours=6))
+        update_listening_rollup(connection, now=DAY + timedelta(days=2))
+
+    assert _report(engine) == {DAY.date(): (0, 0, 1)}
@@ -0,0 +1,44 @@
+"""Tests for the cached token/device binding lookups."""
+
+from __future__ import annotations
+
+import time
+import uuid
+
+import pytest
+
+from app.services.bindings import BindingCache, BoundDevice
+
+
+def test_invalidation_reaches_other_workers_through_redis() -> None:
+    fakeredis = pytest.importorskip("fakeredis")
+    shared = fakeredis.FakeRedis()
+    worker_a, worker_b = BindingCache(redis_client=shared), BindingCache(redis_client=shared)
+    device_id = uuid.uuid4()
+    bound = BoundDevice(qr_id=uuid.uuid4(), account_id=None)
+
+    looked_up_at = time.time()
+    worker_a.put("TOKEN", device_id, bound, 60)
+    worker_b.put("OTHER", device_id, bound, 60)
+    assert worker_a.get("TOKEN", device_id) == bound
+
+    worker_b.invalidate("TOKEN")
+    assert worker_a.get("TOKEN", device_id) is None
+    assert worker_b.get("OTHER", device_id) == bound
+
+    # A lookup that started before the change is stale even if cached after it.
+    worker_a.put("TOKEN", device_id, bound, 60, looked_up_at=looked_up_at)
+    assert worker_a.get("TOKEN", device_id) is None
+    time.sleep(0.01)
+    worker_a.put("TOKEN", device_id, bound, 60)
+    assert worker_a.get("TOKEN", device_id) == bound
+
+
+def test_invalidation_without_redis_drops_local_entries() -> None:
+    cache = BindingCache()
+    device_id = uuid.uuid4()
+    bound = BoundDevice(qr_id=uuid.uuid4(), account_id=None)
+    cache.put("TOKEN", device_id, bound, 60)
+
+    cache.invalidate("TOKEN")
+    assert cache.get("TOKEN", device_id) is None
@@ -0,0 +1,226 @@
+"""Tests for the local disk cache in front of remote storage."""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+from app.services.storage import Buffer, LocalStorage
+from app.services.storage.disk_cache import LOCK_NAME, DiskCachedStorage
+from app.services.storage.s3 import S3Settings, S3Storage
+
+DATA = bytes(range(256)) * 40  # 10240 bytes
+
+
+class CountingStorage(LocalStorage):
+    """Local storage that records the ranges it is asked for."""
+
+    def __init__(self, root: Path, delay: float = 0.0) -> None:
+        super().__init__(root)
+        self.reads: list[tuple[str, int, int]] = []
+        self.delay = delay
+
+    def read_range(self, path: str, start: int, end: int) -> Buffer:
+        self.reads.append((path, start, end))
+        time.sleep(self.delay)
+        return super().read_range(path, start, end)
+
+
+@pytest.fixture()
+def backend(tmp_path: Path) -> CountingStorage:
+    (tmp_path / "remote").mkdir()
+    (tmp_path / "remote" / "book.mp3").write_bytes(DATA)
+    return CountingStorage(tmp_path / "remote")
+
+
+def _cached_files(root: Path) -> list[Path]:
+    return [path for path in root.rglob("*") if path.is_file() and path.name != LOCK_NAME]
+
+
+def test_blocks_are_fetched_once_and_served_from_disk(backend: CountingStorage, tmp_path: Path) -> None:
+    cache = DiskCachedStorage(backend, tmp_path / "cache", max_bytes=10**6, block_size=4096)
+
+    assert bytes(cache.read_range("book.mp3", 100, 5000)) == DATA[100:5000]
+    assert backend.reads == [("book.mp3", 0, 4096), ("book.mp3", 4096, 8192)]
+    assert bytes(cache.read_range("book.mp3", 4200, 4300)) == DATA[4200:4300]
+    assert bytes(cache.read_range("book.mp3", 8000, 10**6)) == DATA[8000:]
+    assert backend.reads[2:] == [("book.mp3", 8192, 10240)]
+
+    stats = cache.stats()
+    assert (stats.hits, stats.misses) == (2, 3)
+    assert stats.miss_bytes == len(DATA) and stats.cached_bytes == len(DATA)
+    assert sorted(path.stat().st_size for path in _cached_files(tmp_path / "cache")) == [2048, 4096, 4096]
+
+    with cache.open("book.mp3") as handle:
+        handle.seek(9000)
+        assert handle.read() == DATA[9000:]
+    assert len(backend.reads) == 3
+
+    # A new process sharing the directory starts with the blocks already there.
+    restarted = DiskCachedStorage(backend, tmp_path / "cache", max_bytes=10**6, block_size=4096)
+    assert restarted.stats().cached_bytes == len(DATA)
+    assert bytes(restarted.read_range("book.mp3", 0, 10240)) == DATA
+    assert len(backend.reads) == 3
+
+
+def test_chunks_are_sliced_from_cached_blocks(backend: CountingStorage, tmp_path: Path) -> None:
+    cache = DiskCachedStorage(backend, tmp_path / "cache", max_bytes=10**6, block_size=4096)
+
+    async def collect(start: int, end: int | None) -> list[bytes]:
+        return [bytes(chunk) async for chunk in cache.iter_chunks("book.mp3", start, end, chunk_size=1000)]
+
+    chunks = asyncio.run(collect(3000, 9000))
+    assert b"".join(chunks) == DATA[3000:9000]
+    assert max(len(chunk) for chunk in chunks) == 1000
+    assert len(backend.reads) == 3
+    assert b"".join(asyncio.run(collect(0, None))) == DATA
+    assert len(backend.reads) == 3
+
+
+def test_least_recently_used_blocks_are_evicted(backend: CountingStorage, tmp_path: Path) -> None:
+    # Sweeps free a sixteenth of the cap, so two blocks still fit.
+    cache = DiskCachedStorage(backend, tmp_path / "cache", max_bytes=9000, block_size=4096)
+
+    cache.read_range("book.mp3", 0, 10)  # block 0
+    cache.read_range("book.mp3", 4096, 4106)  # block 1
+    cache.read_range("book.mp3", 0, 10)  # block 0 becomes most recent
+    cache.read_range("book.mp3", 8192, 8202)  # block 2 evicts block 1
+
+    stats = cache.stats()
+    assert stats.evictions == 1 and stats.evicted_bytes == 4096
+    assert stats.cached_bytes == 4096 + 2048
+    assert sum(path.stat().st_size for path in _cached_files(tmp_path / "cache")) == stats.cached_bytes
+
+    cache.read_range("book.mp3", 0, 10)
+    assert len(backend.reads) == 3
+    cache.read_range("book.mp3", 4096, 4106)
+    assert backend.reads[-1] == ("book.mp3", 4096, 8192)
+
+    # A directory over the cap is trimmed when it is opened.
+    smaller = DiskCachedStorage(backend, tmp_path / "cache", max_bytes=4096, block_size=4096)
+    assert smaller.stats().cached_bytes <= 4096
+    assert sum(path.stat().st_size for path in _cached_files(tmp_path / "cache")) <= 4096
+
+
+def test_processes_sharing_a_directory_keep_it_under_the_cap(backend: CountingStorage, tmp_path: Path) -> None:
+    first = DiskCachedStorage(backend, tmp_path / "cache", max_bytes=9000, block_size=4096)
+    second = DiskCachedStorage(backend, tmp_path / "cache", max_bytes=9000, block_size=4096)
+
+    first.read_range("book.mp3", 0, 10)  # block 0
+    first.read_range("book.mp3", 4096, 4106)  # block 1
+    second.read_range("book.mp3", 0, 10)  # a hit in the other process refreshes block 0
+    second.read_range("book.mp3", 8192, 8202)  # block 2 evicts block 1
+
+    assert sum(path.stat().st_size for path in _cached_files(tmp_path / "cache")) <= 9000
+    assert second.stats().cached_bytes == 4096 + 2048
+    assert second.stats().evicted_bytes == 4096
+    assert len(backend.reads) == 3
+    first.read_range("book.mp3", 0, 10)
+    assert len(backend.reads) == 3
+    first.read_range("book.mp3", 4096, 4106)
+    assert backend.reads[-1] == ("book.mp3", 4096, 8192)
+
+
+def test_a_full_cache_is_not_swept_on_every_miss(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    (tmp_path / "remote").mkdir()
+    (tmp_path / "remote" / "long.mp3").write_bytes(bytes(range(256)) * 4 * 200)
+    cache = DiskCachedStorage(
+        LocalStorage(tmp_path / "remote"), tmp_path / "cache", max_bytes=64 * 1024, block_size=1024
+    )
+    sweeps = 0
+    sweep = cache._sweep
+
+    def counting_sweep() -> None:
+        nonlocal sweeps
+        sweeps += 1
+        sweep()
+
+    monkeypatch.setattr(cache, "_sweep", counting_sweep)
+    for index in range(200):
+        cache.read_range("long.mp3", index * 1024, index * 1024 + 10)
+
+    # One sweep per sixteenth of the cap written: 200 blocks of 1 KiB, 4 KiB each.
+    assert sweeps == 50
+    assert sum(path.stat().st_size for path in _cached_files(tmp_path / "cache")) <= 64 * 1024
+
+
+def test_concurrent_misses_share_one_fetch(tmp_path: Path) -> None:
+    (tmp_path / "remote").mkdir()
+    (tmp_path / "remote" / "book.mp3").write_bytes(DATA)
+    backend = CountingStorage(tmp_path / "remote", delay=0.05)
+    cache = DiskCachedStorage(backend, tmp_path / "cache", max_bytes=10**6, block_size=4096)
+    cache.stat("book.mp3")
+    results: list[bytes] = []
+    barrier = threading.Barrier(8)
+
+    def read() -> None:
+        barrier.wait()
+        results.append(bytes(cache.read_range("book.mp3", 10, 4000)))
+
+    threads = [threading.Thread(target=read) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == [DATA[10:4000]] * 8
+    assert backend.reads == [("book.mp3", 0, 4096)]
+    assert cache.stats().hits == 7
+    assert not [path for path in _cached_files(tmp_path / "cache") if path.name.startswith(".tmp-")]
+
+
+def test_replaced_files_get_new_blocks(backend: CountingStorage, tmp_path: Path) -> None:
+    cache = DiskCachedStorage(backend, tmp_path / "cache", max_bytes=10**6, block_size=4096, stat_ttl_seconds=0)
+    assert bytes(cache.read_range("book.mp3", 0, 10)) == DATA[:10]
+
+    replacement = b"\x01" * 5000
+    cache.write("book.mp3", replacement)
+    os.utime(tmp_path / "remote" / "book.mp3", (1, 1))
+
+    assert bytes(cache.read_range("book.mp3", 0, 10)) == replacement[:10]
+    assert cache.stat("book.mp3").size == 5000
+
+
+def test_stale_temporary_files_are_removed(backend: CountingStorage, tmp_path: Path) -> None:
+    (tmp_path / "cache" / "ab").mkdir(parents=True)
+    stale = tmp_path / "cache" / "ab" / ".tmp-stale"
+    fresh = tmp_path / "cache" / "ab" / ".tmp-fresh"
+    stale.write_bytes(b"partial")
+    fresh.write_bytes(b"partial")
+    os.utime(stale, (1, 1))
+
+    cache = DiskCachedStorage(backend, tmp_path / "cache", max_bytes=10**6)
+
+    assert not stale.exists() and fresh.exists()
+    assert cache.stats().cached_bytes == 0
+
+
+def test_against_moto_server(moto_endpoint: str, tmp_path: Path) -> None:
+    remote = S3Storage(
+        S3Settings(endpoint=moto_endpoint, access_key="AKIDEXAMPLE", secret_key="secret", bucket="media")
+    )
+    requests: list[str] = []
+    original = remote.read_range
+
+    def counted(path: str, start: int, end: int) -> Buffer:
+        requests.append(f"{start}-{end}")
+        return original(path, start, end)
+
+    remote.read_range = counted  # type: ignore[method-assign]
+    cache = DiskCachedStorage(remote, tmp_path / "cache", max_bytes=10**6, block_size=4096)
+    try:
+        cache.write("books/book.mp3", DATA, content_type="audio/mpeg")
+
+        assert cache.exists("books/book.mp3") and not cache.exists("books/missing.mp3")
+        assert bytes(cache.read_range("books/book.mp3", 100, 9000)) == DATA[100:9000]
+        assert bytes(cache.read_range("books/book.mp3", 0, 10**6)) == DATA
+        assert requests == ["0-4096", "4096-8192", "8192-10240"]
+        assert [path for path, _ in cache.iter_files("books/")] == ["books/book.mp3"]
+        assert cache.stats().hit_ratio == 0.5
+    finally:
+        cache.close()
@@ -0,0 +1,66 @@
+"""Tests for the chunked CSV exports."""
+
+from __future__ import annotations
+
+import csv
+import io
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy.engine import Engine
+from sqlmodel import Session
+
+from app.models import Device, ListeningProgress, PlaySession, QrCode
+from app.services.exports import EXPORTS, iter_csv_chunks
+
+START = datetime(2026, 10, 1)
+
+
+@pytest.fixture()
+def engine(engine: Engine) -> Engine:
+    qr_code, device = QrCode(token="EXPORT"), Device(ua_hash="ua")
+    with Session(engine) as session:
+        session.add_all([qr_code, device])
+        session.flush()
+        for index in range(7):
+            # Pairs of sessions end at the same instant to exercise the tie-breaker.
+            ended = START + timedelta(hours=index // 2)
+            session.add(
+                PlaySession(
+                    qr_id=qr_code.id, device_id=device.id, started_at=ended - timedelta(minutes=30),
+                    ended_at=ended, ip_hash=f"ip-{index}",
+                )
+            )
+        session.add(PlaySession(qr_id=qr_code.id, device_id=device.id, started_at=START, ip_hash="open"))
+        session.add(
+            ListeningProgress(
+                qr_id=qr_code.id, device_id=device.id, track_id="ch-1", position_ms=5, updated_at=START
+            )
+        )
+        session.commit()
+    return engine
+
+
+def _read(chunks: list[bytes]) -> list[dict[str, str]]:
+    return list(csv.DictReader(io.StringIO(b"".join(chunks).decode("utf-8"))))
+
+
+def test_export_walks_every_row_once_in_small_chunks(engine: Engine) -> None:
+    chunks = list(
+        iter_csv_chunks([engine], EXPORTS["play_session"], START, START + timedelta(days=1), chunk_rows=2)
+    )
+    rows = _read(chunks)
+
+    assert len(chunks) == 1 + 4
+    assert sorted(row["ip_hash"] for row in rows) == [f"ip-{index}" for index in range(7)]
+    assert [row["ended_at"] for row in rows] == sorted(row["ended_at"] for row in rows)
+
+
+def test_export_filters_by_time_range(engine: Engine) -> None:
+    sessions = _read(
+        list(iter_csv_chunks([engine], EXPORTS["play_session"], START + timedelta(hours=1), START + timedelta(hours=2)))
+    )
+    progress = _read(list(iter_csv_chunks([engine], EXPORTS["listening_progress"], START, START + timedelta(hours=1))))
+
+    assert sorted(row["ip_hash"] for row in sessions) == ["ip-2", "ip-3"]
+    assert [(row["track_id"], row["position_ms"], row["completed_at"]) for row in progress] == [("ch-1", "5", "")]
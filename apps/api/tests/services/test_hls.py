@@ -0,0 +1,149 @@
+"""Tests for frame-accurate HLS segmentation."""
+
+from __future__ import annotations
+
+import struct
+from pathlib import Path
+
+import pytest
+
+from app.scripts.ingest_hls import ingest
+
+from app.services.hls import (
+    MPEG_CLOCK_HZ,
+    TIMESTAMP_OWNER,
+    DurationCounter,
+    UnsupportedAudio,
+    audio_duration,
+    detect_codec,
+    iter_frames,
+    render_media_playlist,
+    split_segments,
+    timestamp_tag,
+)
+from app.services.sampler import parse_media_playlist
+from app.services.storage import LocalStorage
+
+# MPEG-1 Layer III, 128 kbit/s, 44.1 kHz: 417-byte frames of 1152 samples.
+MP3_HEADER = b"\xff\xfb\x90\x00"
+MP3_FRAME = MP3_HEADER + bytes(413)
+MP3_FRAME_SECONDS = 1152 / 44100
+
+
+def mp3(frames: int) -> bytes:
+    return MP3_FRAME * frames
+
+
+def adts_frame(payload: int = 200) -> bytes:
+    length = 7 + payload
+    # AAC LC, 44.1 kHz, stereo, no CRC, one raw data block.
+    header = bytes(
+        [0xFF, 0xF1, 0x50, 0x80 | (length >> 11), (length >> 3) & 0xFF, ((length & 7) << 5) | 0x1F, 0xFC]
+    )
+    return header + bytes(payload)
+
+
+def id3(size: int) -> bytes:
+    return b"ID3\x03\x00\x00" + bytes([(size >> 21) & 0x7F, (size >> 14) & 0x7F, (size >> 7) & 0x7F, size & 0x7F]) + (
+        b"\xff" * size
+    )
+
+
+def test_mp3_frames_skip_tags_and_junk() -> None:
+    data = id3(300) + mp3(3) + b"\xff\xfb\x00junk" + mp3(2) + b"TAG" + bytes(125)
+
+    frames = list(iter_frames(data, "mp3"))
+
+    assert detect_codec(data) == "mp3"
+    assert len(frames) == 5
+    assert frames[0].offset == 310
+    assert {frame.length for frame in frames} == {417}
+    assert frames[3].offset == 310 + 3 * 417 + 7
+
+
+def test_segments_end_on_frame_boundaries() -> None:
+    data = mp3(600)  # about 15.7 seconds
+
+    spans = split_segments(data, "mp3", 6.0)
+
+    frames_per_segment = -(-6.0 // MP3_FRAME_SECONDS)
+    assert [round(span.duration, 3) for span in spans] == [
+        round(frames_per_segment * MP3_FRAME_SECONDS, 3),
+        round(frames_per_segment * MP3_FRAME_SECONDS, 3),
+        round((600 - 2 * frames_per_segment) * MP3_FRAME_SECONDS, 3),
+    ]
+    assert all(span.start % 417 == 0 and span.end % 417 == 0 for span in spans)
+    assert spans[1].start == spans[0].end
+    assert spans[2].start_seconds == pytest.approx(spans[0].duration + spans[1].duration)
+
+
+def test_adts_frames_and_unknown_data() -> None:
+    data = adts_frame() * 300
+
+    spans = split_segments(data, "aac", 6.0)
+
+    assert detect_codec(data) == "aac"
+    assert spans[0].duration == pytest.approx(259 * 1024 / 44100)
+    assert sum(span.end - span.start for span in spans) == len(data)
+    with pytest.raises(UnsupportedAudio):
+        detect_codec(b"RIFF" + bytes(100))
+
+
+@pytest.mark.parametrize("chunk_size", [1000, 65536, 1 << 20])
+def test_duration_counter_matches_whole_file_parsing(chunk_size: int) -> None:
+    samples = [
+        id3(300_000) + mp3(400) + b"\xff\x00junk" * 40_000 + mp3(300) + b"TAG" + bytes(125),
+        adts_frame() * 900,
+        b"RIFF" + bytes(300_000),
+        mp3(1),
+        b"",
+    ]
+    for data in samples:
+        counter = DurationCounter()
+        for start in range(0, len(data), chunk_size):
+            counter.feed(data[start : start + chunk_size])
+        assert counter.finish() == audio_duration(data)
+
+
+def test_timestamp_tag_and_playlist() -> None:
+    tag = timestamp_tag(12.5)
+
+    assert tag.startswith(b"ID3\x04")
+    assert tag[10:14] == b"PRIV"
+    assert tag[20 : 20 + len(TIMESTAMP_OWNER)] == TIMESTAMP_OWNER
+    assert struct.unpack(">Q", tag[-8:])[0] == 12.5 * MPEG_CLOCK_HZ
+
+    playlist = render_media_playlist([[("a-0.mp3", 6.5), ("a-1.mp3", 2.0)], [("b-0.mp3", 7.2)]])
+    assert "#EXT-X-TARGETDURATION:8" in playlist
+    assert playlist.count("#EXT-X-DISCONTINUITY") == 1
+    assert playlist.endswith("b-0.mp3\n#EXT-X-ENDLIST\n")
+
+
+def test_ingest_segments_products_and_skips_unchanged_files(tmp_path: Path) -> None:
+    source, media = tmp_path / "masters", tmp_path / "media"
+    (source / "7").mkdir(parents=True)
+    (source / "7" / "01-intro.mp3").write_bytes(id3(50) + mp3(300))
+    (source / "7" / "02-chapter.aac").write_bytes(adts_frame() * 400)
+    (source / "7" / "notes.txt").write_text("ignored")
+
+    assert ingest(source, workers=2, storage_root=str(media)) == (2, 0, 0)
+
+    storage = LocalStorage(media)
+    with storage.open("hls/7/index.m3u8") as handle:
+        playlist = handle.read().decode()
+    segments = parse_media_playlist(playlist, "hls/7/index.m3u8")
+    assert [Path(segment.path).suffix for segment in segments] == [".mp3", ".mp3", ".aac", ".aac"]
+    assert "#EXT-X-DISCONTINUITY" in playlist
+    first = (media / segments[0].path).read_bytes()
+    assert first.startswith(timestamp_tag(0.0)) and first[len(timestamp_tag(0.0)) :].startswith(MP3_HEADER)
+    first_span = split_segments(mp3(300), "mp3", 6.0)[0]
+    assert (media / segments[1].path).read_bytes().startswith(timestamp_tag(first_span.duration))
+
+    playlist_mtime = (media / "hls/7/index.m3u8").stat().st_mtime_ns
+    assert ingest(source, workers=1, storage_root=str(media)) == (0, 2, 0)
+    assert (media / "hls/7/index.m3u8").stat().st_mtime_ns == playlist_mtime
+
+    (source / "7" / "02-chapter.aac").write_bytes(adts_frame() * 100)
+    assert ingest(source, workers=1, storage_root=str(media)) == (1, 1, 0)
+    with storage.open("hls/7/index.m3u8") as handle:
+        assert len(parse_media_playlist(handle.read().decode(), "hls/7/index.m3u8")) == 3
@@ -0,0 +1,136 @@
+"""Tests for the in-memory hot segment cache."""
+
+from __future__ import annotations
+
+import asyncio
+import os
+from collections import Counter
+from pathlib import Path
+
+import pytest
+
+from app.services.storage import Buffer, LocalStorage
+from app.services.storage.hot_cache import FrequencySketch, HotSegmentCache
+
+DATA = bytes(range(256)) * 64  # 16384 bytes
+
+
+class CountingStorage(LocalStorage):
+    """Local storage that records the ranges it is asked for."""
+
+    def __init__(self, root: Path) -> None:
+        super().__init__(root)
+        self.reads: list[tuple[str, int, int]] = []
+
+    def read_range(self, path: str, start: int, end: int) -> Buffer:
+        self.reads.append((path, start, end))
+        return super().read_range(path, start, end)
+
+
+class ExactSketch:
+    """Frequency counts without the collisions of a real sketch."""
+
+    def __init__(self) -> None:
+        self.counts: Counter[tuple[str, int, int]] = Counter()
+
+    def increment(self, key: tuple[str, int, int]) -> None:
+        self.counts[key] += 1
+
+    def estimate(self, key: tuple[str, int, int]) -> int:
+        return self.counts[key]
+
+
+@pytest.fixture()
+def backend(tmp_path: Path) -> CountingStorage:
+    (tmp_path / "book.mp3").write_bytes(DATA)
+    return CountingStorage(tmp_path)
+
+
+def test_repeated_ranges_are_served_from_memory_without_copies(backend: CountingStorage) -> None:
+    cache = HotSegmentCache(backend, max_bytes=64 * 1024)
+
+    first = cache.read_range("book.mp3", 100, 2100)
+    second = cache.read_range("book.mp3", 100, 2100)
+    assert isinstance(second, memoryview) and bytes(second) == DATA[100:2100]
+    assert second.obj is first.obj  # type: ignore[union-attr]
+    assert backend.reads == [("book.mp3", 100, 2100)]
+
+    # Ranges are clamped to the file before they are used as keys.
+    assert bytes(cache.read_range("book.mp3", 16000, 10**6)) == DATA[16000:]
+    assert bytes(cache.read_range("book.mp3", 16000, 16384)) == DATA[16000:]
+    assert len(backend.reads) == 2
+
+    async def collect() -> list[bytes]:
+        return [bytes(chunk) async for chunk in cache.iter_chunks("book.mp3", 100, 2100, chunk_size=500)]
+
+    assert asyncio.run(collect()) == [DATA[start : start + 500] for start in range(100, 2100, 500)]
+    assert cache.cached_range("book.mp3", 100, 2100) is not None
+    assert len(backend.reads) == 2
+
+    stats = cache.stats()
+    assert (stats.hits, stats.misses) == (4, 2)
+    assert stats.entries == 2 and stats.cached_bytes == 2000 + 384
+
+
+def test_ranges_over_the_entry_limit_pass_through(backend: CountingStorage) -> None:
+    cache = HotSegmentCache(backend, max_bytes=64 * 1024, max_entry_bytes=4096)
+
+    async def collect() -> bytes:
+        return b"".join([bytes(chunk) async for chunk in cache.iter_chunks("book.mp3", chunk_size=4096)])
+
+    assert asyncio.run(collect()) == DATA
+    assert asyncio.run(collect()) == DATA
+    stats = cache.stats()
+    assert stats.entries == 0 and stats.misses == 2
+
+
+def test_memory_budget_holds_and_frequent_ranges_survive_scans(backend: CountingStorage) -> None:
+    cache = HotSegmentCache(backend, max_bytes=8192, max_entry_bytes=1024, window_fraction=0.125)
+    cache._sketch = ExactSketch()  # type: ignore[assignment]
+    hot = [(start, start + 1024) for start in range(0, 6144, 1024)]
+    for _ in range(5):
+        for start, end in hot:
+            cache.read_range("book.mp3", start, end)
+    before = len(backend.reads)
+
+    # A one-off scan of the rest of the file would flush an LRU cache.
+    for start in range(6144, 16384, 512):
+        cache.read_range("book.mp3", start, start + 512)
+        assert cache.stats().cached_bytes <= 8192
+
+    scanned = len(backend.reads)
+    for start, end in hot:
+        cache.read_range("book.mp3", start, end)
+    assert len(backend.reads) == scanned
+    stats = cache.stats()
+    assert stats.rejected > 0
+    assert scanned - before == len(range(6144, 16384, 512))
+
+
+def test_replaced_files_are_read_again(backend: CountingStorage, tmp_path: Path) -> None:
+    cache = HotSegmentCache(backend, max_bytes=64 * 1024, stat_ttl_seconds=0)
+    cache.read_range("book.mp3", 0, 100)
+
+    (tmp_path / "book.mp3").write_bytes(b"\x01" * 200)
+    os.utime(tmp_path / "book.mp3", (1, 1))
+    assert bytes(cache.read_range("book.mp3", 0, 100)) == b"\x01" * 100
+
+    cache.write("book.mp3", b"\x02" * 200)
+    assert bytes(cache.read_range("book.mp3", 0, 100)) == b"\x02" * 100
+    assert len(backend.reads) == 3
+
+
+def test_frequency_sketch_counts_and_ages() -> None:
+    sketch = FrequencySketch(64)
+    for _ in range(20):
+        sketch.increment(("a.mp3", 0, 10))
+    for _ in range(3):
+        sketch.increment(("b.mp3", 0, 10))
+
+    assert sketch.estimate(("a.mp3", 0, 10)) == 15
+    assert 3 <= sketch.estimate(("b.mp3", 0, 10)) < 15
+    assert sketch.estimate(("c.mp3", 0, 10)) <= 1
+
+    for index in range(10 * 64):
+        sketch.increment(("scan.mp3", index, index + 1))
+    assert sketch.estimate(("a.mp3", 0, 10)) <= 8
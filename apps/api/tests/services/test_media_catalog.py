@@ -0,0 +1,98 @@
+"""Tests for the media asset catalog."""
+
+from __future__ import annotations
+
+import hashlib
+from pathlib import Path
+
+import pytest
+from sqlalchemy.engine import Engine
+
+from app.scripts.ingest_hls import ingest
+from app.scripts.rescan_media import rescan
+from app.services.media_catalog import AssetInfo, MediaCatalog
+from app.services.storage import Buffer, HotSegmentCache, LocalStorage, StorageBackend, StorageStat
+
+MP3_FRAME = b"\xff\xfb\x90\x00" + bytes(413)  # 128 kbit/s, 44.1 kHz, 1152 samples
+
+
+class CountingStorage(LocalStorage):
+    def __init__(self, root: Path) -> None:
+        super().__init__(root)
+        self.stats = 0
+
+    def stat(self, path: str) -> StorageStat:
+        self.stats += 1
+        return super().stat(path)
+
+
+def test_lookups_come_from_memory_then_catalog_then_storage(engine: Engine, tmp_path: Path) -> None:
+    storage = CountingStorage(tmp_path)
+    (tmp_path / "loose.mp3").write_bytes(b"abc")
+    catalog = MediaCatalog(lambda: engine)
+    catalog.record([AssetInfo("hls/1/a.mp3", 417, 1.5, 1, 26, 128_000, "0" * 64)])
+
+    fresh = MediaCatalog(lambda: engine)
+    assert fresh.stat(storage, "hls/1/a.mp3") == StorageStat(417, 1.5)
+    assert fresh.peek("hls/1/a.mp3") == AssetInfo("hls/1/a.mp3", 417, 1.5, 1, 26, 128_000, "0" * 64)
+    assert fresh.stat(storage, "loose.mp3").size == 3
+    assert fresh.stat(storage, "loose.mp3").size == 3
+    for _ in range(2):
+        with pytest.raises(FileNotFoundError):
+            fresh.stat(storage, "missing.mp3")
+    assert storage.stats == 2
+    with pytest.raises(FileNotFoundError):
+        fresh.peek("missing.mp3")
+    assert [asset.path for asset in fresh.product_assets(1)] == ["hls/1/a.mp3"]
+
+
+def test_rescan_describes_changed_files_and_prunes(engine: Engine, tmp_path: Path) -> None:
+    storage = LocalStorage(tmp_path)
+    (tmp_path / "hls" / "3").mkdir(parents=True)
+    (tmp_path / "hls" / "3" / "seg.mp3").write_bytes(MP3_FRAME * 100)
+    (tmp_path / "hls" / "3" / "index.m3u8").write_text("#EXTM3U\n")
+    catalog = MediaCatalog(lambda: engine)
+    catalog.record([AssetInfo("hls/3/gone.mp3", 10)])
+
+    assert rescan(storage, catalog, prefix="hls/", prune=True) == (2, 0, 1)
+    assert rescan(storage, catalog, prefix="hls/") == (0, 2, 0)
+
+    segment = MediaCatalog(lambda: engine).get("hls/3/seg.mp3")
+    assert segment is not None
+    assert segment.product_id == 3
+    assert segment.duration_ms == round(100 * 1152 / 44100 * 1000)
+    assert segment.bitrate == pytest.approx(128_000, rel=0.01)
+    assert MediaCatalog(lambda: engine).get("hls/3/gone.mp3") is None
+
+
+def test_rescan_streams_files_past_the_caches(engine: Engine, tmp_path: Path) -> None:
+    class StreamOnlyStorage(LocalStorage):
+        def read_range(self, path: str, start: int, end: int) -> Buffer:
+            raise AssertionError(f"{path} was read whole")
+
+    (tmp_path / "hls" / "5").mkdir(parents=True)
+    (tmp_path / "hls" / "5" / "seg.mp3").write_bytes(MP3_FRAME * 2000)
+    cached = HotSegmentCache(StreamOnlyStorage(tmp_path), max_bytes=1 << 22)
+
+    assert rescan(cached, MediaCatalog(lambda: engine)) == (1, 0, 0)
+    assert cached.stats().cached_bytes == 0
+    segment = MediaCatalog(lambda: engine).get("hls/5/seg.mp3")
+    assert segment is not None
+    assert segment.sha256 == hashlib.sha256(MP3_FRAME * 2000).hexdigest()
+    assert segment.duration_ms == round(2000 * 1152 / 44100 * 1000)
+
+
+def test_ingest_records_segments_and_playlist(engine: Engine, tmp_path: Path) -> None:
+    (tmp_path / "masters" / "4").mkdir(parents=True)
+    (tmp_path / "masters" / "4" / "01.mp3").write_bytes(MP3_FRAME * 500)
+    catalog = MediaCatalog(lambda: engine)
+
+    ingest(tmp_path / "masters", workers=1, storage_root=str(tmp_path / "media"), catalog=catalog)
+
+    storage: StorageBackend = LocalStorage(tmp_path / "media")
+    assets = catalog.product_assets(4)
+    assert {asset.path for asset in assets} == {
+        path for path, _ in storage.iter_files("hls/4/") if not path.endswith("ingest.json")
+    }
+    assert all(asset.stat == storage.stat(asset.path) for asset in assets)
+    assert rescan(storage, catalog, prefix="hls/4/") == (1, len(assets), 0)
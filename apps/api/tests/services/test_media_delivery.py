@@ -0,0 +1,80 @@
+"""Tests for byte-range parsing and media responses."""
+
+from __future__ import annotations
+
+import asyncio
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+from app.services.media_delivery import (
+    ByteRange,
+    MediaResponse,
+    RangeNotSatisfiable,
+    describe,
+    if_range_allows,
+    parse_range_header,
+)
+from app.services.storage import LocalStorage
+
+
+@pytest.mark.parametrize(
+    ("header", "expected"),
+    [
+        (None, []),
+        ("bytes=0-99", [ByteRange(0, 99)]),
+        ("bytes=900-", [ByteRange(900, 999)]),
+        ("bytes=-100", [ByteRange(900, 999)]),
+        ("bytes=990-2000", [ByteRange(990, 999)]),
+        ("bytes=0-9, 20-29", [ByteRange(0, 9), ByteRange(20, 29)]),
+        ("bytes=20-29,0-9,5-15", [ByteRange(0, 15), ByteRange(20, 29)]),
+        ("bytes=0-9,10-19", [ByteRange(0, 19)]),
+        ("bytes=0-1,2000-3000", [ByteRange(0, 1)]),
+        ("items=0-9", []),
+        ("bytes=9-0", []),
+        ("bytes=abc", []),
+        ("bytes=" + ",".join(f"{index * 10}-{index * 10 + 1}" for index in range(20)), []),
+    ],
+)
+def test_parse_range_header(header: str | None, expected: list[ByteRange]) -> None:
+    assert parse_range_header(header, 1000) == expected
+
+
+@pytest.mark.parametrize("header", ["bytes=1000-", "bytes=-0", "bytes=5000-6000,1000-1001"])
+def test_unsatisfiable_ranges(header: str) -> None:
+    with pytest.raises(RangeNotSatisfiable):
+        parse_range_header(header, 1000)
+
+
+def test_if_range_compares_strong_validators(tmp_path: Path) -> None:
+    (tmp_path / "book.mp3").write_bytes(b"x" * 10)
+    media = describe(LocalStorage(tmp_path), "book.mp3")
+
+    assert if_range_allows(None, media)
+    assert if_range_allows(media.etag, media)
+    assert if_range_allows(media.last_modified, media)
+    assert not if_range_allows(f"W/{media.etag}", media)
+    assert not if_range_allows('"stale"', media)
+    assert not if_range_allows("Mon, 01 Jan 2001 00:00:00 GMT", media)
+
+
+def test_zerocopy_extension_receives_the_file_descriptor(tmp_path: Path) -> None:
+    (tmp_path / "book.mp3").write_bytes(bytes(range(256)))
+    response = MediaResponse(describe(LocalStorage(tmp_path), "book.mp3"), [ByteRange(16, 47)])
+    messages: list[dict[str, Any]] = []
+
+    async def send(message: dict[str, Any]) -> None:
+        if message["type"] == "http.response.zerocopysend":
+            handle = message["file"]
+            handle.seek(message["offset"])
+            message = {**message, "data": handle.read(message["count"])}
+        messages.append(message)
+
+    scope = {"type": "http", "extensions": {"http.response.zerocopysend": {}}}
+    asyncio.run(response(scope, None, send))
+
+    assert messages[0]["status"] == 206
+    assert messages[1]["type"] == "http.response.zerocopysend"
+    assert (messages[1]["offset"], messages[1]["count"], messages[1]["more_body"]) == (16, 32, False)
+    assert messages[1]["data"] == bytes(range(16, 48))
@@ -0,0 +1,198 @@
+"""Tests for media URL signing, including nginx secure_link links."""
+
+from __future__ import annotations
+
+import getpass
+import os
+import shutil
+import socket
+import subprocess
+import time
+from collections.abc import Iterator
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+import httpx
+import pytest
+
+from app.core.config import Settings
+from app.core.security import sign_payload
+from app.services.media_signer import (
+    DEVICE_HEADER,
+    MediaUrlSigner,
+    issue_media_url,
+    issue_media_urls,
+    secure_link_token,
+    sign_secure_link,
+    verify_media_signature,
+)
+
+SNIPPET = Path(__file__).resolve().parents[4] / "infra" / "nginx" / "snippets" / "secure_media.conf"
+SECRET = "nginx-test-secret"
+AUDIO = os.urandom(64 * 1024)
+
+
+def test_signer_matches_sign_payload_and_signs_manifests() -> None:
+    signer = MediaUrlSigner("secret")
+    expires_at = datetime(2030, 1, 1, tzinfo=timezone.utc)
+    expires = int(expires_at.timestamp())
+    urls = [f"/api/media/books/chapter-{index}.mp3" for index in range(3)]
+
+    signed = signer.sign_many(urls, expires_at)
+
+    assert signed == [signer.sign(url, expires_at) for url in urls]
+    assert signed[0] == f"{urls[0]}?sig={sign_payload('secret', f'{urls[0]}|{expires}')}&exp={expires}"
+
+
+def test_verifier_caches_accepted_signatures_but_rechecks_expiry() -> None:
+    signer = MediaUrlSigner("secret", cache_size=2)
+    url = "/api/media/books/a.mp3"
+    signature = signer.signature(url, 1_000)
+    forged = ("0" if signature[0] != "0" else "1") + signature[1:]
+
+    assert signer.verify(url, signature, 1_000, now=900)
+    assert signer.verify(url, signature, 1_000, now=950)
+    assert not signer.verify(url, signature, 1_000, now=1_001)
+    assert not signer.verify(url, forged, 1_000, now=900)
+    assert not signer.verify("/api/media/books/b.mp3", signature, 1_000, now=900)
+    assert not signer.verify(url, signature, 2_000, now=900)
+
+    for other in ("/api/media/x.mp3", "/api/media/y.mp3"):
+        assert signer.verify(other, signer.signature(other, 1_000), 1_000, now=900)
+    assert (url, 1_000, signature) not in signer._verified
+    assert signer.verify(url, signature, 1_000, now=900)
+
+
+def test_secure_link_token_matches_nginx_documentation() -> None:
+    # echo -n '2147483647/s/link127.0.0.1 secret' | openssl md5 -binary | openssl base64 | tr +/ -_ | tr -d =
+    assert secure_link_token("secret", "/s/link", 2147483647, "127.0.0.1") == "_e4Nc3iduzkWRm01TBBNYw"
+
+
+def test_sign_secure_link_encodes_path_and_signs_decoded_uri() -> None:
+    expires_at = datetime(2030, 1, 1, tzinfo=timezone.utc)
+
+    url = sign_secure_link("secret", "/media/books/chapter 1.mp3", expires_at, device_id="dev-1")
+
+    parts = urlsplit(url)
+    query = parse_qs(parts.query)
+    assert parts.path == "/media/books/chapter%201.mp3"
+    assert query["expires"] == [str(int(expires_at.timestamp()))]
+    assert query["md5"] == [
+        secure_link_token("secret", "/media/books/chapter 1.mp3", int(expires_at.timestamp()), "dev-1")
+    ]
+    assert query["md5"] != [secure_link_token("secret", "/media/books/chapter 1.mp3", int(expires_at.timestamp()))]
+
+
+def test_issue_media_url_follows_configured_mode() -> None:
+    expires_at = datetime.now(timezone.utc) + timedelta(minutes=5)
+    api = Settings(hmac_media_secret="api-secret", media_url_mode="api")
+    nginx = Settings(
+        media_link_secret=SECRET, media_url_mode="secure_link", media_public_base_url="https://cdn.example/"
+    )
+
+    api_url = urlsplit(issue_media_url("books/a.mp3", expires_at=expires_at, settings=api))
+    nginx_url = issue_media_url("/books/a.mp3", device_id="dev-1", expires_at=expires_at, settings=nginx)
+
+    query = parse_qs(api_url.query)
+    assert api_url.path == "/api/media/books/a.mp3"
+    assert verify_media_signature("api-secret", api_url.path, query["sig"][0], int(query["exp"][0]))
+    assert nginx_url.startswith("https://cdn.example/media/books/a.mp3?md5=")
+    assert issue_media_urls(["books/a.mp3", "books/b.mp3"], expires_at=expires_at, settings=api) == [
+        issue_media_url(path, expires_at=expires_at, settings=api) for path in ("books/a.mp3", "books/b.mp3")
+    ]
+
+
+def _free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture()
+def nginx(tmp_path: Path) -> Iterator[str]:
+    binary = shutil.which("nginx")
+    if binary is None:
+        pytest.skip("nginx is not installed")
+
+    media = tmp_path / "media"
+    (media / "books").mkdir(parents=True)
+    (media / "books" / "chapter-1.mp3").write_bytes(AUDIO)
+    port = _free_port()
+    user = f"user {getpass.getuser()};" if os.geteuid() == 0 else ""
+    temp_paths = "\n".join(
+        f"{name}_temp_path {tmp_path / name};" for name in ("client_body", "proxy", "fastcgi", "uwsgi", "scgi")
+    )
+    config = tmp_path / "nginx.conf"
+    config.write_text(
+        f"""
+        {user}
+        daemon off;
+        worker_processes 1;
+        pid {tmp_path / "nginx.pid"};
+        error_log {tmp_path / "error.log"};
+        events {{}}
+        http {{
+            access_log off;
+            {temp_paths}
+            server {{
+                listen 127.0.0.1:{port};
+                set $media_link_secret "{SECRET}";
+                set $media_root {media};
+                include {SNIPPET};
+            }}
+        }}
+        """
+    )
+    process = subprocess.Popen([binary, "-p", str(tmp_path), "-e", str(tmp_path / "error.log"), "-c", str(config)])
+    try:
+        base = f"http://127.0.0.1:{port}"
+        for _ in range(100):
+            try:
+                socket.create_connection(("127.0.0.1", port), timeout=0.1).close()
+                break
+            except OSError:
+                if process.poll() is not None:
+                    pytest.fail((tmp_path / "error.log").read_text())
+                time.sleep(0.05)
+        yield base
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+
+
+def test_nginx_serves_signed_links(nginx: str) -> None:
+    future = datetime.now(timezone.utc) + timedelta(minutes=5)
+    past = datetime.now(timezone.utc) - timedelta(minutes=5)
+    url = sign_secure_link(SECRET, "/media/books/chapter-1.mp3", future)
+
+    with httpx.Client(base_url=nginx) as client:
+        whole = client.get(url)
+        partial = client.get(url, headers={"Range": "bytes=100-199"})
+        tampered = client.get(url.replace("chapter-1", "chapter-2"))
+        unsigned = client.get("/media/books/chapter-1.mp3")
+        expired = client.get(sign_secure_link(SECRET, "/media/books/chapter-1.mp3", past))
+
+    assert whole.status_code == 200
+    assert whole.content == AUDIO
+    assert whole.headers["content-type"] == "audio/mpeg"
+    assert partial.status_code == 206
+    assert partial.content == AUDIO[100:200]
+    assert tampered.status_code == 403
+    assert unsigned.status_code == 403
+    assert expired.status_code == 410
+
+
+def test_nginx_checks_device_binding(nginx: str) -> None:
+    future = datetime.now(timezone.utc) + timedelta(minutes=5)
+    url = sign_secure_link(SECRET, "/media/books/chapter-1.mp3", future, device_id="device-a")
+
+    with httpx.Client(base_url=nginx) as client:
+        bound = client.get(url, headers={DEVICE_HEADER: "device-a"})
+        other = client.get(url, headers={DEVICE_HEADER: "device-b"})
+        missing = client.get(url)
+
+    assert bound.status_code == 200
+    assert bound.content == AUDIO
+    assert other.status_code == 403
+    assert missing.status_code == 403
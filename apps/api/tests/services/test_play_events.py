@@ -0,0 +1,93 @@
+"""Tests for the playback event broker."""
+
+from __future__ import annotations
+
+import asyncio
+import threading
+import uuid
+
+import pytest
+
+from app.services.play_events import PlayEventBroker
+
+
+async def _next(queue: asyncio.Queue) -> dict:  # type: ignore[type-arg]
+    return await asyncio.wait_for(queue.get(), timeout=2)
+
+
+def test_events_from_request_threads_reach_only_their_qr() -> None:
+    async def scenario() -> None:
+        broker = PlayEventBroker()
+        await broker.start()
+        target, other = uuid.uuid4(), uuid.uuid4()
+        try:
+            async with broker.subscribe(target) as received, broker.subscribe(other) as ignored:
+                thread = threading.Thread(target=broker.publish, args=(target, {"type": "control"}))
+                thread.start()
+                thread.join()
+
+                assert await _next(received) == {"type": "control"}
+                await asyncio.sleep(0)
+                assert ignored.empty()
+            assert broker.subscriber_count() == 0
+        finally:
+            await broker.stop()
+
+    asyncio.run(scenario())
+
+
+def test_thousands_of_idle_subscribers_share_one_broker() -> None:
+    async def scenario() -> None:
+        broker = PlayEventBroker()
+        await broker.start()
+        qr_ids = [uuid.uuid4() for _ in range(5000)]
+        delivered: list[uuid.UUID] = []
+
+        async def listener(qr_id: uuid.UUID, ready: asyncio.Event) -> None:
+            async with broker.subscribe(qr_id) as queue:
+                ready.set()
+                await queue.get()
+                delivered.append(qr_id)
+
+        events = [asyncio.Event() for _ in qr_ids]
+        tasks = [asyncio.create_task(listener(qr_id, ready)) for qr_id, ready in zip(qr_ids, events)]
+        await asyncio.gather(*(ready.wait() for ready in events))
+        assert broker.subscriber_count() == len(qr_ids)
+
+        broker.publish(qr_ids[1234], {"type": "evicted"})
+        await asyncio.sleep(0.05)
+        assert delivered == [qr_ids[1234]]
+
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await broker.stop()
+        assert broker.subscriber_count() == 0
+
+    asyncio.run(scenario())
+
+
+def test_events_are_fanned_out_through_redis_pubsub() -> None:
+    fakeredis = pytest.importorskip("fakeredis")
+
+    async def scenario() -> None:
+        server = fakeredis.FakeServer()
+        broker = PlayEventBroker(
+            redis_client=fakeredis.FakeRedis(server=server),
+            async_redis_client=fakeredis.aioredis.FakeRedis(server=server),
+        )
+        await broker.start()
+        qr_id = uuid.uuid4()
+        try:
+            async with broker.subscribe(qr_id) as queue:
+                # Wait for the shared pattern subscription to be registered.
+                for _ in range(100):
+                    if broker._redis.pubsub_numpat():  # type: ignore[union-attr]
+                        break
+                    await asyncio.sleep(0.01)
+                broker.publish(qr_id, {"type": "evicted", "session_id": "abc"})
+                assert await _next(queue) == {"type": "evicted", "session_id": "abc"}
+        finally:
+            await broker.stop()
+
+    asyncio.run(scenario())
@@ -0,0 +1,34 @@
+"""Tests for the in-memory fallback of the resume position cache."""
+
+from __future__ import annotations
+
+import uuid
+
+import pytest
+
+from app.core import config
+from app.services.resume_cache import ResumePositionCache
+
+
+def test_least_recently_used_positions_are_evicted() -> None:
+    cache = ResumePositionCache(max_entries=2)
+    qr_id, device_id = uuid.uuid4(), uuid.uuid4()
+
+    cache.set(qr_id, device_id, "a", 1)
+    cache.set(qr_id, device_id, "b", 2)
+    assert cache.get(qr_id, device_id, "a") == 1
+    cache.set(qr_id, device_id, "c", 3)
+
+    assert cache.get(qr_id, device_id, "a") == 1
+    assert cache.get(qr_id, device_id, "b") is None
+    assert cache.get(qr_id, device_id, "c") == 3
+
+
+def test_local_positions_expire(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(config.get_settings(), "resume_cache_local_ttl_seconds", 0.0)
+    cache = ResumePositionCache()
+    qr_id, device_id = uuid.uuid4(), uuid.uuid4()
+
+    cache.set(qr_id, device_id, "a", 1)
+
+    assert cache.get(qr_id, device_id, "a") is None
@@ -0,0 +1,96 @@
+"""Tests for sampler playlist generation."""
+
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+
+from app.core.config import Settings
+from app.services.media_signer import verify_media_signature
+from app.services.sampler import SamplerCache, build_sampler_manifest, parse_media_playlist
+from app.services.storage import LocalStorage
+
+PLAYLIST = """#EXTM3U
+#EXT-X-VERSION:3
+#EXT-X-TARGETDURATION:7
+#EXT-X-PLAYLIST-TYPE:VOD
+#EXTINF:6.500,
+seg-00000.mp3
+#EXTINF:6.500,
+seg-00001.mp3
+#EXTINF:6.500,
+seg-00002.mp3
+#EXTINF:4.000,
+seg-00003.mp3
+#EXT-X-ENDLIST
+"""
+
+
+@pytest.fixture()
+def storage(tmp_path: Path) -> LocalStorage:
+    (tmp_path / "hls" / "7").mkdir(parents=True)
+    (tmp_path / "hls" / "7" / "index.m3u8").write_text(PLAYLIST)
+    return LocalStorage(tmp_path)
+
+
+def _settings(**overrides: object) -> Settings:
+    return Settings(hmac_media_secret="secret", preview_max_seconds=12, preview_manifest_window_seconds=300, **overrides)
+
+
+def test_parse_media_playlist_resolves_paths_and_stops_at_limit() -> None:
+    segments = parse_media_playlist(PLAYLIST, "hls/7/index.m3u8", max_seconds=12)
+
+    assert [segment.path for segment in segments] == ["hls/7/seg-00000.mp3", "hls/7/seg-00001.mp3"]
+    assert [segment.duration for segment in segments] == [6.5, 6.5]
+    assert len(parse_media_playlist(PLAYLIST, "hls/7/index.m3u8")) == 4
+
+
+def test_manifest_is_signed_and_stable_within_a_window(storage: LocalStorage) -> None:
+    cache = SamplerCache()
+    settings = _settings()
+    now = datetime(2026, 10, 19, 12, 1, tzinfo=timezone.utc)
+
+    first = build_sampler_manifest("SAMPLE", 7, storage=storage, cache=cache, settings=settings, now=now)
+    again = build_sampler_manifest(
+        "SAMPLE", 7, storage=storage, cache=cache, settings=settings, now=now + timedelta(minutes=3)
+    )
+    later = build_sampler_manifest(
+        "SAMPLE", 7, storage=storage, cache=cache, settings=settings, now=now + timedelta(minutes=5)
+    )
+
+    assert first.token == "SAMPLE"
+    assert again.etag == first.etag and again.body == first.body
+    assert later.etag != first.etag
+    assert first.valid_until == datetime(2026, 10, 19, 12, 5, tzinfo=timezone.utc)
+    assert first.max_age(now) == 240
+    assert first.duration_seconds == 13.0
+
+    lines = first.body.splitlines()
+    assert lines[0] == "#EXTM3U"
+    assert "#EXT-X-TARGETDURATION:7" in lines
+    assert lines[-1] == "#EXT-X-ENDLIST"
+    urls = [line for line in lines if not line.startswith("#")]
+    assert len(urls) == 2
+    parts = urlsplit(urls[1])
+    query = parse_qs(parts.query)
+    assert parts.path == "/api/media/hls/7/seg-00001.mp3"
+    assert verify_media_signature("secret", parts.path, query["sig"][0], int(query["exp"][0]), now=now.timestamp())
+
+
+def test_segment_lists_are_shared_through_redis(storage: LocalStorage, tmp_path: Path) -> None:
+    fakeredis = pytest.importorskip("fakeredis")
+    redis_client = fakeredis.FakeRedis()
+    settings = _settings()
+    build_sampler_manifest("SAMPLE", 7, storage=storage, cache=SamplerCache(redis_client), settings=settings)
+
+    (tmp_path / "hls" / "7" / "index.m3u8").unlink()
+    other_worker = build_sampler_manifest(
+        "SAMPLE", 7, storage=storage, cache=SamplerCache(redis_client), settings=settings
+    )
+
+    assert other_worker.duration_seconds == 13.0
+    with pytest.raises(FileNotFoundError):
+        build_sampler_manifest("OTHER", 8, storage=storage, cache=SamplerCache(redis_client), settings=settings)
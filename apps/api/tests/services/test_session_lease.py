@@ -0,0 +1,92 @@
+"""Tests for play session leases in Redis and in memory."""
+
+from __future__ import annotations
+
+import time
+import uuid
+from collections.abc import Iterator
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.core import config
+from app.services.session_lease import LeaseHolder, LeaseTakeover, SessionLeaseManager
+
+
+@pytest.fixture(params=["memory", "redis"])
+def leases(request: pytest.FixtureRequest) -> Iterator[SessionLeaseManager]:
+    if request.param == "memory":
+        yield SessionLeaseManager()
+        return
+
+    fakeredis = pytest.importorskip("fakeredis")
+    yield SessionLeaseManager(redis_client=fakeredis.FakeRedis())
+
+
+def _holder() -> LeaseHolder:
+    return LeaseHolder(session_id=uuid.uuid4(), device_id=uuid.uuid4())
+
+
+def test_new_session_takes_over_and_reports_eviction(leases: SessionLeaseManager) -> None:
+    qr_id = uuid.uuid4()
+    first, second = _holder(), _holder()
+
+    assert leases.acquire(qr_id, first) is None
+    assert leases.acquire(qr_id, second) == first
+    assert leases.holder(qr_id) == second
+
+    assert leases.renew(qr_id, first) is False
+    assert leases.renew(qr_id, second) is True
+
+
+def test_release_only_drops_own_lease(leases: SessionLeaseManager) -> None:
+    qr_id = uuid.uuid4()
+    first, second = _holder(), _holder()
+    leases.acquire(qr_id, first)
+
+    assert leases.release(qr_id, second) is False
+    assert leases.release(qr_id, first) is True
+    assert leases.holder(qr_id) is None
+
+
+def test_lost_lease_is_not_retaken_by_renewing(leases: SessionLeaseManager) -> None:
+    qr_id = uuid.uuid4()
+    first, second = _holder(), _holder()
+    leases.acquire(qr_id, first)
+    leases.acquire(qr_id, second)
+    leases.release(qr_id, second)
+
+    # The evicted session must not come back once its successor stops.
+    assert leases.renew(qr_id, first) is False
+    assert leases.renew(qr_id, second) is False
+    assert leases.holder(qr_id) is None
+
+
+def test_expired_lease_is_not_reported_as_evicted(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(config.get_settings(), "play_lease_ttl_seconds", 0.0)
+    leases = SessionLeaseManager()
+    qr_id = uuid.uuid4()
+    leases.acquire(qr_id, _holder())
+
+    assert leases.holder(qr_id) is None
+    assert leases.acquire(qr_id, _holder()) is None
+
+
+def test_lapsed_holder_is_reported_with_its_last_renewal(
+    leases: SessionLeaseManager, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(config.get_settings(), "play_lease_ttl_seconds", 0.05)
+    qr_id = uuid.uuid4()
+    first, second = _holder(), _holder()
+    leases.acquire(qr_id, first)
+    before = datetime.utcnow()
+    assert leases.renew(qr_id, first) is True
+    time.sleep(0.1)
+
+    takeover = leases.take_over(qr_id, second)
+    assert takeover.evicted is None and takeover.lapsed == first
+    assert takeover.lapsed_seen_at is not None
+    assert abs(takeover.lapsed_seen_at - before) < timedelta(seconds=1)
+
+    # The new holder's own lease is live, so nothing lapsed behind it.
+    assert leases.take_over(qr_id, _holder()) == LeaseTakeover(evicted=second)
@@ -0,0 +1,116 @@
+"""Tests for ranged and chunked storage reads."""
+
+from __future__ import annotations
+
+import asyncio
+import io
+import os
+from pathlib import Path
+from typing import BinaryIO, Optional
+
+import pytest
+
+from app.scripts.rescan_media import rescan
+from app.services.media_catalog import MediaCatalog
+from app.services.storage import (
+    Buffer,
+    DiskCachedStorage,
+    HotSegmentCache,
+    LocalStorage,
+    StorageBackend,
+    StorageStat,
+)
+
+DATA = bytes(range(256)) * 64
+
+
+class HandleStorage(StorageBackend):
+    """A backend with only ``open``/``exists``, relying on the defaults."""
+
+    def __init__(self, root: Path) -> None:
+        self.root = root
+
+    def open(self, path: str) -> BinaryIO:
+        return (self.root / path).open("rb")
+
+    def exists(self, path: str) -> bool:
+        return (self.root / path).exists()
+
+
+def _collect(storage: StorageBackend, path: str, start: int = 0, end: Optional[int] = None) -> list[Buffer]:
+    async def collect() -> list[Buffer]:
+        return [chunk async for chunk in storage.iter_chunks(path, start, end, chunk_size=1000)]
+
+    return asyncio.run(collect())
+
+
+@pytest.fixture()
+def root(tmp_path: Path) -> Path:
+    (tmp_path / "book.mp3").write_bytes(DATA)
+    (tmp_path / "empty.mp3").write_bytes(b"")
+    return tmp_path
+
+
+@pytest.mark.parametrize("factory", [LocalStorage, HandleStorage])
+def test_ranged_and_chunked_reads(root: Path, factory: type) -> None:
+    storage = factory(root)
+
+    assert storage.stat("book.mp3").size == len(DATA)
+    assert bytes(storage.read_range("book.mp3", 100, 200)) == DATA[100:200]
+    assert bytes(storage.read_range("book.mp3", len(DATA) - 5, len(DATA) + 50)) == DATA[-5:]
+    assert bytes(storage.read_range("empty.mp3", 0, 10)) == b""
+
+    chunks = _collect(storage, "book.mp3", 10, 2510)
+    assert [len(chunk) for chunk in chunks] == [1000, 1000, 500]
+    assert b"".join(bytes(chunk) for chunk in chunks) == DATA[10:2510]
+    assert b"".join(bytes(chunk) for chunk in _collect(storage, "book.mp3")) == DATA
+    assert _collect(storage, "empty.mp3") == []
+
+
+def test_local_reads_are_views_of_a_refreshed_map(root: Path) -> None:
+    storage = LocalStorage(root, max_maps=1)
+
+    view = storage.read_range("book.mp3", 0, 10)
+    assert isinstance(view, memoryview)
+    assert all(isinstance(chunk, memoryview) for chunk in _collect(storage, "book.mp3"))
+    assert storage.stat("book.mp3") == StorageStat(len(DATA), os.stat(root / "book.mp3").st_mtime)
+
+    # Replacing the file switches to a new map; the earlier view stays readable.
+    (root / "book.tmp").write_bytes(b"new contents")
+    os.replace(root / "book.tmp", root / "book.mp3")
+    assert bytes(storage.read_range("book.mp3", 0, 3)) == b"new"
+    assert bytes(view) == DATA[:10]
+
+    storage.read_range("empty.mp3", 0, 1)
+    with pytest.raises(FileNotFoundError):
+        storage.read_range("../outside.mp3", 0, 1)
+
+
+def test_local_writes_replace_files_atomically(root: Path) -> None:
+    storage = LocalStorage(root)
+    view = storage.read_range("book.mp3", 0, 10)
+
+    storage.write("hls/1/seg.mp3", b"segment")
+    storage.write("book.mp3", memoryview(b"rewritten"))
+
+    assert (root / "hls" / "1" / "seg.mp3").read_bytes() == b"segment"
+    assert bytes(storage.read_range("book.mp3", 0, 9)) == b"rewritten"
+    assert bytes(view) == DATA[:10]
+    assert not [name for name in os.listdir(root) if name.startswith(".tmp-")]
+    with pytest.raises(FileNotFoundError):
+        storage.write("../outside.mp3", b"")
+
+
+def test_writing_and_listing_are_optional(root: Path) -> None:
+    read_only = HandleStorage(root)
+
+    assert LocalStorage(root).writable and LocalStorage(root).listable
+    assert not read_only.writable and not read_only.listable
+    assert DiskCachedStorage(LocalStorage(root), root / "cache", max_bytes=1024).writable
+    assert not HotSegmentCache(read_only, max_bytes=1024).listable
+    with pytest.raises(io.UnsupportedOperation):
+        read_only.write("x.mp3", b"")
+    with pytest.raises(io.UnsupportedOperation):
+        list(read_only.iter_files())
+    with pytest.raises(io.UnsupportedOperation):
+        rescan(read_only, MediaCatalog())